@@ -1,3 +1,4 @@
+import asyncio
 import base64
 import csv
 import hmac
@@ -25,6 +26,12 @@ from urllib import parse as urlparse2
 from config import (
     AMOUNT_EPS,
     ADMIN_WEB_ACTIONS_ENABLE,
+    ADMIN_WEB_KEEPALIVE_SEC,
+    ADMIN_WEB_MAX_BODY_MB,
+    ADMIN_WEB_MAX_UPLOAD_MB,
+    ADMIN_WEB_MAX_PENDING,
+    ADMIN_WEB_SERVER_MODE,
+    ADMIN_WEB_WORKERS,
     ADMIN_WEB_ENABLE,
     ADMIN_WEB_ALLOW_IPS,
     ADMIN_WEB_HOST,
@@ -47,13 +54,18 @@ from config import (
     PAID_CHANNEL_ID,
     PLANS,
 )
-from core.db import get_conn
+from core.db import get_conn, pool_size, pool_stats, set_role as set_db_role
+from core import archive, user_cache, view_buffer
+from chain.balance_snapshot import tracked_addresses
+from core.aio_http import AsyncHTTPServer
+from core.router import Request, Router
 from core.models import (
     admin_create_download_job,
     admin_create_video_job,
     admin_set_video_publish,
     admin_set_video_sort,
     admin_update_video_meta,
+    get_latest_balance_snapshots,
     get_user,
     init_tables,
     list_banners,
@@ -65,9 +77,9 @@ from core.models import (
     local_uploader_claim_next,
     local_uploader_update,
     mark_order_success,
-    record_video_view,
     set_usdt_tx_status,
     set_video_category,
+    sync_member_since,
     upsert_banner,
     upsert_category,
     update_user_payment,
@@ -244,6 +256,27 @@ def _safe_join(base_dir: str, rel: str) -> str | None:
     return full
 
 
+def _static_file(path: str) -> tuple[str, str] | None:
+    """
+    asyncio 模式下由事件循环直接发送的静态文件（/uploads/、/webapp/）；不存在或路径非法时返回 None，交给 Handler 按原逻辑响应
+    """
+    if path.startswith("/uploads/"):
+        full = _safe_join(_uploads_dir(), path[len("/uploads/") :])
+    elif path.startswith("/webapp/"):
+        if ".." in path:
+            return None
+        rel = path[len("/webapp/") :]
+        if not rel or rel.endswith("/"):
+            rel += "index.html"
+        full = _safe_join(os.path.join(os.path.dirname(os.path.abspath(__file__)), "webapp"), rel)
+    else:
+        return None
+    if not full or not os.path.isfile(full):
+        return None
+    ctype, _ = mimetypes.guess_type(full)
+    return full, ctype or "application/octet-stream"
+
+
 def _public_base_url(handler: BaseHTTPRequestHandler) -> str:
     proto = (handler.headers.get("X-Forwarded-Proto") or "").strip() or "http"
     host = (handler.headers.get("Host") or "").strip()
@@ -704,6 +737,8 @@ function cardsHtml(s){
     ["最后入账", s.last_credited_at || "—"],
     ["App 心跳", (s.hb_app_age_sec==null ? "—" : (s.hb_app_age_sec + "s"))],
     ["Userbot 心跳", (s.hb_userbot_age_sec==null ? "—" : (s.hb_userbot_age_sec + "s"))],
+    ["地址余额合计", s.balance_addrs ? (s.balance_total + " USDT / " + s.balance_addrs + " 个地址") : "—"],
+    ["余额快照时间", s.balance_snapshot_at || "—"],
   ];
   return items.map(([k,v]) => `<div class="card"><div class="k">${k}</div><div class="v">${v}</div></div>`).join("");
 }
@@ -1393,7 +1428,12 @@ class Handler(BaseHTTPRequestHandler):
         self.send_header("Content-Length", str(len(body)))
         self.send_header("Cache-Control", "no-store")
         self.end_headers()
-        self.wfile.write(body)
+        # HEAD 与 GET 共用路由：头部（含 Content-Length）照常发，不写响应体
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, obj, code: int = 200):
+        self._send(code, _json_bytes(obj), "application/json; charset=utf-8")
 
     def _send_csv(self, filename: str, body: bytes):
         self.send_response(200)
@@ -1402,7 +1442,25 @@ class Handler(BaseHTTPRequestHandler):
         self.send_header("Content-Length", str(len(body)))
         self.send_header("Cache-Control", "no-store")
         self.end_headers()
-        self.wfile.write(body)
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_file(self, full: str):
+        ctype, _ = mimetypes.guess_type(full)
+        if not ctype:
+            ctype = "application/octet-stream"
+        if self.command == "HEAD":
+            try:
+                size = int(os.path.getsize(full))
+            except Exception:
+                size = 0
+            return self._send_headers_only(200, ctype, size)
+        try:
+            with open(full, "rb") as f:
+                data = f.read()
+        except Exception:
+            return self._send(500, b"read failed", "text/plain; charset=utf-8")
+        return self._send(200, data, ctype)
 
     def _unauthorized(self):
         self.send_response(HTTPStatus.UNAUTHORIZED)
@@ -1434,1010 +1492,855 @@ class Handler(BaseHTTPRequestHandler):
             return False
         return True
 
-    def _head_static_webapp(self, path: str):
-        if ".." in path:
-            return self._forbidden("invalid path")
-        rel_path = path[len("/webapp/") :]
-        if not rel_path or rel_path.endswith("/"):
-            rel_path += "index.html"
-        base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "webapp")
-        full_path = os.path.join(base_dir, rel_path)
-        if not os.path.abspath(full_path).startswith(base_dir):
-            return self._forbidden("invalid path")
-        if not os.path.exists(full_path) or not os.path.isfile(full_path):
-            return self._send_headers_only(404, "text/plain", 0)
-        ctype, _ = mimetypes.guess_type(full_path)
-        if not ctype:
-            ctype = "application/octet-stream"
+    def _read_json(self) -> dict:
         try:
-            size = int(os.path.getsize(full_path))
+            n = int(self.headers.get("Content-Length") or "0")
         except Exception:
-            size = 0
-        return self._send_headers_only(200, ctype, size)
+            n = 0
+        raw = self.rfile.read(n) if n > 0 else b"{}"
+        try:
+            return json.loads(raw.decode("utf-8", errors="ignore") or "{}")
+        except Exception:
+            return {}
 
-    def do_HEAD(self):
-        u = urlparse(self.path)
-        path = u.path
-
-        if path.startswith("/uploads/"):
-            rel = path[len("/uploads/") :]
-            base = _uploads_dir()
-            full = _safe_join(base, rel)
-            if not full or not os.path.exists(full) or not os.path.isfile(full):
-                return self._send_headers_only(404, "text/plain", 0)
-            ctype, _ = mimetypes.guess_type(full)
-            if not ctype:
-                ctype = "application/octet-stream"
-            try:
-                size = int(os.path.getsize(full))
-            except Exception:
-                size = 0
-            return self._send_headers_only(200, ctype, size)
+    def _actor(self) -> str:
+        return getattr(self, "_auth_user", ADMIN_WEB_USER)
 
-        if path.startswith("/webapp/"):
-            return self._head_static_webapp(path)
-
-        if path == "/health":
-            ip = _client_ip(self)
-            if not _ip_allowed(ip):
-                self.send_response(HTTPStatus.FORBIDDEN)
-                self.send_header("Content-Type", "text/plain; charset=utf-8")
-                self.send_header("Content-Length", "14")
-                self.send_header("Cache-Control", "no-store")
-                self.end_headers()
-                return
-            body = _json_bytes({"ok": True, "ts": _utc_now().isoformat()})
-            return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-        if path.startswith("/api/webapp/"):
-            qs = parse_qs(u.query)
-            init_data = self.headers.get("X-Telegram-Init-Data") or (qs.get("initData", [""])[0] or "")
-            user_data = _validate_webapp_init_data(init_data, BOT_TOKEN)
-
-            if path == "/api/webapp/auth":
-                if not user_data:
-                    return self._send_headers_only(401, "text/plain", len(b"Invalid initData"))
-                uid = int(user_data.get("id"))
-                u = get_user(uid)
-                is_vip = False
-                if u and u.get("paid_until"):
-                    if u["paid_until"] > _utc_now():
-                        is_vip = True
-                body = _json_bytes({"user": u, "is_vip": is_vip, "bot_username": BOT_USERNAME})
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            if path == "/api/webapp/config":
-                banners = list_banners(active_only=True)
-                for b in banners:
-                    b["image_url"] = _normalize_cover_for_webapp(self, b.get("image_url") or "") or (b.get("image_url") or "")
-                body = _json_bytes({"categories": list_categories(visible_only=True), "banners": banners})
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            if path == "/api/webapp/plans":
-                body = _json_bytes({"plans": PLANS})
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            if path == "/api/webapp/poker/auth":
-                if not user_data:
-                    return self._send_headers_only(401, "text/plain", len(b"Invalid initData"))
-                if not _poker_is_allowed(user_data):
-                    body = _json_bytes({"ok": False, "error": "not allowed"})
-                    return self._send_headers_only(403, "application/json; charset=utf-8", len(body))
-                uid = int(user_data.get("id"))
-                u = get_user(uid)
-                pid = poker_upsert_player(uid, user_data.get("username"))
-                body = _json_bytes({"ok": True, "user": u, "player_id": pid})
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            if path == "/api/webapp/poker/game_get_or_create":
-                if not user_data:
-                    return self._send_headers_only(401, "text/plain", len(b"Invalid initData"))
-                if not _poker_is_allowed(user_data):
-                    body = _json_bytes({"ok": False, "error": "not allowed"})
-                    return self._send_headers_only(403, "application/json; charset=utf-8", len(body))
-                code = (qs.get("code", ["default"])[0] or "default").strip()
-                r = poker_get_or_create_game(code, int(user_data.get("id")), user_data.get("username"))
-                body = _json_bytes(r)
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            if path == "/api/webapp/poker/game_join":
-                if not user_data:
-                    return self._send_headers_only(401, "text/plain", len(b"Invalid initData"))
-                if not _poker_is_allowed(user_data):
-                    body = _json_bytes({"ok": False, "error": "not allowed"})
-                    return self._send_headers_only(403, "application/json; charset=utf-8", len(body))
-                code = (qs.get("code", ["default"])[0] or "default").strip()
-                r = poker_join_game(code, int(user_data.get("id")), user_data.get("username"))
-                body = _json_bytes(r)
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            if path == "/api/webapp/poker/game_start":
-                if not user_data:
-                    return self._send_headers_only(401, "text/plain", len(b"Invalid initData"))
-                if not _poker_is_allowed(user_data):
-                    body = _json_bytes({"ok": False, "error": "not allowed"})
-                    return self._send_headers_only(403, "application/json; charset=utf-8", len(body))
-                gid = int((qs.get("game_id", ["0"])[0] or "0"))
-                r = poker_start_game(gid)
-                body = _json_bytes(r)
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            if path == "/api/webapp/poker/game_state":
-                if not user_data:
-                    return self._send_headers_only(401, "text/plain", len(b"Invalid initData"))
-                if not _poker_is_allowed(user_data):
-                    body = _json_bytes({"ok": False, "error": "not allowed"})
-                    return self._send_headers_only(403, "application/json; charset=utf-8", len(body))
-                gid = int((qs.get("game_id", ["0"])[0] or "0"))
-                try:
-                    poker_auto_fold_if_timeout(gid)
-                except Exception:
-                    pass
-                r = poker_game_state(gid, int(user_data.get("id")))
-                body = _json_bytes(r)
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            if path == "/api/webapp/poker/balances":
-                if not user_data:
-                    return self._send_headers_only(401, "text/plain", len(b"Invalid initData"))
-                if not _poker_is_allowed(user_data):
-                    body = _json_bytes({"ok": False, "error": "not allowed"})
-                    return self._send_headers_only(403, "application/json; charset=utf-8", len(body))
-                poker_upsert_player(int(user_data.get("id")), user_data.get("username"))
-                body = _json_bytes({"ok": True, "items": poker_balances()})
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            if path == "/api/webapp/poker/ledgers":
-                if not user_data:
-                    return self._send_headers_only(401, "text/plain", len(b"Invalid initData"))
-                if not _poker_is_allowed(user_data):
-                    body = _json_bytes({"ok": False, "error": "not allowed"})
-                    return self._send_headers_only(403, "application/json; charset=utf-8", len(body))
-                poker_upsert_player(int(user_data.get("id")), user_data.get("username"))
-                limit = int((qs.get("limit", ["200"])[0] or "200"))
-                days = int((qs.get("days", ["30"])[0] or "30"))
-                body = _json_bytes({"ok": True, "items": poker_list_ledgers(limit=limit, days=days)})
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            if path == "/api/webapp/videos":
-                q = (qs.get("q", [""])[0] or "").strip()
-                page = int((qs.get("page", ["1"])[0] or "1"))
-                limit = int((qs.get("limit", ["20"])[0] or "20"))
-                cat_id = int((qs.get("category_id", ["0"])[0] or "0"))
-                sort = (qs.get("sort", ["latest"])[0] or "latest")
-                is_vip = False
-                if user_data:
-                    uid = int(user_data.get("id"))
-                    u = get_user(uid)
-                    if u and u.get("paid_until") and u["paid_until"] > _utc_now():
-                        is_vip = True
-                data = list_videos(q=q, page=page, limit=limit, category_id=cat_id, sort=sort)
-                for item in data["items"]:
-                    item["cover_url"] = _normalize_cover_for_webapp(self, item.get("cover_url") or "")
-                    item["paid_link"] = (item.get("video_url") or "").strip() or None
-                    item["free_link"] = (item.get("preview_url") or "").strip() or None
-                    if not item["paid_link"] and item.get("channel_id") and item.get("message_id"):
-                        paid_cid = str(item["channel_id"])
-                        if paid_cid.startswith("-100"):
-                            paid_cid = paid_cid[4:]
-                        item["paid_link"] = f"https://t.me/c/{paid_cid}/{item['message_id']}"
-                    if not item["free_link"] and item.get("free_channel_id") and item.get("free_message_id"):
-                        free_cid = str(item["free_channel_id"])
-                        if free_cid.startswith("-100"):
-                            free_cid = free_cid[4:]
-                        item["free_link"] = f"https://t.me/c/{free_cid}/{item['free_message_id']}"
-                    item["is_locked"] = not is_vip
-                body = _json_bytes(data)
-                return self._send_headers_only(200, "application/json; charset=utf-8", len(body))
-
-            return self._send_headers_only(404, "text/plain", 0)
-
-        if not self._require_auth():
-            return
-        return self._send_headers_only(200, "text/plain", 0)
+    def _actor_ip(self) -> str:
+        return getattr(self, "_auth_ip", self.client_address[0])
+
+    def do_HEAD(self):
+        _ROUTES.dispatch(self) or self._send_headers_only(404, "text/plain", 0)
 
     def do_GET(self):
-        u = urlparse(self.path)
-        path = u.path
-
-        if path.startswith("/uploads/"):
-            rel = path[len("/uploads/") :]
-            base = _uploads_dir()
-            full = _safe_join(base, rel)
-            if not full or not os.path.exists(full) or not os.path.isfile(full):
-                return self._send(404, b"Not Found", "text/plain; charset=utf-8")
-            ctype, _ = mimetypes.guess_type(full)
-            if not ctype:
-                ctype = "application/octet-stream"
-            try:
-                with open(full, "rb") as f:
-                    data = f.read()
-            except Exception:
-                return self._send(500, b"read failed", "text/plain; charset=utf-8")
-            return self._send(200, data, ctype)
-
-        if path.startswith("/webapp/"):
-            return self._serve_static_webapp(path)
-
-        if path.startswith("/api/webapp/"):
-            qs = parse_qs(u.query)
-            init_data = self.headers.get("X-Telegram-Init-Data") or (qs.get("initData", [""])[0] or "")
-            user_data = _validate_webapp_init_data(init_data, BOT_TOKEN)
-
-            if path == "/api/webapp/auth":
-                if not user_data:
-                    return self._send(401, b"Invalid initData", "text/plain")
-                uid = int(user_data.get("id"))
-                u = get_user(uid)
-                is_vip = False
-                if u and u.get("paid_until"):
-                    if u["paid_until"] > _utc_now():
-                        is_vip = True
-                return self._send(200, _json_bytes({"user": u, "is_vip": is_vip, "bot_username": BOT_USERNAME}), "application/json; charset=utf-8")
-            
-            if path == "/api/webapp/config":
-                banners = list_banners(active_only=True)
-                for b in banners:
-                    b["image_url"] = _normalize_cover_for_webapp(self, b.get("image_url") or "") or (b.get("image_url") or "")
-                return self._send(200, _json_bytes({
-                    "categories": list_categories(visible_only=True),
-                    "banners": banners
-                }), "application/json; charset=utf-8")
-
-            if path == "/api/webapp/plans":
-                return self._send(200, _json_bytes({"plans": PLANS}), "application/json; charset=utf-8")
-
-            if path == "/api/webapp/poker/auth":
-                if not user_data:
-                    return self._send(401, b"Invalid initData", "text/plain")
-                if not _poker_is_allowed(user_data):
-                    return self._send(403, _json_bytes({"ok": False, "error": "not allowed"}), "application/json; charset=utf-8")
-                uid = int(user_data.get("id"))
-                u = get_user(uid)
-                pid = poker_upsert_player(uid, user_data.get("username"))
-                return self._send(200, _json_bytes({"ok": True, "user": u, "player_id": pid}), "application/json; charset=utf-8")
-
-            if path == "/api/webapp/poker/game_get_or_create":
-                if not user_data:
-                    return self._send(401, b"Invalid initData", "text/plain")
-                if not _poker_is_allowed(user_data):
-                    return self._send(403, _json_bytes({"ok": False, "error": "not allowed"}), "application/json; charset=utf-8")
-                code = (qs.get("code", ["default"])[0] or "default").strip()
-                r = poker_get_or_create_game(code, int(user_data.get("id")), user_data.get("username"))
-                return self._send(200, _json_bytes(r), "application/json; charset=utf-8")
-
-            if path == "/api/webapp/poker/game_join":
-                if not user_data:
-                    return self._send(401, b"Invalid initData", "text/plain")
-                if not _poker_is_allowed(user_data):
-                    return self._send(403, _json_bytes({"ok": False, "error": "not allowed"}), "application/json; charset=utf-8")
-                code = (qs.get("code", ["default"])[0] or "default").strip()
-                r = poker_join_game(code, int(user_data.get("id")), user_data.get("username"))
-                return self._send(200, _json_bytes(r), "application/json; charset=utf-8")
-
-            if path == "/api/webapp/poker/game_start":
-                if not user_data:
-                    return self._send(401, b"Invalid initData", "text/plain")
-                if not _poker_is_allowed(user_data):
-                    return self._send(403, _json_bytes({"ok": False, "error": "not allowed"}), "application/json; charset=utf-8")
-                gid = int((qs.get("game_id", ["0"])[0] or "0"))
-                r = poker_start_game(gid)
-                return self._send(200, _json_bytes(r), "application/json; charset=utf-8")
-
-            if path == "/api/webapp/poker/game_state":
-                if not user_data:
-                    return self._send(401, b"Invalid initData", "text/plain")
-                if not _poker_is_allowed(user_data):
-                    return self._send(403, _json_bytes({"ok": False, "error": "not allowed"}), "application/json; charset=utf-8")
-                gid = int((qs.get("game_id", ["0"])[0] or "0"))
-                try:
-                    poker_auto_fold_if_timeout(gid)
-                except Exception:
-                    pass
-                r = poker_game_state(gid, int(user_data.get("id")))
-                return self._send(200, _json_bytes(r), "application/json; charset=utf-8")
-
-            if path == "/api/webapp/poker/balances":
-                if not user_data:
-                    return self._send(401, b"Invalid initData", "text/plain")
-                if not _poker_is_allowed(user_data):
-                    return self._send(403, _json_bytes({"ok": False, "error": "not allowed"}), "application/json; charset=utf-8")
-                poker_upsert_player(int(user_data.get("id")), user_data.get("username"))
-                return self._send(200, _json_bytes({"ok": True, "items": poker_balances()}), "application/json; charset=utf-8")
-
-            if path == "/api/webapp/poker/ledgers":
-                if not user_data:
-                    return self._send(401, b"Invalid initData", "text/plain")
-                if not _poker_is_allowed(user_data):
-                    return self._send(403, _json_bytes({"ok": False, "error": "not allowed"}), "application/json; charset=utf-8")
-                poker_upsert_player(int(user_data.get("id")), user_data.get("username"))
-                limit = int((qs.get("limit", ["200"])[0] or "200"))
-                days = int((qs.get("days", ["30"])[0] or "30"))
-                return self._send(200, _json_bytes({"ok": True, "items": poker_list_ledgers(limit=limit, days=days)}), "application/json; charset=utf-8")
-
-            if path == "/api/webapp/videos":
-                q = (qs.get("q", [""])[0] or "").strip()
-                page = int((qs.get("page", ["1"])[0] or "1"))
-                limit = int((qs.get("limit", ["20"])[0] or "20"))
-                cat_id = int((qs.get("category_id", ["0"])[0] or "0"))
-                sort = (qs.get("sort", ["latest"])[0] or "latest")
-                
-                is_vip = False
-                if user_data:
-                    uid = int(user_data.get("id"))
-                    u = get_user(uid)
-                    if u and u.get("paid_until") and u["paid_until"] > _utc_now():
-                        is_vip = True
-                
-                data = list_videos(q=q, page=page, limit=limit, category_id=cat_id, sort=sort)
-                for item in data["items"]:
-                    item["cover_url"] = _normalize_cover_for_webapp(self, item.get("cover_url") or "")
-                    item["paid_link"] = (item.get("video_url") or "").strip() or None
-                    item["free_link"] = (item.get("preview_url") or "").strip() or None
-                    if not item["paid_link"] and item.get("channel_id") and item.get("message_id"):
-                        paid_cid = str(item["channel_id"])
-                        if paid_cid.startswith("-100"):
-                            paid_cid = paid_cid[4:]
-                        item["paid_link"] = f"https://t.me/c/{paid_cid}/{item['message_id']}"
-                    if not item["free_link"] and item.get("free_channel_id") and item.get("free_message_id"):
-                         free_cid = str(item["free_channel_id"])
-                         if free_cid.startswith("-100"):
-                             free_cid = free_cid[4:]
-                         item["free_link"] = f"https://t.me/c/{free_cid}/{item['free_message_id']}"
-                    
-                    item["is_locked"] = not is_vip
-                    
-                return self._send(200, _json_bytes(data), "application/json; charset=utf-8")
-
-            if path == "/api/webapp/track_view":
-                if not user_data:
-                    return self._send(401, b"Invalid initData", "text/plain")
-                vid = int((qs.get("video_id", ["0"])[0] or "0"))
-                if vid > 0:
-                    try:
-                        record_video_view(int(user_data.get("id")), vid)
-                    except Exception:
-                        pass
-                return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
-            
-            return self._send(404, b"Not Found", "text/plain")
+        _ROUTES.dispatch(self) or self._send(404, b"not found", "text/plain; charset=utf-8")
 
-        if path.startswith("/api/local_uploader/"):
-            qs = parse_qs(u.query)
-            if not self._require_local_uploader(qs):
-                return
-            if path == "/api/local_uploader/claim":
-                job = local_uploader_claim_next()
-                return self._send(200, _json_bytes({"job": job}), "application/json; charset=utf-8")
-            if path == "/api/local_uploader/download_claim":
-                job = local_downloader_claim_next()
-                return self._send(200, _json_bytes({"job": job}), "application/json; charset=utf-8")
-            return self._send(404, b"Not Found", "text/plain")
-
-        if path == "/health":
-            ip = _client_ip(self)
-            if not _ip_allowed(ip):
-                return self._forbidden("ip not allowed")
-            body = _json_bytes({"ok": True, "ts": _utc_now().isoformat()})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if not self._require_auth():
-            return
+    def do_POST(self):
+        _ROUTES.dispatch(self) or self._send(404, b"not found", "text/plain; charset=utf-8")
 
-        if path == "/":
-            return self._send(200, INDEX_HTML.encode("utf-8"), "text/html; charset=utf-8")
-
-        if path == "/api/stats":
-            body = _json_bytes(stats())
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/videos_admin":
-            qs = parse_qs(u.query)
-            q = (qs.get("q", [""])[0] or "").strip()
-            status = (qs.get("status", [""])[0] or "").strip() or None
-            limit = int((qs.get("limit", ["200"])[0] or "200"))
-            body = _json_bytes({"items": list_videos_admin(q=q, limit=limit, status=status)})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/download_jobs":
-            qs = parse_qs(u.query)
-            status = (qs.get("status", [""])[0] or "").strip() or None
-            limit = int((qs.get("limit", ["200"])[0] or "200"))
-            body = _json_bytes({"items": list_download_jobs(limit=limit, status=status)})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/worldcup":
-            body = _json_bytes(worldcup_live())
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/users":
-            qs = parse_qs(u.query)
-            q = (qs.get("q", [""])[0] or "").strip()
-            limit = int((qs.get("limit", ["50"])[0] or "50"))
-            body = _json_bytes({"items": list_users(q=q, limit=limit)})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/user_detail":
-            qs = parse_qs(u.query)
-            telegram_id = int((qs.get("telegram_id", ["0"])[0] or "0"))
-            body = _json_bytes(user_detail(telegram_id))
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/orders":
-            qs = parse_qs(u.query)
-            hours = int((qs.get("hours", ["24"])[0] or "24"))
-            limit = int((qs.get("limit", ["50"])[0] or "50"))
-            body = _json_bytes({"items": list_orders(hours=hours, limit=limit)})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/coupons":
-            qs = parse_qs(u.query)
-            limit = int((qs.get("limit", ["50"])[0] or "50"))
-            body = _json_bytes({"items": list_coupons(limit=limit)})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/access_codes":
-            qs = parse_qs(u.query)
-            limit = int((qs.get("limit", ["50"])[0] or "50"))
-            body = _json_bytes({"items": list_access_codes(limit=limit)})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/broadcast_jobs":
-            qs = parse_qs(u.query)
-            limit = int((qs.get("limit", ["30"])[0] or "30"))
-            body = _json_bytes({"items": list_broadcast_jobs(limit=limit)})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/broadcast_logs":
-            qs = parse_qs(u.query)
-            job_id = int((qs.get("job_id", ["0"])[0] or "0"))
-            limit = int((qs.get("limit", ["200"])[0] or "200"))
-            body = _json_bytes({"items": list_broadcast_logs(job_id=job_id, limit=limit)})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/broadcast_preview":
-            qs = parse_qs(u.query)
-            segment = (qs.get("segment", [""])[0] or "").strip()
-            source = (qs.get("source", [""])[0] or "").strip()
-            targets = _pick_broadcast_targets(segment, source or None)
-            body = _json_bytes({"count": len(targets), "sample": targets[:10]})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/reconcile":
-            qs = parse_qs(u.query)
-            pending_min = int((qs.get("pending_min", ["60"])[0] or "60"))
-            limit = int((qs.get("limit", ["50"])[0] or "50"))
-            body = _json_bytes(
-                {
-                    "unmatched_txs": list_unmatched_txs(limit=limit),
-                    "pending_orders": list_pending_orders_older(minutes=pending_min, limit=limit),
-                }
-            )
-            return self._send(200, body, "application/json; charset=utf-8")
+    def log_message(self, format, *args):
+        return
 
-        if path == "/api/categories":
-            body = _json_bytes({"items": list_categories(visible_only=False)})
-            return self._send(200, body, "application/json; charset=utf-8")
-        
-        if path == "/api/banners":
-            body = _json_bytes({"items": list_banners(active_only=False)})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/export/users.csv":
-            qs = parse_qs(u.query)
-            q = (qs.get("q", [""])[0] or "").strip()
-            limit = int((qs.get("limit", ["2000"])[0] or "2000"))
-            rows = list_users(q=q, limit=limit)
-            cols = ["telegram_id", "username", "paid_until", "total_received", "wallet_addr", "first_source", "last_source", "last_source_at", "is_blacklisted", "is_whitelisted", "note", "created_at"]
-            body = _csv_bytes(rows, cols)
-            return self._send_csv("users.csv", body)
-
-        if path == "/api/export/coupons.csv":
-            qs = parse_qs(u.query)
-            limit = int((qs.get("limit", ["20000"])[0] or "20000"))
-            rows = list_coupons(limit=limit)
-            cols = ["code", "kind", "value", "plan_codes", "max_uses", "used_count", "expires_at", "active", "created_at"]
-            body = _csv_bytes(rows, cols)
-            return self._send_csv("coupons.csv", body)
-
-        if path == "/api/export/access_codes.csv":
-            qs = parse_qs(u.query)
-            limit = int((qs.get("limit", ["20000"])[0] or "20000"))
-            rows = list_access_codes(limit=limit)
-            cols = ["code", "days", "plan_code", "max_uses", "used_count", "expires_at", "note", "created_by", "created_at", "last_used_at"]
-            body = _csv_bytes(rows, cols)
-            return self._send_csv("access_codes.csv", body)
-
-        if path == "/api/export/orders.csv":
-            qs = parse_qs(u.query)
-            hours = int((qs.get("hours", ["168"])[0] or "168"))
-            limit = int((qs.get("limit", ["5000"])[0] or "5000"))
-            rows = list_orders(hours=hours, limit=limit)
-            cols = ["id", "telegram_id", "addr", "amount", "plan_code", "status", "tx_id", "created_at"]
-            body = _csv_bytes(rows, cols)
-            return self._send_csv("orders.csv", body)
-
-        if path == "/api/export/txs.csv":
-            qs = parse_qs(u.query)
-            hours = int((qs.get("hours", ["168"])[0] or "168"))
-            limit = int((qs.get("limit", ["5000"])[0] or "5000"))
-            rows = list_txs(hours=hours, limit=limit)
-            cols = ["tx_id", "telegram_id", "addr", "from_addr", "amount", "status", "plan_code", "credited_amount", "processed_at", "block_time", "created_at"]
-            body = _csv_bytes(rows, cols)
-            return self._send_csv("txs.csv", body)
-
-        if path == "/api/export/broadcast_logs.csv":
-            qs = parse_qs(u.query)
-            job_id = int((qs.get("job_id", ["0"])[0] or "0"))
-            limit = int((qs.get("limit", ["20000"])[0] or "20000"))
-            rows = list_broadcast_logs(job_id=job_id, limit=limit)
-            cols = ["telegram_id", "status", "error", "created_at"]
-            body = _csv_bytes(rows, cols)
-            return self._send_csv(f"broadcast_{job_id}.csv", body)
-
-        if path == "/api/export/admin_audit.csv":
-            qs = parse_qs(u.query)
-            hours = int((qs.get("hours", ["168"])[0] or "168"))
-            limit = int((qs.get("limit", ["5000"])[0] or "5000"))
-            rows = list_admin_audit(hours=hours, limit=limit)
-            cols = ["id", "actor", "action", "target_id", "payload", "created_at"]
-            body = _csv_bytes(rows, cols)
-            return self._send_csv("admin_audit.csv", body)
-
-        self._send(404, b"not found", "text/plain; charset=utf-8")
 
-    def do_POST(self):
-        u = urlparse(self.path)
-        path = u.path
+# ---- 路由表 ----
+# 中间件签名 (handler, req) -> bool，返回 False 表示已经写了响应（403 / 401 等），后续中间件和处理函数不再执行。
+# 未匹配任何精确路径的请求落到前缀兜底路由上，保持原来的顺序语义：
+# /api/webapp/ 下未知路径直接 404；/api/local_uploader/ 先验 token 再 404；其余路径先过后台鉴权再 404。
 
-        if path.startswith("/api/local_uploader/"):
-            qs = parse_qs(u.query)
-            if not self._require_local_uploader(qs):
-                return
-            try:
-                n = int(self.headers.get("Content-Length") or "0")
-            except Exception:
-                n = 0
-            raw = self.rfile.read(n) if n > 0 else b"{}"
-            try:
-                data = json.loads(raw.decode("utf-8", errors="ignore") or "{}")
-            except Exception:
-                data = {}
-
-            if path == "/api/local_uploader/update":
-                local_uploader_update(
-                    video_id=int(data.get("video_id") or 0),
-                    upload_status=(data.get("upload_status") or "").strip(),
-                    channel_id=data.get("channel_id"),
-                    message_id=data.get("message_id"),
-                    free_channel_id=data.get("free_channel_id"),
-                    free_message_id=data.get("free_message_id"),
-                    file_id=data.get("file_id"),
-                    error=data.get("error"),
-                )
-                return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
-            if path == "/api/local_uploader/download_update":
-                local_downloader_update(
-                    job_id=int(data.get("job_id") or 0),
-                    status=(data.get("status") or "").strip(),
-                    progress=data.get("progress"),
-                    file_size=data.get("file_size"),
-                    filename=data.get("filename"),
-                    started_at=None,
-                    finished_at=None,
-                    error=data.get("error"),
-                )
-                return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
-            return self._send(404, b"Not Found", "text/plain")
-
-        if path.startswith("/api/webapp/poker/"):
-            qs = parse_qs(u.query)
-            init_data = self.headers.get("X-Telegram-Init-Data") or (qs.get("initData", [""])[0] or "")
-            user_data = _validate_webapp_init_data(init_data, BOT_TOKEN)
-            if not user_data:
-                return self._send(401, b"Invalid initData", "text/plain")
-            if not _poker_is_allowed(user_data):
-                return self._send(403, _json_bytes({"ok": False, "error": "not allowed"}), "application/json; charset=utf-8")
-            try:
-                n = int(self.headers.get("Content-Length") or "0")
-            except Exception:
-                n = 0
-            raw = self.rfile.read(n) if n > 0 else b"{}"
-            try:
-                data = json.loads(raw.decode("utf-8", errors="ignore") or "{}")
-            except Exception:
-                data = {}
-            if path == "/api/webapp/poker/ledger_add":
-                uid = int(user_data.get("id"))
-                pid = poker_upsert_player(uid, user_data.get("username"))
-                amt_raw = str(data.get("amount") or "").strip()
-                try:
-                    amt = Decimal(amt_raw)
-                except Exception:
-                    return self._send(400, _json_bytes({"ok": False, "error": "bad amount"}), "application/json; charset=utf-8")
-                note = (data.get("note") or "").strip()
-                poker_add_ledger(pid, amt, note)
-                return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
-            if path == "/api/webapp/poker/action":
-                gid = int(data.get("game_id") or 0)
-                act = (data.get("action") or "").strip()
-                amt = int(data.get("amount") or 0)
-                r = poker_apply_action(gid, int(user_data.get("id")), act, amt)
-                return self._send(200, _json_bytes(r), "application/json; charset=utf-8")
-            return self._send(404, b"Not Found", "text/plain")
-
-        if not self._require_auth():
-            return
-        if getattr(self, "_auth_role", "") != "admin":
-            return self._send(403, b"readonly", "text/plain; charset=utf-8")
-        if not ADMIN_WEB_ACTIONS_ENABLE:
-            return self._send(403, b"actions disabled", "text/plain; charset=utf-8")
-
-        if path == "/api/upload_image":
-            ct = (self.headers.get("Content-Type") or "").strip()
-            if "multipart/form-data" not in ct:
-                return self._send(400, b"bad content-type", "text/plain; charset=utf-8")
-            try:
-                form = cgi.FieldStorage(fp=self.rfile, headers=self.headers, environ={"REQUEST_METHOD": "POST", "CONTENT_TYPE": ct})
-            except Exception:
-                return self._send(400, b"bad multipart", "text/plain; charset=utf-8")
-            ff = form["file"] if "file" in form else None
-            if not ff or not getattr(ff, "file", None):
-                return self._send(400, b"missing file", "text/plain; charset=utf-8")
-            filename = (getattr(ff, "filename", "") or "").strip()
-            ctype = (getattr(ff, "type", "") or "").strip().lower()
-            folder = (form.getfirst("folder", "") or "").strip().lower()
-            if folder not in ("banners", "covers", "misc"):
-                folder = "misc"
-            ext = ""
-            fn_lower = filename.lower()
-            for e in (".jpg", ".jpeg", ".png", ".webp", ".gif"):
-                if fn_lower.endswith(e):
-                    ext = e
-                    break
-            if not ext:
-                if ctype == "image/jpeg":
-                    ext = ".jpg"
-                elif ctype == "image/png":
-                    ext = ".png"
-                elif ctype == "image/webp":
-                    ext = ".webp"
-                elif ctype == "image/gif":
-                    ext = ".gif"
-            if ext not in (".jpg", ".jpeg", ".png", ".webp", ".gif"):
-                return self._send(400, b"bad file type", "text/plain; charset=utf-8")
-            base = _uploads_dir()
-            rel = f"{folder}/{datetime.utcnow().strftime('%Y%m%d')}"
-            out_dir = _safe_join(base, rel)
-            if not out_dir:
-                return self._send(400, b"bad path", "text/plain; charset=utf-8")
-            os.makedirs(out_dir, exist_ok=True)
-            out_name = secrets.token_hex(16) + ext
-            out_full = os.path.join(out_dir, out_name)
-            try:
-                with open(out_full, "wb") as f:
-                    shutil.copyfileobj(ff.file, f, length=1024 * 1024)
-            except Exception:
-                return self._send(500, b"write failed", "text/plain; charset=utf-8")
-            web_path = "/uploads/" + rel + "/" + out_name
-            url = _public_base_url(self) + web_path
-            return self._send(200, _json_bytes({"ok": True, "url": url, "path": web_path}), "application/json; charset=utf-8")
-
-        if path == "/api/upload_video_file":
-            ct = (self.headers.get("Content-Type") or "").strip()
-            if "multipart/form-data" not in ct:
-                return self._send(400, b"bad content-type", "text/plain; charset=utf-8")
-            try:
-                form = cgi.FieldStorage(fp=self.rfile, headers=self.headers, environ={"REQUEST_METHOD": "POST", "CONTENT_TYPE": ct})
-            except Exception:
-                return self._send(400, b"bad multipart", "text/plain; charset=utf-8")
-            ff = form["file"] if "file" in form else None
-            if not ff or not getattr(ff, "file", None):
-                return self._send(400, b"missing file", "text/plain; charset=utf-8")
-            filename = (getattr(ff, "filename", "") or "").strip()
-            fn_lower = filename.lower()
-            ext = ""
-            for e in (".mp4", ".mov", ".mkv", ".webm", ".m4v"):
-                if fn_lower.endswith(e):
-                    ext = e
-                    break
-            if not ext:
-                ext = ".mp4"
-            base = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmp", "video_uploads")
-            rel = f"{datetime.utcnow().strftime('%Y%m%d')}"
-            out_dir = os.path.join(base, rel)
-            os.makedirs(out_dir, exist_ok=True)
-            out_name = secrets.token_hex(16) + ext
-            out_full = os.path.join(out_dir, out_name)
-            try:
-                with open(out_full, "wb") as f:
-                    shutil.copyfileobj(ff.file, f, length=1024 * 1024)
-            except Exception:
-                return self._send(500, b"write failed", "text/plain; charset=utf-8")
-            try:
-                size = int(os.path.getsize(out_full))
-            except Exception:
-                size = 0
-            server_path = os.path.join("tmp", "video_uploads", rel, out_name).replace("\\", "/")
-            return self._send(
-                200,
-                _json_bytes({"ok": True, "server_path": server_path, "original_filename": filename, "file_size": size}),
-                "application/json; charset=utf-8",
-            )
+_ROUTES = Router()
 
+
+def _mw_ip(h: Handler, req: Request) -> bool:
+    if not _ip_allowed(_client_ip(h)):
+        h._forbidden("ip not allowed")
+        return False
+    return True
+
+
+def _mw_auth(h: Handler, req: Request) -> bool:
+    return h._require_auth()
+
+
+def _mw_write(h: Handler, req: Request) -> bool:
+    if getattr(h, "_auth_role", "") != "admin":
+        h._send(403, b"readonly", "text/plain; charset=utf-8")
+        return False
+    if not ADMIN_WEB_ACTIONS_ENABLE:
+        h._send(403, b"actions disabled", "text/plain; charset=utf-8")
+        return False
+    return True
+
+
+def _mw_uploader(h: Handler, req: Request) -> bool:
+    return h._require_local_uploader(req.qs)
+
+
+def _mw_init_data(h: Handler, req: Request) -> bool:
+    # 只在需要用户身份的路由上校验 initData（HMAC），config / plans 等公开接口不再为此付出开销
+    init_data = h.headers.get("X-Telegram-Init-Data") or req.arg("initData")
+    req.user_data = _validate_webapp_init_data(init_data, BOT_TOKEN)
+    return True
+
+
+def _mw_webapp_user(h: Handler, req: Request) -> bool:
+    _mw_init_data(h, req)
+    if not req.user_data:
+        h._send(401, b"Invalid initData", "text/plain")
+        return False
+    return True
+
+
+def _mw_poker(h: Handler, req: Request) -> bool:
+    if not _poker_is_allowed(req.user_data):
+        h._send_json({"ok": False, "error": "not allowed"}, 403)
+        return False
+    return True
+
+
+_ADMIN = (_mw_auth,)
+_ADMIN_WRITE = (_mw_auth, _mw_write)
+_UPLOADER = (_mw_uploader,)
+_WEBAPP_USER = (_mw_webapp_user,)
+_POKER = (_mw_webapp_user, _mw_poker)
+
+
+def _not_found(h: Handler, req: Request):
+    h._send(404, b"Not Found", "text/plain")
+
+
+def _admin_not_found(h: Handler, req: Request):
+    h._send(404, b"not found", "text/plain; charset=utf-8")
+
+
+def _admin_head(h: Handler, req: Request):
+    h._send_headers_only(200, "text/plain", 0)
+
+
+_ROUTES.add("GET", "/api/webapp/", _not_found, prefix=True, head=True)
+_ROUTES.add("GET", "/api/local_uploader/", _not_found, _UPLOADER, prefix=True)
+_ROUTES.add("POST", "/api/local_uploader/", _not_found, _UPLOADER, prefix=True)
+_ROUTES.add("POST", "/api/webapp/poker/", _not_found, _POKER, prefix=True)
+_ROUTES.add("GET", "/", _admin_not_found, _ADMIN, prefix=True)
+_ROUTES.add("HEAD", "/", _admin_head, _ADMIN, prefix=True)
+_ROUTES.add("POST", "/", _admin_not_found, _ADMIN_WRITE, prefix=True)
+
+
+# ---- 静态文件 / 健康检查 ----
+
+
+@_ROUTES.route("GET", "/uploads/", prefix=True, head=True)
+def _uploads(h: Handler, req: Request):
+    full = _safe_join(_uploads_dir(), req.path[len("/uploads/") :])
+    if not full or not os.path.exists(full) or not os.path.isfile(full):
+        return h._send(404, b"Not Found", "text/plain; charset=utf-8")
+    return h._send_file(full)
+
+
+@_ROUTES.route("GET", "/webapp/", prefix=True, head=True)
+def _webapp_static(h: Handler, req: Request):
+    path = req.path
+    if ".." in path:
+        return h._forbidden("invalid path")
+    rel_path = path[len("/webapp/") :]
+    if not rel_path or rel_path.endswith("/"):
+        rel_path += "index.html"
+    base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "webapp")
+    full_path = os.path.join(base_dir, rel_path)
+    if not os.path.abspath(full_path).startswith(base_dir):
+        return h._forbidden("invalid path")
+    if not os.path.exists(full_path) or not os.path.isfile(full_path):
+        return h._send(404, b"Not Found", "text/plain")
+    return h._send_file(full_path)
+
+
+@_ROUTES.route("GET", "/health", (_mw_ip,), head=True)
+def _health(h: Handler, req: Request):
+    h._send_json({"ok": True, "ts": _utc_now().isoformat()})
+
+
+# ---- Mini App ----
+
+
+def _is_vip(user: dict | None) -> bool:
+    return bool(user and user.get("paid_until") and user["paid_until"] > _utc_now())
+
+
+@_ROUTES.route("GET", "/api/webapp/auth", _WEBAPP_USER, head=True)
+def _api_webapp_auth(h: Handler, req: Request):
+    # is_vip 决定 Mini App 的会员态；入账多在 bot 进程完成，本进程缓存可能还是旧值，直接读库
+    u = get_user(int(req.user_data.get("id")), fresh=True)
+    h._send_json({"user": u, "is_vip": _is_vip(u), "bot_username": BOT_USERNAME})
+
+
+@_ROUTES.route("GET", "/api/webapp/config", head=True)
+def _api_webapp_config(h: Handler, req: Request):
+    banners = list_banners(active_only=True)
+    for b in banners:
+        b["image_url"] = _normalize_cover_for_webapp(h, b.get("image_url") or "") or (b.get("image_url") or "")
+    h._send_json({"categories": list_categories(visible_only=True), "banners": banners})
+
+
+@_ROUTES.route("GET", "/api/webapp/plans", head=True)
+def _api_webapp_plans(h: Handler, req: Request):
+    h._send_json({"plans": PLANS})
+
+
+@_ROUTES.route("GET", "/api/webapp/videos", (_mw_init_data,), head=True)
+def _api_webapp_videos(h: Handler, req: Request):
+    q = req.arg("q").strip()
+    page = req.int_arg("page", 1)
+    limit = req.int_arg("limit", 20)
+    cat_id = req.int_arg("category_id", 0)
+    sort = req.arg("sort", "latest")
+    is_vip = bool(req.user_data) and _is_vip(get_user(int(req.user_data.get("id"))))
+
+    data = list_videos(q=q, page=page, limit=limit, category_id=cat_id, sort=sort)
+    for item in data["items"]:
+        item["cover_url"] = _normalize_cover_for_webapp(h, item.get("cover_url") or "")
+        item["paid_link"] = (item.get("video_url") or "").strip() or None
+        item["free_link"] = (item.get("preview_url") or "").strip() or None
+        if not item["paid_link"] and item.get("channel_id") and item.get("message_id"):
+            paid_cid = str(item["channel_id"])
+            if paid_cid.startswith("-100"):
+                paid_cid = paid_cid[4:]
+            item["paid_link"] = f"https://t.me/c/{paid_cid}/{item['message_id']}"
+        if not item["free_link"] and item.get("free_channel_id") and item.get("free_message_id"):
+            free_cid = str(item["free_channel_id"])
+            if free_cid.startswith("-100"):
+                free_cid = free_cid[4:]
+            item["free_link"] = f"https://t.me/c/{free_cid}/{item['free_message_id']}"
+        item["is_locked"] = not is_vip
+    h._send_json(data)
+
+
+@_ROUTES.route("GET", "/api/webapp/track_view", _WEBAPP_USER)
+def _api_webapp_track_view(h: Handler, req: Request):
+    vid = req.int_arg("video_id", 0)
+    if vid > 0:
         try:
-            n = int(self.headers.get("Content-Length") or "0")
-        except Exception:
-            n = 0
-        raw = self.rfile.read(n) if n > 0 else b"{}"
-        try:
-            data = json.loads(raw.decode("utf-8", errors="ignore") or "{}")
+            view_buffer.add(int(req.user_data.get("id")), vid)
         except Exception:
-            data = {}
+            pass
+    h._send_json({"ok": True})
 
-        actor = getattr(self, "_auth_user", ADMIN_WEB_USER)
-        if path == "/api/categories_upsert":
-            upsert_category(
-                id=int(data.get("id") or 0),
-                name=data.get("name"),
-                is_visible=bool(data.get("is_visible")),
-                sort_order=int(data.get("sort_order") or 0)
-            )
-            return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
-            
-        if path == "/api/banners_upsert":
-            upsert_banner(
-                id=int(data.get("id") or 0),
-                image_url=data.get("image_url"),
-                link_url=data.get("link_url"),
-                is_active=bool(data.get("is_active")),
-                sort_order=int(data.get("sort_order") or 0)
-            )
-            return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
 
-        if path == "/api/categories_delete":
-            delete_category(int(data.get("id") or 0))
-            return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
+@_ROUTES.route("GET", "/api/webapp/poker/auth", _POKER, head=True)
+def _api_webapp_poker_auth(h: Handler, req: Request):
+    uid = int(req.user_data.get("id"))
+    u = get_user(uid)
+    pid = poker_upsert_player(uid, req.user_data.get("username"))
+    h._send_json({"ok": True, "user": u, "player_id": pid})
 
-        if path == "/api/banners_delete":
-            delete_banner(int(data.get("id") or 0))
-            return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
 
-        if path == "/api/download_job_create":
-            jid = admin_create_download_job(
-                source_url=(data.get("source_url") or "").strip(),
-                caption=(data.get("caption") or "").strip(),
-                filename=(data.get("filename") or "").strip(),
-            )
-            return self._send(200, _json_bytes({"ok": True, "id": jid}), "application/json; charset=utf-8")
-
-        if path == "/api/video_create":
-            sdt = (data.get("published_at") or "").strip()
-            dt = None
-            if sdt:
-                try:
-                    dt = datetime.fromisoformat(sdt.replace("Z", "+00:00"))
-                    dt = dt.replace(tzinfo=None)
-                except Exception:
-                    dt = None
-            server_file_path = (data.get("server_file_path") or "").strip()
-            video_url = (data.get("video_url") or "").strip()
-            cover_url = (data.get("cover_url") or "").strip()
-            if cover_url and cover_url.startswith("/uploads/") and not _uploads_file_exists(cover_url):
-                cover_url = ""
-            if not cover_url and video_url:
-                cover_url = _try_generate_cover_from_video_url(self, video_url) or ""
-            upload_status = "pending"
-            if video_url and not server_file_path:
-                upload_status = "done"
-            vid = admin_create_video_job(
-                local_filename=(data.get("local_filename") or "").strip(),
-                caption=(data.get("caption") or "").strip(),
-                cover_url=cover_url,
-                tags=(data.get("tags") or "").strip(),
-                category_id=int(data.get("category_id") or 0),
-                sort_order=int(data.get("sort_order") or 0),
-                is_published=bool(data.get("is_published")),
-                published_at=dt,
-                upload_status=upload_status,
-                server_file_path=server_file_path,
-                server_file_size=int(data.get("server_file_size") or 0),
-                video_url=video_url,
-                preview_url=(data.get("preview_url") or "").strip(),
-            )
-            return self._send(200, _json_bytes({"ok": True, "id": vid}), "application/json; charset=utf-8")
-
-        if path == "/api/video_update":
-            sdt = (data.get("published_at") or "").strip()
-            dt = None
-            if sdt:
-                try:
-                    dt = datetime.fromisoformat(sdt.replace("Z", "+00:00"))
-                    dt = dt.replace(tzinfo=None)
-                except Exception:
-                    dt = None
-            video_url = (data.get("video_url") or "").strip()
-            cover_url = (data.get("cover_url") or "").strip()
-            if cover_url and cover_url.startswith("/uploads/") and not _uploads_file_exists(cover_url):
-                cover_url = ""
-            if not cover_url and video_url:
-                cover_url = _try_generate_cover_from_video_url(self, video_url) or ""
-            admin_update_video_meta(
-                video_id=int(data.get("id") or 0),
-                caption=(data.get("caption") or "").strip(),
-                cover_url=cover_url,
-                tags=(data.get("tags") or "").strip(),
-                category_id=int(data.get("category_id") or 0),
-                sort_order=int(data.get("sort_order") or 0),
-                is_published=bool(data.get("is_published")),
-                published_at=dt,
-                local_filename=(data.get("local_filename") or "").strip(),
-                video_url=video_url,
-                preview_url=(data.get("preview_url") or "").strip(),
-            )
-            return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
-
-        if path == "/api/video_publish":
-            admin_set_video_publish(int(data.get("id") or 0), bool(data.get("is_published")))
-            return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
-
-        if path == "/api/video_sort":
-            admin_set_video_sort(int(data.get("id") or 0), int(data.get("sort_order") or 0))
-            return self._send(200, _json_bytes({"ok": True}), "application/json; charset=utf-8")
-
-        if path == "/api/user_extend":
-            telegram_id = int(str(data.get("telegram_id") or "0"))
-            days = int(data.get("days") or 0)
-            note = (data.get("note") or "").strip()
-            paid_until = user_extend_days(telegram_id, days, actor=actor, note=note, ip=getattr(self, "_auth_ip", self.client_address[0]))
-            body = _json_bytes({"ok": True, "paid_until": paid_until})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/user_resend_invite":
-            telegram_id = int(str(data.get("telegram_id") or "0"))
-            note = (data.get("note") or "").strip()
-            ok, err = resend_invite_link(telegram_id, actor=actor, note=note, ip=getattr(self, "_auth_ip", self.client_address[0]))
-            code = 200 if ok else 500
-            body = _json_bytes({"ok": ok, "error": err})
-            return self._send(code, body, "application/json; charset=utf-8")
-
-        if path == "/api/coupons_create":
-            upsert_coupon(
-                code=(data.get("code") or "").strip(),
-                kind=(data.get("kind") or "").strip(),
-                value=(data.get("value") or "").strip(),
-                plan_codes=(data.get("plan_codes") or "").strip(),
-                max_uses=(data.get("max_uses") or ""),
-                expire_hours=(data.get("expire_hours") or ""),
-            )
-            body = _json_bytes({"ok": True})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/coupons_generate":
-            created = generate_coupons(
-                kind=(data.get("kind") or "").strip(),
-                value=(data.get("value") or "").strip(),
-                plan_codes=(data.get("plan_codes") or "").strip(),
-                max_uses=(data.get("max_uses") or ""),
-                expire_hours=(data.get("expire_hours") or ""),
-                count=int(data.get("count") or 0),
-                prefix=(data.get("prefix") or "").strip(),
-            )
-            body = _json_bytes({"ok": True, "created": created})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/access_codes_create":
-            upsert_access_code(
-                code=(data.get("code") or "").strip(),
-                days=int(data.get("days") or 0),
-                max_uses=int(data.get("max_uses") or 1),
-                expire_hours=(data.get("expire_hours") or ""),
-                note=(data.get("note") or "").strip(),
-                created_by=actor,
-            )
-            body = _json_bytes({"ok": True})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/access_codes_generate":
-            created = generate_access_codes(
-                days=int(data.get("days") or 0),
-                max_uses=int(data.get("max_uses") or 1),
-                expire_hours=(data.get("expire_hours") or ""),
-                note=(data.get("note") or "").strip(),
-                count=int(data.get("count") or 0),
-                prefix=(data.get("prefix") or "").strip(),
-                created_by=actor,
-            )
-            body = _json_bytes({"ok": True, "created": created})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/broadcast_create":
-            bid = create_broadcast_job_v2(
-                segment=(data.get("segment") or "").strip(),
-                source=(data.get("source") or "").strip(),
-                text=(data.get("text") or ""),
-                parse_mode=(data.get("parse_mode") or "").strip(),
-                media_type=(data.get("media_type") or "").strip(),
-                media=(data.get("media") or "").strip(),
-                button_text=(data.get("button_text") or "").strip(),
-                button_url=(data.get("button_url") or "").strip(),
-                disable_preview=int(data.get("disable_preview") or 0),
-                created_by=actor,
-            )
-            body = _json_bytes({"ok": True, "id": bid})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/broadcast_run":
-            bid = int(data.get("id") or 0)
-            ok = run_broadcast_async(bid)
-            body = _json_bytes({"ok": ok})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/broadcast_pause":
-            bid = int(data.get("id") or 0)
-            ok = broadcast_set_status(bid, "paused")
-            body = _json_bytes({"ok": ok})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/broadcast_resume":
-            bid = int(data.get("id") or 0)
-            ok = broadcast_set_status(bid, "running")
-            if ok:
-                run_broadcast_async(bid)
-            body = _json_bytes({"ok": ok})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/user_flags":
-            telegram_id = int(str(data.get("telegram_id") or "0"))
-            toggle = (data.get("toggle") or "").strip()
-            note = (data.get("note") or "").strip()
-            res = user_toggle_flags(telegram_id, toggle=toggle, note=note, actor=actor, ip=getattr(self, "_auth_ip", self.client_address[0]))
-            body = _json_bytes({"ok": True, **res})
-            return self._send(200, body, "application/json; charset=utf-8")
-
-        if path == "/api/reconcile_assign":
-            tx_id = (data.get("tx_id") or "").strip()
-            order_id = int(data.get("order_id") or 0)
-            note = (data.get("note") or "").strip()
-            ok, err = reconcile_assign(tx_id=tx_id, order_id=order_id, actor=actor, note=note, ip=getattr(self, "_auth_ip", self.client_address[0]))
-            code = 200 if ok else 400
-            body = _json_bytes({"ok": ok, "error": err})
-            return self._send(code, body, "application/json; charset=utf-8")
-
-        if path == "/api/reconcile_retry_tx":
-            tx_id = (data.get("tx_id") or "").strip()
-            note = (data.get("note") or "").strip()
-            ok, err = reconcile_retry_tx(tx_id=tx_id, actor=actor, note=note, ip=getattr(self, "_auth_ip", self.client_address[0]))
-            code = 200 if ok else 400
-            body = _json_bytes({"ok": ok, "error": err})
-            return self._send(code, body, "application/json; charset=utf-8")
-
-        self._send(404, b"not found", "text/plain; charset=utf-8")
-
-    def _serve_static_webapp(self, path: str):
-        if ".." in path:
-            return self._forbidden("invalid path")
-        rel_path = path[len("/webapp/"):]
-        if not rel_path or rel_path.endswith("/"):
-            rel_path += "index.html"
-        base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "webapp")
-        full_path = os.path.join(base_dir, rel_path)
-        if not os.path.abspath(full_path).startswith(base_dir):
-            return self._forbidden("invalid path")
-        if not os.path.exists(full_path) or not os.path.isfile(full_path):
-            return self._send(404, b"Not Found", "text/plain")
-        ctype, _ = mimetypes.guess_type(full_path)
-        if not ctype:
-            ctype = "application/octet-stream"
-        try:
-            with open(full_path, "rb") as f:
-                content = f.read()
-            self._send(200, content, ctype)
-        except Exception as e:
-            self._send(500, str(e).encode("utf-8"), "text/plain")
+@_ROUTES.route("GET", "/api/webapp/poker/game_get_or_create", _POKER, head=True)
+def _api_webapp_poker_game_get_or_create(h: Handler, req: Request):
+    code = req.arg("code", "default").strip()
+    h._send_json(poker_get_or_create_game(code, int(req.user_data.get("id")), req.user_data.get("username")))
+
+
+@_ROUTES.route("GET", "/api/webapp/poker/game_join", _POKER, head=True)
+def _api_webapp_poker_game_join(h: Handler, req: Request):
+    code = req.arg("code", "default").strip()
+    h._send_json(poker_join_game(code, int(req.user_data.get("id")), req.user_data.get("username")))
+
+
+@_ROUTES.route("GET", "/api/webapp/poker/game_start", _POKER, head=True)
+def _api_webapp_poker_game_start(h: Handler, req: Request):
+    h._send_json(poker_start_game(req.int_arg("game_id", 0)))
+
+
+@_ROUTES.route("GET", "/api/webapp/poker/game_state", _POKER, head=True)
+def _api_webapp_poker_game_state(h: Handler, req: Request):
+    gid = req.int_arg("game_id", 0)
+    try:
+        poker_auto_fold_if_timeout(gid)
+    except Exception:
+        pass
+    h._send_json(poker_game_state(gid, int(req.user_data.get("id"))))
+
+
+@_ROUTES.route("GET", "/api/webapp/poker/balances", _POKER, head=True)
+def _api_webapp_poker_balances(h: Handler, req: Request):
+    poker_upsert_player(int(req.user_data.get("id")), req.user_data.get("username"))
+    h._send_json({"ok": True, "items": poker_balances()})
+
+
+@_ROUTES.route("GET", "/api/webapp/poker/ledgers", _POKER, head=True)
+def _api_webapp_poker_ledgers(h: Handler, req: Request):
+    poker_upsert_player(int(req.user_data.get("id")), req.user_data.get("username"))
+    limit = req.int_arg("limit", 200)
+    days = req.int_arg("days", 30)
+    h._send_json({"ok": True, "items": poker_list_ledgers(limit=limit, days=days)})
+
+
+@_ROUTES.route("POST", "/api/webapp/poker/ledger_add", _POKER)
+def _api_webapp_poker_ledger_add(h: Handler, req: Request):
+    data = h._read_json()
+    pid = poker_upsert_player(int(req.user_data.get("id")), req.user_data.get("username"))
+    amt_raw = str(data.get("amount") or "").strip()
+    try:
+        amt = Decimal(amt_raw)
+    except Exception:
+        return h._send_json({"ok": False, "error": "bad amount"}, 400)
+    note = (data.get("note") or "").strip()
+    poker_add_ledger(pid, amt, note)
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/webapp/poker/action", _POKER)
+def _api_webapp_poker_action(h: Handler, req: Request):
+    data = h._read_json()
+    gid = int(data.get("game_id") or 0)
+    act = (data.get("action") or "").strip()
+    amt = int(data.get("amount") or 0)
+    h._send_json(poker_apply_action(gid, int(req.user_data.get("id")), act, amt))
+
+
+# ---- 本地上传 / 下载端 ----
+
+
+@_ROUTES.route("GET", "/api/local_uploader/claim", _UPLOADER)
+def _api_local_uploader_claim(h: Handler, req: Request):
+    h._send_json({"job": local_uploader_claim_next()})
+
+
+@_ROUTES.route("GET", "/api/local_uploader/download_claim", _UPLOADER)
+def _api_local_uploader_download_claim(h: Handler, req: Request):
+    h._send_json({"job": local_downloader_claim_next()})
+
+
+@_ROUTES.route("POST", "/api/local_uploader/update", _UPLOADER)
+def _api_local_uploader_update(h: Handler, req: Request):
+    data = h._read_json()
+    local_uploader_update(
+        video_id=int(data.get("video_id") or 0),
+        upload_status=(data.get("upload_status") or "").strip(),
+        channel_id=data.get("channel_id"),
+        message_id=data.get("message_id"),
+        free_channel_id=data.get("free_channel_id"),
+        free_message_id=data.get("free_message_id"),
+        file_id=data.get("file_id"),
+        error=data.get("error"),
+    )
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/local_uploader/download_update", _UPLOADER)
+def _api_local_uploader_download_update(h: Handler, req: Request):
+    data = h._read_json()
+    local_downloader_update(
+        job_id=int(data.get("job_id") or 0),
+        status=(data.get("status") or "").strip(),
+        progress=data.get("progress"),
+        file_size=data.get("file_size"),
+        filename=data.get("filename"),
+        started_at=None,
+        finished_at=None,
+        error=data.get("error"),
+    )
+    h._send_json({"ok": True})
+
+
+# ---- 后台查询 ----
+
+
+@_ROUTES.route("GET", "/", _ADMIN)
+def _index(h: Handler, req: Request):
+    h._send(200, INDEX_HTML.encode("utf-8"), "text/html; charset=utf-8")
+
+
+@_ROUTES.route("GET", "/api/stats", _ADMIN)
+def _api_stats(h: Handler, req: Request):
+    h._send_json(stats())
+
+
+@_ROUTES.route("GET", "/api/videos_admin", _ADMIN)
+def _api_videos_admin(h: Handler, req: Request):
+    q = req.arg("q").strip()
+    status = req.arg("status").strip() or None
+    h._send_json({"items": list_videos_admin(q=q, limit=req.int_arg("limit", 200), status=status)})
+
+
+@_ROUTES.route("GET", "/api/download_jobs", _ADMIN)
+def _api_download_jobs(h: Handler, req: Request):
+    status = req.arg("status").strip() or None
+    h._send_json({"items": list_download_jobs(limit=req.int_arg("limit", 200), status=status)})
+
+
+@_ROUTES.route("GET", "/api/worldcup", _ADMIN)
+def _api_worldcup(h: Handler, req: Request):
+    h._send_json(worldcup_live())
+
+
+@_ROUTES.route("GET", "/api/users", _ADMIN)
+def _api_users(h: Handler, req: Request):
+    h._send_json({"items": list_users(q=req.arg("q").strip(), limit=req.int_arg("limit", 50))})
+
+
+@_ROUTES.route("GET", "/api/user_detail", _ADMIN)
+def _api_user_detail(h: Handler, req: Request):
+    h._send_json(user_detail(req.int_arg("telegram_id", 0)))
+
+
+@_ROUTES.route("GET", "/api/orders", _ADMIN)
+def _api_orders(h: Handler, req: Request):
+    h._send_json({"items": list_orders(hours=req.int_arg("hours", 24), limit=req.int_arg("limit", 50))})
+
+
+@_ROUTES.route("GET", "/api/coupons", _ADMIN)
+def _api_coupons(h: Handler, req: Request):
+    h._send_json({"items": list_coupons(limit=req.int_arg("limit", 50))})
+
+
+@_ROUTES.route("GET", "/api/access_codes", _ADMIN)
+def _api_access_codes(h: Handler, req: Request):
+    h._send_json({"items": list_access_codes(limit=req.int_arg("limit", 50))})
+
+
+@_ROUTES.route("GET", "/api/broadcast_jobs", _ADMIN)
+def _api_broadcast_jobs(h: Handler, req: Request):
+    h._send_json({"items": list_broadcast_jobs(limit=req.int_arg("limit", 30))})
+
+
+@_ROUTES.route("GET", "/api/broadcast_logs", _ADMIN)
+def _api_broadcast_logs(h: Handler, req: Request):
+    h._send_json({"items": list_broadcast_logs(job_id=req.int_arg("job_id", 0), limit=req.int_arg("limit", 200))})
+
+
+@_ROUTES.route("GET", "/api/broadcast_preview", _ADMIN)
+def _api_broadcast_preview(h: Handler, req: Request):
+    segment = req.arg("segment").strip()
+    source = req.arg("source").strip()
+    targets = _pick_broadcast_targets(segment, source or None)
+    h._send_json({"count": len(targets), "sample": targets[:10]})
+
+
+@_ROUTES.route("GET", "/api/reconcile", _ADMIN)
+def _api_reconcile(h: Handler, req: Request):
+    pending_min = req.int_arg("pending_min", 60)
+    limit = req.int_arg("limit", 50)
+    h._send_json(
+        {
+            "unmatched_txs": list_unmatched_txs(limit=limit),
+            "pending_orders": list_pending_orders_older(minutes=pending_min, limit=limit),
+        }
+    )
+
+
+@_ROUTES.route("GET", "/api/categories", _ADMIN)
+def _api_categories(h: Handler, req: Request):
+    h._send_json({"items": list_categories(visible_only=False)})
+
+
+@_ROUTES.route("GET", "/api/banners", _ADMIN)
+def _api_banners(h: Handler, req: Request):
+    h._send_json({"items": list_banners(active_only=False)})
+
+
+# ---- CSV 导出 ----
+
+
+@_ROUTES.route("GET", "/api/export/users.csv", _ADMIN)
+def _api_export_users_csv(h: Handler, req: Request):
+    rows = list_users(q=req.arg("q").strip(), limit=req.int_arg("limit", 2000))
+    cols = ["telegram_id", "username", "paid_until", "total_received", "wallet_addr", "first_source", "last_source", "last_source_at", "is_blacklisted", "is_whitelisted", "note", "created_at"]
+    h._send_csv("users.csv", _csv_bytes(rows, cols))
+
+
+@_ROUTES.route("GET", "/api/export/coupons.csv", _ADMIN)
+def _api_export_coupons_csv(h: Handler, req: Request):
+    rows = list_coupons(limit=req.int_arg("limit", 20000))
+    cols = ["code", "kind", "value", "plan_codes", "max_uses", "used_count", "expires_at", "active", "created_at"]
+    h._send_csv("coupons.csv", _csv_bytes(rows, cols))
+
+
+@_ROUTES.route("GET", "/api/export/access_codes.csv", _ADMIN)
+def _api_export_access_codes_csv(h: Handler, req: Request):
+    rows = list_access_codes(limit=req.int_arg("limit", 20000))
+    cols = ["code", "days", "plan_code", "max_uses", "used_count", "expires_at", "note", "created_by", "created_at", "last_used_at"]
+    h._send_csv("access_codes.csv", _csv_bytes(rows, cols))
+
+
+@_ROUTES.route("GET", "/api/export/orders.csv", _ADMIN)
+def _api_export_orders_csv(h: Handler, req: Request):
+    rows = list_orders(hours=req.int_arg("hours", 168), limit=req.int_arg("limit", 5000))
+    cols = ["id", "telegram_id", "addr", "amount", "plan_code", "status", "tx_id", "created_at"]
+    h._send_csv("orders.csv", _csv_bytes(rows, cols))
+
+
+@_ROUTES.route("GET", "/api/export/txs.csv", _ADMIN)
+def _api_export_txs_csv(h: Handler, req: Request):
+    rows = list_txs(hours=req.int_arg("hours", 168), limit=req.int_arg("limit", 5000))
+    cols = ["tx_id", "telegram_id", "addr", "from_addr", "amount", "status", "plan_code", "credited_amount", "processed_at", "block_time", "created_at"]
+    h._send_csv("txs.csv", _csv_bytes(rows, cols))
+
+
+@_ROUTES.route("GET", "/api/export/broadcast_logs.csv", _ADMIN)
+def _api_export_broadcast_logs_csv(h: Handler, req: Request):
+    job_id = req.int_arg("job_id", 0)
+    rows = list_broadcast_logs(job_id=job_id, limit=req.int_arg("limit", 20000))
+    cols = ["telegram_id", "status", "error", "created_at"]
+    h._send_csv(f"broadcast_{job_id}.csv", _csv_bytes(rows, cols))
+
+
+@_ROUTES.route("GET", "/api/export/admin_audit.csv", _ADMIN)
+def _api_export_admin_audit_csv(h: Handler, req: Request):
+    rows = list_admin_audit(hours=req.int_arg("hours", 168), limit=req.int_arg("limit", 5000))
+    cols = ["id", "actor", "action", "target_id", "payload", "created_at"]
+    h._send_csv("admin_audit.csv", _csv_bytes(rows, cols))
+
+
+# ---- 后台操作（需 admin 角色且 ADMIN_WEB_ACTIONS_ENABLE=1）----
+
+
+# asyncio 模式下这些上传接口不受 ADMIN_WEB_MAX_BODY_MB 限制，改用 ADMIN_WEB_MAX_UPLOAD_MB
+_UPLOAD_PATHS = ("/api/upload_image", "/api/upload_video_file")
+
+
+@_ROUTES.route("POST", "/api/upload_image", _ADMIN_WRITE)
+def _api_upload_image(h: Handler, req: Request):
+    ct = (h.headers.get("Content-Type") or "").strip()
+    if "multipart/form-data" not in ct:
+        return h._send(400, b"bad content-type", "text/plain; charset=utf-8")
+    try:
+        form = cgi.FieldStorage(fp=h.rfile, headers=h.headers, environ={"REQUEST_METHOD": "POST", "CONTENT_TYPE": ct})
+    except Exception:
+        return h._send(400, b"bad multipart", "text/plain; charset=utf-8")
+    ff = form["file"] if "file" in form else None
+    if not ff or not getattr(ff, "file", None):
+        return h._send(400, b"missing file", "text/plain; charset=utf-8")
+    filename = (getattr(ff, "filename", "") or "").strip()
+    ctype = (getattr(ff, "type", "") or "").strip().lower()
+    folder = (form.getfirst("folder", "") or "").strip().lower()
+    if folder not in ("banners", "covers", "misc"):
+        folder = "misc"
+    ext = ""
+    fn_lower = filename.lower()
+    for e in (".jpg", ".jpeg", ".png", ".webp", ".gif"):
+        if fn_lower.endswith(e):
+            ext = e
+            break
+    if not ext:
+        if ctype == "image/jpeg":
+            ext = ".jpg"
+        elif ctype == "image/png":
+            ext = ".png"
+        elif ctype == "image/webp":
+            ext = ".webp"
+        elif ctype == "image/gif":
+            ext = ".gif"
+    if ext not in (".jpg", ".jpeg", ".png", ".webp", ".gif"):
+        return h._send(400, b"bad file type", "text/plain; charset=utf-8")
+    base = _uploads_dir()
+    rel = f"{folder}/{datetime.utcnow().strftime('%Y%m%d')}"
+    out_dir = _safe_join(base, rel)
+    if not out_dir:
+        return h._send(400, b"bad path", "text/plain; charset=utf-8")
+    os.makedirs(out_dir, exist_ok=True)
+    out_name = secrets.token_hex(16) + ext
+    out_full = os.path.join(out_dir, out_name)
+    try:
+        with open(out_full, "wb") as f:
+            shutil.copyfileobj(ff.file, f, length=1024 * 1024)
+    except Exception:
+        return h._send(500, b"write failed", "text/plain; charset=utf-8")
+    web_path = "/uploads/" + rel + "/" + out_name
+    url = _public_base_url(h) + web_path
+    h._send_json({"ok": True, "url": url, "path": web_path})
+
+
+@_ROUTES.route("POST", "/api/upload_video_file", _ADMIN_WRITE)
+def _api_upload_video_file(h: Handler, req: Request):
+    ct = (h.headers.get("Content-Type") or "").strip()
+    if "multipart/form-data" not in ct:
+        return h._send(400, b"bad content-type", "text/plain; charset=utf-8")
+    try:
+        form = cgi.FieldStorage(fp=h.rfile, headers=h.headers, environ={"REQUEST_METHOD": "POST", "CONTENT_TYPE": ct})
+    except Exception:
+        return h._send(400, b"bad multipart", "text/plain; charset=utf-8")
+    ff = form["file"] if "file" in form else None
+    if not ff or not getattr(ff, "file", None):
+        return h._send(400, b"missing file", "text/plain; charset=utf-8")
+    filename = (getattr(ff, "filename", "") or "").strip()
+    fn_lower = filename.lower()
+    ext = ""
+    for e in (".mp4", ".mov", ".mkv", ".webm", ".m4v"):
+        if fn_lower.endswith(e):
+            ext = e
+            break
+    if not ext:
+        ext = ".mp4"
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmp", "video_uploads")
+    rel = f"{datetime.utcnow().strftime('%Y%m%d')}"
+    out_dir = os.path.join(base, rel)
+    os.makedirs(out_dir, exist_ok=True)
+    out_name = secrets.token_hex(16) + ext
+    out_full = os.path.join(out_dir, out_name)
+    try:
+        with open(out_full, "wb") as f:
+            shutil.copyfileobj(ff.file, f, length=1024 * 1024)
+    except Exception:
+        return h._send(500, b"write failed", "text/plain; charset=utf-8")
+    try:
+        size = int(os.path.getsize(out_full))
+    except Exception:
+        size = 0
+    server_path = os.path.join("tmp", "video_uploads", rel, out_name).replace("\\", "/")
+    h._send_json({"ok": True, "server_path": server_path, "original_filename": filename, "file_size": size})
+
+
+@_ROUTES.route("POST", "/api/categories_upsert", _ADMIN_WRITE)
+def _api_categories_upsert(h: Handler, req: Request):
+    data = h._read_json()
+    upsert_category(
+        id=int(data.get("id") or 0),
+        name=data.get("name"),
+        is_visible=bool(data.get("is_visible")),
+        sort_order=int(data.get("sort_order") or 0)
+    )
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/banners_upsert", _ADMIN_WRITE)
+def _api_banners_upsert(h: Handler, req: Request):
+    data = h._read_json()
+    upsert_banner(
+        id=int(data.get("id") or 0),
+        image_url=data.get("image_url"),
+        link_url=data.get("link_url"),
+        is_active=bool(data.get("is_active")),
+        sort_order=int(data.get("sort_order") or 0)
+    )
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/categories_delete", _ADMIN_WRITE)
+def _api_categories_delete(h: Handler, req: Request):
+    delete_category(int(h._read_json().get("id") or 0))
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/banners_delete", _ADMIN_WRITE)
+def _api_banners_delete(h: Handler, req: Request):
+    delete_banner(int(h._read_json().get("id") or 0))
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/download_job_create", _ADMIN_WRITE)
+def _api_download_job_create(h: Handler, req: Request):
+    data = h._read_json()
+    jid = admin_create_download_job(
+        source_url=(data.get("source_url") or "").strip(),
+        caption=(data.get("caption") or "").strip(),
+        filename=(data.get("filename") or "").strip(),
+    )
+    h._send_json({"ok": True, "id": jid})
+
+
+def _parse_published_at(data: dict) -> datetime | None:
+    sdt = (data.get("published_at") or "").strip()
+    if not sdt:
+        return None
+    try:
+        return datetime.fromisoformat(sdt.replace("Z", "+00:00")).replace(tzinfo=None)
+    except Exception:
+        return None
 
-    def log_message(self, format, *args):
-        return
+
+def _resolve_cover_url(h: Handler, data: dict, video_url: str) -> str:
+    cover_url = (data.get("cover_url") or "").strip()
+    if cover_url and cover_url.startswith("/uploads/") and not _uploads_file_exists(cover_url):
+        cover_url = ""
+    if not cover_url and video_url:
+        cover_url = _try_generate_cover_from_video_url(h, video_url) or ""
+    return cover_url
+
+
+@_ROUTES.route("POST", "/api/video_create", _ADMIN_WRITE)
+def _api_video_create(h: Handler, req: Request):
+    data = h._read_json()
+    dt = _parse_published_at(data)
+    server_file_path = (data.get("server_file_path") or "").strip()
+    video_url = (data.get("video_url") or "").strip()
+    cover_url = _resolve_cover_url(h, data, video_url)
+    upload_status = "pending"
+    if video_url and not server_file_path:
+        upload_status = "done"
+    vid = admin_create_video_job(
+        local_filename=(data.get("local_filename") or "").strip(),
+        caption=(data.get("caption") or "").strip(),
+        cover_url=cover_url,
+        tags=(data.get("tags") or "").strip(),
+        category_id=int(data.get("category_id") or 0),
+        sort_order=int(data.get("sort_order") or 0),
+        is_published=bool(data.get("is_published")),
+        published_at=dt,
+        upload_status=upload_status,
+        server_file_path=server_file_path,
+        server_file_size=int(data.get("server_file_size") or 0),
+        video_url=video_url,
+        preview_url=(data.get("preview_url") or "").strip(),
+    )
+    h._send_json({"ok": True, "id": vid})
+
+
+@_ROUTES.route("POST", "/api/video_update", _ADMIN_WRITE)
+def _api_video_update(h: Handler, req: Request):
+    data = h._read_json()
+    dt = _parse_published_at(data)
+    video_url = (data.get("video_url") or "").strip()
+    cover_url = _resolve_cover_url(h, data, video_url)
+    admin_update_video_meta(
+        video_id=int(data.get("id") or 0),
+        caption=(data.get("caption") or "").strip(),
+        cover_url=cover_url,
+        tags=(data.get("tags") or "").strip(),
+        category_id=int(data.get("category_id") or 0),
+        sort_order=int(data.get("sort_order") or 0),
+        is_published=bool(data.get("is_published")),
+        published_at=dt,
+        local_filename=(data.get("local_filename") or "").strip(),
+        video_url=video_url,
+        preview_url=(data.get("preview_url") or "").strip(),
+    )
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/video_publish", _ADMIN_WRITE)
+def _api_video_publish(h: Handler, req: Request):
+    data = h._read_json()
+    admin_set_video_publish(int(data.get("id") or 0), bool(data.get("is_published")))
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/video_sort", _ADMIN_WRITE)
+def _api_video_sort(h: Handler, req: Request):
+    data = h._read_json()
+    admin_set_video_sort(int(data.get("id") or 0), int(data.get("sort_order") or 0))
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/user_extend", _ADMIN_WRITE)
+def _api_user_extend(h: Handler, req: Request):
+    data = h._read_json()
+    telegram_id = int(str(data.get("telegram_id") or "0"))
+    days = int(data.get("days") or 0)
+    note = (data.get("note") or "").strip()
+    paid_until = user_extend_days(telegram_id, days, actor=h._actor(), note=note, ip=h._actor_ip())
+    h._send_json({"ok": True, "paid_until": paid_until})
+
+
+@_ROUTES.route("POST", "/api/user_resend_invite", _ADMIN_WRITE)
+def _api_user_resend_invite(h: Handler, req: Request):
+    data = h._read_json()
+    telegram_id = int(str(data.get("telegram_id") or "0"))
+    note = (data.get("note") or "").strip()
+    ok, err = resend_invite_link(telegram_id, actor=h._actor(), note=note, ip=h._actor_ip())
+    h._send_json({"ok": ok, "error": err}, 200 if ok else 500)
+
+
+@_ROUTES.route("POST", "/api/coupons_create", _ADMIN_WRITE)
+def _api_coupons_create(h: Handler, req: Request):
+    data = h._read_json()
+    upsert_coupon(
+        code=(data.get("code") or "").strip(),
+        kind=(data.get("kind") or "").strip(),
+        value=(data.get("value") or "").strip(),
+        plan_codes=(data.get("plan_codes") or "").strip(),
+        max_uses=(data.get("max_uses") or ""),
+        expire_hours=(data.get("expire_hours") or ""),
+    )
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/coupons_generate", _ADMIN_WRITE)
+def _api_coupons_generate(h: Handler, req: Request):
+    data = h._read_json()
+    created = generate_coupons(
+        kind=(data.get("kind") or "").strip(),
+        value=(data.get("value") or "").strip(),
+        plan_codes=(data.get("plan_codes") or "").strip(),
+        max_uses=(data.get("max_uses") or ""),
+        expire_hours=(data.get("expire_hours") or ""),
+        count=int(data.get("count") or 0),
+        prefix=(data.get("prefix") or "").strip(),
+    )
+    h._send_json({"ok": True, "created": created})
+
+
+@_ROUTES.route("POST", "/api/access_codes_create", _ADMIN_WRITE)
+def _api_access_codes_create(h: Handler, req: Request):
+    data = h._read_json()
+    upsert_access_code(
+        code=(data.get("code") or "").strip(),
+        days=int(data.get("days") or 0),
+        max_uses=int(data.get("max_uses") or 1),
+        expire_hours=(data.get("expire_hours") or ""),
+        note=(data.get("note") or "").strip(),
+        created_by=h._actor(),
+    )
+    h._send_json({"ok": True})
+
+
+@_ROUTES.route("POST", "/api/access_codes_generate", _ADMIN_WRITE)
+def _api_access_codes_generate(h: Handler, req: Request):
+    data = h._read_json()
+    created = generate_access_codes(
+        days=int(data.get("days") or 0),
+        max_uses=int(data.get("max_uses") or 1),
+        expire_hours=(data.get("expire_hours") or ""),
+        note=(data.get("note") or "").strip(),
+        count=int(data.get("count") or 0),
+        prefix=(data.get("prefix") or "").strip(),
+        created_by=h._actor(),
+    )
+    h._send_json({"ok": True, "created": created})
+
+
+@_ROUTES.route("POST", "/api/broadcast_create", _ADMIN_WRITE)
+def _api_broadcast_create(h: Handler, req: Request):
+    data = h._read_json()
+    bid = create_broadcast_job_v2(
+        segment=(data.get("segment") or "").strip(),
+        source=(data.get("source") or "").strip(),
+        text=(data.get("text") or ""),
+        parse_mode=(data.get("parse_mode") or "").strip(),
+        media_type=(data.get("media_type") or "").strip(),
+        media=(data.get("media") or "").strip(),
+        button_text=(data.get("button_text") or "").strip(),
+        button_url=(data.get("button_url") or "").strip(),
+        disable_preview=int(data.get("disable_preview") or 0),
+        created_by=h._actor(),
+    )
+    h._send_json({"ok": True, "id": bid})
+
+
+@_ROUTES.route("POST", "/api/broadcast_run", _ADMIN_WRITE)
+def _api_broadcast_run(h: Handler, req: Request):
+    h._send_json({"ok": run_broadcast_async(int(h._read_json().get("id") or 0))})
+
+
+@_ROUTES.route("POST", "/api/broadcast_pause", _ADMIN_WRITE)
+def _api_broadcast_pause(h: Handler, req: Request):
+    h._send_json({"ok": broadcast_set_status(int(h._read_json().get("id") or 0), "paused")})
+
+
+@_ROUTES.route("POST", "/api/broadcast_resume", _ADMIN_WRITE)
+def _api_broadcast_resume(h: Handler, req: Request):
+    bid = int(h._read_json().get("id") or 0)
+    ok = broadcast_set_status(bid, "running")
+    if ok:
+        run_broadcast_async(bid)
+    h._send_json({"ok": ok})
+
+
+@_ROUTES.route("POST", "/api/user_flags", _ADMIN_WRITE)
+def _api_user_flags(h: Handler, req: Request):
+    data = h._read_json()
+    telegram_id = int(str(data.get("telegram_id") or "0"))
+    toggle = (data.get("toggle") or "").strip()
+    note = (data.get("note") or "").strip()
+    res = user_toggle_flags(telegram_id, toggle=toggle, note=note, actor=h._actor(), ip=h._actor_ip())
+    h._send_json({"ok": True, **res})
+
+
+@_ROUTES.route("POST", "/api/reconcile_assign", _ADMIN_WRITE)
+def _api_reconcile_assign(h: Handler, req: Request):
+    data = h._read_json()
+    tx_id = (data.get("tx_id") or "").strip()
+    order_id = int(data.get("order_id") or 0)
+    note = (data.get("note") or "").strip()
+    ok, err = reconcile_assign(tx_id=tx_id, order_id=order_id, actor=h._actor(), note=note, ip=h._actor_ip())
+    h._send_json({"ok": ok, "error": err}, 200 if ok else 400)
+
+
+@_ROUTES.route("POST", "/api/reconcile_retry_tx", _ADMIN_WRITE)
+def _api_reconcile_retry_tx(h: Handler, req: Request):
+    data = h._read_json()
+    tx_id = (data.get("tx_id") or "").strip()
+    note = (data.get("note") or "").strip()
+    ok, err = reconcile_retry_tx(tx_id=tx_id, actor=h._actor(), note=note, ip=h._actor_ip())
+    h._send_json({"ok": ok, "error": err}, 200 if ok else 400)
 
 
 def list_videos(q: str, page: int, limit: int, category_id: int = 0, sort: str = "latest", include_unpublished: bool = False) -> dict:
@@ -2589,6 +2492,14 @@ def stats() -> dict:
     last_credited_at = _q_one("SELECT MAX(processed_at) FROM usdt_txs WHERE status IN ('processed','credited')") or None
     hb_app = _read_heartbeat(HEARTBEAT_FILE)
     hb_userbot = _read_heartbeat(HEARTBEAT_USERBOT_FILE)
+    # 只统计当前在用的收款地址（与快照任务刷新的地址一致），已移出地址池的旧地址快照不计入
+    addrs = tracked_addresses()
+    try:
+        snaps = get_latest_balance_snapshots(addrs) if addrs else {}
+    except Exception:
+        snaps = {}
+    balance_total = sum((r["balance"] for r in snaps.values()), Decimal("0"))
+    balance_at = min((r["created_at"] for r in snaps.values() if r.get("created_at")), default=None)
 
     return {
         "users_total": users_total,
@@ -2602,6 +2513,15 @@ def stats() -> dict:
         "last_credited_at": last_credited_at,
         "hb_app_age_sec": hb_app.get("age_sec"),
         "hb_userbot_age_sec": hb_userbot.get("age_sec"),
+        "balance_total": str(balance_total),
+        "balance_addrs": len(snaps),
+        "balance_snapshot_at": balance_at,
+        "db_pool": pool_stats(),
+        "user_cache": user_cache.stats(),
+        "video_views": view_buffer.stats(),
+        "archive": archive.stats(),
+        "web_server": _async_server.stats() if _async_server is not None else {"mode": "threading"},
+        "routes": _ROUTES.stats(),
     }
 
 
@@ -2774,7 +2694,7 @@ def list_users(q: str, limit: int) -> list[dict]:
               u.created_at,
               u.paid_until,
               (u.paid_until IS NOT NULL AND u.paid_until > UTC_TIMESTAMP()) AS is_member,
-              (SELECT MIN(o.created_at) FROM orders o WHERE o.telegram_id=u.telegram_id AND o.status='success') AS member_since,
+              u.member_since,
               u.last_plan,
               u.total_received,
               u.wallet_addr
@@ -2792,7 +2712,7 @@ def list_users(q: str, limit: int) -> list[dict]:
               u.created_at,
               u.paid_until,
               (u.paid_until IS NOT NULL AND u.paid_until > UTC_TIMESTAMP()) AS is_member,
-              (SELECT MIN(o.created_at) FROM orders o WHERE o.telegram_id=u.telegram_id AND o.status='success') AS member_since,
+              u.member_since,
               u.last_plan,
               u.total_received,
               u.wallet_addr
@@ -2809,7 +2729,7 @@ def list_users(q: str, limit: int) -> list[dict]:
           u.created_at,
           u.paid_until,
           (u.paid_until IS NOT NULL AND u.paid_until > UTC_TIMESTAMP()) AS is_member,
-          (SELECT MIN(o.created_at) FROM orders o WHERE o.telegram_id=u.telegram_id AND o.status='success') AS member_since,
+          u.member_since,
           u.last_plan,
           u.total_received,
           u.wallet_addr
@@ -2821,30 +2741,36 @@ def list_users(q: str, limit: int) -> list[dict]:
     return _q_all(sql, (f"%{q}%", limit))
 
 
+# 订单 / 入账 / 审计列表与导出可回看的最长时间；早于 ARCHIVE_AFTER_DAYS 的行从归档月表读取
+_LIST_MAX_HOURS = 24 * 366
+
+
 def list_orders(hours: int, limit: int) -> list[dict]:
-    hours = max(1, min(int(hours), 720))
+    hours = max(1, min(int(hours), _LIST_MAX_HOURS))
     limit = max(1, min(int(limit), 200))
-    sql = """
-        SELECT id, telegram_id, addr, amount, plan_code, status, tx_id, created_at
-        FROM orders
-        WHERE created_at >= (UTC_TIMESTAMP() - INTERVAL %s HOUR)
-        ORDER BY created_at DESC
-        LIMIT %s
-    """
-    return _q_all(sql, (hours, limit))
+    return archive.read_recent(
+        "orders",
+        "id, telegram_id, addr, amount, plan_code, status, tx_id, created_at",
+        "created_at >= (UTC_TIMESTAMP() - INTERVAL %s HOUR)",
+        (hours,),
+        "created_at DESC",
+        limit,
+        since=datetime.utcnow() - timedelta(hours=hours),
+    )
 
 
 def list_txs(hours: int, limit: int) -> list[dict]:
-    hours = max(1, min(int(hours), 720))
+    hours = max(1, min(int(hours), _LIST_MAX_HOURS))
     limit = max(1, min(int(limit), 20000))
-    sql = """
-        SELECT tx_id, telegram_id, addr, from_addr, amount, status, plan_code, credited_amount, processed_at, block_time, created_at
-        FROM usdt_txs
-        WHERE created_at >= (UTC_TIMESTAMP() - INTERVAL %s HOUR)
-        ORDER BY created_at DESC
-        LIMIT %s
-    """
-    return _q_all(sql, (hours, limit))
+    return archive.read_recent(
+        "usdt_txs",
+        "tx_id, telegram_id, addr, from_addr, amount, status, plan_code, credited_amount, processed_at, block_time, created_at",
+        "created_at >= (UTC_TIMESTAMP() - INTERVAL %s HOUR)",
+        (hours,),
+        "created_at DESC",
+        limit,
+        since=datetime.utcnow() - timedelta(hours=hours),
+    )
 
 
 def list_unmatched_txs(limit: int) -> list[dict]:
@@ -2918,7 +2844,7 @@ def reconcile_assign(tx_id: str, order_id: int, actor: str, note: str, ip: str)
             return False, f"amount mismatch tx={tx_amount} order={order_amount}"
 
         telegram_id = int(order.get("telegram_id") or 0)
-        user = get_user(telegram_id) if telegram_id else None
+        user = get_user(telegram_id, fresh=True) if telegram_id else None
         if not user:
             return False, "user not found"
 
@@ -2943,6 +2869,8 @@ def reconcile_assign(tx_id: str, order_id: int, actor: str, note: str, ip: str)
             (new_paid_until, str(total_new), plan_code, telegram_id),
         )
         cur2.execute("UPDATE orders SET status='success', tx_id=%s WHERE id=%s", (tx_id, order_id))
+        sync_member_since(cur2, order_id)
+        cur2.execute("DELETE FROM payment_amount_slots WHERE addr=%s AND amount=%s", (addr, str(order_amount)))
         cur2.execute(
             """
             UPDATE usdt_txs
@@ -2960,6 +2888,7 @@ def reconcile_assign(tx_id: str, order_id: int, actor: str, note: str, ip: str)
                 cur2.execute("UPDATE orders SET coupon_used=1 WHERE id=%s", (order_id,))
                 cur2.execute("UPDATE coupons SET used_count=used_count+1 WHERE code=%s", (coupon_code,))
         conn.commit()
+        user_cache.invalidate(telegram_id)
         try:
             _audit(actor, "reconcile_assign", telegram_id, {"tx_id": tx_id, "order_id": order_id, "note": note, "ip": ip})
         except Exception:
@@ -3017,16 +2946,17 @@ def reconcile_retry_tx(tx_id: str, actor: str, note: str, ip: str) -> tuple[bool
 
 
 def list_admin_audit(hours: int, limit: int) -> list[dict]:
-    hours = max(1, min(int(hours), 720))
+    hours = max(1, min(int(hours), _LIST_MAX_HOURS))
     limit = max(1, min(int(limit), 20000))
-    sql = """
-        SELECT id, actor, action, target_id, payload, created_at
-        FROM admin_audit
-        WHERE created_at >= (UTC_TIMESTAMP() - INTERVAL %s HOUR)
-        ORDER BY created_at DESC
-        LIMIT %s
-    """
-    return _q_all(sql, (hours, limit))
+    return archive.read_recent(
+        "admin_audit",
+        "id, actor, action, target_id, payload, created_at",
+        "created_at >= (UTC_TIMESTAMP() - INTERVAL %s HOUR)",
+        (hours,),
+        "created_at DESC",
+        limit,
+        since=datetime.utcnow() - timedelta(hours=hours),
+    )
 
 
 def list_coupons(limit: int) -> list[dict]:
@@ -3292,14 +3222,9 @@ def list_broadcast_logs(job_id: int, limit: int) -> list[dict]:
     limit = max(1, min(int(limit), 500))
     if job_id <= 0:
         return []
-    sql = """
-        SELECT telegram_id, status, error, created_at
-        FROM broadcast_logs
-        WHERE job_id=%s
-        ORDER BY created_at DESC
-        LIMIT %s
-    """
-    return _q_all(sql, (job_id, limit))
+    return archive.read_recent(
+        "broadcast_logs", "telegram_id, status, error, created_at", "job_id=%s", (job_id,), "created_at DESC", limit, since=None
+    )
 
 
 def broadcast_set_status(job_id: int, status: str) -> bool:
@@ -3473,25 +3398,25 @@ def user_detail(telegram_id: int) -> dict:
         (telegram_id,),
     )
     user = user_rows[0] if user_rows else None
-    orders = _q_all(
-        """
-        SELECT id, telegram_id, addr, amount, plan_code, status, tx_id, created_at
-        FROM orders
-        WHERE telegram_id=%s
-        ORDER BY created_at DESC
-        LIMIT 20
-        """,
+    # 最近 20 笔可能已被归档（老用户、长期不续费），按注册时间起读热表 + 归档月表
+    since = user.get("created_at") if user else None
+    orders = archive.read_recent(
+        "orders",
+        "id, telegram_id, addr, amount, plan_code, status, tx_id, created_at",
+        "telegram_id=%s",
         (telegram_id,),
+        "created_at DESC",
+        20,
+        since=since,
     )
-    txs = _q_all(
-        """
-        SELECT tx_id, amount, addr, from_addr, status, plan_code, processed_at, created_at
-        FROM usdt_txs
-        WHERE telegram_id=%s
-        ORDER BY created_at DESC
-        LIMIT 20
-        """,
+    txs = archive.read_recent(
+        "usdt_txs",
+        "tx_id, amount, addr, from_addr, status, plan_code, processed_at, created_at",
+        "telegram_id=%s",
         (telegram_id,),
+        "created_at DESC",
+        20,
+        since=since,
     )
     viewed_tags = []
     try:
@@ -3515,6 +3440,7 @@ def user_extend_days(telegram_id: int, days: int, actor: str, note: str, ip: str
         """,
         (int(days), int(telegram_id)),
     )
+    user_cache.invalidate(telegram_id)
     row = _q_all("SELECT paid_until FROM users WHERE telegram_id=%s LIMIT 1", (telegram_id,))
     paid_until = row[0]["paid_until"] if row else None
     _audit(actor, "user_extend_days", telegram_id, {"days": days, "note": note, "ip": ip, "paid_until": paid_until})
@@ -3542,6 +3468,7 @@ def user_toggle_flags(telegram_id: int, toggle: str, note: str, actor: str, ip:
         "UPDATE users SET is_blacklisted=%s, is_whitelisted=%s, note=%s WHERE telegram_id=%s",
         (new_black, new_white, note, telegram_id),
     )
+    user_cache.invalidate(telegram_id)
     _audit(actor, "user_flags", telegram_id, {"toggle": toggle, "black": new_black, "white": new_white, "note": note, "ip": ip})
     return {"is_blacklisted": new_black, "is_whitelisted": new_white}
 
@@ -3593,12 +3520,16 @@ def resend_invite_link(telegram_id: int, actor: str, note: str, ip: str) -> tupl
     return True, ""
 
 
+_async_server: AsyncHTTPServer | None = None
+
+
 def main():
     if not ADMIN_WEB_ENABLE:
         raise SystemExit("ADMIN_WEB_ENABLE=0")
     if not ADMIN_WEB_USER or not ADMIN_WEB_PASS:
         raise SystemExit("ADMIN_WEB_USER/ADMIN_WEB_PASS missing")
 
+    set_db_role("admin_web")
     init_tables()
     def _poker_watchdog():
         while True:
@@ -3622,6 +3553,24 @@ def main():
         threading.Thread(target=_poker_watchdog, daemon=True).start()
     except Exception:
         pass
+    if ADMIN_WEB_SERVER_MODE == "asyncio":
+        global _async_server
+        _async_server = AsyncHTTPServer(
+            Handler,
+            ADMIN_WEB_HOST,
+            int(ADMIN_WEB_PORT),
+            workers=int(ADMIN_WEB_WORKERS) if int(ADMIN_WEB_WORKERS) > 0 else pool_size(),
+            max_pending=int(ADMIN_WEB_MAX_PENDING),
+            keepalive_sec=float(ADMIN_WEB_KEEPALIVE_SEC),
+            max_body_bytes=int(ADMIN_WEB_MAX_BODY_MB) * 1024 * 1024,
+            static_resolver=_static_file,
+            body_limits={p: int(ADMIN_WEB_MAX_UPLOAD_MB) * 1024 * 1024 for p in _UPLOAD_PATHS},
+        )
+        try:
+            asyncio.run(_async_server.serve_forever())
+        except KeyboardInterrupt:
+            pass
+        return
     httpd = ThreadingHTTPServer((ADMIN_WEB_HOST, int(ADMIN_WEB_PORT)), Handler)
     httpd.serve_forever()
 
@@ -15,7 +15,10 @@ def _short_addr(addr: str) -> str:
     return f"{addr[:6]}...{addr[-4:]}"
 
 
-def _targets() -> list[int]:
+def admin_targets() -> list[int]:
+    """
+    管理员通知的接收方：ADMIN_USER_IDS + ADMIN_REPORT_CHAT_ID（ADMIN_REPORT_ENABLE 关闭时为空）
+    """
     if not ADMIN_REPORT_ENABLE:
         return []
     ids: set[int] = set()
@@ -30,7 +33,7 @@ def _targets() -> list[int]:
 
 
 async def send_admin_text(bot: Bot, text: str, parse_mode: str | None = None):
-    targets = _targets()
+    targets = admin_targets()
     for chat_id in targets:
         try:
             await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
@@ -38,16 +41,9 @@ async def send_admin_text(bot: Bot, text: str, parse_mode: str | None = None):
             continue
 
 
-async def notify_recharge_success(
-    bot: Bot,
-    telegram_id: int,
-    amount: Decimal,
-    plan_code: str,
-    addr: str,
-    tx_id: str,
-):
+def recharge_success_text(telegram_id: int, amount: Decimal, plan_code: str, addr: str, tx_id: str) -> str:
     ts = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-    text = (
+    return (
         "<b>充值成功</b>\n"
         f"用户ID：<code>{telegram_id}</code>\n"
         f"金额：<code>{amount}</code> USDT\n"
@@ -56,4 +52,14 @@ async def notify_recharge_success(
         f"TX：<code>{html.escape(tx_id[:10])}</code>\n"
         f"时间：<code>{ts}</code>"
     )
-    await send_admin_text(bot, text, parse_mode="HTML")
+
+
+async def notify_recharge_success(
+    bot: Bot,
+    telegram_id: int,
+    amount: Decimal,
+    plan_code: str,
+    addr: str,
+    tx_id: str,
+):
+    await send_admin_text(bot, recharge_success_text(telegram_id, amount, plan_code, addr, tx_id), parse_mode="HTML")
@@ -24,6 +24,7 @@ from config import (
 from bot.captions import compose_free_caption
 from bot.admin_report import send_admin_text
 from core.models import claim_clip_dispatch_takeover, mark_clip_dispatch_sent, unclaim_clip_dispatch
+from core.adb import run_db
 
 logger = logging.getLogger(__name__)
 
@@ -187,17 +188,17 @@ async def private_channel_video_handler(update: Update, context: ContextTypes.DE
         last_err = None
         for i in range(SEND_RETRY):
             try:
-                if not claim_clip_dispatch_takeover(PAID_CHANNEL_ID, int(message.message_id), int(ch), "bot", 600):
+                if not await run_db(claim_clip_dispatch_takeover, PAID_CHANNEL_ID, int(message.message_id), int(ch), "bot", 600):
                     break
                 with open(dst, "rb") as f:
                     await context.bot.send_video(chat_id=ch, video=f, caption=caption)
                 logger.info("[clipper] 已将剪辑发送到频道 %s (尝试第 %s 次)", ch, i + 1)
-                mark_clip_dispatch_sent(PAID_CHANNEL_ID, int(message.message_id), int(ch))
+                await run_db(mark_clip_dispatch_sent, PAID_CHANNEL_ID, int(message.message_id), int(ch))
                 break
             except Exception as e:
                 last_err = e
                 try:
-                    unclaim_clip_dispatch(PAID_CHANNEL_ID, int(message.message_id), int(ch))
+                    await run_db(unclaim_clip_dispatch, PAID_CHANNEL_ID, int(message.message_id), int(ch))
                 except Exception:
                     pass
                 logger.error(
@@ -1,4 +1,5 @@
 # bot/handlers.py
+import asyncio
 from datetime import datetime, timedelta
 from decimal import Decimal
 import random
@@ -26,6 +27,7 @@ from config import (
     JOIN_REQUEST_ENABLE,
     JOIN_REQUEST_LINK_EXPIRE_HOURS,
     WEBAPP_URL,
+    MATCH_ORDER_LOOKBACK_HOURS,
 )
 from core.models import (
     get_user,
@@ -44,7 +46,12 @@ from core.models import (
 )
 from core.utils import b58decode, b58encode
 from bot.i18n import t, normalize_lang
-from core.models import bind_inviter
+from core.models import bind_inviter, attach_amount_slot_order
+from core import amount_slots
+from core.adb import run_db, stats as db_stats
+from core.db import pool_stats
+from core import user_cache
+from chain import tron_client
 import logging
 logger = logging.getLogger(__name__)
 
@@ -106,7 +113,7 @@ def _plans_kb(lang: str) -> InlineKeyboardMarkup:
     )
 
 
-def _pick_payment_amount(base: Decimal) -> Decimal:
+def _pick_payment_amount(base: Decimal, telegram_id: int | None = None) -> Decimal:
     if PAYMENT_MODE != "single_address" or not RECEIVE_ADDRESS:
         return base.quantize(Decimal("0.000001"))
 
@@ -124,11 +131,32 @@ def _pick_payment_amount(base: Decimal) -> Decimal:
     if span_steps <= 0:
         return (base + lo).quantize(Decimal("0.000001"))
 
+    try:
+        amount = amount_slots.allocate(RECEIVE_ADDRESS, base, lo, hi, int(telegram_id or 0), int(MATCH_ORDER_LOOKBACK_HOURS))
+    except Exception as e:
+        logger.warning(f"[pay] 分配唯一尾数失败，回退随机尾数: {e}")
+        amount = None
+    if amount is not None:
+        return amount
+    logger.warning(f"[pay] 尾数已全部被未结订单占用 base={base}，回退随机尾数（可能与其它订单金额重复）")
+
     r = random.randint(0, span_steps)
     suffix = lo + (Decimal(r) * Decimal("0.0001"))
     return (base + suffix).quantize(Decimal("0.000001"))
 
 
+def _release_payment_amount(addr: str, amount: Decimal, base: Decimal):
+    """
+    下单失败时把 _pick_payment_amount 刚占的尾数槽位还回去
+    """
+    if PAYMENT_MODE != "single_address" or not PAYMENT_SUFFIX_ENABLE:
+        return
+    try:
+        amount_slots.release(addr, amount, base, Decimal(str(PAYMENT_SUFFIX_MIN)))
+    except Exception as e:
+        logger.warning(f"[pay] 释放尾数槽位失败 amount={amount}: {e}")
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     telegram_id = user.id
@@ -144,31 +172,31 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             try:
                 inviter_id = b58decode(code)
                 if inviter_id != telegram_id:
-                    bind_inviter(telegram_id, inviter_id)
+                    await run_db(bind_inviter, telegram_id, inviter_id)
             except Exception:
                 pass
             try:
-                set_user_source(telegram_id, "ref")
+                await run_db(set_user_source, telegram_id, "ref")
             except Exception:
                 pass
             continue
         if a.startswith("cp_"):
             try:
-                set_user_pending_coupon(telegram_id, a[3:])
+                await run_db(set_user_pending_coupon, telegram_id, a[3:])
             except Exception:
                 pass
             continue
         if a:
             try:
-                set_user_source(telegram_id, a)
+                await run_db(set_user_source, telegram_id, a)
             except Exception:
                 pass
 
     # 更新基础信息
     logger.info("handers.py--->更新基础信息")
-    upsert_user_basic(telegram_id, username, lang)
+    await run_db(upsert_user_basic, telegram_id, username, lang)
 
-    u = get_user(telegram_id)
+    u = await run_db(get_user, telegram_id)
     if u and u.get("wallet_addr"):
         addr = u["wallet_addr"]
         paid_until = u.get("paid_until")
@@ -177,11 +205,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             addr = RECEIVE_ADDRESS
         else:
             try:
-                addr = allocate_address(telegram_id)
+                addr = await run_db(allocate_address, telegram_id)
             except Exception:
                 addr = None
         paid_until = None
-        u = get_user(telegram_id)
+        u = await run_db(get_user, telegram_id)
     logger.info("handers.py--->upsert_user_basic")
     parts = []
     parts.append(t(lang, "welcome_title"))
@@ -261,7 +289,7 @@ async def support_user_inbox(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     username = f"@{user.username}" if user.username else ""
     name = (user.full_name or "").strip()
-    u = get_user(int(user.id)) or {}
+    u = await run_db(get_user, int(user.id)) or {}
     paid_until = u.get("paid_until")
     now = datetime.utcnow()
     if paid_until and paid_until > now:
@@ -275,7 +303,7 @@ async def support_user_inbox(update: Update, context: ContextTypes.DEFAULT_TYPE)
     text = f"用户：<code>{user.id}</code> {username} {name} | {member}\n【消息】{body}".strip()
     kb = InlineKeyboardMarkup([[InlineKeyboardButton("回复", callback_data="support_reply:pending")]])
     ticket = await context.bot.send_message(chat_id=SUPPORT_GROUP_ID, text=text, parse_mode="HTML", reply_markup=kb)
-    support_store_mapping(SUPPORT_GROUP_ID, ticket.message_id, int(user.id), int(msg.message_id))
+    await run_db(support_store_mapping, SUPPORT_GROUP_ID, ticket.message_id, int(user.id), int(msg.message_id))
     try:
         await context.bot.edit_message_reply_markup(
             chat_id=SUPPORT_GROUP_ID,
@@ -296,7 +324,7 @@ async def support_user_inbox(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 reply_to_message_id=ticket.message_id,
             )
             try:
-                support_store_mapping(SUPPORT_GROUP_ID, int(copied.message_id), int(user.id), int(msg.message_id))
+                await run_db(support_store_mapping, SUPPORT_GROUP_ID, int(copied.message_id), int(user.id), int(msg.message_id))
             except Exception:
                 pass
         except Exception:
@@ -314,12 +342,12 @@ async def support_group_reply(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     reply_to_id = msg.reply_to_message.message_id
-    user_id = support_get_user_id(SUPPORT_GROUP_ID, reply_to_id)
+    user_id = await run_db(support_get_user_id, SUPPORT_GROUP_ID, reply_to_id)
     if not user_id:
         try:
             parent = getattr(msg.reply_to_message, "reply_to_message", None)
             if parent:
-                user_id = support_get_user_id(SUPPORT_GROUP_ID, int(parent.message_id))
+                user_id = await run_db(support_get_user_id, SUPPORT_GROUP_ID, int(parent.message_id))
         except Exception:
             user_id = None
     if not user_id:
@@ -357,7 +385,7 @@ async def support_reply_button(update: Update, context: ContextTypes.DEFAULT_TYP
         ticket_id = int(parts[1])
     except Exception:
         return
-    user_id = support_get_user_id(SUPPORT_GROUP_ID, ticket_id)
+    user_id = await run_db(support_get_user_id, SUPPORT_GROUP_ID, ticket_id)
     if not user_id:
         await query.answer("未找到对应用户", show_alert=True)
         return
@@ -412,13 +440,13 @@ async def reset_addr(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except Exception:
             target_id = user.id
 
-    old_addr = reset_user_address(target_id)
+    old_addr = await run_db(reset_user_address, target_id)
 
     if PAYMENT_MODE == "single_address" and RECEIVE_ADDRESS:
         new_addr = RECEIVE_ADDRESS
     else:
         try:
-            new_addr = allocate_address(target_id)
+            new_addr = await run_db(allocate_address, target_id)
         except Exception:
             new_addr = None
 
@@ -463,6 +491,30 @@ async def diag(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except Exception as e:
             lines.append(f"{name}={chat_id} ERROR: {type(e).__name__}: {e}")
 
+    tg = tron_client.stats()
+    for k in tg["keys"]:
+        lines.append(f"trongrid key={k['key']} requests={k['requests']} throttled={k['throttled']} cooldown={k['cooldown_sec']}s")
+    c = tg["cache"]
+    lines.append(f"trongrid cache entries={c['entries']} hits={c['hits']} misses={c['misses']} ttl={c['ttl_sec']}s")
+    d = db_stats()
+    lines.append(
+        f"db executor workers={d['workers']} calls={d['calls']} errors={d['errors']} slow={d['slow']} "
+        f"inflight={d['inflight']}/{d['max_inflight']} wait_avg={d['wait_ms_avg']}ms run_avg={d['run_ms_avg']}ms"
+    )
+    p = pool_stats()
+    lines.append(
+        f"db pool role={p['role']} size={p['size']} open={p['open']} in_use={p['in_use']} waits={p['waits']} "
+        f"timeouts={p['timeouts']} wait_max={p['wait_ms_max']}ms pings={p['pings']} reconnects={p['reconnects']}"
+    )
+    uc = user_cache.stats()
+    lines.append(
+        f"user cache size={uc['size']}/{uc['capacity']} ttl={uc['ttl_sec']}s hits={uc['hits']} misses={uc['misses']} "
+        f"hit_rate={uc['hit_rate']:.1%} invalidations={uc['invalidations']}"
+    )
+    if RECEIVE_ADDRESS:
+        bal = await asyncio.to_thread(tron_client.get_usdt_balance, RECEIVE_ADDRESS)
+        lines.append(f"RECEIVE_ADDRESS balance={bal if bal is not None else 'ERROR'} USDT")
+
     if update.message:
         await update.message.reply_text("\n".join(lines))
 
@@ -488,7 +540,7 @@ async def on_menu_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if data == "menu_status" and telegram_id:
-        u = get_user(telegram_id)
+        u = await run_db(get_user, telegram_id)
         paid_until = u.get("paid_until") if u else None
         if paid_until and paid_until > datetime.utcnow():
             msg = t(lang, "current_status", until=paid_until.strftime("%Y-%m-%d %H:%M:%S"))
@@ -506,7 +558,7 @@ async def on_menu_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if data.startswith("pay_") and telegram_id:
-        u = get_user(telegram_id)
+        u = await run_db(get_user, telegram_id)
         plan_code_map = {
             "pay_monthly": "monthly",
             "pay_quarter": "quarter",
@@ -522,23 +574,33 @@ async def on_menu_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
             addr = (u and u.get("wallet_addr"))
             if not addr:
                 try:
-                    addr = allocate_address(telegram_id)
+                    addr = await run_db(allocate_address, telegram_id)
                 except Exception as e:
                     logger.warning("[pay] allocate_address failed uid=%s err=%s", telegram_id, e)
                     addr = None
 
         coupon_code = ((u or {}).get("pending_coupon") or "").strip() or None
-        discounted, _disc, applied = compute_amount_after_coupon(base_amount, plan_code, coupon_code)
-        amount = _pick_payment_amount(discounted)
+        discounted, _disc, applied = await run_db(compute_amount_after_coupon, base_amount, plan_code, coupon_code)
+        amount = await run_db(_pick_payment_amount, discounted, telegram_id)
         if addr:
+            try:
+                if applied:
+                    order_id = await run_db(create_pending_order_priced, telegram_id, addr, amount, base_amount, plan_code, applied)
+                else:
+                    order_id = await run_db(create_pending_order, telegram_id, addr, amount, plan_code)
+            except Exception:
+                await run_db(_release_payment_amount, addr, amount, discounted)
+                raise
             if applied:
-                create_pending_order_priced(telegram_id, addr, amount, base_amount, plan_code, applied)
                 try:
-                    set_user_pending_coupon(telegram_id, None)
+                    await run_db(set_user_pending_coupon, telegram_id, None)
+                except Exception:
+                    pass
+            if PAYMENT_MODE == "single_address" and PAYMENT_SUFFIX_ENABLE:
+                try:
+                    await run_db(attach_amount_slot_order, addr, amount, order_id)
                 except Exception:
                     pass
-            else:
-                create_pending_order(telegram_id, addr, amount, plan_code)
 
         if lang == "zh":
             msg = (
@@ -564,7 +626,7 @@ async def invite(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = tg_user.id
     lang = normalize_lang(tg_user.language_code or "en")
 
-    u = get_user(telegram_id)
+    u = await run_db(get_user, telegram_id)
     username = (u and u.get("username")) or tg_user.username or str(telegram_id)
     invite_count = (u and u.get("invite_count")) or 0
     invite_days = (u and u.get("invite_reward_days")) or 0
@@ -600,11 +662,11 @@ async def coupon(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not code:
         await msg.reply_text("用法：/coupon 优惠码")
         return
-    if not coupon_basic_valid(code):
+    if not await run_db(coupon_basic_valid, code):
         await msg.reply_text("优惠码无效或已过期。")
         return
     try:
-        set_user_pending_coupon(telegram_id, code)
+        await run_db(set_user_pending_coupon, telegram_id, code)
     except Exception:
         await msg.reply_text("设置失败，请稍后重试。")
         return
@@ -623,7 +685,7 @@ async def redeem(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not code:
         await msg.reply_text("用法：/redeem 兑换码")
         return
-    ok, err, paid_until, days = redeem_access_code(code, telegram_id)
+    ok, err, paid_until, days = await run_db(redeem_access_code, code, telegram_id)
     if not ok:
         await msg.reply_text("兑换失败：" + (err or "未知错误"))
         return
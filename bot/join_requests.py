@@ -5,6 +5,7 @@ from telegram.ext import ContextTypes
 
 from config import JOIN_REQUEST_ENABLE, PAID_CHANNEL_ID
 from core.models import admin_audit_log, get_user
+from core.adb import run_db
 from bot.i18n import normalize_lang, t
 from bot.admin_report import send_admin_text
 
@@ -26,7 +27,8 @@ async def paid_channel_join_request(update: Update, context: ContextTypes.DEFAUL
     telegram_id = int(getattr(user, "id", 0) or 0)
     u = None
     try:
-        u = get_user(telegram_id)
+        # 放行 / 拒绝依据会员状态：分片进程、后台补单入账只清各自进程的缓存，这里直接读库
+        u = await run_db(get_user, telegram_id, fresh=True)
     except Exception:
         u = None
 
@@ -42,7 +44,7 @@ async def paid_channel_join_request(update: Update, context: ContextTypes.DEFAUL
         except Exception:
             pass
         try:
-            admin_audit_log("join_request", "decline_blacklisted", telegram_id, {"chat_id": int(PAID_CHANNEL_ID), "paid_until": paid_until})
+            await run_db(admin_audit_log, "join_request", "decline_blacklisted", telegram_id, {"chat_id": int(PAID_CHANNEL_ID), "paid_until": paid_until})
         except Exception:
             pass
         try:
@@ -59,7 +61,7 @@ async def paid_channel_join_request(update: Update, context: ContextTypes.DEFAUL
                 pass
             await context.bot.approve_chat_join_request(chat_id=PAID_CHANNEL_ID, user_id=telegram_id)
             try:
-                admin_audit_log("join_request", "approve", telegram_id, {"chat_id": int(PAID_CHANNEL_ID), "paid_until": paid_until})
+                await run_db(admin_audit_log, "join_request", "approve", telegram_id, {"chat_id": int(PAID_CHANNEL_ID), "paid_until": paid_until})
             except Exception:
                 pass
             try:
@@ -82,7 +84,7 @@ async def paid_channel_join_request(update: Update, context: ContextTypes.DEFAUL
     except Exception:
         pass
     try:
-        admin_audit_log("join_request", "decline", telegram_id, {"chat_id": int(PAID_CHANNEL_ID), "paid_until": paid_until})
+        await run_db(admin_audit_log, "join_request", "decline", telegram_id, {"chat_id": int(PAID_CHANNEL_ID), "paid_until": paid_until})
     except Exception:
         pass
     try:
@@ -0,0 +1,202 @@
+# bot/outbox.py
+# 出站消息队列：入账事务内写 outbound_messages，这里按 Telegram 限流异步投递。
+# 全局令牌桶 + 单聊天最小间隔；遇到 RetryAfter 整体暂停，其余错误按指数退避重试。
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from telegram.ext import ContextTypes
+
+from config import (
+    PAID_CHANNEL_ID,
+    JOIN_REQUEST_ENABLE,
+    JOIN_REQUEST_LINK_EXPIRE_HOURS,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_GLOBAL_RATE,
+    OUTBOX_PER_CHAT_INTERVAL_SEC,
+    OUTBOX_MAX_ATTEMPTS,
+)
+from core.models import (
+    claim_outbound_messages,
+    mark_outbound_sent,
+    reschedule_outbound,
+    requeue_stale_outbound,
+)
+from core.adb import run_db
+from bot.i18n import t, normalize_lang
+from bot.admin_report import recharge_success_text
+import logging
+logger = logging.getLogger(__name__)
+
+_STALE_REQUEUE_SEC = 300
+_last_stale_requeue_ts = 0.0
+
+
+class _RateLimiter:
+    def __init__(self, rate_per_sec: float, per_chat_interval_sec: float):
+        self.rate = max(0.1, float(rate_per_sec))
+        self.per_chat_interval = max(0.0, float(per_chat_interval_sec))
+        self._tokens = self.rate
+        self._refill_ts = time.monotonic()
+        self._paused_until = 0.0
+        self._chat_next: dict[int, float] = {}
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + max(0.0, float(seconds)))
+
+    def chat_wait(self, chat_id: int | None) -> float:
+        if not chat_id:
+            return 0.0
+        return max(0.0, self._chat_next.get(int(chat_id), 0.0) - time.monotonic())
+
+    async def acquire(self, chat_id: int | None, cost: int = 1):
+        cost = max(1, int(cost))
+        while True:
+            now = time.monotonic()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.rate, self._tokens + (now - self._refill_ts) * self.rate)
+            self._refill_ts = now
+            if self._tokens >= min(cost, self.rate):
+                self._tokens -= cost
+                if chat_id:
+                    self._chat_next[int(chat_id)] = now + self.per_chat_interval
+                    if len(self._chat_next) > 10000:
+                        self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+                return
+            await asyncio.sleep((min(cost, self.rate) - self._tokens) / self.rate)
+
+
+_limiter = _RateLimiter(OUTBOX_GLOBAL_RATE, OUTBOX_PER_CHAT_INTERVAL_SEC)
+
+
+def _retry_after_sec(e: RetryAfter) -> float:
+    v = getattr(e, "retry_after", 1)
+    if isinstance(v, timedelta):
+        return v.total_seconds()
+    try:
+        return float(v)
+    except Exception:
+        return 1.0
+
+
+async def _send_admin_recharge(bot, chat_id: int, payload: dict):
+    text = recharge_success_text(
+        int(payload.get("telegram_id") or 0),
+        Decimal(str(payload.get("amount") or 0)),
+        str(payload.get("plan_code") or ""),
+        str(payload.get("addr") or ""),
+        str(payload.get("tx_id") or ""),
+    )
+    await _limiter.acquire(chat_id)
+    # 不经过 send_admin_text（它吞掉所有异常），RetryAfter 等错误交给 outbox_worker_job 的重试 / 退避
+    await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+
+
+async def _send_paid_invite(bot, chat_id: int, payload: dict):
+    until = datetime.strptime(str(payload.get("until")), "%Y-%m-%d %H:%M:%S")
+    await _limiter.acquire(None)
+    if JOIN_REQUEST_ENABLE:
+        expire_ts = int((datetime.utcnow() + timedelta(hours=int(JOIN_REQUEST_LINK_EXPIRE_HOURS))).timestamp())
+        invite_link = await bot.create_chat_invite_link(
+            chat_id=PAID_CHANNEL_ID,
+            expire_date=expire_ts,
+            creates_join_request=True,
+        )
+    else:
+        invite_link = await bot.create_chat_invite_link(
+            chat_id=PAID_CHANNEL_ID,
+            expire_date=int(until.timestamp()),
+            member_limit=1,
+        )
+    msg = t(
+        payload.get("lang") or "en",
+        "success_payment",
+        amount=str(payload.get("amount") or ""),
+        until=until.strftime("%Y-%m-%d %H:%M:%S UTC"),
+        link=invite_link.invite_link,
+    )
+    await _limiter.acquire(chat_id)
+    await bot.send_message(chat_id=chat_id, text=msg)
+
+
+async def _send_invite_reward(bot, chat_id: int, payload: dict):
+    lang = normalize_lang(payload.get("lang") or "en")
+    msg = t(lang, "invite_reward_message", uid=int(payload.get("uid") or 0), days=int(payload.get("days") or 0))
+    await _limiter.acquire(chat_id)
+    await bot.send_message(chat_id=chat_id, text=msg)
+
+
+async def _dispatch(bot, msg: dict):
+    kind = msg.get("kind")
+    chat_id = int(msg.get("chat_id") or 0)
+    payload = msg.get("payload") or {}
+    if kind == "admin_recharge":
+        await _send_admin_recharge(bot, chat_id, payload)
+    elif kind == "paid_invite":
+        await _send_paid_invite(bot, chat_id, payload)
+    elif kind == "invite_reward":
+        await _send_invite_reward(bot, chat_id, payload)
+    else:
+        raise ValueError(f"unknown outbound kind: {kind}")
+
+
+def _backoff_sec(attempts: int) -> int:
+    return min(900, 5 * (2 ** max(0, int(attempts))))
+
+
+async def outbox_worker_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    投递 outbound_messages：每轮认领一批到期消息，成功置 sent，失败按退避重排，超过次数置 failed
+    """
+    global _last_stale_requeue_ts
+    bot = context.bot
+    now_ts = time.time()
+    if (now_ts - _last_stale_requeue_ts) >= _STALE_REQUEUE_SEC:
+        _last_stale_requeue_ts = now_ts
+        try:
+            n = await run_db(requeue_stale_outbound, 10)
+            if n:
+                logger.warning(f"[outbox] 回收超时未确认的消息 {n} 条")
+        except Exception as e:
+            logger.warning(f"[outbox] 回收超时消息失败: {e}")
+
+    token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+    try:
+        batch = await run_db(claim_outbound_messages, token, int(OUTBOX_BATCH_SIZE))
+    except Exception as e:
+        logger.warning(f"[outbox] 认领消息失败: {e}")
+        return
+
+    for i, msg in enumerate(batch):
+        mid = int(msg["id"])
+        chat_wait = _limiter.chat_wait(msg.get("chat_id"))
+        if chat_wait > 0:
+            await run_db(reschedule_outbound, mid, chat_wait, None, count_attempt=False)
+            continue
+        try:
+            await _dispatch(bot, msg)
+        except RetryAfter as e:
+            wait = _retry_after_sec(e)
+            _limiter.pause(wait)
+            logger.warning(f"[outbox] 触发限流 RetryAfter={wait}s，本批剩余 {len(batch) - i} 条顺延")
+            for rest in batch[i:]:
+                await run_db(reschedule_outbound, int(rest["id"]), wait, f"RetryAfter {wait}", count_attempt=False)
+            return
+        except (Forbidden, BadRequest) as e:
+            logger.warning(f"[outbox] 投递失败（不重试） id={mid} kind={msg.get('kind')} chat={msg.get('chat_id')}: {e}")
+            await run_db(reschedule_outbound, mid, 0, str(e), give_up=True)
+            continue
+        except Exception as e:
+            attempts = int(msg.get("attempts") or 0) + 1
+            give_up = attempts >= int(OUTBOX_MAX_ATTEMPTS)
+            logger.warning(f"[outbox] 投递失败 id={mid} kind={msg.get('kind')} attempts={attempts}: {e}")
+            await run_db(reschedule_outbound, mid, _backoff_sec(attempts), str(e), give_up=give_up)
+            continue
+        await run_db(mark_outbound_sent, mid)
@@ -1,31 +1,130 @@
 # bot/payments.py
+import threading
 from datetime import datetime, timedelta
-from decimal import Decimal
+from decimal import Decimal, ROUND_FLOOR
 from typing import List, Dict, Tuple
 
 from config import PLANS, AMOUNT_EPS
 
-def split_amount_to_plans(delta: Decimal) -> Tuple[List[Dict], Decimal]:
+
+class PlanDecomposer:
+    """
+    把金额拆成套餐组合（完全背包 DP，金额按最小价格单位取整）。
+    objective="days"：优先入账天数最多，其次剩余最少；objective="remainder"：优先剩余最少，其次天数最多。
+    表按需增长；性价比最高的套餐为 b 时，容量足够大后 f(C) = f(C - price_b) + value_b，
+    检测到该周期后更大的金额直接按周期折算，查询耗时与金额大小无关。
+    """
+
+    def __init__(self, plans: List[Dict], objective: str = "days"):
+        self.plans = [p for p in plans if Decimal(str(p["price"])) > 0]
+        if not self.plans:
+            raise ValueError("no plans with positive price")
+        exp = min(Decimal(str(p["price"])).normalize().as_tuple().exponent for p in self.plans)
+        self.unit = Decimal(1).scaleb(min(0, exp))
+        weights = [int(Decimal(str(p["price"])) / self.unit) for p in self.plans]
+        days = [max(0, int(p["days"])) for p in self.plans]
+        if objective not in ("days", "remainder"):
+            raise ValueError(f"unknown objective: {objective}")
+        # 周期套餐 b 取打包价值 / 价格最大者：days 目标为 (d*m+w)/w = m*d/w + 1，remainder 目标为 (w*m+d)/w = m + d/w，
+        # 两个目标下都等价于天数 / 价格最大（同比值取更贵的，周期更短出现），因此可以在确定 m 之前选出
+        self.b = max(range(len(self.plans)), key=lambda i: (Decimal(days[i]) / weights[i], weights[i]))
+        p_b, p_max = weights[self.b], max(weights)
+        # 容量 >= (p_b-1)*p_max + p_b 时一定存在含 b 的最优解（鸽巢 + 交换），周期最迟在其后 p_max 内出现
+        self._limit = (p_b - 1) * p_max + p_b + p_max + 2
+        # 两个目标打包成一个整数比较，低位部分在表内的总和必须小于进位基数，否则会溢出到高位打乱字典序：
+        # days 目标低位是花费（<= 表长）；remainder 目标低位是天数（<= 表长 / 最低价 * 最长天数）
+        if objective == "days":
+            m = self._limit + 1
+            values = [d * m + w for w, d in zip(weights, days)]
+        else:
+            m = (self._limit // min(weights) + 1) * (max(days) + 1)
+            values = [w * m + d for w, d in zip(weights, days)]
+        self._items = list(zip(weights, values))
+        self._f = [0]
+        self._choice = [-1]
+        self._run = 0
+        self._periodic = False
+        self._lock = threading.Lock()
+
+    def _extend(self, upto: int):
+        f, choice = self._f, self._choice
+        p_b, v_b = self._items[self.b]
+        p_max = max(w for w, _ in self._items)
+        while len(f) <= upto and not self._periodic and len(f) <= self._limit:
+            c = len(f)
+            best, pick = f[c - 1], -1
+            for i, (w, v) in enumerate(self._items):
+                if w <= c and f[c - w] + v > best:
+                    best, pick = f[c - w] + v, i
+            f.append(best)
+            choice.append(pick)
+            self._run = self._run + 1 if (c >= p_b and best == f[c - p_b] + v_b) else 0
+            if self._run > p_max:
+                self._periodic = True
+
+    def _counts_at(self, c: int) -> List[int]:
+        counts = [0] * len(self._items)
+        while c > 0:
+            i = self._choice[c]
+            if i < 0:
+                c -= 1
+                continue
+            counts[i] += 1
+            c -= self._items[i][0]
+        return counts
+
+    def decompose(self, amount: Decimal, eps: Decimal | None = None) -> Tuple[Dict[str, int], Decimal]:
+        """
+        返回 ({plan_code: 份数}, 剩余金额)
+        """
+        amount = Decimal(str(amount))
+        eps = Decimal(str(AMOUNT_EPS if eps is None else eps))
+        cap = int(((amount + eps) / self.unit).to_integral_value(rounding=ROUND_FLOOR))
+        if cap <= 0:
+            return {}, amount
+        with self._lock:
+            if cap >= len(self._f):
+                self._extend(cap)
+            last = len(self._f) - 1
+            k = 0
+            if cap > last:
+                p_b = self._items[self.b][0]
+                k = -(-(cap - last) // p_b)
+            counts = self._counts_at(cap - k * self._items[self.b][0])
+        counts[self.b] += k
+        out = {self.plans[i]["code"]: n for i, n in enumerate(counts) if n > 0}
+        spent = sum((Decimal(str(self.plans[i]["price"])) * n for i, n in enumerate(counts)), Decimal("0"))
+        return out, amount - spent
+
+
+_decomposers: Dict[tuple, PlanDecomposer] = {}
+_decomposers_lock = threading.Lock()
+
+
+def get_plan_decomposer(objective: str = "days") -> PlanDecomposer:
+    key = (tuple((p["code"], str(p["price"]), int(p["days"])) for p in PLANS), objective)
+    with _decomposers_lock:
+        d = _decomposers.get(key)
+        if d is None:
+            d = PlanDecomposer(PLANS, objective)
+            _decomposers[key] = d
+        return d
+
+
+def split_amount_to_plans(delta: Decimal, objective: str = "days") -> Tuple[Dict[str, int], Decimal]:
     """
-    把新增金额拆成若干套餐（贪心：价格从大到小）
+    把新增金额拆成若干套餐：返回 ({plan_code: 份数}, 剩余金额)，默认按入账天数最多拆分
     """
-    delta = Decimal(str(delta))
-    eps = Decimal(str(AMOUNT_EPS))
-    remain = delta
-    result: List[Dict] = []
+    return get_plan_decomposer(objective).decompose(Decimal(str(delta)))
+
 
-    for plan in sorted(PLANS, key=lambda x: x["price"], reverse=True):
-        price = plan["price"]
-        count = (remain + eps) // price
-        if count > 0:
-            for _ in range(int(count)):
-                result.append(plan)
-                remain -= price
+def plan_counts_days(counts: Dict[str, int]) -> int:
+    days = {p["code"]: int(p["days"]) for p in PLANS}
+    return sum(days.get(code, 0) * int(n) for code, n in counts.items())
 
-    return result, remain
 
 def compute_new_paid_until(old_paid_until: datetime, plans: List[Dict]) -> datetime:
     now = datetime.utcnow()
     base = old_paid_until if (old_paid_until and old_paid_until > now) else now
     total_days = sum(p["days"] for p in plans)
-    return base + timedelta(days=total_days)
\ No newline at end of file
+    return base + timedelta(days=total_days)
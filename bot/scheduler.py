@@ -1,23 +1,22 @@
 # bot/scheduler.py
+import asyncio
 from datetime import datetime, timedelta
 from decimal import Decimal
 import json
 import os
 import time
+import zlib
 
 from telegram.ext import ContextTypes
 
 from config import (
-    PLANS,
     PAID_CHANNEL_ID,
-    INVITE_REWARD,
     MIN_TX_AGE_SEC,
     PAYMENT_MODE,
     RECEIVE_ADDRESS,
     AMOUNT_EPS,
     LOG_RETENTION_DAYS,
     ADMIN_REPORT_HOURLY,
-    USDT_ADDRESS_POOL,
     ADMIN_REPORT_TZ_OFFSET,
     ADMIN_REPORT_QUIET_START_HOUR,
     ADMIN_REPORT_QUIET_END_HOUR,
@@ -28,44 +27,116 @@ from config import (
     EXPIRING_REMIND_DAYS,
     EXPIRED_RECALL_ENABLE,
     EXPIRED_RECALL_DAYS,
-    JOIN_REQUEST_ENABLE,
-    JOIN_REQUEST_LINK_EXPIRE_HOURS,
     HEARTBEAT_FILE,
     MATCH_ORDER_LOOKBACK_HOURS,
     MATCH_ORDER_PREFER_RECENT,
+    DEPOSIT_COLD_SWEEP_SEC,
+    DEPOSIT_WATCH_REBUILD_SEC,
+    BALANCE_SNAPSHOT_RETENTION_DAYS,
+    DEPOSIT_INGEST_MODE,
+    TRON_EVENT_MIN_TX_AGE_SEC,
+    TRON_EVENT_DEBOUNCE_SEC,
+    DEPOSIT_WORKER_ID,
+    DEPOSIT_WORKER_INDEX,
+    DEPOSIT_WORKER_COUNT,
+    DEPOSIT_CLAIM_LEASE_SEC,
+    ADDRESS_POOL_LOW_WATERMARK,
+    ADDRESS_RECYCLE_IDLE_DAYS,
+    VIDEO_VIEW_RETENTION_DAYS,
+    VIDEO_VIEW_HOURLY_RETENTION_DAYS,
+    VIDEO_HOT_TOP_N,
+    VIDEO_HOT_WINDOW_DAYS,
 )
+from core import archive, deposit_watch
+from core.adb import run_db
+from core.order_matcher import PendingOrderIndex
 from core.models import (
-    get_all_users,
-    update_user_payment,
+    get_pending_order_refs,
+    get_wallet_addrs,
+    get_tron_cursors,
+    save_tron_cursors,
     get_unhandled_expired_users,
     mark_user_expired_handled,
     get_users_expiring_within_days,
     mark_user_reminded,
     get_expired_users_for_recall,
-    get_user,
-    get_inviter_id,
-    add_invite_reward,
-    insert_usdt_tx_if_new,
-    set_usdt_tx_status,
+    ingest_usdt_txs,
+    claim_usdt_txs,
+    mark_claimed_usdt_tx_unmatched,
     get_unassigned_usdt_txs,
     get_unassigned_usdt_txs_since,
     get_address_assigned_at,
-    match_pending_order_by_amount,
-    match_pending_order_by_amount_v2,
-    mark_order_success,
+    get_pending_orders_for_match,
+    credit_deposit,
     get_success_orders_between,
+    prune_balance_snapshots,
+    release_expired_amount_slots,
+    get_address_pool_counts,
+    recycle_idle_addresses,
+    refresh_hot_videos,
+    prune_video_views,
 )
-from chain.tron_client import list_usdt_incoming, get_usdt_balance
-from bot.payments import compute_new_paid_until
+from chain.tron_client import poll_usdt_incoming_many, new_cursor
+from chain import balance_snapshot, tron_events
 from bot.i18n import t, normalize_lang
 from core.logging_setup import cleanup_old_logs
-from bot.admin_report import notify_recharge_success, send_admin_text
+from bot.admin_report import send_admin_text
 import logging
 logger = logging.getLogger(__name__)
 _last_heartbeat_err_ts = 0
 
 _last_overnight_report_local_date = None
 _last_health_alert_ts = None
+_last_pool_alert_ts = None
+_last_watch_rebuild_ts = 0.0
+_last_cold_sweep_ts = 0.0
+_deposit_job_lock = asyncio.Lock()
+
+
+async def _deposit_poll_plan() -> tuple[list[str], bool]:
+    """
+    返回本轮需要轮询的热地址，以及本轮是否需要做一次冷地址全量扫描
+    """
+    global _last_watch_rebuild_ts, _last_cold_sweep_ts
+    now_ts = time.time()
+    if deposit_watch.loaded_at() is None or (now_ts - _last_watch_rebuild_ts) >= int(DEPOSIT_WATCH_REBUILD_SEC):
+        try:
+            deposit_watch.rebuild(await run_db(get_pending_order_refs, int(MATCH_ORDER_LOOKBACK_HOURS)))
+            _last_watch_rebuild_ts = now_ts
+        except Exception as e:
+            logger.warning(f"[check_deposits] 重建热地址索引失败: {e}")
+    cold = (now_ts - _last_cold_sweep_ts) >= int(DEPOSIT_COLD_SWEEP_SEC)
+    if cold:
+        _last_cold_sweep_ts = now_ts
+    return deposit_watch.hot_addresses(int(MATCH_ORDER_LOOKBACK_HOURS)), cold
+
+
+async def _poll_incoming(addrs: list[str]) -> tuple[dict[str, list[dict]], dict[str, dict]]:
+    """
+    按持久化游标增量拉取；新地址从订单回看窗口起点开始。
+    返回 (入账, 有推进的游标)；游标由调用方在入账写库成功后再保存，写库失败时下一轮会重新拉到同一批交易
+    """
+    try:
+        cursors = await run_db(get_tron_cursors, addrs)
+    except Exception as e:
+        logger.warning(f"[check_deposits] 读取 TronGrid 游标失败: {e}")
+        return await poll_usdt_incoming_many(addrs), {}
+    start_ms = int((time.time() - int(MATCH_ORDER_LOOKBACK_HOURS) * 3600) * 1000)
+    for addr in addrs:
+        cursors.setdefault(addr, new_cursor(start_ms))
+    before = {a: dict(c) for a, c in cursors.items()}
+    incoming = await poll_usdt_incoming_many(addrs, cursors=cursors)
+    return incoming, {a: c for a, c in cursors.items() if c != before.get(a)}
+
+
+async def _save_cursors(cursors: dict[str, dict]):
+    if not cursors:
+        return
+    try:
+        await run_db(save_tron_cursors, cursors)
+    except Exception as e:
+        # 游标没存上只会导致下一轮重复拉取，入库是 INSERT IGNORE，不会重复入账
+        logger.warning(f"[check_deposits] 保存 TronGrid 游标失败: {e}")
 
 
 def _deposit_health_snapshot() -> dict:
@@ -196,20 +267,13 @@ async def hourly_admin_report_job(context: ContextTypes.DEFAULT_TYPE):
         title = "<b>每小时充值汇报</b>"
         time_range = f"{(local_now - timedelta(hours=1)).strftime('%m-%d %H:%M')} - {local_now.strftime('%H:%M')} 本地时间"
 
-    orders = get_success_orders_between(start, end)
+    orders = await run_db(get_success_orders_between, start, end)
     users = {int(o["telegram_id"]) for o in orders if o.get("telegram_id") is not None}
     total = sum((Decimal(str(o.get("amount") or 0)) for o in orders), Decimal("0"))
 
-    base_addrs = []
-    if PAYMENT_MODE == "single_address" and RECEIVE_ADDRESS:
-        base_addrs = [RECEIVE_ADDRESS]
-    else:
-        base_addrs = USDT_ADDRESS_POOL
-    addrs = list(dict.fromkeys([a for a in base_addrs if a]))
-    balances = []
-    for addr in addrs[:50]:
-        bal = get_usdt_balance(addr)
-        balances.append((addr, bal))
+    addrs = balance_snapshot.tracked_addresses()[:50]
+    snap = await balance_snapshot.refresh(addrs)
+    balances = [(addr, snap.get(addr)) for addr in addrs]
 
     lines = []
     lines.append(title)
@@ -224,7 +288,7 @@ async def hourly_admin_report_job(context: ContextTypes.DEFAULT_TYPE):
         lines.append(f"<code>{addr}</code>  <code>{v}</code>")
 
     if local_hour == quiet_end:
-        snap = _deposit_health_snapshot()
+        snap = await run_db(_deposit_health_snapshot)
         lines.append("")
         lines.append("<b>健康统计：入账延迟</b>")
         if not snap.get("ok"):
@@ -246,258 +310,203 @@ async def hourly_admin_report_job(context: ContextTypes.DEFAULT_TYPE):
 
     await send_admin_text(bot, "\n".join(lines), parse_mode="HTML")
 
-async def check_deposits_job(context: ContextTypes.DEFAULT_TYPE):
-    bot = context.bot
-    confirm_before = datetime.utcnow() - timedelta(seconds=MIN_TX_AGE_SEC)
+def _in_shard(key: str) -> bool:
+    """
+    多进程分片：crc32(key) % DEPOSIT_WORKER_COUNT == DEPOSIT_WORKER_INDEX 的地址/交易归本进程处理
+    """
+    if int(DEPOSIT_WORKER_COUNT) <= 1:
+        return True
+    return zlib.crc32((key or "").encode("utf-8")) % int(DEPOSIT_WORKER_COUNT) == int(DEPOSIT_WORKER_INDEX)
 
-    if PAYMENT_MODE == "single_address" and RECEIVE_ADDRESS:
-        addr = RECEIVE_ADDRESS
-        for tx in list_usdt_incoming(addr):
-            insert_usdt_tx_if_new(
-                telegram_id=None,
-                addr=addr,
-                tx_id=tx["tx_id"],
-                amount=tx["amount"],
-                from_addr=tx.get("from"),
-                block_time=(tx.get("block_time") and tx["block_time"].replace(tzinfo=None)),
-            )
-
-        eps = Decimal(str(AMOUNT_EPS))
-        for tx in get_unassigned_usdt_txs(addr, confirm_before):
-            tx_id = tx["tx_id"]
-            tx_amount = Decimal(str(tx.get("amount") or 0))
-
-            tx_time = tx.get("block_time") or tx.get("created_at") or None
-            order = match_pending_order_by_amount_v2(
-                addr=addr,
-                amount=tx_amount,
-                eps=eps,
-                tx_time=tx_time,
-                lookback_hours=int(MATCH_ORDER_LOOKBACK_HOURS),
-                prefer_recent=bool(MATCH_ORDER_PREFER_RECENT),
-            )
-            if not order:
-                set_usdt_tx_status(tx_id, "unmatched")
-                continue
 
-            telegram_id = int(order["telegram_id"])
-            plan_code = order["plan_code"]
-            user = get_user(telegram_id)
-            if not user:
-                set_usdt_tx_status(tx_id, "unmatched")
-                continue
+async def _credit_matched_tx(bot, addr: str, tx_id: str, tx_amount: Decimal, order: dict, matcher: PendingOrderIndex):
+    try:
+        res = await run_db(credit_deposit, tx_id, int(order["id"]), worker_id=DEPOSIT_WORKER_ID, admin_targets=admin_targets())
+    except Exception as e:
+        logger.warning(f"[check_deposits] 入账事务失败 tx={tx_id} order={order.get('id')}: {e}")
+        return
+    matcher.discard(int(order["id"]))
+    if not res.get("ok"):
+        if res.get("reason") in ("user not found", "plan not found"):
+            await run_db(mark_claimed_usdt_tx_unmatched, tx_id, DEPOSIT_WORKER_ID)
+        return
 
-            paid_until = user.get("paid_until")
-            plan = next((p for p in PLANS if p["code"] == plan_code), None)
-            if not plan:
-                set_usdt_tx_status(tx_id, "unmatched")
-                continue
+    # 充值通知（管理员/会员邀请链接/邀请人奖励）已在入账事务内写入 outbound_messages，由 outbox_worker_job 投递
+    logger.info(f"[check_deposits] 入账成功 uid={res['telegram_id']} order={order.get('id')} tx={tx_id} amount={tx_amount}")
 
-            new_paid_until = compute_new_paid_until(paid_until, [plan])
-            total_old = Decimal(str(user.get("total_received") or 0))
-            new_total = total_old + Decimal(str(plan["price"]))
-
-            update_user_payment(telegram_id, new_paid_until, new_total, plan_code)
-            mark_order_success(int(order["id"]), tx_id)
-            set_usdt_tx_status(
-                tx_id,
-                "processed",
-                plan_code,
-                Decimal(str(plan["price"])),
-                datetime.utcnow(),
-                telegram_id=telegram_id,
-            )
-            try:
-                await notify_recharge_success(bot, telegram_id, tx_amount, plan_code, addr, tx_id)
-            except Exception:
-                pass
 
-            lang = user.get("language") or "en"
-            try:
-                if JOIN_REQUEST_ENABLE:
-                    expire_ts = int((datetime.utcnow() + timedelta(hours=int(JOIN_REQUEST_LINK_EXPIRE_HOURS))).timestamp())
-                    invite_link = await bot.create_chat_invite_link(
-                        chat_id=PAID_CHANNEL_ID,
-                        expire_date=expire_ts,
-                        creates_join_request=True,
-                    )
-                else:
-                    invite_link = await bot.create_chat_invite_link(
-                        chat_id=PAID_CHANNEL_ID,
-                        expire_date=int(new_paid_until.timestamp()),
-                        member_limit=1,
-                    )
-                msg = t(
-                    lang,
-                    "success_payment",
-                    amount=str(tx_amount),
-                    until=new_paid_until.strftime("%Y-%m-%d %H:%M:%S UTC"),
-                    link=invite_link.invite_link,
-                )
-                await bot.send_message(chat_id=telegram_id, text=msg)
-            except Exception as e:
-                logger.warning(f"[check_deposits] 创建邀请链接或发消息失败 uid={telegram_id}: {e}")
-
-            inviter_id = get_inviter_id(telegram_id)
-            if inviter_id and total_old == 0:
-                reward_days = INVITE_REWARD.get(plan_code, 0)
-                if reward_days > 0:
-                    add_invite_reward(inviter_id, reward_days, telegram_id)
-
-                    inviter = get_user(inviter_id)
-                    if inviter:
-                        inviter_lang = normalize_lang(inviter.get("language") or "en")
-                        inviter_paid_until = inviter.get("paid_until")
-                        base = (
-                            inviter_paid_until
-                            if (inviter_paid_until and inviter_paid_until > datetime.utcnow())
-                            else datetime.utcnow()
-                        )
-                        inviter_new_until = base + timedelta(days=reward_days)
-                        inviter_total = Decimal(str(inviter.get("total_received") or 0))
-                        update_user_payment(inviter_id, inviter_new_until, inviter_total, "INVITE")
-
-                        reward_msg = t(inviter_lang, "invite_reward_message", uid=telegram_id, days=reward_days)
-                        try:
-                            await bot.send_message(chat_id=inviter_id, text=reward_msg)
-                        except Exception as e:
-                            logger.warning(f"[check_deposits] 通知邀请人失败 inviter={inviter_id}: {e}")
+async def _process_unassigned_txs(bot, addr: str, txs: list[dict], matcher: PendingOrderIndex):
+    # 先认领（带租约）再处理，多个进程不会同时处理同一笔交易；认领不到的留给持有租约的进程
+    claimed = await run_db(claim_usdt_txs, [tx["tx_id"] for tx in txs], DEPOSIT_WORKER_ID, int(DEPOSIT_CLAIM_LEASE_SEC))
+    for tx in txs:
+        tx_id = tx["tx_id"]
+        if tx_id not in claimed:
+            continue
+        tx_amount = Decimal(str(tx.get("amount") or 0))
+
+        tx_time = tx.get("block_time") or tx.get("created_at") or None
+        order = matcher.match(addr, tx_amount, tx_time)
+        if not order:
+            await run_db(mark_claimed_usdt_tx_unmatched, tx_id, DEPOSIT_WORKER_ID)
+            continue
+        await _credit_matched_tx(bot, addr, tx_id, tx_amount, order, matcher)
+
+
+async def _fetch_incoming(addrs: list[str], cold_sweep: bool) -> tuple[dict[str, list[dict]], bool, dict[str, dict]]:
+    """
+    推送模式且事件流在线时直接取缓冲的事件（冷扫描轮次仍轮询兜底），否则按游标轮询。
+    返回 (入账, 是否来自事件流, 待保存的游标)
+    """
+    if DEPOSIT_INGEST_MODE != "push":
+        incoming, cursors = await _poll_incoming(addrs)
+        return incoming, False, cursors
+    pushed = tron_events.pop_usdt_incoming()
+    if tron_events.is_live() and not cold_sweep:
+        return pushed, True, {}
+    incoming, cursors = await _poll_incoming(list(dict.fromkeys(addrs + list(pushed.keys()))))
+    for addr, txs in pushed.items():
+        incoming.setdefault(addr, []).extend(txs)
+    return incoming, False, cursors
+
+
+async def check_deposits_job(context: ContextTypes.DEFAULT_TYPE):
+    # 定时轮次与事件流触发的轮次可能重叠，串行执行避免同一笔交易被并发处理
+    async with _deposit_job_lock:
+        await _check_deposits(context.bot)
+
+
+async def _check_deposits(bot):
+    hot_addrs, cold_sweep = await _deposit_poll_plan()
 
+    if PAYMENT_MODE == "single_address" and RECEIVE_ADDRESS:
+        addr = RECEIVE_ADDRESS
+        if addr not in hot_addrs and not cold_sweep and not tron_events.has_buffered(addr):
+            return
+        # 单地址模式按交易分片：0 号进程负责拉取入库，各进程按 crc32(tx_id) 处理自己那份
+        pushed = False
+        if int(DEPOSIT_WORKER_INDEX) == 0:
+            incoming, pushed, cursors = await _fetch_incoming([addr], cold_sweep)
+            await run_db(ingest_usdt_txs, incoming.get(addr) or [])
+            await _save_cursors(cursors)
+        confirm_before = datetime.utcnow() - timedelta(seconds=TRON_EVENT_MIN_TX_AGE_SEC if pushed else MIN_TX_AGE_SEC)
+
+        matcher = PendingOrderIndex(
+            await run_db(get_pending_orders_for_match, [addr], int(MATCH_ORDER_LOOKBACK_HOURS)),
+            Decimal(str(AMOUNT_EPS)),
+            bool(MATCH_ORDER_PREFER_RECENT),
+        )
+        txs = [tx for tx in await run_db(get_unassigned_usdt_txs, addr, confirm_before) if _in_shard(tx["tx_id"])]
+        await _process_unassigned_txs(bot, addr, txs, matcher)
         return
 
-    users = get_all_users()
-    for u in users:
-        addr = u.get("wallet_addr")
-        if not addr:
-            continue
-        assigned_at = get_address_assigned_at(addr)
-
-        for tx in list_usdt_incoming(addr):
-            insert_usdt_tx_if_new(
-                telegram_id=None,
-                addr=addr,
-                tx_id=tx["tx_id"],
-                amount=tx["amount"],
-                from_addr=tx.get("from"),
-                block_time=(tx.get("block_time") and tx["block_time"].replace(tzinfo=None)),
-            )
-
-        eps = Decimal(str(AMOUNT_EPS))
-        pending = get_unassigned_usdt_txs_since(addr, confirm_before, assigned_at)
+    addrs = [a for a in hot_addrs if _in_shard(a)]
+    if cold_sweep:
+        addrs.extend(await run_db(get_wallet_addrs, int(DEPOSIT_WORKER_INDEX), int(DEPOSIT_WORKER_COUNT)))
+    addrs = list(dict.fromkeys([a for a in addrs if a]))
+    incoming, pushed, cursors = await _fetch_incoming(addrs, cold_sweep)
+    incoming = {a: txs for a, txs in incoming.items() if _in_shard(a)}
+    confirm_before = datetime.utcnow() - timedelta(seconds=TRON_EVENT_MIN_TX_AGE_SEC if pushed else MIN_TX_AGE_SEC)
+    addrs = list(dict.fromkeys(addrs + list(incoming.keys())))
+    await run_db(ingest_usdt_txs, [tx for txs in incoming.values() for tx in txs])
+    # 只推进已入库地址的游标：不属于本分片的地址交易被丢弃了，游标也不能前移
+    await _save_cursors({a: c for a, c in cursors.items() if _in_shard(a)})
+    matcher = PendingOrderIndex(
+        await run_db(get_pending_orders_for_match, addrs, int(MATCH_ORDER_LOOKBACK_HOURS)),
+        Decimal(str(AMOUNT_EPS)),
+        bool(MATCH_ORDER_PREFER_RECENT),
+    )
+    for addr in addrs:
+        assigned_at = await run_db(get_address_assigned_at, addr)
+
+        pending = await run_db(get_unassigned_usdt_txs_since, addr, confirm_before, assigned_at)
         if not pending:
             continue
+        await _process_unassigned_txs(bot, addr, pending, matcher)
+
+
+def trigger_deposit_check(app):
+    """
+    事件流收到我方入账时调用：短暂合并后立即跑一轮充值检查，不用等下一个 60s 轮次
+    """
+    jq = app.job_queue
+    if not jq.get_jobs_by_name("deposit_push"):
+        jq.run_once(check_deposits_job, when=float(TRON_EVENT_DEBOUNCE_SEC), name="deposit_push")
+    # 立即那一轮只负责入库；等过了确认时间再补跑一轮完成入账，不必等下一个定时轮次
+    if not jq.get_jobs_by_name("deposit_push_confirm"):
+        jq.run_once(
+            check_deposits_job,
+            when=float(TRON_EVENT_MIN_TX_AGE_SEC) + float(TRON_EVENT_DEBOUNCE_SEC) + 1.0,
+            name="deposit_push_confirm",
+        )
 
-        for tx in pending:
-            tx_id = tx["tx_id"]
-            tx_amount = Decimal(str(tx.get("amount") or 0))
-
-            tx_time = tx.get("block_time") or tx.get("created_at") or None
-            order = match_pending_order_by_amount_v2(
-                addr=addr,
-                amount=tx_amount,
-                eps=eps,
-                tx_time=tx_time,
-                lookback_hours=int(MATCH_ORDER_LOOKBACK_HOURS),
-                prefer_recent=bool(MATCH_ORDER_PREFER_RECENT),
-            )
-            if not order:
-                set_usdt_tx_status(tx_id, "unmatched")
-                continue
 
-            telegram_id = int(order["telegram_id"])
-            plan_code = order["plan_code"]
-            user = get_user(telegram_id)
-            if not user:
-                set_usdt_tx_status(tx_id, "unmatched")
-                continue
+async def release_amount_slots_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    释放已过期订单占用的收款金额槽位（超过 MATCH_ORDER_LOOKBACK_HOURS 的订单不会再被匹配）
+    """
+    try:
+        released = await run_db(release_expired_amount_slots)
+    except Exception as e:
+        logger.warning(f"[amount_slots] 释放过期槽位失败: {e}")
+        return
+    if released:
+        logger.info(f"[amount_slots] 释放过期槽位 {len(released)} 个")
 
-            paid_until = user.get("paid_until")
-            plan = next((p for p in PLANS if p["code"] == plan_code), None)
-            if not plan:
-                set_usdt_tx_status(tx_id, "unmatched")
-                continue
 
-            new_paid_until = compute_new_paid_until(paid_until, [plan])
-            total_old = Decimal(str(user.get("total_received") or 0))
-            new_total = total_old + Decimal(str(plan["price"]))
-
-            update_user_payment(telegram_id, new_paid_until, new_total, plan_code)
-            mark_order_success(int(order["id"]), tx_id)
-            set_usdt_tx_status(
-                tx_id,
-                "processed",
-                plan_code,
-                Decimal(str(plan["price"])),
-                datetime.utcnow(),
-                telegram_id=telegram_id,
-            )
-            try:
-                await notify_recharge_success(bot, telegram_id, tx_amount, plan_code, addr, tx_id)
-            except Exception:
-                pass
+async def balance_snapshot_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await balance_snapshot.refresh(balance_snapshot.tracked_addresses())
+    except Exception as e:
+        logger.warning(f"[balance_snapshot] 刷新失败: {e}")
+    try:
+        await run_db(prune_balance_snapshots, int(BALANCE_SNAPSHOT_RETENTION_DAYS))
+    except Exception as e:
+        logger.warning(f"[balance_snapshot] 清理旧快照失败: {e}")
 
-            try:
-                if JOIN_REQUEST_ENABLE:
-                    expire_ts = int((datetime.utcnow() + timedelta(hours=int(JOIN_REQUEST_LINK_EXPIRE_HOURS))).timestamp())
-                    invite_link = await bot.create_chat_invite_link(
-                        chat_id=PAID_CHANNEL_ID,
-                        expire_date=expire_ts,
-                        creates_join_request=True,
-                    )
-                else:
-                    invite_link = await bot.create_chat_invite_link(
-                        chat_id=PAID_CHANNEL_ID,
-                        expire_date=int(new_paid_until.timestamp()),
-                        member_limit=1,
-                    )
-                msg = t(
-                    user.get("language") or "en",
-                    "success_payment",
-                    amount=str(tx_amount),
-                    until=new_paid_until.strftime("%Y-%m-%d %H:%M:%S UTC"),
-                    link=invite_link.invite_link,
-                )
-                await bot.send_message(chat_id=telegram_id, text=msg)
-            except Exception as e:
-                logger.warning(f"[check_deposits] 创建邀请链接或发消息失败 uid={telegram_id}: {e}")
-
-            inviter_id = get_inviter_id(telegram_id)
-            if inviter_id and total_old == 0:
-                reward_days = INVITE_REWARD.get(plan_code, 0)
-                if reward_days > 0:
-                    add_invite_reward(inviter_id, reward_days, telegram_id)
-
-                    inviter = get_user(inviter_id)
-                    if inviter:
-                        inviter_lang = normalize_lang(inviter.get("language") or "en")
-                        inviter_paid_until = inviter.get("paid_until")
-                        base = (
-                            inviter_paid_until
-                            if (inviter_paid_until and inviter_paid_until > datetime.utcnow())
-                            else datetime.utcnow()
-                        )
-                        inviter_new_until = base + timedelta(days=reward_days)
-                        inviter_total = Decimal(str(inviter.get("total_received") or 0))
-                        update_user_payment(inviter_id, inviter_new_until, inviter_total, "INVITE")
-
-                        reward_msg = t(inviter_lang, "invite_reward_message", uid=telegram_id, days=reward_days)
-                        try:
-                            await bot.send_message(chat_id=inviter_id, text=reward_msg)
-                        except Exception as e:
-                            logger.warning(f"[check_deposits] 通知邀请人失败 inviter={inviter_id}: {e}")
+
+async def video_views_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    观看量维护：按日汇总刷新热门标记，清理超过保留期的观看明细和小时汇总
+    """
+    if int(VIDEO_HOT_TOP_N) > 0:
+        try:
+            added, removed = await run_db(refresh_hot_videos, int(VIDEO_HOT_TOP_N), int(VIDEO_HOT_WINDOW_DAYS))
+            if added or removed:
+                logger.info(f"[video_views] 热门标记更新 新增={added} 取消={removed}")
+        except Exception as e:
+            logger.warning(f"[video_views] 刷新热门失败: {e}")
+    try:
+        pruned = await run_db(prune_video_views, int(VIDEO_VIEW_RETENTION_DAYS), int(VIDEO_VIEW_HOURLY_RETENTION_DAYS))
+        if pruned:
+            logger.info(f"[video_views] 清理观看明细 {pruned} 行")
+    except Exception as e:
+        logger.warning(f"[video_views] 清理观看明细失败: {e}")
+
+
+async def archive_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    冷数据归档：把超过 ARCHIVE_AFTER_DAYS 天的订单 / 入账 / 审计 / 群发日志搬到按月归档表
+    """
+    try:
+        moved = await run_db(archive.run_archive)
+    except Exception as e:
+        logger.warning(f"[archive] 归档失败: {e}")
+        return
+    if moved:
+        logger.info(f"[archive] 归档完成 {moved}")
 
 
 async def check_expired_job(context: ContextTypes.DEFAULT_TYPE):
     bot = context.bot
     now = datetime.utcnow()
-    expired_users = get_unhandled_expired_users(now)
+    expired_users = await run_db(get_unhandled_expired_users, now)
 
     for u in expired_users:
         telegram_id = u["telegram_id"]
         lang = normalize_lang(u.get("language") or "en")
         if int(u.get("is_whitelisted") or 0) == 1:
             try:
-                mark_user_expired_handled(telegram_id, now)
+                await run_db(mark_user_expired_handled, telegram_id, now)
             except Exception:
                 pass
             continue
@@ -506,7 +515,7 @@ async def check_expired_job(context: ContextTypes.DEFAULT_TYPE):
             await bot.unban_chat_member(chat_id=PAID_CHANNEL_ID, user_id=telegram_id)
             msg = t(lang, "expired_notice")
             await bot.send_message(chat_id=telegram_id, text=msg)
-            mark_user_expired_handled(telegram_id, now)
+            await run_db(mark_user_expired_handled, telegram_id, now)
         except Exception as e:
             logger.warning(f"[check_expired] 踢用户失败 uid={telegram_id}: {e}")
 
@@ -537,7 +546,7 @@ async def check_expiring_job(context: ContextTypes.DEFAULT_TYPE):
         col = col_map.get(int(days))
         if not col:
             continue
-        users = get_users_expiring_within_days(now, days, col)
+        users = await run_db(get_users_expiring_within_days, now, days, col)
         for u in users:
             telegram_id = u["telegram_id"]
             lang = normalize_lang(u.get("language") or "en")
@@ -552,7 +561,7 @@ async def check_expiring_job(context: ContextTypes.DEFAULT_TYPE):
                     until=paid_until.strftime("%Y-%m-%d %H:%M:%S UTC"),
                 )
                 await bot.send_message(chat_id=telegram_id, text=msg)
-                mark_user_reminded(telegram_id, col, now)
+                await run_db(mark_user_reminded, telegram_id, col, now)
             except Exception as e:
                 logger.warning(f"[check_expiring] 提醒失败 uid={telegram_id}: {e}")
 
@@ -583,14 +592,14 @@ async def expired_recall_job(context: ContextTypes.DEFAULT_TYPE):
         col = col_map.get(int(days_after))
         if not col:
             continue
-        users = get_expired_users_for_recall(now, days_after, col)
+        users = await run_db(get_expired_users_for_recall, now, days_after, col)
         for u in users:
             telegram_id = u["telegram_id"]
             lang = normalize_lang(u.get("language") or "en")
             try:
                 msg = t(lang, "expired_recall_notice", days=days_after)
                 await bot.send_message(chat_id=telegram_id, text=msg)
-                mark_user_reminded(telegram_id, col, now)
+                await run_db(mark_user_reminded, telegram_id, col, now)
             except Exception as e:
                 logger.warning(f"[expired_recall] 召回失败 uid={telegram_id}: {e}")
 
@@ -601,7 +610,7 @@ async def health_alert_job(context: ContextTypes.DEFAULT_TYPE):
     bot = context.bot
     global _last_health_alert_ts
 
-    snap = _deposit_health_snapshot()
+    snap = await run_db(_deposit_health_snapshot)
     if not snap.get("ok"):
         try:
             await send_admin_text(bot, f"<b>健康告警：DB 异常</b>\nerr=<code>{snap.get('error') or 'unknown'}</code>", parse_mode="HTML")
@@ -637,3 +646,46 @@ async def health_alert_job(context: ContextTypes.DEFAULT_TYPE):
         )
     except Exception:
         pass
+
+
+async def address_pool_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    地址池维护：回收长期闲置的地址；空闲地址低于水位时告警（按 HEALTH_ALERT_MIN_INTERVAL_MINUTES 限频）
+    """
+    global _last_pool_alert_ts
+    if PAYMENT_MODE == "single_address":
+        return
+    recycled: list[str] = []
+    if int(ADDRESS_RECYCLE_IDLE_DAYS) > 0:
+        try:
+            recycled = await run_db(recycle_idle_addresses, int(ADDRESS_RECYCLE_IDLE_DAYS))
+        except Exception as e:
+            logger.warning(f"[address_pool] 回收闲置地址失败: {e}")
+        if recycled:
+            logger.info(f"[address_pool] 回收闲置地址 {len(recycled)} 个")
+    try:
+        counts = await run_db(get_address_pool_counts)
+    except Exception as e:
+        logger.warning(f"[address_pool] 统计地址池失败: {e}")
+        return
+    free = int(counts.get("free") or 0)
+    if free >= int(ADDRESS_POOL_LOW_WATERMARK):
+        return
+    now = datetime.utcnow()
+    if _last_pool_alert_ts and (now - _last_pool_alert_ts).total_seconds() / 60.0 < float(HEALTH_ALERT_MIN_INTERVAL_MINUTES):
+        return
+    _last_pool_alert_ts = now
+    logger.warning(f"[address_pool] 空闲地址不足 free={free} total={counts.get('total')}")
+    try:
+        await send_admin_text(
+            context.bot,
+            (
+                "<b>地址池告警：空闲地址不足</b>\n"
+                f"空闲/总数：<code>{free}/{int(counts.get('total') or 0)}</code>\n"
+                f"告警水位：<code>{int(ADDRESS_POOL_LOW_WATERMARK)}</code>\n"
+                f"本轮回收：<code>{len(recycled)}</code>"
+            ),
+            parse_mode="HTML",
+        )
+    except Exception:
+        pass
@@ -29,6 +29,7 @@ from config import (
 from bot.captions import compose_free_caption
 from core.models import create_video_post
 from core.models import claim_clip_dispatch, mark_clip_dispatch_sent, unclaim_clip_dispatch
+from core.adb import run_db
 
 logger = logging.getLogger(__name__)
 
@@ -125,7 +126,7 @@ async def upload_receive_media(update: Update, context: ContextTypes.DEFAULT_TYP
             video=file_id,
             caption=caption if caption else None,
         )
-        create_video_post(PAID_CHANNEL_ID, paid_sent.message_id, file_id, caption)
+        await run_db(create_video_post, PAID_CHANNEL_ID, paid_sent.message_id, file_id, caption)
     except Exception as e:
         await msg.reply_text(f"发布到付费频道失败：{e}")
         return ConversationHandler.END
@@ -180,7 +181,7 @@ async def upload_receive_media(update: Update, context: ContextTypes.DEFAULT_TYP
         last_err = None
         for i in range(SEND_RETRY):
             try:
-                if not claim_clip_dispatch(PAID_CHANNEL_ID, int(paid_sent.message_id), int(ch), "upload"):
+                if not await run_db(claim_clip_dispatch, PAID_CHANNEL_ID, int(paid_sent.message_id), int(ch), "upload"):
                     sent = None
                     break
                 with open(dst, "rb") as f:
@@ -188,7 +189,7 @@ async def upload_receive_media(update: Update, context: ContextTypes.DEFAULT_TYP
                 break
             except Exception as e:
                 try:
-                    unclaim_clip_dispatch(PAID_CHANNEL_ID, int(paid_sent.message_id), int(ch))
+                    await run_db(unclaim_clip_dispatch, PAID_CHANNEL_ID, int(paid_sent.message_id), int(ch))
                 except Exception:
                     pass
                 last_err = e
@@ -197,7 +198,7 @@ async def upload_receive_media(update: Update, context: ContextTypes.DEFAULT_TYP
             highlight_msg = sent
         if sent is not None:
             try:
-                mark_clip_dispatch_sent(PAID_CHANNEL_ID, int(paid_sent.message_id), int(ch))
+                await run_db(mark_clip_dispatch_sent, PAID_CHANNEL_ID, int(paid_sent.message_id), int(ch))
             except Exception:
                 pass
         if sent is None and last_err is not None and ch == HIGHLIGHT_CHANNEL_ID:
@@ -210,7 +211,7 @@ async def upload_receive_media(update: Update, context: ContextTypes.DEFAULT_TYP
         pass
 
     if highlight_msg:
-        create_video_post(HIGHLIGHT_CHANNEL_ID, highlight_msg.message_id, file_id, caption_text)
+        await run_db(create_video_post, HIGHLIGHT_CHANNEL_ID, highlight_msg.message_id, file_id, caption_text)
         await msg.reply_text(
             f"发布完成：\n付费频道 message_id={paid_sent.message_id}\n引流频道 message_id={highlight_msg.message_id}"
         )
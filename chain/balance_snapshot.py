@@ -0,0 +1,75 @@
+# chain/balance_snapshot.py
+# USDT 余额快照：并发查询 + 进程内 TTL 缓存，成功结果写入 usdt_balance_snapshots 时序表。
+# 汇报/后台统计读快照，不再逐个地址同步请求 TronGrid。
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from config import PAYMENT_MODE, RECEIVE_ADDRESS, USDT_ADDRESS_POOL, BALANCE_SNAPSHOT_TTL_SEC
+from chain.tron_client import get_usdt_balances_many
+from core.models import get_latest_balance_snapshots, save_balance_snapshots
+from core.adb import run_db
+import logging
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_latest: dict[str, tuple[datetime, Decimal]] = {}
+_seeded = False
+
+
+def tracked_addresses() -> list[str]:
+    if PAYMENT_MODE == "single_address" and RECEIVE_ADDRESS:
+        base = [RECEIVE_ADDRESS]
+    else:
+        base = USDT_ADDRESS_POOL
+    return list(dict.fromkeys([a for a in base if a]))
+
+
+async def _seed_from_db(addrs: list[str]):
+    global _seeded
+    if _seeded:
+        return
+    _seeded = True
+    try:
+        rows = await run_db(get_latest_balance_snapshots, addrs)
+    except Exception as e:
+        logger.warning(f"[balance_snapshot] 读取历史快照失败: {e}")
+        return
+    with _lock:
+        for addr, r in rows.items():
+            if addr not in _latest and r.get("created_at"):
+                _latest[addr] = (r["created_at"], r["balance"])
+
+
+def cached(addrs: list[str]) -> dict[str, Decimal | None]:
+    with _lock:
+        return {a: (_latest[a][1] if a in _latest else None) for a in addrs}
+
+
+async def refresh(addrs: list[str], max_age_sec: int | None = None) -> dict[str, Decimal | None]:
+    """
+    返回各地址余额：快照未过期直接用，过期的并发重新查询并落库；查询失败时沿用上一次快照
+    """
+    uniq = list(dict.fromkeys([a for a in addrs if a]))
+    if not uniq:
+        return {}
+    await _seed_from_db(uniq)
+    ttl = int(BALANCE_SNAPSHOT_TTL_SEC if max_age_sec is None else max_age_sec)
+    cutoff = datetime.utcnow() - timedelta(seconds=max(0, ttl))
+    with _lock:
+        stale = [a for a in uniq if a not in _latest or _latest[a][0] < cutoff]
+    if stale:
+        fetched = await get_usdt_balances_many(stale)
+        ok = {a: b for a, b in fetched.items() if b is not None}
+        if len(ok) < len(stale):
+            logger.warning(f"[balance_snapshot] 余额查询失败 {len(stale) - len(ok)}/{len(stale)} 个地址，沿用旧快照")
+        if ok:
+            try:
+                await run_db(save_balance_snapshots, ok)
+            except Exception as e:
+                logger.warning(f"[balance_snapshot] 写入快照失败: {e}")
+            now = datetime.utcnow()
+            with _lock:
+                for a, b in ok.items():
+                    _latest[a] = (now, b)
+    return cached(uniq)
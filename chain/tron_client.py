@@ -1,37 +1,200 @@
 # chain/tron_client.py
+import asyncio
+import random
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import httpx
 import requests
 from decimal import Decimal
 from datetime import datetime, timezone
 
-from config import TRX_API_URL, USDT_CONTRACT, TRONGRID_API_KEY
+from config import (
+    TRX_API_URL,
+    USDT_CONTRACT,
+    TRONGRID_API_BASE,
+    TRONGRID_API_KEYS,
+    TRONGRID_KEY_RATE,
+    TRONGRID_MAX_RETRIES,
+    TRONGRID_CACHE_TTL_SEC,
+    TRONGRID_POLL_CONCURRENCY,
+    TRONGRID_MAX_PAGES,
+)
 import logging
 logger = logging.getLogger(__name__)
 
+_async_client: httpx.AsyncClient | None = None
+_async_client_loop: asyncio.AbstractEventLoop | None = None
+
+_CACHE_MAX_ENTRIES = 1024
+
+
+class _KeyBudget:
+    """
+    单个 API Key 的令牌桶；key 为空串表示不带 Key 的匿名请求
+    """
+
+    def __init__(self, key: str, rate: float):
+        self.key = key
+        self.rate = max(0.1, float(rate))
+        self.tokens = self.rate
+        self.refill_ts = time.monotonic()
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.throttled = 0
 
-def _headers() -> dict:
-    if TRONGRID_API_KEY:
-        return {"TRON-PRO-API-KEY": TRONGRID_API_KEY}
+    def refill(self, now: float):
+        self.tokens = min(self.rate, self.tokens + (now - self.refill_ts) * self.rate)
+        self.refill_ts = now
+
+    def wait_sec(self, now: float) -> float:
+        if self.cooldown_until > now:
+            return self.cooldown_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+_key_lock = threading.Lock()
+_keys: list[_KeyBudget] = [_KeyBudget(k, TRONGRID_KEY_RATE) for k in TRONGRID_API_KEYS] or [_KeyBudget("", TRONGRID_KEY_RATE)]
+
+_cache_lock = threading.Lock()
+_cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+_cache_hits = 0
+_cache_misses = 0
+
+
+def _reserve_key() -> tuple[_KeyBudget | None, float]:
+    """
+    取一个有余量的 Key 并扣一个令牌；都没有余量时返回 (None, 需要等待的秒数)
+    """
+    now = time.monotonic()
+    with _key_lock:
+        best = None
+        min_wait = None
+        for kb in _keys:
+            kb.refill(now)
+            w = kb.wait_sec(now)
+            if w <= 0 and (best is None or kb.tokens > best.tokens):
+                best = kb
+            min_wait = w if min_wait is None else min(min_wait, w)
+        if best is None:
+            return None, max(0.01, float(min_wait or 0.01))
+        best.tokens -= 1
+        best.requests += 1
+        return best, 0.0
+
+
+def _throttle_key(kb: _KeyBudget, seconds: float):
+    with _key_lock:
+        kb.throttled += 1
+        kb.tokens = min(kb.tokens, 0.0)
+        kb.cooldown_until = max(kb.cooldown_until, time.monotonic() + max(0.0, float(seconds)))
+
+
+def _key_headers(kb: _KeyBudget) -> dict:
+    if kb.key:
+        return {"TRON-PRO-API-KEY": kb.key}
     return {}
 
 
-def list_usdt_incoming(addr: str) -> list[dict]:
-    url = TRX_API_URL.format(addr)
-    try:
-        resp = requests.get(url, headers=_headers(), timeout=8)
-    except Exception as e:
-        logger.warning(f"[tron_client] 请求失败 addr={addr} err={e}")
-        return []
+def _backoff_sec(attempt: int, retry_after: str | None = None) -> float:
+    if retry_after:
+        try:
+            return min(30.0, max(0.0, float(retry_after)))
+        except Exception:
+            pass
+    return min(8.0, 0.5 * (2 ** int(attempt))) + random.uniform(0, 0.25)
 
-    if resp.status_code != 200:
-        logger.warning(f"[tron_client] 非200 addr={addr} code={resp.status_code} body={resp.text[:200]}")
-        return []
 
-    try:
-        data = resp.json()
-    except Exception as e:
-        logger.warning(f"[tron_client] JSON解析失败 addr={addr} err={e} body={resp.text[:200]}")
-        return []
+def _cache_get(url: str) -> dict | None:
+    global _cache_hits, _cache_misses
+    if int(TRONGRID_CACHE_TTL_SEC) <= 0:
+        return None
+    now = time.monotonic()
+    with _cache_lock:
+        ent = _cache.get(url)
+        if ent is None or ent[0] <= now:
+            if ent is not None:
+                _cache.pop(url, None)
+            _cache_misses += 1
+            return None
+        _cache.move_to_end(url)
+        _cache_hits += 1
+        return ent[1]
 
+
+def _cache_put(url: str, data: dict):
+    if int(TRONGRID_CACHE_TTL_SEC) <= 0:
+        return
+    with _cache_lock:
+        _cache[url] = (time.monotonic() + int(TRONGRID_CACHE_TTL_SEC), data)
+        _cache.move_to_end(url)
+        while len(_cache) > _CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def stats() -> dict:
+    with _key_lock:
+        now = time.monotonic()
+        keys = [
+            {
+                "key": (kb.key[:4] + "…" + kb.key[-4:]) if len(kb.key) > 8 else ("anonymous" if not kb.key else "***"),
+                "requests": kb.requests,
+                "throttled": kb.throttled,
+                "cooldown_sec": round(max(0.0, kb.cooldown_until - now), 1),
+            }
+            for kb in _keys
+        ]
+    with _cache_lock:
+        cache = {"entries": len(_cache), "hits": _cache_hits, "misses": _cache_misses, "ttl_sec": int(TRONGRID_CACHE_TTL_SEC)}
+    return {"keys": keys, "cache": cache}
+
+
+def _get_json(url: str, label: str, use_cache: bool = True) -> dict | None:
+    """
+    同步 GET：缓存 -> 按 Key 令牌桶限速 -> 429/5xx 指数退避重试（429 时该 Key 冷却）
+    """
+    if use_cache:
+        cached = _cache_get(url)
+        if cached is not None:
+            return cached
+    for attempt in range(max(0, int(TRONGRID_MAX_RETRIES)) + 1):
+        kb, wait = _reserve_key()
+        while kb is None:
+            time.sleep(wait)
+            kb, wait = _reserve_key()
+        try:
+            resp = requests.get(url, headers=_key_headers(kb), timeout=8)
+        except Exception as e:
+            logger.warning(f"[tron_client] 请求失败 {label} attempt={attempt} err={e}")
+            time.sleep(_backoff_sec(attempt))
+            continue
+        if resp.status_code == 429 or resp.status_code >= 500:
+            delay = _backoff_sec(attempt, resp.headers.get("Retry-After"))
+            if resp.status_code == 429:
+                _throttle_key(kb, delay)
+            logger.warning(f"[tron_client] {label} code={resp.status_code} attempt={attempt} retry_in={delay:.1f}s")
+            time.sleep(delay)
+            continue
+        if resp.status_code != 200:
+            logger.warning(f"[tron_client] 非200 {label} code={resp.status_code} body={resp.text[:200]}")
+            return None
+        try:
+            data = resp.json()
+        except Exception as e:
+            logger.warning(f"[tron_client] JSON解析失败 {label} err={e} body={resp.text[:200]}")
+            return None
+        if use_cache:
+            _cache_put(url, data)
+        return data
+    logger.warning(f"[tron_client] 重试耗尽 {label}")
+    return None
+
+
+def _parse_incoming(data: dict, addr: str) -> list[dict]:
     txs: list[dict] = []
     for tx in data.get("data", []):
         token_info = tx.get("token_info") or {}
@@ -74,6 +237,166 @@ def list_usdt_incoming(addr: str) -> list[dict]:
 
     txs.sort(key=lambda x: x["block_time"] or datetime.min.replace(tzinfo=timezone.utc))
     return txs
+
+
+def _max_block_ts(data: dict) -> int:
+    out = 0
+    for tx in data.get("data", []):
+        try:
+            out = max(out, int(tx.get("block_timestamp") or 0))
+        except Exception:
+            continue
+    return out
+
+
+def new_cursor(min_timestamp_ms: int) -> dict:
+    """
+    增量游标：min_timestamp 为本轮扫描起点（毫秒），fingerprint 非空表示上轮分页未走完
+    """
+    ts = max(0, int(min_timestamp_ms or 0))
+    return {"min_timestamp": ts, "last_block_ts": ts, "fingerprint": None}
+
+
+def _incoming_url(addr: str, cursor: dict | None) -> str:
+    url = TRX_API_URL.format(addr)
+    if cursor is None:
+        return url
+    params = {"order_by": "block_timestamp,asc", "min_timestamp": int(cursor.get("min_timestamp") or 0)}
+    if cursor.get("fingerprint"):
+        params["fingerprint"] = str(cursor["fingerprint"])
+    return url + ("&" if "?" in url else "?") + urlencode(params)
+
+
+def list_usdt_incoming(addr: str) -> list[dict]:
+    data = _get_json(TRX_API_URL.format(addr), f"addr={addr}")
+    if data is None:
+        return []
+    return _parse_incoming(data, addr)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    进程内共享的 TronGrid 异步 HTTP 客户端（keep-alive 连接池，按事件循环复用）
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is not None and not _async_client.is_closed and _async_client_loop is loop:
+        return _async_client
+    n = max(1, int(TRONGRID_POLL_CONCURRENCY))
+    _async_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(8.0),
+        limits=httpx.Limits(max_connections=n, max_keepalive_connections=n, keepalive_expiry=60.0),
+    )
+    _async_client_loop = loop
+    return _async_client
+
+
+async def aclose_async_client():
+    global _async_client, _async_client_loop
+    client = _async_client
+    _async_client = None
+    _async_client_loop = None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+async def _aget_json(client: httpx.AsyncClient, url: str, addr: str, use_cache: bool = True) -> dict | None:
+    if use_cache:
+        cached = _cache_get(url)
+        if cached is not None:
+            return cached
+    for attempt in range(max(0, int(TRONGRID_MAX_RETRIES)) + 1):
+        kb, wait = _reserve_key()
+        while kb is None:
+            await asyncio.sleep(wait)
+            kb, wait = _reserve_key()
+        try:
+            resp = await client.get(url, headers=_key_headers(kb))
+        except Exception as e:
+            logger.warning(f"[tron_client] 请求失败 addr={addr} attempt={attempt} err={e}")
+            await asyncio.sleep(_backoff_sec(attempt))
+            continue
+        if resp.status_code == 429 or resp.status_code >= 500:
+            delay = _backoff_sec(attempt, resp.headers.get("Retry-After"))
+            if resp.status_code == 429:
+                _throttle_key(kb, delay)
+            logger.warning(f"[tron_client] addr={addr} code={resp.status_code} attempt={attempt} retry_in={delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        if resp.status_code != 200:
+            logger.warning(f"[tron_client] 非200 addr={addr} code={resp.status_code} body={resp.text[:200]}")
+            return None
+        try:
+            data = resp.json()
+        except Exception as e:
+            logger.warning(f"[tron_client] JSON解析失败 addr={addr} err={e} body={resp.text[:200]}")
+            return None
+        if use_cache:
+            _cache_put(url, data)
+        return data
+    logger.warning(f"[tron_client] 重试耗尽 addr={addr}")
+    return None
+
+
+async def alist_usdt_incoming(addr: str, client: httpx.AsyncClient | None = None) -> list[dict]:
+    data = await _aget_json(client or get_async_client(), _incoming_url(addr, None), addr)
+    if data is None:
+        return []
+    return _parse_incoming(data, addr)
+
+
+async def alist_usdt_incoming_since(addr: str, cursor: dict, client: httpx.AsyncClient | None = None) -> tuple[list[dict], dict]:
+    """
+    按游标增量拉取（按 block_timestamp 升序 + fingerprint 翻页），返回 (新交易, 新游标)。
+    单轮最多翻 TRONGRID_MAX_PAGES 页，没翻完的 fingerprint 留到下一轮继续。
+    """
+    client = client or get_async_client()
+    cur = dict(cursor)
+    txs: list[dict] = []
+    for _ in range(max(1, int(TRONGRID_MAX_PAGES))):
+        data = await _aget_json(client, _incoming_url(addr, cur), addr, use_cache=False)
+        if data is None:
+            break
+        txs.extend(_parse_incoming(data, addr))
+        cur["last_block_ts"] = max(int(cur.get("last_block_ts") or 0), _max_block_ts(data))
+        fp = ((data.get("meta") or {}).get("fingerprint") or "").strip()
+        if not fp:
+            cur["min_timestamp"] = int(cur["last_block_ts"])
+            cur["fingerprint"] = None
+            break
+        cur["fingerprint"] = fp
+    return txs, cur
+
+
+async def poll_usdt_incoming_many(addrs: list[str], concurrency: int | None = None, cursors: dict[str, dict] | None = None) -> dict[str, list[dict]]:
+    """
+    并发拉取多个地址的 USDT 入账（有界并发，不阻塞事件循环）。
+    传入 cursors 时按地址游标增量拉取，并把新游标原地写回 cursors。
+    """
+    uniq = list(dict.fromkeys([a for a in addrs if a]))
+    if not uniq:
+        return {}
+    n = max(1, int(concurrency or TRONGRID_POLL_CONCURRENCY))
+    client = get_async_client()
+    sem = asyncio.Semaphore(n)
+
+    async def _one(addr: str) -> tuple[str, list[dict]]:
+        async with sem:
+            if cursors is not None and addr in cursors:
+                txs, cursors[addr] = await alist_usdt_incoming_since(addr, cursors[addr], client)
+                return addr, txs
+            return addr, await alist_usdt_incoming(addr, client)
+
+    out: dict[str, list[dict]] = {}
+    for res in await asyncio.gather(*(_one(a) for a in uniq), return_exceptions=True):
+        if isinstance(res, BaseException):
+            logger.warning(f"[tron_client] 并发拉取异常 err={res}")
+            continue
+        addr, txs = res
+        out[addr] = txs
+    return out
+
+
 def get_usdt_received(addr: str) -> Decimal:
     """
     使用 TronGrid 查询某地址累计收到的 USDT 数量（单位：USDT）
@@ -85,22 +408,7 @@ def get_usdt_received(addr: str) -> Decimal:
     return total
 
 
-def get_usdt_balance(addr: str) -> Decimal | None:
-    url = f"https://api.trongrid.io/v1/accounts/{addr}"
-    try:
-        resp = requests.get(url, headers=_headers(), timeout=8)
-    except Exception as e:
-        logger.warning(f"[tron_client] balance 请求失败 addr={addr} err={e}")
-        return None
-    if resp.status_code != 200:
-        logger.warning(f"[tron_client] balance 非200 addr={addr} code={resp.status_code} body={resp.text[:200]}")
-        return None
-    try:
-        data = resp.json()
-    except Exception as e:
-        logger.warning(f"[tron_client] balance JSON解析失败 addr={addr} err={e} body={resp.text[:200]}")
-        return None
-
+def _parse_usdt_balance(data: dict) -> Decimal | None:
     items = data.get("data") or []
     if not items:
         return Decimal("0")
@@ -123,3 +431,40 @@ def get_usdt_balance(addr: str) -> Decimal | None:
                 except Exception:
                     return None
     return None
+
+
+def get_usdt_balance(addr: str) -> Decimal | None:
+    data = _get_json(f"{TRONGRID_API_BASE}/v1/accounts/{addr}", f"balance addr={addr}")
+    if data is None:
+        return None
+    return _parse_usdt_balance(data)
+
+
+async def aget_usdt_balance(addr: str, client: httpx.AsyncClient | None = None) -> Decimal | None:
+    data = await _aget_json(client or get_async_client(), f"{TRONGRID_API_BASE}/v1/accounts/{addr}", addr)
+    if data is None:
+        return None
+    return _parse_usdt_balance(data)
+
+
+async def get_usdt_balances_many(addrs: list[str], concurrency: int | None = None) -> dict[str, Decimal | None]:
+    """
+    并发查询多个地址的 USDT 余额（有界并发），失败的地址值为 None
+    """
+    uniq = list(dict.fromkeys([a for a in addrs if a]))
+    if not uniq:
+        return {}
+    client = get_async_client()
+    sem = asyncio.Semaphore(max(1, int(concurrency or TRONGRID_POLL_CONCURRENCY)))
+
+    async def _one(addr: str) -> Decimal | None:
+        async with sem:
+            return await aget_usdt_balance(addr, client)
+
+    out: dict[str, Decimal | None] = {}
+    for addr, res in zip(uniq, await asyncio.gather(*(_one(a) for a in uniq), return_exceptions=True)):
+        if isinstance(res, BaseException):
+            logger.warning(f"[tron_client] 并发查询余额异常 addr={addr} err={res}")
+            res = None
+        out[addr] = res
+    return out
@@ -0,0 +1,244 @@
+# chain/tron_events.py
+# 推送模式充值检测：订阅 USDT 合约的 TRC20 Transfer 事件流（SSE 或逐行 JSON），
+# 只保留转入我方地址的事件，缓冲后由充值任务取走；断线时自动重连，期间充值任务回退到轮询。
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Callable
+
+import httpx
+
+from config import USDT_CONTRACT, TRON_EVENT_STREAM_URL, TRON_EVENT_STALE_SEC, DEPOSIT_WATCH_REBUILD_SEC
+from core import deposit_watch
+from core.utils import b58encode
+import logging
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_buffer: dict[str, dict[str, dict]] = {}
+_addresses: set[str] = set()
+_connected = False
+_last_message_ts = 0.0
+_task: asyncio.Task | None = None
+_events_total = 0
+_reconnects = 0
+
+
+def _hex_to_base58(addr: str) -> str:
+    """
+    事件里的地址可能是 41 开头的 hex（或 0x 前缀的 20 字节），统一转成 base58check
+    """
+    a = (addr or "").strip()
+    if a.startswith("0x"):
+        a = "41" + a[2:]
+    if len(a) != 42 or not a.startswith("41"):
+        return a
+    try:
+        raw = bytes.fromhex(a)
+    except ValueError:
+        return a
+    checksum = hashlib.sha256(hashlib.sha256(raw).digest()).digest()[:4]
+    return b58encode(int.from_bytes(raw + checksum, "big"))
+
+
+def _is_removed(ev: dict) -> bool:
+    """
+    分叉回滚时事件插件会重发一条 removed=true 的同一事件
+    """
+    v = ev.get("removed")
+    return v is True or str(v).lower() == "true"
+
+
+def _parse_event(ev: dict) -> dict | None:
+    """
+    Transfer 事件 -> 与 tron_client.list_usdt_incoming 相同的交易结构。
+    事件只作为"有新交易"的提示入库，入账仍要等 TRON_EVENT_MIN_TX_AGE_SEC（不小于 MIN_TX_AGE_SEC）之后
+    """
+    if (ev.get("event_name") or ev.get("eventName") or "Transfer") != "Transfer":
+        return None
+    contract = _hex_to_base58(ev.get("contract_address") or ev.get("contractAddress") or "")
+    if contract != USDT_CONTRACT:
+        return None
+    result = ev.get("result") or {}
+    to_addr = _hex_to_base58(str(result.get("to") or result.get("1") or ""))
+    from_addr = _hex_to_base58(str(result.get("from") or result.get("0") or ""))
+    tx_id = ev.get("transaction_id") or ev.get("transactionId")
+    if not tx_id or not to_addr:
+        return None
+    try:
+        amount = Decimal(str(result.get("value") or result.get("2") or "0")) / (Decimal(10) ** int(ev.get("token_decimals") or 6))
+    except Exception:
+        return None
+    block_time = None
+    ts_ms = ev.get("block_timestamp") or ev.get("timeStamp")
+    if ts_ms is not None:
+        try:
+            block_time = datetime.fromtimestamp(int(ts_ms) / 1000, tz=timezone.utc)
+        except Exception:
+            block_time = None
+    return {"tx_id": tx_id, "from": from_addr, "to": to_addr, "amount": amount, "block_time": block_time}
+
+
+def _wanted(addr: str) -> bool:
+    with _lock:
+        if addr in _addresses:
+            return True
+    return deposit_watch.is_hot(addr)
+
+
+def _discard(tx_id: str):
+    with _lock:
+        for addr in list(_buffer.keys()):
+            if _buffer[addr].pop(tx_id, None) is not None and not _buffer[addr]:
+                _buffer.pop(addr, None)
+
+
+def _accept(tx: dict) -> bool:
+    global _events_total
+    if not _wanted(tx["to"]):
+        return False
+    with _lock:
+        _buffer.setdefault(tx["to"], {})[tx["tx_id"]] = tx
+        _events_total += 1
+    return True
+
+
+def is_live() -> bool:
+    """
+    事件流已连接且在 TRON_EVENT_STALE_SEC 内收到过数据（含心跳）
+    """
+    return _connected and (time.monotonic() - _last_message_ts) < int(TRON_EVENT_STALE_SEC)
+
+
+def has_buffered(addr: str) -> bool:
+    with _lock:
+        return bool(_buffer.get(addr))
+
+
+def pop_usdt_incoming(addrs: list[str] | None = None) -> dict[str, list[dict]]:
+    """
+    取走缓冲的入账事件 {addr: [tx...]}（结构同 tron_client.list_usdt_incoming）；addrs 为空取全部
+    """
+    with _lock:
+        keys = list(_buffer.keys()) if addrs is None else [a for a in addrs if a in _buffer]
+        out = {a: list(_buffer.pop(a).values()) for a in keys}
+    for txs in out.values():
+        txs.sort(key=lambda x: x["block_time"] or datetime.min.replace(tzinfo=timezone.utc))
+    return out
+
+
+def stats() -> dict:
+    with _lock:
+        buffered = sum(len(v) for v in _buffer.values())
+        addrs = len(_addresses)
+    return {
+        "live": is_live(),
+        "connected": _connected,
+        "addresses": addrs,
+        "buffered": buffered,
+        "events_total": _events_total,
+        "reconnects": _reconnects,
+    }
+
+
+async def _refresh_addresses(addresses_fn: Callable[[], list[str]]):
+    try:
+        addrs = await asyncio.to_thread(addresses_fn)
+    except Exception as e:
+        logger.warning(f"[tron_events] 加载监听地址失败: {e}")
+        return
+    with _lock:
+        _addresses.clear()
+        _addresses.update(a for a in addrs if a)
+
+
+def _iter_payloads(line: str):
+    line = line.strip()
+    if not line or line.startswith(":"):
+        return
+    if line.startswith("data:"):
+        line = line[5:].strip()
+    elif line.startswith(("event:", "id:", "retry:")):
+        return
+    try:
+        obj = json.loads(line)
+    except Exception:
+        return
+    if isinstance(obj, list):
+        yield from (x for x in obj if isinstance(x, dict))
+    elif isinstance(obj, dict):
+        yield obj
+
+
+async def _run(addresses_fn: Callable[[], list[str]], on_transfer: Callable[[], None]):
+    global _connected, _last_message_ts, _reconnects
+    backoff = 1.0
+    last_refresh = 0.0
+    sep = "&" if "?" in TRON_EVENT_STREAM_URL else "?"
+    url = f"{TRON_EVENT_STREAM_URL}{sep}contract={USDT_CONTRACT}&event_name=Transfer"
+    while True:
+        if (time.monotonic() - last_refresh) >= int(DEPOSIT_WATCH_REBUILD_SEC):
+            await _refresh_addresses(addresses_fn)
+            last_refresh = time.monotonic()
+        try:
+            timeout = httpx.Timeout(10.0, read=float(TRON_EVENT_STALE_SEC))
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                async with client.stream("GET", url, headers={"Accept": "text/event-stream, application/x-ndjson"}) as resp:
+                    if resp.status_code != 200:
+                        raise RuntimeError(f"stream status={resp.status_code}")
+                    _connected = True
+                    _last_message_ts = time.monotonic()
+                    backoff = 1.0
+                    logger.info(f"[tron_events] 已连接事件流 {TRON_EVENT_STREAM_URL}")
+                    async for line in resp.aiter_lines():
+                        _last_message_ts = time.monotonic()
+                        got = False
+                        for ev in _iter_payloads(line):
+                            if _is_removed(ev):
+                                # 已入库的交易由 MIN_TX_AGE_SEC 延迟兜底，冷扫描轮询时链上查不到也不会再出现
+                                _discard(str(ev.get("transaction_id") or ev.get("transactionId") or ""))
+                                continue
+                            tx = _parse_event(ev)
+                            if tx is not None and _accept(tx):
+                                got = True
+                        if got:
+                            on_transfer()
+                        if (time.monotonic() - last_refresh) >= int(DEPOSIT_WATCH_REBUILD_SEC):
+                            await _refresh_addresses(addresses_fn)
+                            last_refresh = time.monotonic()
+        except asyncio.CancelledError:
+            _connected = False
+            raise
+        except Exception as e:
+            logger.warning(f"[tron_events] 事件流断开，{backoff:.0f}s 后重连（期间回退轮询）: {e}")
+        _connected = False
+        _reconnects += 1
+        await asyncio.sleep(backoff)
+        backoff = min(30.0, backoff * 2)
+
+
+def start(addresses_fn: Callable[[], list[str]], on_transfer: Callable[[], None]):
+    """
+    在当前事件循环里启动订阅任务；addresses_fn 返回需要监听的收款地址，on_transfer 在收到我方入账时调用
+    """
+    global _task
+    if _task is not None and not _task.done():
+        return
+    _task = asyncio.get_running_loop().create_task(_run(addresses_fn, on_transfer))
+
+
+async def stop():
+    global _task, _connected
+    task = _task
+    _task = None
+    _connected = False
+    if task is not None and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
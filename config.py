@@ -1,6 +1,7 @@
 # config.py
 import os
 import json
+import socket
 from decimal import Decimal
 from dotenv import load_dotenv
 
@@ -60,6 +61,9 @@ _ENV_ONLY_KEYS = {
     "FREE_CHANNEL_ID_2",
     "FREE_CHANNEL_IDS",
     "TRONGRID_API_KEY",
+    "TRONGRID_API_KEYS",
+    "DEPOSIT_WORKER_INDEX",
+    "DEPOSIT_WORKER_ID",
     "MIN_TX_AGE_SEC",
     "PAYMENT_MODE",
     "RECEIVE_ADDRESS",
@@ -267,9 +271,16 @@ PAYMENT_SUFFIX_MAX = _to_decimal(_cfg_value("PAYMENT_SUFFIX_MAX", "0.0099"), "0.
 
 # TronGrid 查询 USDT 交易
 USDT_CONTRACT = "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"
-TRX_API_URL   = "https://api.trongrid.io/v1/accounts/{}/transactions/trc20?limit=200&only_to=true"
+TRONGRID_API_BASE = (str(_cfg_value("TRONGRID_API_BASE", "https://api.trongrid.io") or "").strip() or "https://api.trongrid.io").rstrip("/")
+TRX_API_URL   = TRONGRID_API_BASE + "/v1/accounts/{}/transactions/trc20?limit=200&only_to=true"
 TRONGRID_API_KEY = str(_cfg_value("TRONGRID_API_KEY", "") or "").strip()
+TRONGRID_API_KEYS = list(dict.fromkeys(_to_str_list(_cfg_value("TRONGRID_API_KEYS", "")) + ([TRONGRID_API_KEY] if TRONGRID_API_KEY else [])))
+TRONGRID_KEY_RATE = _to_float(_cfg_value("TRONGRID_KEY_RATE", "10"), 10.0)
+TRONGRID_MAX_RETRIES = _to_int(_cfg_value("TRONGRID_MAX_RETRIES", "3"), 3)
+TRONGRID_CACHE_TTL_SEC = _to_int(_cfg_value("TRONGRID_CACHE_TTL_SEC", "15"), 15)
 MIN_TX_AGE_SEC = _to_int(_cfg_value("MIN_TX_AGE_SEC", "60"), 60)
+TRONGRID_POLL_CONCURRENCY = _to_int(_cfg_value("TRONGRID_POLL_CONCURRENCY", "8"), 8)
+TRONGRID_MAX_PAGES = _to_int(_cfg_value("TRONGRID_MAX_PAGES", "5"), 5)
 
 # MySQL
 DB_HOST = str(_cfg_value("DB_HOST", "127.0.0.1") or "").strip()
@@ -277,6 +288,17 @@ DB_PORT = _to_int(_cfg_value("DB_PORT", "3306"), 3306)
 DB_USER = str(_cfg_value("DB_USER", "root") or "").strip()
 DB_PASS = str(_cfg_value("DB_PASS", "panss") or "").strip()
 DB_NAME = str(_cfg_value("DB_NAME", "usdt_membership") or "").strip()
+# 连接池按进程角色配置大小（0=用 DB_POOL_SIZE）；连接空闲超过 DB_POOL_PING_IDLE_SEC 秒才在借出时 ping
+DB_POOL_SIZE = _to_int(_cfg_value("DB_POOL_SIZE", "10"), 10)
+DB_POOL_SIZE_BOT = _to_int(_cfg_value("DB_POOL_SIZE_BOT", "0"), 0)
+DB_POOL_SIZE_ADMIN_WEB = _to_int(_cfg_value("DB_POOL_SIZE_ADMIN_WEB", "0"), 0)
+DB_POOL_PING_IDLE_SEC = _to_int(_cfg_value("DB_POOL_PING_IDLE_SEC", "30"), 30)
+DB_POOL_WAIT_TIMEOUT_SEC = _to_int(_cfg_value("DB_POOL_WAIT_TIMEOUT_SEC", "10"), 10)
+DB_EXECUTOR_WORKERS = _to_int(_cfg_value("DB_EXECUTOR_WORKERS", "8"), 8)
+DB_SLOW_CALL_MS = _to_int(_cfg_value("DB_SLOW_CALL_MS", "500"), 500)
+# get_user 进程内缓存：最多缓存 USER_CACHE_SIZE 个用户，每条 USER_CACHE_TTL_SEC 秒过期（任一为 0 关闭缓存）
+USER_CACHE_SIZE = _to_int(_cfg_value("USER_CACHE_SIZE", "5000"), 5000)
+USER_CACHE_TTL_SEC = _to_int(_cfg_value("USER_CACHE_TTL_SEC", "30"), 30)
 
 # 会员套餐
 PLANS = [
@@ -302,6 +324,34 @@ HEARTBEAT_INTERVAL_SEC = _to_int(_cfg_value("HEARTBEAT_INTERVAL_SEC", "60"), 60)
 
 MATCH_ORDER_LOOKBACK_HOURS = _to_int(_cfg_value("MATCH_ORDER_LOOKBACK_HOURS", "72"), 72)
 MATCH_ORDER_PREFER_RECENT = _to_bool(_cfg_value("MATCH_ORDER_PREFER_RECENT", "1"), True)
+DEPOSIT_COLD_SWEEP_SEC = _to_int(_cfg_value("DEPOSIT_COLD_SWEEP_SEC", "1800"), 1800)
+DEPOSIT_WATCH_REBUILD_SEC = _to_int(_cfg_value("DEPOSIT_WATCH_REBUILD_SEC", "300"), 300)
+ADDRESS_POOL_LOW_WATERMARK = _to_int(_cfg_value("ADDRESS_POOL_LOW_WATERMARK", "20"), 20)
+ADDRESS_RECYCLE_IDLE_DAYS = _to_int(_cfg_value("ADDRESS_RECYCLE_IDLE_DAYS", "0"), 0)
+# 多进程分片处理充值：每个进程配置相同的 COUNT、不同的 INDEX（0..COUNT-1）
+DEPOSIT_WORKER_COUNT = max(1, _to_int(_cfg_value("DEPOSIT_WORKER_COUNT", "1"), 1))
+DEPOSIT_WORKER_INDEX = min(DEPOSIT_WORKER_COUNT - 1, max(0, _to_int(_cfg_value("DEPOSIT_WORKER_INDEX", "0"), 0)))
+DEPOSIT_WORKER_ID = (str(_cfg_value("DEPOSIT_WORKER_ID", "") or "").strip() or f"{socket.gethostname()}:{os.getpid()}")[:64]
+DEPOSIT_CLAIM_LEASE_SEC = _to_int(_cfg_value("DEPOSIT_CLAIM_LEASE_SEC", "120"), 120)
+DEPOSIT_INGEST_MODE = str(_cfg_value("DEPOSIT_INGEST_MODE", "poll") or "poll").strip().lower()
+if DEPOSIT_INGEST_MODE not in ("poll", "push"):
+    DEPOSIT_INGEST_MODE = "poll"
+TRON_EVENT_STREAM_URL = str(_cfg_value("TRON_EVENT_STREAM_URL", "http://127.0.0.1:8091/events") or "").strip()
+TRON_EVENT_STALE_SEC = _to_int(_cfg_value("TRON_EVENT_STALE_SEC", "60"), 60)
+# 推送来的事件同样要等确认，不能比轮询的 MIN_TX_AGE_SEC 更短
+TRON_EVENT_MIN_TX_AGE_SEC = max(
+    MIN_TX_AGE_SEC,
+    _to_int(_cfg_value("TRON_EVENT_MIN_TX_AGE_SEC", str(MIN_TX_AGE_SEC)), MIN_TX_AGE_SEC),
+)
+TRON_EVENT_DEBOUNCE_SEC = _to_float(_cfg_value("TRON_EVENT_DEBOUNCE_SEC", "0.5"), 0.5)
+BALANCE_SNAPSHOT_INTERVAL_SEC = _to_int(_cfg_value("BALANCE_SNAPSHOT_INTERVAL_SEC", "600"), 600)
+BALANCE_SNAPSHOT_TTL_SEC = _to_int(_cfg_value("BALANCE_SNAPSHOT_TTL_SEC", "900"), 900)
+BALANCE_SNAPSHOT_RETENTION_DAYS = _to_int(_cfg_value("BALANCE_SNAPSHOT_RETENTION_DAYS", "30"), 30)
+OUTBOX_POLL_SEC = _to_float(_cfg_value("OUTBOX_POLL_SEC", "2"), 2.0)
+OUTBOX_BATCH_SIZE = _to_int(_cfg_value("OUTBOX_BATCH_SIZE", "50"), 50)
+OUTBOX_GLOBAL_RATE = _to_float(_cfg_value("OUTBOX_GLOBAL_RATE", "25"), 25.0)
+OUTBOX_PER_CHAT_INTERVAL_SEC = _to_float(_cfg_value("OUTBOX_PER_CHAT_INTERVAL_SEC", "1"), 1.0)
+OUTBOX_MAX_ATTEMPTS = _to_int(_cfg_value("OUTBOX_MAX_ATTEMPTS", "8"), 8)
 
 USERBOT_ENABLE = _to_bool(_cfg_value("USERBOT_ENABLE", "0"), False)
 USERBOT_API_ID = _to_int(_cfg_value("USERBOT_API_ID", "0"), 0)
@@ -323,6 +373,14 @@ ADMIN_WEB_RO_PASS = str(_cfg_value("ADMIN_WEB_RO_PASS", "") or "").strip()
 ADMIN_WEB_ALLOW_IPS = str(_cfg_value("ADMIN_WEB_ALLOW_IPS", "") or "").strip()
 ADMIN_WEB_TRUST_PROXY = _to_bool(_cfg_value("ADMIN_WEB_TRUST_PROXY", "0"), False)
 ADMIN_WEB_ACTIONS_ENABLE = _to_bool(_cfg_value("ADMIN_WEB_ACTIONS_ENABLE", "1"), True)
+# 服务模式：threading=每连接一个线程（ThreadingHTTPServer）；asyncio=事件循环 + 固定线程池，支持 keep-alive 与背压
+ADMIN_WEB_SERVER_MODE = str(_cfg_value("ADMIN_WEB_SERVER_MODE", "threading") or "threading").strip().lower()
+# asyncio 模式：处理线程数（0=与 admin_web 连接池大小相同）、线程池满后最多排队请求数（超出直接 503）、keep-alive 空闲秒数、请求体上限
+ADMIN_WEB_WORKERS = _to_int(_cfg_value("ADMIN_WEB_WORKERS", "0"), 0)
+ADMIN_WEB_MAX_PENDING = _to_int(_cfg_value("ADMIN_WEB_MAX_PENDING", "256"), 256)
+ADMIN_WEB_KEEPALIVE_SEC = _to_int(_cfg_value("ADMIN_WEB_KEEPALIVE_SEC", "15"), 15)
+ADMIN_WEB_MAX_BODY_MB = _to_int(_cfg_value("ADMIN_WEB_MAX_BODY_MB", "64"), 64)
+ADMIN_WEB_MAX_UPLOAD_MB = _to_int(_cfg_value("ADMIN_WEB_MAX_UPLOAD_MB", "0"), 0)
 
 # Mini App URL (Public HTTPS URL pointing to /webapp/)
 # Example: https://your-domain.com/webapp/
@@ -330,6 +388,16 @@ WEBAPP_URL = str(_cfg_value("WEBAPP_URL", "") or "").strip()
 
 LOCAL_UPLOADER_TOKEN = str(_cfg_value("LOCAL_UPLOADER_TOKEN", "") or "").strip()
 
+# 视频观看记录：admin_web 内存缓冲每 VIDEO_VIEW_FLUSH_SEC 秒批量落库（0=逐条直接写库），缓冲上限 VIDEO_VIEW_BUFFER_MAX 条
+VIDEO_VIEW_FLUSH_SEC = _to_int(_cfg_value("VIDEO_VIEW_FLUSH_SEC", "5"), 5)
+VIDEO_VIEW_BUFFER_MAX = _to_int(_cfg_value("VIDEO_VIEW_BUFFER_MAX", "20000"), 20000)
+# 观看明细保留天数 / 小时汇总保留天数（日汇总长期保留）
+VIDEO_VIEW_RETENTION_DAYS = _to_int(_cfg_value("VIDEO_VIEW_RETENTION_DAYS", "90"), 90)
+VIDEO_VIEW_HOURLY_RETENTION_DAYS = _to_int(_cfg_value("VIDEO_VIEW_HOURLY_RETENTION_DAYS", "14"), 14)
+# 最近 VIDEO_HOT_WINDOW_DAYS 天播放量前 VIDEO_HOT_TOP_N 的视频自动标为热门（0=不自动维护 is_hot）
+VIDEO_HOT_TOP_N = _to_int(_cfg_value("VIDEO_HOT_TOP_N", "20"), 20)
+VIDEO_HOT_WINDOW_DAYS = _to_int(_cfg_value("VIDEO_HOT_WINDOW_DAYS", "7"), 7)
+
 # 广播（admin_web）
 BROADCAST_SLEEP_SEC = _to_float(_cfg_value("BROADCAST_SLEEP_SEC", "0.15"), 0.15)
 BROADCAST_ABORT_MIN_SENT = _to_int(_cfg_value("BROADCAST_ABORT_MIN_SENT", "50"), 50)
@@ -342,6 +410,11 @@ INVITE_REWARD = {
     "yearly":   30,  # 年卡 → 奖励 30 天
 }
 
+# 冷数据归档：orders / usdt_txs / admin_audit / broadcast_logs 早于 ARCHIVE_AFTER_DAYS 天的行按月搬到归档表（0=关闭，最少 30 天）
+ARCHIVE_AFTER_DAYS = _to_int(_cfg_value("ARCHIVE_AFTER_DAYS", "180"), 180)
+ARCHIVE_BATCH_ROWS = _to_int(_cfg_value("ARCHIVE_BATCH_ROWS", "2000"), 2000)
+ARCHIVE_MAX_ROWS_PER_RUN = _to_int(_cfg_value("ARCHIVE_MAX_ROWS_PER_RUN", "200000"), 200000)
+
 # 日志
 LOG_FILE = _abs_path(str(_cfg_value("LOG_FILE", "logs/bot.log") or "logs/bot.log"))
 RUNTIME_LOG_FILE = _abs_path(str(_cfg_value("RUNTIME_LOG_FILE", "logs/runtime.log") or "logs/runtime.log"))
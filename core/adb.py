@@ -0,0 +1,114 @@
+# core/adb.py
+# 异步 DB 访问：core.models 里的同步函数放到专用线程池执行，handler / 定时任务 await 结果。
+# MySQL 变慢时只占住 DB 线程，PTB 事件循环照常处理其它更新；线程数不超过连接池大小，避免线程空等连接。
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DB_EXECUTOR_WORKERS, DB_SLOW_CALL_MS
+from core.db import pool_size
+import logging
+logger = logging.getLogger(__name__)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    "calls": 0,
+    "errors": 0,
+    "slow": 0,
+    "inflight": 0,
+    "max_inflight": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+    "run_ms_total": 0.0,
+    "run_ms_max": 0.0,
+}
+
+
+def _workers() -> int:
+    # 线程数不超过连接池大小：多出来的线程只会在连接池上排队
+    return max(1, min(int(DB_EXECUTOR_WORKERS), pool_size()))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is not None:
+        return _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="db")
+        return _executor
+
+
+def _call(fn, submitted: float, args: tuple, kwargs: dict):
+    started = time.perf_counter()
+    wait_ms = (started - submitted) * 1000.0
+    ok = False
+    try:
+        out = fn(*args, **kwargs)
+        ok = True
+        return out
+    finally:
+        run_ms = (time.perf_counter() - started) * 1000.0
+        with _stats_lock:
+            _stats["calls"] += 1
+            _stats["inflight"] -= 1
+            if not ok:
+                _stats["errors"] += 1
+            _stats["wait_ms_total"] += wait_ms
+            _stats["wait_ms_max"] = max(_stats["wait_ms_max"], wait_ms)
+            _stats["run_ms_total"] += run_ms
+            _stats["run_ms_max"] = max(_stats["run_ms_max"], run_ms)
+            slow = (wait_ms + run_ms) >= float(DB_SLOW_CALL_MS) > 0
+            if slow:
+                _stats["slow"] += 1
+        if slow:
+            name = getattr(fn, "__name__", None) or repr(fn)
+            logger.warning(f"[adb] 慢调用 {name} wait={wait_ms:.0f}ms run={run_ms:.0f}ms")
+
+
+async def run_db(fn, *args, **kwargs):
+    """
+    在 DB 线程池里执行同步函数 fn(*args, **kwargs) 并返回结果；异常原样抛出
+    """
+    with _stats_lock:
+        _stats["inflight"] += 1
+        _stats["max_inflight"] = max(_stats["max_inflight"], _stats["inflight"])
+    loop = asyncio.get_running_loop()
+    try:
+        fut = loop.run_in_executor(_get_executor(), functools.partial(_call, fn, time.perf_counter(), args, kwargs))
+    except RuntimeError:
+        # 线程池已关闭（进程退出中）
+        with _stats_lock:
+            _stats["inflight"] -= 1
+        raise
+    return await fut
+
+
+def stats() -> dict:
+    with _stats_lock:
+        s = dict(_stats)
+    n = max(1, int(s["calls"]))
+    return {
+        "workers": _workers(),
+        "calls": int(s["calls"]),
+        "errors": int(s["errors"]),
+        "slow": int(s["slow"]),
+        "inflight": int(s["inflight"]),
+        "max_inflight": int(s["max_inflight"]),
+        "wait_ms_avg": round(s["wait_ms_total"] / n, 1),
+        "wait_ms_max": round(s["wait_ms_max"], 1),
+        "run_ms_avg": round(s["run_ms_total"] / n, 1),
+        "run_ms_max": round(s["run_ms_max"], 1),
+    }
+
+
+def shutdown(wait: bool = True):
+    global _executor
+    with _executor_lock:
+        ex, _executor = _executor, None
+    if ex is not None:
+        ex.shutdown(wait=wait, cancel_futures=True)
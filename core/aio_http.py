@@ -0,0 +1,301 @@
+# core/aio_http.py
+# asyncio 版 HTTP/1.1 服务：事件循环负责收发与 keep-alive，业务仍由原 BaseHTTPRequestHandler 子类处理，
+# 放到固定大小的线程池执行（线程数与 DB 连接池对齐），排队超过上限直接 503，不再每连接一个线程。
+# 请求体按块读入（超过 1MB 落临时文件），静态文件由事件循环用 sendfile 发送，不整文件读进内存。
+import asyncio
+import http.client
+import io
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+
+import logging
+logger = logging.getLogger(__name__)
+
+_HEADER_LIMIT = 64 * 1024
+_HEADER_TIMEOUT_SEC = 10.0
+_BODY_TIMEOUT_SEC = 60.0
+_BODY_SPOOL_BYTES = 1024 * 1024
+_MAX_REQUESTS_PER_CONN = 1000
+
+
+def _status_line(code: int) -> bytes:
+    try:
+        phrase = HTTPStatus(code).phrase
+    except ValueError:
+        phrase = ""
+    return f"HTTP/1.1 {code} {phrase}\r\n".encode("latin-1")
+
+
+class AsyncHTTPServer:
+    def __init__(
+        self,
+        handler_cls,
+        host: str,
+        port: int,
+        workers: int,
+        max_pending: int,
+        keepalive_sec: float,
+        max_body_bytes: int,
+        static_resolver=None,
+        body_limits: dict | None = None,
+    ):
+        """
+        static_resolver(path) -> (绝对路径, content-type) 或 None；返回 None 的 GET/HEAD 交给 handler_cls 处理。
+        body_limits: {路径: 字节数} 按路径覆盖 max_body_bytes（<= 0 不限），给上传接口用；请求体超过内存阈值即落临时文件
+        """
+        self.handler_cls = handler_cls
+        self.host = host
+        self.port = int(port)
+        # 与 socketserver 保持一致，Handler 在缺少 Host 头时用它拼外部地址
+        self.server_address = (host, self.port)
+        self.workers = max(1, int(workers))
+        self.max_pending = max(0, int(max_pending))
+        self.keepalive_sec = max(1.0, float(keepalive_sec))
+        self.max_body_bytes = max(1024, int(max_body_bytes))
+        self.body_limits = {str(k): int(v) for k, v in (body_limits or {}).items()}
+        self.static_resolver = static_resolver
+        self.server_version = str(getattr(handler_cls, "server_version", "") or "aio_http")
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="web")
+        self._lock = threading.Lock()
+        self._stats = {
+            "connections": 0,
+            "open_connections": 0,
+            "requests": 0,
+            "static": 0,
+            "rejected": 0,
+            "errors": 0,
+            "inflight": 0,
+            "max_inflight": 0,
+            "handler_ms_total": 0.0,
+            "handler_ms_max": 0.0,
+        }
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self._client, self.host, self.port, limit=_HEADER_LIMIT, backlog=1024)
+        logger.info(f"[aio_http] listening on {self.host}:{self.port} workers={self.workers} max_pending={self.max_pending}")
+        async with server:
+            await server.serve_forever()
+
+    def _bump(self, key: str, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername") or ("", 0)
+        self._bump("connections")
+        self._bump("open_connections")
+        served = 0
+        try:
+            while served < _MAX_REQUESTS_PER_CONN:
+                timeout = self.keepalive_sec if served else _HEADER_TIMEOUT_SEC
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=timeout)
+                except asyncio.LimitOverrunError:
+                    await self._write_simple(writer, 431, b"request header too large", False)
+                    return
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                served += 1
+                keep_alive = await self._one_request(reader, writer, head, (peer[0], peer[1]) if len(peer) >= 2 else peer)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            return
+        except Exception:
+            self._bump("errors")
+            logger.exception("[aio_http] connection error")
+        finally:
+            self._bump("open_connections", -1)
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _one_request(self, reader, writer, head: bytes, peer) -> bool:
+        lines = head.split(b"\r\n", 1)
+        try:
+            method, target, version = lines[0].decode("latin-1").split(" ", 2)
+        except ValueError:
+            await self._write_simple(writer, 400, b"bad request line", False)
+            return False
+        if not version.startswith("HTTP/1."):
+            await self._write_simple(writer, 505, b"http version not supported", False)
+            return False
+        headers = http.client.parse_headers(io.BytesIO(lines[1] if len(lines) > 1 else b""))
+        conn_hdr = (headers.get("Connection") or "").lower()
+        if version == "HTTP/1.0":
+            keep_alive = "keep-alive" in conn_hdr
+        else:
+            keep_alive = "close" not in conn_hdr
+
+        if "chunked" in (headers.get("Transfer-Encoding") or "").lower():
+            await self._write_simple(writer, 411, b"chunked request body not supported", False)
+            return False
+        try:
+            length = int(headers.get("Content-Length") or "0")
+        except ValueError:
+            await self._write_simple(writer, 400, b"bad content-length", False)
+            return False
+        path = target.split("?", 1)[0]
+        limit = self.body_limits.get(path, self.max_body_bytes)
+        if limit > 0 and length > limit:
+            await self._write_simple(writer, 413, b"request body too large", False)
+            return False
+        body = tempfile.SpooledTemporaryFile(max_size=_BODY_SPOOL_BYTES)
+        try:
+            remaining = length
+            while remaining > 0:
+                chunk = await asyncio.wait_for(reader.read(min(remaining, 65536)), timeout=_BODY_TIMEOUT_SEC)
+                if not chunk:
+                    return False
+                body.write(chunk)
+                remaining -= len(chunk)
+            body.seek(0)
+
+            if method in ("GET", "HEAD") and self.static_resolver is not None:
+                hit = self.static_resolver(path)
+                if hit:
+                    self._bump("static")
+                    await self._send_file(writer, method, hit[0], hit[1], keep_alive)
+                    return keep_alive
+
+            with self._lock:
+                busy = self._stats["inflight"] >= self.workers + self.max_pending
+                if not busy:
+                    self._stats["inflight"] += 1
+                    self._stats["max_inflight"] = max(self._stats["max_inflight"], self._stats["inflight"])
+                    self._stats["requests"] += 1
+                else:
+                    self._stats["rejected"] += 1
+            if busy:
+                # 背压：线程池和排队都满了，立即拒绝，不让排队时间拖高所有请求的延迟
+                await self._write_simple(writer, 503, b"server busy", keep_alive, extra=b"Retry-After: 1\r\n")
+                return keep_alive
+            started = time.perf_counter()
+            try:
+                raw, close = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._run_handler, method, target, version, headers, body, peer, keep_alive
+                )
+            finally:
+                ms = (time.perf_counter() - started) * 1000.0
+                with self._lock:
+                    self._stats["inflight"] -= 1
+                    self._stats["handler_ms_total"] += ms
+                    self._stats["handler_ms_max"] = max(self._stats["handler_ms_max"], ms)
+        finally:
+            body.close()
+        if not raw:
+            return False
+        keep_alive = keep_alive and not close
+        writer.write(self._finalize(raw, method, keep_alive))
+        await writer.drain()
+        return keep_alive
+
+    def _run_handler(self, method, target, version, headers, body, peer, keep_alive) -> tuple[bytes, bool]:
+        """
+        在线程池里执行原 Handler 的 do_XXX：不经过 socketserver，rfile / wfile 换成内存缓冲
+        """
+        h = self.handler_cls.__new__(self.handler_cls)
+        h.server = self
+        h.request = None
+        h.client_address = peer
+        h.command = method
+        h.path = target
+        h.request_version = version
+        h.requestline = f"{method} {target} {version}"
+        h.protocol_version = "HTTP/1.1"
+        h.headers = headers
+        h.rfile = body
+        h.wfile = io.BytesIO()
+        h.close_connection = not keep_alive
+        fn = getattr(h, "do_" + method, None)
+        try:
+            if fn is None:
+                h.send_error(HTTPStatus.NOT_IMPLEMENTED, f"Unsupported method ({method!r})")
+            else:
+                fn()
+        except Exception:
+            self._bump("errors")
+            logger.exception(f"[aio_http] handler error {method} {target.split('?', 1)[0]}")
+            if not h.wfile.getvalue():
+                return _status_line(500) + b"Content-Type: text/plain; charset=utf-8\r\nContent-Length: 14\r\n\r\ninternal error", True
+            return h.wfile.getvalue(), True
+        return h.wfile.getvalue(), bool(h.close_connection)
+
+    def _finalize(self, raw: bytes, method: str, keep_alive: bool) -> bytes:
+        """
+        补齐 keep-alive 需要的头：Handler 有的响应（如 401）不带 Content-Length，按缓冲的实际长度补上
+        """
+        sep = raw.find(b"\r\n\r\n")
+        if sep < 0:
+            return raw
+        head, body = raw[: sep + 2], raw[sep + 4 :]
+        lower = head.lower()
+        extra = b""
+        if b"\r\ncontent-length:" not in lower and method != "HEAD":
+            extra += f"Content-Length: {len(body)}\r\n".encode("latin-1")
+        if b"\r\nconnection:" not in lower:
+            extra += b"Connection: keep-alive\r\n" if keep_alive else b"Connection: close\r\n"
+        return head + extra + b"\r\n" + body
+
+    async def _write_simple(self, writer, code: int, body: bytes, keep_alive: bool, extra: bytes = b""):
+        head = (
+            _status_line(code)
+            + f"Server: {self.server_version}\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Length: {len(body)}\r\n".encode("latin-1")
+            + extra
+            + (b"Connection: keep-alive\r\n" if keep_alive else b"Connection: close\r\n")
+            + b"\r\n"
+        )
+        try:
+            writer.write(head + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _send_file(self, writer, method: str, full: str, ctype: str, keep_alive: bool):
+        try:
+            f = open(full, "rb")
+        except OSError:
+            await self._write_simple(writer, 404, b"Not Found", keep_alive)
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            head = (
+                _status_line(200)
+                + (
+                    f"Server: {self.server_version}\r\nDate: {formatdate(usegmt=True)}\r\n"
+                    f"Content-Type: {ctype}\r\nContent-Length: {size}\r\nCache-Control: no-store\r\n"
+                ).encode("latin-1")
+                + (b"Connection: keep-alive\r\n" if keep_alive else b"Connection: close\r\n")
+                + b"\r\n"
+            )
+            writer.write(head)
+            if method == "GET" and size > 0:
+                # 非 TLS 连接走 os.sendfile；不支持时 asyncio 自动退回到线程池分块读
+                await asyncio.get_running_loop().sendfile(writer.transport, f)
+            await writer.drain()
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+        n = max(1, int(s["requests"]))
+        return {
+            "mode": "asyncio",
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "connections": int(s["connections"]),
+            "open_connections": int(s["open_connections"]),
+            "requests": int(s["requests"]),
+            "static": int(s["static"]),
+            "rejected": int(s["rejected"]),
+            "errors": int(s["errors"]),
+            "inflight": int(s["inflight"]),
+            "max_inflight": int(s["max_inflight"]),
+            "handler_ms_avg": round(s["handler_ms_total"] / n, 1),
+            "handler_ms_max": round(s["handler_ms_max"], 1),
+        }
@@ -0,0 +1,80 @@
+# core/amount_slots.py
+# 单地址模式的收款金额分配：每个 (地址, 基础金额) 维护一份空闲尾数列表，
+# 分配时在 payment_amount_slots 表里占位（主键 addr+amount 保证跨进程不重复），订单成功或过期后释放。
+# 同一用户对同一 (地址, 基础金额) 重复下单时复用并续期已有槽位，不会每点一次支付就多占一个尾数。
+import random
+import threading
+import time
+from decimal import Decimal
+
+from core.models import get_reserved_amounts, release_amount_slot, renew_user_amount_slot, reserve_amount_slot
+
+_STEP = Decimal("0.0001")
+_QUANT = Decimal("0.000001")
+_REFRESH_SEC = 600
+
+_lock = threading.Lock()
+_free: dict[tuple[str, Decimal], tuple[float, list[int]]] = {}
+
+
+def _amount(base: Decimal, lo: Decimal, idx: int) -> Decimal:
+    return (base + lo + Decimal(idx) * _STEP).quantize(_QUANT)
+
+
+def _load(addr: str, base: Decimal, lo: Decimal, span: int) -> list[int]:
+    taken = get_reserved_amounts(addr, base + lo, base + lo + Decimal(span) * _STEP)
+    free = [i for i in range(span + 1) if _amount(base, lo, i) not in taken]
+    random.shuffle(free)
+    return free
+
+
+def allocate(addr: str, base: Decimal, lo: Decimal, hi: Decimal, telegram_id: int, ttl_hours: int) -> Decimal | None:
+    """
+    分配一个当前没有被未结订单占用的 base+尾数 金额并落库占位；该用户已占有同一 base 的槽位时续期复用；
+    尾数全部被占时返回 None
+    """
+    base = Decimal(str(base))
+    lo = Decimal(str(lo))
+    span = int(((Decimal(str(hi)) - lo) / _STEP).to_integral_value(rounding="ROUND_FLOOR"))
+    if span < 0:
+        return None
+    if telegram_id:
+        held = renew_user_amount_slot(addr, _amount(base, lo, 0), _amount(base, lo, span), int(telegram_id), ttl_hours)
+        if held is not None:
+            return held
+    key = (addr, base.quantize(_QUANT))
+    reloaded = False
+    while True:
+        with _lock:
+            ent = _free.get(key)
+            stale = ent is None or (time.time() - ent[0]) >= _REFRESH_SEC
+        if stale or (not ent[1] and not reloaded):
+            free = _load(addr, base, lo, span)
+            reloaded = True
+            with _lock:
+                _free[key] = (time.time(), free)
+                ent = _free[key]
+        with _lock:
+            idx = ent[1].pop() if ent[1] else None
+        if idx is None:
+            return None
+        amount = _amount(base, lo, idx)
+        if reserve_amount_slot(addr, amount, telegram_id, ttl_hours):
+            return amount
+
+
+def release(addr: str, amount: Decimal, base: Decimal | None = None, lo: Decimal | None = None):
+    """
+    下单失败时释放刚分配、还没挂到订单上的槽位；传入 base/lo 时把尾数放回本进程的空闲列表。
+    复用的槽位已挂在该用户之前的订单上，不会被释放
+    """
+    if not release_amount_slot(addr, amount, unattached_only=True):
+        return
+    if base is None or lo is None:
+        return
+    idx = int(((Decimal(str(amount)) - Decimal(str(base)) - Decimal(str(lo))) / _STEP).to_integral_value())
+    key = (addr, Decimal(str(base)).quantize(_QUANT))
+    with _lock:
+        ent = _free.get(key)
+        if ent is not None and idx >= 0 and idx not in ent[1]:
+            ent[1].append(idx)
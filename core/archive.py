@@ -0,0 +1,313 @@
+# core/archive.py
+# 冷数据归档：orders / usdt_txs / admin_audit / broadcast_logs 中早于 ARCHIVE_AFTER_DAYS 天的行
+# 按月搬到 {表名}_archive_{YYYYMM}（CREATE TABLE LIKE 原表，索引相同），搬迁时按天 + 状态累加到 archive_rollups。
+# 每批在一个事务里完成 复制 → 汇总 → 删除，中断不会丢行或重复计数。
+# 读取：read_recent 把热表和时间范围内的归档月表 UNION ALL 后统一排序，后台导出对归档透明。
+import threading
+import time
+from datetime import datetime, timedelta
+
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_ROWS, ARCHIVE_MAX_ROWS_PER_RUN
+from core.db import get_conn
+import logging
+logger = logging.getLogger(__name__)
+
+# 归档窗口下限：usdt_txs 以 tx_id 去重，必须远大于链上轮询可能回看的范围，避免已归档的交易被当成新交易再次入账
+_MIN_AFTER_DAYS = 30
+_LOCK_NAME = "usdt_membership.archive"
+
+# ts: 时间列；group: 汇总分组列；amount: 汇总金额列；keep: 满足条件的行始终留在热表；
+# before: 同一事务里搬迁前先执行的 SQL（{pk} / {marks} 替换为本批主键条件），用于把仍需在线读取的字段沉淀到别的表
+_SPECS = {
+    "orders": {
+        "ts": "created_at",
+        "group": "status",
+        "amount": "amount",
+        "keep": None,
+        # 后台用户列表的 member_since 只读 users，订单离开热表前先并入
+        "before": """
+            UPDATE users u
+            JOIN (SELECT telegram_id, MIN(created_at) AS t FROM orders WHERE {pk} IN ({marks}) AND status='success' GROUP BY telegram_id) x
+              ON x.telegram_id=u.telegram_id
+            SET u.member_since = LEAST(COALESCE(u.member_since, x.t), x.t)
+        """,
+    },
+    # 未匹配的入账后台还可能手工补单，不归档
+    "usdt_txs": {"ts": "created_at", "group": "status", "amount": "amount", "keep": "status IN ('seen','unmatched')"},
+    "admin_audit": {"ts": "created_at", "group": "action", "amount": None, "keep": None},
+    "broadcast_logs": {"ts": "created_at", "group": "status", "amount": None, "keep": None},
+}
+
+_months_lock = threading.Lock()
+_months_cache: dict = {"ts": 0.0, "data": {}}
+_MONTHS_TTL_SEC = 60.0
+
+
+def _month_key(ts: datetime) -> str:
+    return ts.strftime("%Y%m")
+
+
+def archive_table_name(table: str, month: str) -> str:
+    return f"{table}_archive_{month}"
+
+
+def _primary_key(cur, table: str) -> str | None:
+    cur.execute(
+        """
+        SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY'
+        """,
+        (table,),
+    )
+    rows = cur.fetchall() or []
+    return str(rows[0][0]) if len(rows) == 1 else None
+
+
+def _columns(cur, table: str) -> list[str]:
+    cur.execute(
+        """
+        SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY ORDINAL_POSITION
+        """,
+        (table,),
+    )
+    return [str(r[0]) for r in (cur.fetchall() or [])]
+
+
+def _registered_months() -> dict[str, list[str]]:
+    now = time.monotonic()
+    with _months_lock:
+        if now - _months_cache["ts"] < _MONTHS_TTL_SEC:
+            return _months_cache["data"]
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT table_name, month FROM archive_months ORDER BY month DESC")
+    data: dict[str, list[str]] = {}
+    for table, month in cur.fetchall() or []:
+        data.setdefault(str(table), []).append(str(month))
+    cur.close()
+    conn.close()
+    with _months_lock:
+        _months_cache["ts"] = now
+        _months_cache["data"] = data
+    return data
+
+
+def _forget_months():
+    with _months_lock:
+        _months_cache["ts"] = 0.0
+
+
+def months_between(table: str, since: datetime | None, until: datetime | None = None) -> list[str]:
+    """
+    返回与 [since, until] 有交集的已归档月份（新到旧）；since 为 None 表示不限
+    """
+    lo = _month_key(since) if since else ""
+    hi = _month_key(until) if until else "999999"
+    return [m for m in _registered_months().get(table, []) if lo <= m <= hi]
+
+
+def read_recent(
+    table: str,
+    cols: str,
+    where: str,
+    params: tuple,
+    order_by: str,
+    limit: int,
+    since: datetime | None,
+    until: datetime | None = None,
+) -> list[dict]:
+    """
+    热表 + 归档月表合并查询：每个分表先各自 ORDER BY ... LIMIT，再整体排序取前 limit 行。
+    since / until 只用来挑选要读的归档月表，过滤条件仍由 where 负责
+    """
+    tables = [table] + [archive_table_name(table, m) for m in months_between(table, since, until)]
+    limit = int(limit)
+    conn = get_conn()
+    try:
+        cur = conn.cursor(dictionary=True)
+        if len(tables) == 1:
+            cur.execute(f"SELECT {cols} FROM {table} WHERE {where} ORDER BY {order_by} LIMIT %s", tuple(params) + (limit,))
+        else:
+            parts = [f"(SELECT {cols} FROM {t} WHERE {where} ORDER BY {order_by} LIMIT %s)" for t in tables]
+            all_params: tuple = ()
+            for _ in tables:
+                all_params += tuple(params) + (limit,)
+            cur.execute(" UNION ALL ".join(parts) + f" ORDER BY {order_by} LIMIT %s", all_params + (limit,))
+        rows = cur.fetchall() or []
+        cur.close()
+        return rows
+    finally:
+        conn.close()
+
+
+def _ensure_archive_table(cur, table: str, month: str) -> str:
+    name = archive_table_name(table, month)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {name} LIKE {table}")
+    return name
+
+
+def _archive_batch(conn, table: str, spec: dict, pk: str, cols: list[str], cutoff: datetime, batch: int) -> int:
+    ts = spec["ts"]
+    keep = f" AND NOT ({spec['keep']})" if spec.get("keep") else ""
+    cur = conn.cursor()
+    cur.execute(f"SELECT {pk}, {ts} FROM {table} WHERE {ts} < %s{keep} ORDER BY {ts} LIMIT %s", (cutoff, int(batch)))
+    by_month: dict[str, list] = {}
+    for key, t in cur.fetchall() or []:
+        by_month.setdefault(_month_key(t), []).append(key)
+    if not by_month:
+        cur.close()
+        return 0
+    # 建表是 DDL（隐式提交），放在事务外
+    targets = {}
+    for month in by_month:
+        name = _ensure_archive_table(cur, table, month)
+        have = set(_columns(cur, name))
+        targets[month] = (name, [c for c in cols if c in have])
+
+    group = spec["group"]
+    amount = f"COALESCE(SUM({spec['amount']}),0)" if spec.get("amount") else "0"
+    moved = 0
+    try:
+        conn.start_transaction()
+        for month, keys in sorted(by_month.items()):
+            name, common = targets[month]
+            col_sql = ", ".join(common)
+            marks = ",".join(["%s"] * len(keys))
+            if spec.get("before"):
+                cur.execute(spec["before"].format(pk=pk, marks=marks), tuple(keys))
+            cur.execute(
+                f"INSERT IGNORE INTO {name} ({col_sql}) SELECT {col_sql} FROM {table} WHERE {pk} IN ({marks})",
+                tuple(keys),
+            )
+            cur.execute(
+                f"""
+                SELECT DATE({ts}), COALESCE({group}, ''), COUNT(*), {amount}
+                FROM {table} WHERE {pk} IN ({marks})
+                GROUP BY DATE({ts}), COALESCE({group}, '')
+                """,
+                tuple(keys),
+            )
+            rollups = [(table, d, str(g)[:128], int(n), s) for d, g, n, s in (cur.fetchall() or [])]
+            if rollups:
+                cur.executemany(
+                    """
+                    INSERT INTO archive_rollups (table_name, day, group_key, row_count, amount_sum)
+                    VALUES (%s,%s,%s,%s,%s)
+                    ON DUPLICATE KEY UPDATE row_count=row_count+VALUES(row_count), amount_sum=amount_sum+VALUES(amount_sum)
+                    """,
+                    rollups,
+                )
+            cur.execute(f"DELETE FROM {table} WHERE {pk} IN ({marks})", tuple(keys))
+            n = int(cur.rowcount or 0)
+            cur.execute(
+                """
+                INSERT INTO archive_months (table_name, month, rows_moved) VALUES (%s,%s,%s)
+                ON DUPLICATE KEY UPDATE rows_moved=rows_moved+VALUES(rows_moved)
+                """,
+                (table, month, n),
+            )
+            moved += n
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        cur.close()
+    return moved
+
+
+def archive_table(table: str, after_days: int, batch: int, max_rows: int) -> int:
+    spec = _SPECS[table]
+    cutoff = datetime.utcnow() - timedelta(days=max(_MIN_AFTER_DAYS, int(after_days)))
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        pk = _primary_key(cur, table)
+        cols = _columns(cur, table)
+        cur.close()
+        if not pk or spec["ts"] not in cols:
+            # 表不存在或没有单列主键：跳过
+            return 0
+        moved = 0
+        while moved < int(max_rows):
+            n = _archive_batch(conn, table, spec, pk, cols, cutoff, min(int(batch), int(max_rows) - moved))
+            if n <= 0:
+                break
+            moved += n
+        return moved
+    finally:
+        conn.close()
+
+
+def run_archive() -> dict[str, int]:
+    """
+    归档全部表（定时任务入口）；多个进程同时触发时只有拿到锁的一个执行
+    """
+    if int(ARCHIVE_AFTER_DAYS) <= 0:
+        return {}
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT GET_LOCK(%s, 0)", (_LOCK_NAME,))
+    row = cur.fetchone()
+    if not row or int(row[0] or 0) != 1:
+        cur.close()
+        conn.close()
+        return {}
+    out: dict[str, int] = {}
+    try:
+        for table in _SPECS:
+            try:
+                n = archive_table(table, int(ARCHIVE_AFTER_DAYS), int(ARCHIVE_BATCH_ROWS), int(ARCHIVE_MAX_ROWS_PER_RUN))
+            except Exception as e:
+                logger.warning(f"[archive] 归档 {table} 失败: {e}")
+                continue
+            if n:
+                out[table] = n
+        return out
+    finally:
+        _forget_months()
+        try:
+            cur.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_NAME,))
+            cur.fetchone()
+        except Exception:
+            pass
+        cur.close()
+        conn.close()
+
+
+def rollup_summary(table: str, since_day, until_day) -> list[dict]:
+    """
+    已归档部分的按天汇总（热表里的行不在其中）
+    """
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(
+        """
+        SELECT day, group_key, row_count, amount_sum FROM archive_rollups
+        WHERE table_name=%s AND day BETWEEN %s AND %s
+        ORDER BY day DESC, group_key
+        """,
+        (table, since_day, until_day),
+    )
+    rows = cur.fetchall() or []
+    cur.close()
+    conn.close()
+    return rows
+
+
+def stats() -> dict:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT table_name, COUNT(*), COALESCE(SUM(rows_moved),0), MIN(month), MAX(month) FROM archive_months GROUP BY table_name")
+    out = {
+        str(t): {"months": int(m), "rows": int(n), "oldest": lo, "newest": hi}
+        for t, m, n, lo, hi in (cur.fetchall() or [])
+    }
+    cur.close()
+    conn.close()
+    return out
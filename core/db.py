@@ -1,43 +1,257 @@
 # core/db.py
+# 进程内 MySQL 连接池：按进程角色（bot / admin_web / 脚本）配置大小；借出时只对空闲超过
+# DB_POOL_PING_IDLE_SEC 的连接做 ping；池满时排队等待并记录等待指标；坏连接逐个重建，不整体丢弃连接池。
+import threading
+import time
+from collections import deque
+
 import mysql.connector
-from mysql.connector import pooling
-from mysql.connector.errors import OperationalError, InterfaceError, DatabaseError
-from config import DB_HOST, DB_PORT, DB_USER, DB_PASS, DB_NAME
+from mysql.connector.errors import OperationalError, InterfaceError, DatabaseError, PoolError
+from config import (
+    DB_HOST,
+    DB_PORT,
+    DB_USER,
+    DB_PASS,
+    DB_NAME,
+    DB_POOL_SIZE,
+    DB_POOL_SIZE_BOT,
+    DB_POOL_SIZE_ADMIN_WEB,
+    DB_POOL_PING_IDLE_SEC,
+    DB_POOL_WAIT_TIMEOUT_SEC,
+)
+
+_ROLE_SIZES = {"bot": DB_POOL_SIZE_BOT, "admin_web": DB_POOL_SIZE_ADMIN_WEB}
+
+
+class _ManagedPool:
+    def __init__(self, size: int, ping_idle_sec: float, wait_timeout_sec: float):
+        self.size = max(1, int(size))
+        self.ping_idle_sec = max(0.0, float(ping_idle_sec))
+        self.wait_timeout_sec = max(0.1, float(wait_timeout_sec))
+        self._cond = threading.Condition()
+        self._idle: deque = deque()
+        self._created = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "timeouts": 0,
+            "pings": 0,
+            "reconnects": 0,
+            "discarded": 0,
+            "connect_errors": 0,
+        }
+
+    def _connect(self):
+        return mysql.connector.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            user=DB_USER,
+            password=DB_PASS,
+            database=DB_NAME,
+            autocommit=True,
+            connection_timeout=10,
+        )
+
+    def _drop_slot(self):
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def acquire(self):
+        started = time.perf_counter()
+        deadline = started + self.wait_timeout_sec
+        waited = False
+        raw = None
+        last_used = 0.0
+        with self._cond:
+            while True:
+                if self._idle:
+                    # 后进先出：热连接优先复用，长期闲置的连接沉在队尾
+                    raw, last_used = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolError(f"MySQL pool exhausted (size={self.size}, waited {self.wait_timeout_sec:.1f}s)")
+                waited = True
+                self._cond.wait(remaining)
+            wait_ms = (time.perf_counter() - started) * 1000.0
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["wait_ms_total"] += wait_ms
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+
+        if raw is None:
+            try:
+                return self._connect()
+            except Exception:
+                with self._cond:
+                    self._stats["connect_errors"] += 1
+                self._drop_slot()
+                raise
+        if (time.monotonic() - last_used) < self.ping_idle_sec:
+            return raw
+        with self._cond:
+            self._stats["pings"] += 1
+        try:
+            raw.ping(reconnect=False)
+            return raw
+        except Exception:
+            pass
+        # 只重建这一条连接，其它连接不受影响
+        try:
+            raw.close()
+        except Exception:
+            pass
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._stats["connect_errors"] += 1
+            self._drop_slot()
+            raise
+        with self._cond:
+            self._stats["reconnects"] += 1
+        return raw
+
+    def release(self, raw):
+        ok = True
+        try:
+            if raw.unread_result:
+                raw.consume_results()
+            if raw.in_transaction:
+                raw.rollback()
+            raw.reset_session()
+        except Exception:
+            ok = False
+        if not ok:
+            try:
+                raw.close()
+            except Exception:
+                pass
+            with self._cond:
+                self._stats["discarded"] += 1
+            self._drop_slot()
+            return
+        with self._cond:
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["discarded"] += 1
+        self._drop_slot()
+
+    def stats(self) -> dict:
+        with self._cond:
+            s = dict(self._stats)
+            idle = len(self._idle)
+            created = self._created
+        n = max(1, int(s["checkouts"]))
+        return {
+            "size": self.size,
+            "open": created,
+            "idle": idle,
+            "in_use": created - idle,
+            "checkouts": int(s["checkouts"]),
+            "waits": int(s["waits"]),
+            "timeouts": int(s["timeouts"]),
+            "wait_ms_avg": round(s["wait_ms_total"] / n, 2),
+            "wait_ms_max": round(s["wait_ms_max"], 1),
+            "pings": int(s["pings"]),
+            "reconnects": int(s["reconnects"]),
+            "discarded": int(s["discarded"]),
+            "connect_errors": int(s["connect_errors"]),
+        }
 
-_pool: pooling.MySQLConnectionPool | None = None
 
+class PooledConnection:
+    """
+    借出的连接：用法与 mysql.connector 连接相同，close() 归还连接池
+    """
 
-def _get_pool() -> pooling.MySQLConnectionPool:
+    def __init__(self, pool: _ManagedPool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw)
+
+    def discard(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.discard(raw)
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise InterfaceError("connection already returned to pool")
+        return getattr(raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+_pool: _ManagedPool | None = None
+_pool_lock = threading.Lock()
+_role = "default"
+
+
+def set_role(role: str):
+    """
+    进程启动时声明角色（bot / admin_web），决定连接池大小；须在第一次 get_conn 之前调用
+    """
+    global _role
+    _role = (role or "default").strip() or "default"
+
+
+def pool_size() -> int:
+    size = int(_ROLE_SIZES.get(_role) or 0)
+    return size if size > 0 else max(1, int(DB_POOL_SIZE))
+
+
+def _get_pool() -> _ManagedPool:
     global _pool
     if _pool is not None:
         return _pool
-    _pool = pooling.MySQLConnectionPool(
-        pool_name="main_pool",
-        pool_size=10,
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASS,
-        database=DB_NAME,
-        autocommit=True,
-        pool_reset_session=True,
-        connection_timeout=10,
-    )
-    return _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _ManagedPool(pool_size(), DB_POOL_PING_IDLE_SEC, DB_POOL_WAIT_TIMEOUT_SEC)
+        return _pool
+
+
+def pool_stats() -> dict:
+    s = _get_pool().stats()
+    s["role"] = _role
+    return s
+
 
 def get_conn():
-    global _pool
     last_err: Exception | None = None
     for _ in range(3):
+        pool = _get_pool()
         try:
-            conn = _get_pool().get_connection()
-            try:
-                conn.ping(reconnect=True, attempts=3, delay=1)
-            except Exception:
-                conn.ping(reconnect=True, attempts=3, delay=1)
-            return conn
+            return PooledConnection(pool, pool.acquire())
+        except PoolError:
+            raise
         except (OperationalError, InterfaceError, DatabaseError) as e:
             last_err = e
-            _pool = None
+            time.sleep(0.2)
             continue
     raise last_err or OperationalError("MySQL Connection not available.")
@@ -0,0 +1,85 @@
+# core/deposit_watch.py
+# 热地址索引：记录有 pending 订单的收款地址，充值轮询每轮只查这些地址。
+# 下单时加入，订单成功时移除；定期从 orders 表全量重建以兼容多进程/重启。
+import threading
+from datetime import datetime, timedelta
+
+_lock = threading.Lock()
+_by_addr: dict[str, dict[int, datetime]] = {}
+_order_addr: dict[int, str] = {}
+_loaded_at: datetime | None = None
+
+
+def watch_order(addr: str, order_id: int, created_at: datetime | None = None):
+    addr = (addr or "").strip()
+    order_id = int(order_id or 0)
+    if not addr or order_id <= 0:
+        return
+    ts = created_at or datetime.utcnow()
+    with _lock:
+        _by_addr.setdefault(addr, {})[order_id] = ts
+        _order_addr[order_id] = addr
+
+
+def unwatch_order(order_id: int):
+    order_id = int(order_id or 0)
+    with _lock:
+        addr = _order_addr.pop(order_id, None)
+        if not addr:
+            return
+        orders = _by_addr.get(addr)
+        if orders is None:
+            return
+        orders.pop(order_id, None)
+        if not orders:
+            _by_addr.pop(addr, None)
+
+
+def rebuild(rows: list[dict]):
+    by_addr: dict[str, dict[int, datetime]] = {}
+    order_addr: dict[int, str] = {}
+    for r in rows:
+        addr = (r.get("addr") or "").strip()
+        oid = int(r.get("id") or 0)
+        if not addr or oid <= 0:
+            continue
+        by_addr.setdefault(addr, {})[oid] = r.get("created_at") or datetime.utcnow()
+        order_addr[oid] = addr
+    global _loaded_at
+    with _lock:
+        _by_addr.clear()
+        _by_addr.update(by_addr)
+        _order_addr.clear()
+        _order_addr.update(order_addr)
+        _loaded_at = datetime.utcnow()
+
+
+def loaded_at() -> datetime | None:
+    return _loaded_at
+
+
+def is_hot(addr: str) -> bool:
+    with _lock:
+        return (addr or "").strip() in _by_addr
+
+
+def hot_addresses(lookback_hours: int) -> list[str]:
+    cutoff = datetime.utcnow() - timedelta(hours=int(lookback_hours))
+    with _lock:
+        for addr in list(_by_addr.keys()):
+            orders = _by_addr[addr]
+            for oid in [k for k, ts in orders.items() if ts < cutoff]:
+                orders.pop(oid, None)
+                _order_addr.pop(oid, None)
+            if not orders:
+                _by_addr.pop(addr, None)
+        return list(_by_addr.keys())
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            "addresses": len(_by_addr),
+            "orders": len(_order_addr),
+            "loaded_at": _loaded_at,
+        }
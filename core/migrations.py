@@ -0,0 +1,685 @@
+# core/migrations.py
+# 版本化表结构迁移：schema_version 记录已应用的版本，进程启动时只查一次 MAX(version)，
+# 已是最新就直接返回；有待执行的迁移时用 GET_LOCK 串行化多个进程，按版本号顺序执行并记录。
+# 迁移函数须可重复执行（DDL 会隐式提交，中途失败后下次启动会重跑整个版本），
+# 加索引/加列走 ALGORITHM=INPLACE, LOCK=NONE，大表（usdt_txs、video_views 等）建索引期间不阻塞读写。
+import time
+
+from mysql.connector.errors import ProgrammingError
+
+from core.db import get_conn
+import logging
+logger = logging.getLogger(__name__)
+
+_LOCK_NAME = "usdt_membership.schema_migrate"
+_LOCK_TIMEOUT_SEC = 600
+
+MIGRATIONS: list[tuple[int, str, object]] = []
+
+
+def migration(version: int, name: str):
+    def deco(fn):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"migration {version} must be greater than {MIGRATIONS[-1][0]}")
+        MIGRATIONS.append((int(version), name, fn))
+        return fn
+
+    return deco
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def _index_exists(cur, table: str, index_name: str) -> bool:
+    cur.execute(
+        """
+        SELECT COUNT(1)
+        FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = %s
+          AND INDEX_NAME = %s
+        """,
+        (table, index_name),
+    )
+    row = cur.fetchone()
+    try:
+        return int(row[0] or 0) > 0
+    except Exception:
+        return False
+
+
+def _ensure_index(cur, table: str, index_name: str, columns_sql: str):
+    """
+    在线建索引：InnoDB 二级索引支持 INPLACE + LOCK=NONE，建索引期间表照常读写；
+    服务端不支持时直接报错，不会退化成锁表
+    """
+    if _index_exists(cur, table, index_name):
+        return
+    started = time.perf_counter()
+    cur.execute(f"ALTER TABLE {table} ADD INDEX {index_name} ({columns_sql}), ALGORITHM=INPLACE, LOCK=NONE")
+    logger.info(f"[migrate] 建索引 {table}.{index_name} 用时 {time.perf_counter() - started:.1f}s")
+
+
+def _column_exists(cur, table: str, column_name: str) -> bool:
+    cur.execute(
+        """
+        SELECT COUNT(1)
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = %s
+          AND COLUMN_NAME = %s
+        """,
+        (table, column_name),
+    )
+    row = cur.fetchone()
+    try:
+        return int(row[0] or 0) > 0
+    except Exception:
+        return False
+
+
+def _table_exists(cur, table: str) -> bool:
+    cur.execute(
+        "SELECT COUNT(1) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,),
+    )
+    row = cur.fetchone()
+    return bool(row and int(row[0] or 0) > 0)
+
+
+def _ensure_column(cur, table: str, column_name: str, column_sql: str):
+    if _column_exists(cur, table, column_name):
+        return
+    cur.execute(f"ALTER TABLE {table} ADD COLUMN {column_sql}, ALGORITHM=INPLACE, LOCK=NONE")
+
+
+@migration(1, "baseline")
+def _m001_baseline(cur):
+    """
+    引入迁移之前 init_tables 的全部建表/补列/补索引；老库上执行时只补缺的部分
+    """
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            telegram_id BIGINT PRIMARY KEY,
+            username VARCHAR(128),
+            language VARCHAR(16),
+            paid_until DATETIME NULL,
+            total_received DECIMAL(24,8) DEFAULT 0,
+            last_plan VARCHAR(32),
+            wallet_addr VARCHAR(128),
+            inviter_id BIGINT NULL,
+            invite_count INT DEFAULT 0,
+            invite_reward_days INT DEFAULT 0,
+            pending_coupon VARCHAR(64),
+            first_source VARCHAR(64),
+            last_source VARCHAR(64),
+            last_source_at DATETIME NULL,
+            is_blacklisted TINYINT DEFAULT 0,
+            is_whitelisted TINYINT DEFAULT 0,
+            note VARCHAR(256),
+            expired_handled_at DATETIME NULL,
+            remind_7d_at DATETIME NULL,
+            remind_3d_at DATETIME NULL,
+            remind_1d_at DATETIME NULL,
+            expired_recall_3d_at DATETIME NULL,
+            expired_recall_7d_at DATETIME NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS address_pool (
+            addr VARCHAR(128) PRIMARY KEY,
+            assigned_to BIGINT NULL,
+            assigned_at DATETIME NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "address_pool", "idx_address_pool_assigned_to", "assigned_to")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS orders (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            telegram_id BIGINT NOT NULL,
+            addr VARCHAR(128),
+            amount DECIMAL(24,8) NOT NULL,
+            base_amount DECIMAL(24,8) NULL,
+            discount_amount DECIMAL(24,8) NULL,
+            coupon_code VARCHAR(64) NULL,
+            coupon_used TINYINT DEFAULT 0,
+            plan_code VARCHAR(32) NOT NULL,
+            status VARCHAR(16) DEFAULT 'pending',
+            tx_id VARCHAR(128) NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "orders", "idx_orders_addr_status", "addr, status")
+    _ensure_index(cur, "orders", "idx_orders_telegram_created", "telegram_id, created_at")
+    _ensure_index(cur, "orders", "idx_orders_status_created", "status, created_at")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS usdt_txs (
+            tx_id VARCHAR(128) PRIMARY KEY,
+            telegram_id BIGINT NULL,
+            addr VARCHAR(128) NULL,
+            from_addr VARCHAR(128) NULL,
+            amount DECIMAL(24,8) NOT NULL,
+            status VARCHAR(16) DEFAULT 'seen',
+            plan_code VARCHAR(32) NULL,
+            credited_amount DECIMAL(24,8) NULL,
+            processed_at DATETIME NULL,
+            block_time DATETIME NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "usdt_txs", "idx_usdt_txs_addr_created", "addr, created_at")
+    _ensure_index(cur, "usdt_txs", "idx_usdt_txs_status_created", "status, created_at")
+    _ensure_index(cur, "usdt_txs", "idx_usdt_txs_telegram_created", "telegram_id, created_at")
+    _ensure_column(cur, "usdt_txs", "claimed_by", "claimed_by VARCHAR(64) NULL")
+    _ensure_column(cur, "usdt_txs", "lease_until", "lease_until DATETIME NULL")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tron_cursors (
+            addr VARCHAR(128) PRIMARY KEY,
+            min_timestamp BIGINT DEFAULT 0,
+            last_block_ts BIGINT DEFAULT 0,
+            fingerprint VARCHAR(512) NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS payment_amount_slots (
+            addr VARCHAR(128) NOT NULL,
+            amount DECIMAL(24,8) NOT NULL,
+            telegram_id BIGINT NULL,
+            order_id BIGINT NULL,
+            reserved_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            expires_at DATETIME NOT NULL,
+            PRIMARY KEY (addr, amount)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "payment_amount_slots", "idx_amount_slots_expires", "expires_at")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS usdt_balance_snapshots (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            addr VARCHAR(128) NOT NULL,
+            balance DECIMAL(24,6) NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "usdt_balance_snapshots", "idx_balance_snap_addr_id", "addr, id")
+    _ensure_index(cur, "usdt_balance_snapshots", "idx_balance_snap_created", "created_at")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbound_messages (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            kind VARCHAR(32) NOT NULL,
+            chat_id BIGINT NULL,
+            payload TEXT NULL,
+            status VARCHAR(16) DEFAULT 'pending',
+            attempts INT DEFAULT 0,
+            next_attempt_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            claim_token VARCHAR(64) NULL,
+            claimed_at DATETIME NULL,
+            last_error VARCHAR(256) NULL,
+            sent_at DATETIME NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "outbound_messages", "idx_outbound_status_next", "status, next_attempt_at")
+    _ensure_index(cur, "outbound_messages", "idx_outbound_claim", "claim_token")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS coupons (
+            code VARCHAR(64) PRIMARY KEY,
+            kind VARCHAR(16) NOT NULL,
+            value DECIMAL(24,8) NOT NULL,
+            plan_codes VARCHAR(256) NULL,
+            max_uses INT NULL,
+            used_count INT DEFAULT 0,
+            expires_at DATETIME NULL,
+            active TINYINT DEFAULT 1,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS access_codes (
+            code VARCHAR(64) PRIMARY KEY,
+            days INT NOT NULL,
+            plan_code VARCHAR(32) NULL,
+            max_uses INT DEFAULT 1,
+            used_count INT DEFAULT 0,
+            expires_at DATETIME NULL,
+            note VARCHAR(256) NULL,
+            created_by VARCHAR(64) NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_used_at DATETIME NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS admin_audit (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            actor VARCHAR(64) NOT NULL,
+            action VARCHAR(128) NOT NULL,
+            target_id BIGINT NULL,
+            payload TEXT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS support_mapping (
+            group_id BIGINT NOT NULL,
+            ticket_message_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            user_message_id BIGINT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (group_id, ticket_message_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS clip_dispatch (
+            paid_channel_id BIGINT NOT NULL,
+            paid_message_id BIGINT NOT NULL,
+            target_channel_id BIGINT NOT NULL,
+            actor VARCHAR(64) NULL,
+            status VARCHAR(16) DEFAULT 'sending',
+            claimed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            sent_at DATETIME NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (paid_channel_id, paid_message_id, target_channel_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS videos (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            channel_id BIGINT,
+            message_id BIGINT,
+            file_id VARCHAR(128),
+            caption TEXT,
+            view_count INT DEFAULT 0,
+            category_id INT DEFAULT 0,
+            free_channel_id BIGINT NULL,
+            free_message_id BIGINT NULL,
+            is_hot TINYINT DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_column(cur, "videos", "category_id", "category_id INT DEFAULT 0")
+    _ensure_column(cur, "videos", "free_channel_id", "free_channel_id BIGINT NULL")
+    _ensure_column(cur, "videos", "free_message_id", "free_message_id BIGINT NULL")
+    _ensure_column(cur, "videos", "is_hot", "is_hot TINYINT DEFAULT 0")
+    _ensure_column(cur, "videos", "cover_url", "cover_url VARCHAR(512) NULL")
+    _ensure_column(cur, "videos", "tags", "tags VARCHAR(512) NULL")
+    _ensure_column(cur, "videos", "is_published", "is_published TINYINT DEFAULT 1")
+    _ensure_column(cur, "videos", "sort_order", "sort_order INT DEFAULT 0")
+    _ensure_column(cur, "videos", "published_at", "published_at DATETIME NULL")
+    _ensure_column(cur, "videos", "upload_status", "upload_status VARCHAR(16) DEFAULT 'done'")
+    _ensure_column(cur, "videos", "local_filename", "local_filename VARCHAR(256) NULL")
+    _ensure_column(cur, "videos", "error_message", "error_message VARCHAR(256) NULL")
+    _ensure_column(cur, "videos", "server_file_path", "server_file_path VARCHAR(512) NULL")
+    _ensure_column(cur, "videos", "server_file_size", "server_file_size BIGINT DEFAULT 0")
+    _ensure_column(cur, "videos", "video_url", "video_url VARCHAR(1024) NULL")
+    _ensure_column(cur, "videos", "preview_url", "preview_url VARCHAR(1024) NULL")
+    _ensure_index(cur, "videos", "idx_videos_channel_msg", "channel_id, message_id")
+    _ensure_index(cur, "videos", "idx_videos_created", "created_at")
+    _ensure_index(cur, "videos", "idx_videos_view_count", "view_count")
+    _ensure_index(cur, "videos", "idx_videos_category", "category_id")
+    _ensure_index(cur, "videos", "idx_videos_publish_sort", "is_published, sort_order, published_at")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS video_views (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            telegram_id BIGINT NOT NULL,
+            video_id BIGINT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "video_views", "idx_video_views_user_time", "telegram_id, created_at")
+    _ensure_index(cur, "video_views", "idx_video_views_video_time", "video_id, created_at")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS categories (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(64) NOT NULL,
+            is_visible TINYINT DEFAULT 1,
+            sort_order INT DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS banners (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            image_url VARCHAR(512) NOT NULL,
+            link_url VARCHAR(512),
+            is_active TINYINT DEFAULT 1,
+            sort_order INT DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS video_download_jobs (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            source_url VARCHAR(1024) NULL,
+            caption TEXT NULL,
+            filename VARCHAR(256) NULL,
+            file_size BIGINT DEFAULT 0,
+            progress INT DEFAULT 0,
+            status VARCHAR(16) DEFAULT 'pending',
+            started_at DATETIME NULL,
+            finished_at DATETIME NULL,
+            error_message VARCHAR(256) NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "video_download_jobs", "idx_vdj_status_created", "status, created_at")
+    _ensure_index(cur, "video_download_jobs", "idx_vdj_updated", "updated_at")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS poker_players (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            telegram_id BIGINT NOT NULL,
+            username VARCHAR(128),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "poker_players", "idx_poker_players_telegram", "telegram_id")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS poker_ledgers (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            player_id INT NOT NULL,
+            amount DECIMAL(24,8) NOT NULL,
+            note VARCHAR(256),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "poker_ledgers", "idx_poker_ledgers_player_time", "player_id, created_at")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS poker_games (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            code VARCHAR(64) NOT NULL,
+            status VARCHAR(16) DEFAULT 'waiting',
+            max_players INT DEFAULT 6,
+            dealer_seat INT DEFAULT 1,
+            small_blind INT DEFAULT 5,
+            big_blind INT DEFAULT 10,
+            street VARCHAR(16) DEFAULT 'waiting',
+            pot INT DEFAULT 0,
+            current_bet INT DEFAULT 0,
+            turn_seat INT DEFAULT 1,
+            turn_started_at DATETIME NULL,
+            turn_timeout_sec INT DEFAULT 60,
+            board_json TEXT,
+            deck_json TEXT,
+            hand_no INT DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "poker_games", "idx_poker_games_code_status", "code, status")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS poker_game_players (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            game_id BIGINT NOT NULL,
+            seat INT NOT NULL,
+            telegram_id BIGINT NOT NULL,
+            username VARCHAR(128),
+            stack INT DEFAULT 0,
+            in_hand TINYINT DEFAULT 1,
+            acted TINYINT DEFAULT 0,
+            bet_street INT DEFAULT 0,
+            hole_json TEXT,
+            joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_pgp_game_seat (game_id, seat),
+            UNIQUE KEY uq_pgp_game_user (game_id, telegram_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "poker_game_players", "idx_pgp_game", "game_id")
+    _ensure_index(cur, "poker_game_players", "idx_pgp_user", "telegram_id")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS poker_game_actions (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            game_id BIGINT NOT NULL,
+            hand_no INT NOT NULL,
+            street VARCHAR(16) NOT NULL,
+            seat INT NOT NULL,
+            telegram_id BIGINT NOT NULL,
+            action VARCHAR(16) NOT NULL,
+            amount INT DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "poker_game_actions", "idx_pga_game_hand", "game_id, hand_no, id")
+
+
+@migration(2, "users_notice_indexes")
+def _m002_users_notice_indexes(cur):
+    """
+    users 上到期处理 / 提醒 / 召回 / 统计 / 群发筛选用的覆盖索引（InnoDB 二级索引自带主键 telegram_id）：
+    - 标记列 IS NULL 打头、paid_until 在后：只扫还没处理过的用户，且按 paid_until 有序，无需 filesort
+    - 到期前提醒的 paid_until 范围很窄（最多 7 天），三个 remind_* 列放进同一个 paid_until 索引里过滤
+    """
+    _ensure_index(cur, "users", "idx_users_expired_handled", "expired_handled_at, paid_until, language, is_whitelisted")
+    _ensure_index(cur, "users", "idx_users_recall_3d", "expired_recall_3d_at, paid_until, language, is_whitelisted")
+    _ensure_index(cur, "users", "idx_users_recall_7d", "expired_recall_7d_at, paid_until, language, is_whitelisted")
+    _ensure_index(
+        cur,
+        "users",
+        "idx_users_paid_until",
+        "paid_until, remind_7d_at, remind_3d_at, remind_1d_at, is_blacklisted, language, is_whitelisted",
+    )
+    _ensure_index(cur, "users", "idx_users_last_source", "last_source")
+
+
+@migration(3, "video_view_rollups")
+def _m003_video_view_rollups(cur):
+    """
+    观看量按小时 / 按天汇总；由 flush_video_views 随明细一起累加，历史明细不回填
+    """
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS video_view_hourly (
+            video_id BIGINT NOT NULL,
+            hour_at DATETIME NOT NULL,
+            views INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (video_id, hour_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "video_view_hourly", "idx_vvh_hour", "hour_at")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS video_view_daily (
+            video_id BIGINT NOT NULL,
+            day DATE NOT NULL,
+            views INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (video_id, day)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    # 热门计算按日期范围聚合，覆盖索引免回表
+    _ensure_index(cur, "video_view_daily", "idx_vvd_day", "day, video_id, views")
+
+
+@migration(4, "archive")
+def _m004_archive(cur):
+    """
+    core.archive 的登记表和汇总表；被归档的表补 created_at 索引（按时间挑选待归档行、后台按时间倒序列表都要用）
+    """
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive_months (
+            table_name VARCHAR(64) NOT NULL,
+            month CHAR(6) NOT NULL,
+            rows_moved BIGINT NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, month)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive_rollups (
+            table_name VARCHAR(64) NOT NULL,
+            day DATE NOT NULL,
+            group_key VARCHAR(128) NOT NULL,
+            row_count BIGINT NOT NULL DEFAULT 0,
+            amount_sum DECIMAL(30,8) NOT NULL DEFAULT 0,
+            PRIMARY KEY (table_name, day, group_key)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+    )
+    _ensure_index(cur, "orders", "idx_orders_created", "created_at")
+    _ensure_index(cur, "usdt_txs", "idx_usdt_txs_created", "created_at")
+    _ensure_index(cur, "admin_audit", "idx_admin_audit_created", "created_at")
+    if _table_exists(cur, "broadcast_logs"):
+        _ensure_index(cur, "broadcast_logs", "idx_broadcast_logs_created", "created_at")
+
+
+@migration(5, "users_member_since")
+def _m005_users_member_since(cur):
+    """
+    users.member_since：最早一笔成功订单的创建时间。订单归档后后台用户列表不再回查订单表，按热表 + 已有归档月表回填
+    """
+    _ensure_column(cur, "users", "member_since", "member_since DATETIME NULL")
+    tables = ["orders"]
+    if _table_exists(cur, "archive_months"):
+        cur.execute("SELECT month FROM archive_months WHERE table_name='orders' ORDER BY month")
+        tables += [f"orders_archive_{r[0]}" for r in (cur.fetchall() or [])]
+    for t in tables:
+        if not _table_exists(cur, t):
+            continue
+        cur.execute(
+            f"""
+            UPDATE users u
+            JOIN (SELECT telegram_id, MIN(created_at) AS t FROM {t} WHERE status='success' GROUP BY telegram_id) x
+              ON x.telegram_id=u.telegram_id
+            SET u.member_since = LEAST(COALESCE(u.member_since, x.t), x.t)
+            """
+        )
+
+
+def _current_version(cur) -> int | None:
+    try:
+        cur.execute("SELECT MAX(version) FROM schema_version")
+    except ProgrammingError as e:
+        if getattr(e, "errno", None) == 1146:
+            return None
+        raise
+    row = cur.fetchone()
+    return int(row[0]) if row and row[0] is not None else 0
+
+
+def migrate() -> int:
+    """
+    执行未应用的迁移，返回当前版本
+    """
+    latest = latest_version()
+    conn = get_conn()
+    cur = conn.cursor()
+    locked = False
+    try:
+        version = _current_version(cur)
+        if version is not None and version >= latest:
+            if version > latest:
+                logger.warning(f"[migrate] 数据库版本 {version} 比代码 {latest} 新，可能有更新的进程在运行")
+            return version
+        cur.execute("SELECT GET_LOCK(%s, %s)", (_LOCK_NAME, _LOCK_TIMEOUT_SEC))
+        row = cur.fetchone()
+        if not row or int(row[0] or 0) != 1:
+            raise RuntimeError("schema migration lock timeout")
+        locked = True
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                name VARCHAR(128) NOT NULL,
+                duration_ms INT DEFAULT 0,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        # 拿到锁后重新读：等锁期间别的进程可能已经迁移完
+        version = _current_version(cur) or 0
+        for ver, name, fn in MIGRATIONS:
+            if ver <= version:
+                continue
+            logger.info(f"[migrate] 执行迁移 {ver} {name}")
+            started = time.perf_counter()
+            fn(cur)
+            ms = int((time.perf_counter() - started) * 1000)
+            cur.execute("INSERT INTO schema_version (version, name, duration_ms) VALUES (%s,%s,%s)", (ver, name, ms))
+            logger.info(f"[migrate] 迁移 {ver} {name} 完成 用时 {ms}ms")
+            version = ver
+        return version
+    finally:
+        if locked:
+            try:
+                cur.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_NAME,))
+                cur.fetchone()
+            except Exception:
+                pass
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
@@ -1,419 +1,35 @@
 import json
+import random
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from decimal import Decimal
 
-from config import AMOUNT_EPS, MATCH_ORDER_LOOKBACK_HOURS, MATCH_ORDER_PREFER_RECENT, PLANS
+import mysql.connector
+
+from bot.payments import compute_new_paid_until
+from config import AMOUNT_EPS, INVITE_REWARD, MATCH_ORDER_LOOKBACK_HOURS, MATCH_ORDER_PREFER_RECENT, PLANS
+from core import archive, deposit_watch, user_cache
 from core.db import get_conn
+from core.rows import fetch_rows, row_type
 from core.poker import best_hand_rank, new_deck
 
 
-def _utc_now() -> datetime:
-    return datetime.utcnow()
-
-def _index_exists(cur, table: str, index_name: str) -> bool:
-    cur.execute(
-        """
-        SELECT COUNT(1)
-        FROM INFORMATION_SCHEMA.STATISTICS
-        WHERE TABLE_SCHEMA = DATABASE()
-          AND TABLE_NAME = %s
-          AND INDEX_NAME = %s
-        """,
-        (table, index_name),
-    )
-    row = cur.fetchone()
-    try:
-        return int(row[0] or 0) > 0
-    except Exception:
-        return False
-
+_RECENT_TX_IDS_MAX = 20000
+_recent_tx_ids: OrderedDict[str, None] = OrderedDict()
+_recent_tx_lock = threading.Lock()
 
-def _ensure_index(cur, table: str, index_name: str, columns_sql: str):
-    if _index_exists(cur, table, index_name):
-        return
-    cur.execute(f"CREATE INDEX {index_name} ON {table} ({columns_sql})")
-
-def _column_exists(cur, table: str, column_name: str) -> bool:
-    cur.execute(
-        """
-        SELECT COUNT(1)
-        FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_SCHEMA = DATABASE()
-          AND TABLE_NAME = %s
-          AND COLUMN_NAME = %s
-        """,
-        (table, column_name),
-    )
-    row = cur.fetchone()
-    try:
-        return int(row[0] or 0) > 0
-    except Exception:
-        return False
-
-
-def _ensure_column(cur, table: str, column_name: str, column_sql: str):
-    if _column_exists(cur, table, column_name):
-        return
-    cur.execute(f"ALTER TABLE {table} ADD COLUMN {column_sql}")
 
+def _utc_now() -> datetime:
+    return datetime.utcnow()
 
 def init_tables():
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            telegram_id BIGINT PRIMARY KEY,
-            username VARCHAR(128),
-            language VARCHAR(16),
-            paid_until DATETIME NULL,
-            total_received DECIMAL(24,8) DEFAULT 0,
-            last_plan VARCHAR(32),
-            wallet_addr VARCHAR(128),
-            inviter_id BIGINT NULL,
-            invite_count INT DEFAULT 0,
-            invite_reward_days INT DEFAULT 0,
-            pending_coupon VARCHAR(64),
-            first_source VARCHAR(64),
-            last_source VARCHAR(64),
-            last_source_at DATETIME NULL,
-            is_blacklisted TINYINT DEFAULT 0,
-            is_whitelisted TINYINT DEFAULT 0,
-            note VARCHAR(256),
-            expired_handled_at DATETIME NULL,
-            remind_7d_at DATETIME NULL,
-            remind_3d_at DATETIME NULL,
-            remind_1d_at DATETIME NULL,
-            expired_recall_3d_at DATETIME NULL,
-            expired_recall_7d_at DATETIME NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS address_pool (
-            addr VARCHAR(128) PRIMARY KEY,
-            assigned_to BIGINT NULL,
-            assigned_at DATETIME NULL
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_index(cur, "address_pool", "idx_address_pool_assigned_to", "assigned_to")
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS orders (
-            id BIGINT AUTO_INCREMENT PRIMARY KEY,
-            telegram_id BIGINT NOT NULL,
-            addr VARCHAR(128),
-            amount DECIMAL(24,8) NOT NULL,
-            base_amount DECIMAL(24,8) NULL,
-            discount_amount DECIMAL(24,8) NULL,
-            coupon_code VARCHAR(64) NULL,
-            coupon_used TINYINT DEFAULT 0,
-            plan_code VARCHAR(32) NOT NULL,
-            status VARCHAR(16) DEFAULT 'pending',
-            tx_id VARCHAR(128) NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_index(cur, "orders", "idx_orders_addr_status", "addr, status")
-    _ensure_index(cur, "orders", "idx_orders_telegram_created", "telegram_id, created_at")
-    _ensure_index(cur, "orders", "idx_orders_status_created", "status, created_at")
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS usdt_txs (
-            tx_id VARCHAR(128) PRIMARY KEY,
-            telegram_id BIGINT NULL,
-            addr VARCHAR(128) NULL,
-            from_addr VARCHAR(128) NULL,
-            amount DECIMAL(24,8) NOT NULL,
-            status VARCHAR(16) DEFAULT 'seen',
-            plan_code VARCHAR(32) NULL,
-            credited_amount DECIMAL(24,8) NULL,
-            processed_at DATETIME NULL,
-            block_time DATETIME NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_index(cur, "usdt_txs", "idx_usdt_txs_addr_created", "addr, created_at")
-    _ensure_index(cur, "usdt_txs", "idx_usdt_txs_status_created", "status, created_at")
-    _ensure_index(cur, "usdt_txs", "idx_usdt_txs_telegram_created", "telegram_id, created_at")
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS coupons (
-            code VARCHAR(64) PRIMARY KEY,
-            kind VARCHAR(16) NOT NULL,
-            value DECIMAL(24,8) NOT NULL,
-            plan_codes VARCHAR(256) NULL,
-            max_uses INT NULL,
-            used_count INT DEFAULT 0,
-            expires_at DATETIME NULL,
-            active TINYINT DEFAULT 1,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS access_codes (
-            code VARCHAR(64) PRIMARY KEY,
-            days INT NOT NULL,
-            plan_code VARCHAR(32) NULL,
-            max_uses INT DEFAULT 1,
-            used_count INT DEFAULT 0,
-            expires_at DATETIME NULL,
-            note VARCHAR(256) NULL,
-            created_by VARCHAR(64) NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            last_used_at DATETIME NULL
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS admin_audit (
-            id BIGINT AUTO_INCREMENT PRIMARY KEY,
-            actor VARCHAR(64) NOT NULL,
-            action VARCHAR(128) NOT NULL,
-            target_id BIGINT NULL,
-            payload TEXT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS support_mapping (
-            group_id BIGINT NOT NULL,
-            ticket_message_id BIGINT NOT NULL,
-            user_id BIGINT NOT NULL,
-            user_message_id BIGINT NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY (group_id, ticket_message_id)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS clip_dispatch (
-            paid_channel_id BIGINT NOT NULL,
-            paid_message_id BIGINT NOT NULL,
-            target_channel_id BIGINT NOT NULL,
-            actor VARCHAR(64) NULL,
-            status VARCHAR(16) DEFAULT 'sending',
-            claimed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            sent_at DATETIME NULL,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY (paid_channel_id, paid_message_id, target_channel_id)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS videos (
-            id BIGINT AUTO_INCREMENT PRIMARY KEY,
-            channel_id BIGINT,
-            message_id BIGINT,
-            file_id VARCHAR(128),
-            caption TEXT,
-            view_count INT DEFAULT 0,
-            category_id INT DEFAULT 0,
-            free_channel_id BIGINT NULL,
-            free_message_id BIGINT NULL,
-            is_hot TINYINT DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_column(cur, "videos", "category_id", "category_id INT DEFAULT 0")
-    _ensure_column(cur, "videos", "free_channel_id", "free_channel_id BIGINT NULL")
-    _ensure_column(cur, "videos", "free_message_id", "free_message_id BIGINT NULL")
-    _ensure_column(cur, "videos", "is_hot", "is_hot TINYINT DEFAULT 0")
-    _ensure_column(cur, "videos", "cover_url", "cover_url VARCHAR(512) NULL")
-    _ensure_column(cur, "videos", "tags", "tags VARCHAR(512) NULL")
-    _ensure_column(cur, "videos", "is_published", "is_published TINYINT DEFAULT 1")
-    _ensure_column(cur, "videos", "sort_order", "sort_order INT DEFAULT 0")
-    _ensure_column(cur, "videos", "published_at", "published_at DATETIME NULL")
-    _ensure_column(cur, "videos", "upload_status", "upload_status VARCHAR(16) DEFAULT 'done'")
-    _ensure_column(cur, "videos", "local_filename", "local_filename VARCHAR(256) NULL")
-    _ensure_column(cur, "videos", "error_message", "error_message VARCHAR(256) NULL")
-    _ensure_column(cur, "videos", "server_file_path", "server_file_path VARCHAR(512) NULL")
-    _ensure_column(cur, "videos", "server_file_size", "server_file_size BIGINT DEFAULT 0")
-    _ensure_column(cur, "videos", "video_url", "video_url VARCHAR(1024) NULL")
-    _ensure_column(cur, "videos", "preview_url", "preview_url VARCHAR(1024) NULL")
-    _ensure_index(cur, "videos", "idx_videos_channel_msg", "channel_id, message_id")
-    _ensure_index(cur, "videos", "idx_videos_created", "created_at")
-    _ensure_index(cur, "videos", "idx_videos_view_count", "view_count")
-    _ensure_index(cur, "videos", "idx_videos_category", "category_id")
-    _ensure_index(cur, "videos", "idx_videos_publish_sort", "is_published, sort_order, published_at")
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS video_views (
-            id BIGINT AUTO_INCREMENT PRIMARY KEY,
-            telegram_id BIGINT NOT NULL,
-            video_id BIGINT NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_index(cur, "video_views", "idx_video_views_user_time", "telegram_id, created_at")
-    _ensure_index(cur, "video_views", "idx_video_views_video_time", "video_id, created_at")
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS categories (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(64) NOT NULL,
-            is_visible TINYINT DEFAULT 1,
-            sort_order INT DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS banners (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            image_url VARCHAR(512) NOT NULL,
-            link_url VARCHAR(512),
-            is_active TINYINT DEFAULT 1,
-            sort_order INT DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS video_download_jobs (
-            id BIGINT AUTO_INCREMENT PRIMARY KEY,
-            source_url VARCHAR(1024) NULL,
-            caption TEXT NULL,
-            filename VARCHAR(256) NULL,
-            file_size BIGINT DEFAULT 0,
-            progress INT DEFAULT 0,
-            status VARCHAR(16) DEFAULT 'pending',
-            started_at DATETIME NULL,
-            finished_at DATETIME NULL,
-            error_message VARCHAR(256) NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_index(cur, "video_download_jobs", "idx_vdj_status_created", "status, created_at")
-    _ensure_index(cur, "video_download_jobs", "idx_vdj_updated", "updated_at")
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS poker_players (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            telegram_id BIGINT NOT NULL,
-            username VARCHAR(128),
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_index(cur, "poker_players", "idx_poker_players_telegram", "telegram_id")
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS poker_ledgers (
-            id BIGINT AUTO_INCREMENT PRIMARY KEY,
-            player_id INT NOT NULL,
-            amount DECIMAL(24,8) NOT NULL,
-            note VARCHAR(256),
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_index(cur, "poker_ledgers", "idx_poker_ledgers_player_time", "player_id, created_at")
+    """
+    建表 / 升级表结构：按 core.migrations 的版本号执行未应用的迁移；已是最新版本时只查一次 schema_version
+    """
+    from core.migrations import migrate
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS poker_games (
-            id BIGINT AUTO_INCREMENT PRIMARY KEY,
-            code VARCHAR(64) NOT NULL,
-            status VARCHAR(16) DEFAULT 'waiting',
-            max_players INT DEFAULT 6,
-            dealer_seat INT DEFAULT 1,
-            small_blind INT DEFAULT 5,
-            big_blind INT DEFAULT 10,
-            street VARCHAR(16) DEFAULT 'waiting',
-            pot INT DEFAULT 0,
-            current_bet INT DEFAULT 0,
-            turn_seat INT DEFAULT 1,
-            turn_started_at DATETIME NULL,
-            turn_timeout_sec INT DEFAULT 60,
-            board_json TEXT,
-            deck_json TEXT,
-            hand_no INT DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_index(cur, "poker_games", "idx_poker_games_code_status", "code, status")
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS poker_game_players (
-            id BIGINT AUTO_INCREMENT PRIMARY KEY,
-            game_id BIGINT NOT NULL,
-            seat INT NOT NULL,
-            telegram_id BIGINT NOT NULL,
-            username VARCHAR(128),
-            stack INT DEFAULT 0,
-            in_hand TINYINT DEFAULT 1,
-            acted TINYINT DEFAULT 0,
-            bet_street INT DEFAULT 0,
-            hole_json TEXT,
-            joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE KEY uq_pgp_game_seat (game_id, seat),
-            UNIQUE KEY uq_pgp_game_user (game_id, telegram_id)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_index(cur, "poker_game_players", "idx_pgp_game", "game_id")
-    _ensure_index(cur, "poker_game_players", "idx_pgp_user", "telegram_id")
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS poker_game_actions (
-            id BIGINT AUTO_INCREMENT PRIMARY KEY,
-            game_id BIGINT NOT NULL,
-            hand_no INT NOT NULL,
-            street VARCHAR(16) NOT NULL,
-            seat INT NOT NULL,
-            telegram_id BIGINT NOT NULL,
-            action VARCHAR(16) NOT NULL,
-            amount INT DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    _ensure_index(cur, "poker_game_actions", "idx_pga_game_hand", "game_id, hand_no, id")
-
-    cur.close()
-    try:
-        conn.close()
-    except Exception:
-        pass
+    migrate()
 
 
 def admin_audit_log(category: str, action: str, target_id: int | None, payload: dict | None = None):
@@ -427,13 +43,24 @@ def admin_audit_log(category: str, action: str, target_id: int | None, payload:
     conn.close()
 
 
-def get_user(telegram_id: int) -> dict | None:
+def get_user(telegram_id: int, fresh: bool = False) -> dict | None:
+    """
+    读用户行（经 user_cache 读穿透）；要在读到的值基础上再写回的调用方传 fresh=True 直接读库
+    """
+    use_cache = user_cache.enabled() and not fresh
+    if use_cache:
+        hit, row = user_cache.get(telegram_id)
+        if hit:
+            return row
+        token = user_cache.begin()
     conn = get_conn()
     cur = conn.cursor(dictionary=True)
     cur.execute("SELECT * FROM users WHERE telegram_id=%s LIMIT 1", (int(telegram_id),))
     row = cur.fetchone()
     cur.close()
     conn.close()
+    if use_cache:
+        user_cache.put(telegram_id, row, token)
     return row
 
 
@@ -450,6 +77,7 @@ def upsert_user_basic(telegram_id: int, username: str, language: str):
     )
     cur.close()
     conn.close()
+    user_cache.invalidate(telegram_id)
 
 
 def bind_inviter(telegram_id: int, inviter_id: int):
@@ -471,6 +99,7 @@ def bind_inviter(telegram_id: int, inviter_id: int):
     cur2.close()
     cur.close()
     conn.close()
+    user_cache.invalidate(telegram_id, inviter_id)
 
 
 def set_user_source(telegram_id: int, source: str):
@@ -493,6 +122,7 @@ def set_user_source(telegram_id: int, source: str):
     )
     cur.close()
     conn.close()
+    user_cache.invalidate(telegram_id)
 
 
 def set_user_pending_coupon(telegram_id: int, code: str | None):
@@ -503,6 +133,7 @@ def set_user_pending_coupon(telegram_id: int, code: str | None):
     cur.execute("UPDATE users SET pending_coupon=%s WHERE telegram_id=%s", (c, telegram_id))
     cur.close()
     conn.close()
+    user_cache.invalidate(telegram_id)
 
 
 def _plan_by_code(code: str) -> dict | None:
@@ -584,53 +215,142 @@ def compute_amount_after_coupon(base_amount: Decimal, plan_code: str, coupon_cod
     return out, discount, code
 
 
+_free_addr_lock = threading.Lock()
+_free_addr_batch: list[str] = []
+_FREE_ADDR_BATCH_SIZE = 128
+
+
+def _take_free_addr_candidate(cur) -> str | None:
+    """
+    从进程内预取的空闲地址批次里取一个候选；批次空了再从库里取一批（打乱顺序，减少多进程撞同一行）
+    """
+    with _free_addr_lock:
+        if _free_addr_batch:
+            return _free_addr_batch.pop()
+    cur.execute("SELECT addr FROM address_pool WHERE assigned_to IS NULL LIMIT %s", (_FREE_ADDR_BATCH_SIZE,))
+    batch = [str(r["addr"]) for r in cur.fetchall() or [] if r.get("addr")]
+    random.shuffle(batch)
+    with _free_addr_lock:
+        _free_addr_batch[:] = batch
+        return _free_addr_batch.pop() if _free_addr_batch else None
+
+
 def allocate_address(telegram_id: int) -> str | None:
+    """
+    给用户分配收款地址（单连接单事务）：锁用户行串行化同一用户的并发请求，
+    地址用条件 UPDATE 原子认领（assigned_to IS NULL 才成功），抢不到换下一个候选。
+    """
     telegram_id = int(telegram_id)
     if telegram_id <= 0:
         return None
-    user = get_user(telegram_id)
-    if user and user.get("wallet_addr"):
-        return str(user.get("wallet_addr"))
     conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT addr FROM address_pool WHERE assigned_to=%s LIMIT 1", (telegram_id,))
-    row = cur.fetchone()
-    if row and row.get("addr"):
-        addr = str(row["addr"])
-        cur.close()
-        conn.close()
-        conn2 = get_conn()
-        cur2 = conn2.cursor()
-        cur2.execute("UPDATE users SET wallet_addr=%s WHERE telegram_id=%s", (addr, telegram_id))
-        cur2.close()
-        conn2.close()
+    try:
+        conn.start_transaction()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("INSERT IGNORE INTO users (telegram_id) VALUES (%s)", (telegram_id,))
+        cur.execute("SELECT wallet_addr FROM users WHERE telegram_id=%s LIMIT 1 FOR UPDATE", (telegram_id,))
+        row = cur.fetchone()
+        if row and row.get("wallet_addr"):
+            conn.commit()
+            return str(row["wallet_addr"])
+        cur.execute("SELECT addr FROM address_pool WHERE assigned_to=%s LIMIT 1", (telegram_id,))
+        row = cur.fetchone()
+        addr = str(row["addr"]) if row and row.get("addr") else None
+
+        for _ in range(8):
+            if addr:
+                break
+            cand = _take_free_addr_candidate(cur)
+            if not cand:
+                break
+            cur.execute(
+                "UPDATE address_pool SET assigned_to=%s, assigned_at=UTC_TIMESTAMP() WHERE addr=%s AND assigned_to IS NULL",
+                (telegram_id, cand),
+            )
+            if int(cur.rowcount or 0) == 1:
+                addr = cand
+        if not addr:
+            # 候选都被别的进程抢走：单语句认领任意一个空闲地址，用 assigned_to 作为认领标记取回地址
+            cur.execute(
+                "UPDATE address_pool SET assigned_to=%s, assigned_at=UTC_TIMESTAMP() WHERE assigned_to IS NULL ORDER BY addr LIMIT 1",
+                (telegram_id,),
+            )
+            if int(cur.rowcount or 0) == 1:
+                cur.execute("SELECT addr FROM address_pool WHERE assigned_to=%s LIMIT 1", (telegram_id,))
+                row = cur.fetchone()
+                addr = str(row["addr"]) if row and row.get("addr") else None
+        if not addr:
+            conn.rollback()
+            return None
+        cur.execute("UPDATE users SET wallet_addr=%s WHERE telegram_id=%s", (addr, telegram_id))
+        conn.commit()
         return addr
-    cur.execute("SELECT addr FROM address_pool WHERE assigned_to IS NULL LIMIT 1")
-    row2 = cur.fetchone()
-    if not row2 or not row2.get("addr"):
-        cur.close()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
         conn.close()
-        return None
-    addr = str(row2["addr"])
+        # INSERT IGNORE 可能新建了用户行，无论是否分配成功都失效
+        user_cache.invalidate(telegram_id)
+
+
+def get_address_pool_counts() -> dict:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*), COALESCE(SUM(assigned_to IS NULL),0) FROM address_pool")
+    row = cur.fetchone() or (0, 0)
     cur.close()
     conn.close()
-    conn3 = get_conn()
-    cur3 = conn3.cursor()
-    cur3.execute("UPDATE address_pool SET assigned_to=%s, assigned_at=UTC_TIMESTAMP() WHERE addr=%s AND assigned_to IS NULL", (telegram_id, addr))
-    cur3.execute(
-        "INSERT INTO users (telegram_id, wallet_addr) VALUES (%s,%s) ON DUPLICATE KEY UPDATE wallet_addr=VALUES(wallet_addr)",
-        (telegram_id, addr),
+    return {"total": int(row[0] or 0), "free": int(row[1] or 0)}
+
+
+def recycle_idle_addresses(idle_days: int, limit: int = 500) -> list[str]:
+    """
+    回收闲置地址：分配超过 idle_days 天、用户会员已过期超过 idle_days 天（或从未付费）、
+    且这段时间内该地址没有订单和入账。返回回收的地址
+    """
+    days = max(1, int(idle_days))
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT p.addr, p.assigned_to
+        FROM address_pool p
+        LEFT JOIN users u ON u.telegram_id = p.assigned_to
+        WHERE p.assigned_to IS NOT NULL
+          AND p.assigned_at < (UTC_TIMESTAMP() - INTERVAL %s DAY)
+          AND (u.paid_until IS NULL OR u.paid_until < (UTC_TIMESTAMP() - INTERVAL %s DAY))
+          AND NOT EXISTS (
+            SELECT 1 FROM orders o WHERE o.addr = p.addr AND o.created_at >= (UTC_TIMESTAMP() - INTERVAL %s DAY)
+          )
+          AND NOT EXISTS (
+            SELECT 1 FROM usdt_txs t WHERE t.addr = p.addr AND t.created_at >= (UTC_TIMESTAMP() - INTERVAL %s DAY)
+          )
+        LIMIT %s
+        """,
+        (days, days, days, days, max(1, int(limit))),
     )
-    cur3.close()
-    conn3.close()
-    return addr
+    rows = cur.fetchall() or []
+    out: list[str] = []
+    for addr, uid in rows:
+        cur.execute("UPDATE address_pool SET assigned_to=NULL, assigned_at=NULL WHERE addr=%s AND assigned_to=%s", (addr, uid))
+        if int(cur.rowcount or 0) == 1:
+            cur.execute("UPDATE users SET wallet_addr=NULL WHERE telegram_id=%s AND wallet_addr=%s", (uid, addr))
+            user_cache.invalidate(uid)
+            out.append(str(addr))
+    cur.close()
+    conn.close()
+    return out
 
 
 def reset_user_address(telegram_id: int) -> str | None:
     telegram_id = int(telegram_id)
     if telegram_id <= 0:
         return None
-    u = get_user(telegram_id)
+    u = get_user(telegram_id, fresh=True)
     old = str(u.get("wallet_addr")) if u and u.get("wallet_addr") else None
     conn = get_conn()
     cur = conn.cursor()
@@ -639,6 +359,7 @@ def reset_user_address(telegram_id: int) -> str | None:
         cur.execute("UPDATE address_pool SET assigned_to=NULL, assigned_at=NULL WHERE addr=%s AND assigned_to=%s", (old, telegram_id))
     cur.close()
     conn.close()
+    user_cache.invalidate(telegram_id)
     return old
 
 
@@ -649,8 +370,11 @@ def create_pending_order(telegram_id: int, addr: str, amount: Decimal, plan_code
         "INSERT INTO orders (telegram_id, addr, amount, plan_code, status) VALUES (%s,%s,%s,%s,'pending')",
         (int(telegram_id), (addr or "")[:128], str(Decimal(str(amount))), (plan_code or "")[:32]),
     )
+    order_id = int(cur.lastrowid or 0)
     cur.close()
     conn.close()
+    deposit_watch.watch_order(addr, order_id)
+    return order_id
 
 
 def create_pending_order_priced(telegram_id: int, addr: str, amount: Decimal, base_amount: Decimal, plan_code: str, coupon_code: str):
@@ -666,49 +390,377 @@ def create_pending_order_priced(telegram_id: int, addr: str, amount: Decimal, ba
         """,
         (int(telegram_id), (addr or "")[:128], str(a), str(b), str(disc), (coupon_code or "")[:64], (plan_code or "")[:32]),
     )
+    order_id = int(cur.lastrowid or 0)
     cur.close()
     conn.close()
+    deposit_watch.watch_order(addr, order_id)
+    return order_id
+
+
+def sync_member_since(cur, order_id: int):
+    """
+    订单置为成功后调用：把订单创建时间并入 users.member_since（取最早一笔），后台用户列表只读这一列
+    """
+    cur.execute(
+        """
+        UPDATE users u JOIN orders o ON o.telegram_id=u.telegram_id
+        SET u.member_since = LEAST(COALESCE(u.member_since, o.created_at), o.created_at)
+        WHERE o.id=%s AND o.status='success'
+        """,
+        (int(order_id),),
+    )
 
 
 def mark_order_success(order_id: int, tx_id: str):
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE orders SET status='success', tx_id=%s WHERE id=%s", ((tx_id or "")[:128], int(order_id)))
+    cur = conn.cursor()
+    cur.execute("UPDATE orders SET status='success', tx_id=%s WHERE id=%s", ((tx_id or "")[:128], int(order_id)))
+    sync_member_since(cur, order_id)
+    cur.execute(
+        "DELETE s FROM payment_amount_slots s JOIN orders o ON o.addr=s.addr AND o.amount=s.amount WHERE o.id=%s",
+        (int(order_id),),
+    )
+    cur.close()
+    conn.close()
+    deposit_watch.unwatch_order(int(order_id))
+
+
+def reserve_amount_slot(addr: str, amount: Decimal, telegram_id: int, ttl_hours: int) -> bool:
+    """
+    占用 (addr, amount) 收款金额槽位；已被未过期的订单占用时返回 False（主键冲突）
+    """
+    addr = (addr or "")[:128]
+    amt = str(Decimal(str(amount)))
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "DELETE FROM payment_amount_slots WHERE addr=%s AND amount=%s AND expires_at < UTC_TIMESTAMP()",
+            (addr, amt),
+        )
+        cur.execute(
+            """
+            INSERT INTO payment_amount_slots (addr, amount, telegram_id, reserved_at, expires_at)
+            VALUES (%s,%s,%s,UTC_TIMESTAMP(),UTC_TIMESTAMP() + INTERVAL %s HOUR)
+            """,
+            (addr, amt, int(telegram_id or 0) or None, max(1, int(ttl_hours))),
+        )
+        return True
+    except mysql.connector.IntegrityError:
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+
+def attach_amount_slot_order(addr: str, amount: Decimal, order_id: int):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE payment_amount_slots SET order_id=%s WHERE addr=%s AND amount=%s",
+        (int(order_id), (addr or "")[:128], str(Decimal(str(amount)))),
+    )
+    cur.close()
+    conn.close()
+
+
+def renew_user_amount_slot(addr: str, lo: Decimal, hi: Decimal, telegram_id: int, ttl_hours: int) -> Decimal | None:
+    """
+    该用户在 [lo, hi] 内已占有未过期槽位时续期并返回其金额（同一用户重复点支付复用同一尾数），没有返回 None。
+    复用时把该用户同金额的旧 pending 订单置为 superseded：槽位随新订单成功释放后，旧订单不能再匹配到别人的同金额转账
+    """
+    addr = (addr or "")[:128]
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT amount FROM payment_amount_slots
+            WHERE addr=%s AND amount BETWEEN %s AND %s AND telegram_id=%s AND expires_at >= UTC_TIMESTAMP()
+            ORDER BY reserved_at DESC
+            LIMIT 1
+            """,
+            (addr, str(Decimal(str(lo))), str(Decimal(str(hi))), int(telegram_id)),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        amount = Decimal(str(row[0]))
+        cur.execute(
+            """
+            UPDATE payment_amount_slots SET expires_at=(UTC_TIMESTAMP() + INTERVAL %s HOUR)
+            WHERE addr=%s AND amount=%s AND telegram_id=%s AND expires_at >= UTC_TIMESTAMP()
+            """,
+            (max(1, int(ttl_hours)), addr, str(amount), int(telegram_id)),
+        )
+        if int(cur.rowcount or 0) <= 0:
+            return None
+        cur.execute(
+            "UPDATE orders SET status='superseded' WHERE addr=%s AND amount=%s AND telegram_id=%s AND status='pending'",
+            (addr, str(amount), int(telegram_id)),
+        )
+        return amount
+    finally:
+        cur.close()
+        conn.close()
+
+
+def release_amount_slot(addr: str, amount: Decimal, unattached_only: bool = False) -> bool:
+    """
+    删除槽位；unattached_only=True 时只删还没挂到订单上的（下单失败回滚用），返回是否删到
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "DELETE FROM payment_amount_slots WHERE addr=%s AND amount=%s" + (" AND order_id IS NULL" if unattached_only else ""),
+        ((addr or "")[:128], str(Decimal(str(amount)))),
+    )
+    n = int(cur.rowcount or 0)
+    cur.close()
+    conn.close()
+    return n > 0
+
+
+def get_reserved_amounts(addr: str, lo: Decimal, hi: Decimal) -> set[Decimal]:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT amount FROM payment_amount_slots
+        WHERE addr=%s AND amount BETWEEN %s AND %s AND expires_at >= UTC_TIMESTAMP()
+        """,
+        ((addr or "")[:128], str(Decimal(str(lo))), str(Decimal(str(hi)))),
+    )
+    rows = cur.fetchall() or []
+    cur.close()
+    conn.close()
+    return {Decimal(str(r[0])) for r in rows}
+
+
+def release_expired_amount_slots(limit: int = 5000) -> list[tuple[str, Decimal]]:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT addr, amount FROM payment_amount_slots WHERE expires_at < UTC_TIMESTAMP() ORDER BY expires_at ASC LIMIT %s",
+        (max(1, int(limit)),),
+    )
+    rows = [(str(r[0]), Decimal(str(r[1]))) for r in cur.fetchall() or []]
+    if rows:
+        cur.executemany(
+            "DELETE FROM payment_amount_slots WHERE addr=%s AND amount=%s AND expires_at < UTC_TIMESTAMP()",
+            [(a, str(m)) for a, m in rows],
+        )
+    cur.close()
+    conn.close()
+    return rows
+
+
+def update_user_payment(telegram_id: int, paid_until: datetime, total_received: Decimal, plan_code: str):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE users SET paid_until=%s, total_received=%s, last_plan=%s WHERE telegram_id=%s",
+        (paid_until, str(Decimal(str(total_received))), (plan_code or "")[:32], int(telegram_id)),
+    )
+    cur.close()
+    conn.close()
+    user_cache.invalidate(telegram_id)
+
+
+def insert_usdt_tx_if_new(telegram_id: int | None, addr: str, tx_id: str, amount, from_addr: str | None, block_time: datetime | None):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT IGNORE INTO usdt_txs (tx_id, telegram_id, addr, from_addr, amount, status, block_time)
+        VALUES (%s,%s,%s,%s,%s,'seen',%s)
+        """,
+        ((tx_id or "")[:128], int(telegram_id) if telegram_id else None, (addr or "")[:128], (from_addr or "")[:128] if from_addr else None, str(Decimal(str(amount))), block_time),
+    )
+    cur.close()
+    conn.close()
+
+
+def _remember_tx_ids(tx_ids: list[str]):
+    with _recent_tx_lock:
+        for tx_id in tx_ids:
+            _recent_tx_ids[tx_id] = None
+            _recent_tx_ids.move_to_end(tx_id)
+        while len(_recent_tx_ids) > _RECENT_TX_IDS_MAX:
+            _recent_tx_ids.popitem(last=False)
+
+
+def ingest_usdt_txs(txs: list[dict]) -> int:
+    """
+    批量写入链上入账（tron_client 返回格式，可跨多个地址）。
+    先用最近见过的 tx_id LRU 过滤，再在一个连接上多行 INSERT IGNORE；返回新写入行数。
+    """
+    rows: list[tuple] = []
+    fresh: list[str] = []
+    batch_ids: set[str] = set()
+    with _recent_tx_lock:
+        for tx in txs:
+            tx_id = (tx.get("tx_id") or "")[:128]
+            if not tx_id or tx_id in _recent_tx_ids or tx_id in batch_ids:
+                continue
+            batch_ids.add(tx_id)
+            block_time = tx.get("block_time")
+            if block_time is not None and block_time.tzinfo is not None:
+                block_time = block_time.replace(tzinfo=None)
+            from_addr = tx.get("from")
+            rows.append(
+                (
+                    tx_id,
+                    (tx.get("to") or tx.get("addr") or "")[:128],
+                    (from_addr or "")[:128] if from_addr else None,
+                    str(Decimal(str(tx.get("amount") or 0))),
+                    block_time,
+                )
+            )
+            fresh.append(tx_id)
+    if not rows:
+        return 0
+    inserted = 0
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        for i in range(0, len(rows), 500):
+            chunk = rows[i : i + 500]
+            params: list = []
+            for r in chunk:
+                params.extend(r)
+            cur.execute(
+                "INSERT IGNORE INTO usdt_txs (tx_id, addr, from_addr, amount, status, block_time) VALUES "
+                + ",".join(["(%s,%s,%s,%s,'seen',%s)"] * len(chunk)),
+                tuple(params),
+            )
+            inserted += max(0, int(cur.rowcount or 0))
+    finally:
+        cur.close()
+        conn.close()
+    _remember_tx_ids(fresh)
+    return inserted
+
+
+def get_tron_cursors(addrs: list[str]) -> dict[str, dict]:
+    keys = list(dict.fromkeys([(a or "")[:128] for a in addrs if a]))
+    if not keys:
+        return {}
+    out: dict[str, dict] = {}
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    for i in range(0, len(keys), 500):
+        chunk = keys[i : i + 500]
+        cur.execute(
+            f"SELECT addr, min_timestamp, last_block_ts, fingerprint FROM tron_cursors WHERE addr IN ({','.join(['%s'] * len(chunk))})",
+            tuple(chunk),
+        )
+        for r in cur.fetchall() or []:
+            out[str(r["addr"])] = {
+                "min_timestamp": int(r.get("min_timestamp") or 0),
+                "last_block_ts": int(r.get("last_block_ts") or 0),
+                "fingerprint": r.get("fingerprint") or None,
+            }
+    cur.close()
+    conn.close()
+    return out
+
+
+def save_balance_snapshots(balances: dict[str, Decimal]):
+    rows = [((addr or "")[:128], str(bal)) for addr, bal in balances.items() if addr and bal is not None]
+    if not rows:
+        return
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO usdt_balance_snapshots (addr, balance, created_at) VALUES (%s,%s,UTC_TIMESTAMP())",
+        rows,
+    )
+    cur.close()
+    conn.close()
+
+
+def get_latest_balance_snapshots(addrs: list[str] | None = None) -> dict[str, dict]:
+    """
+    每个地址最近一次余额快照 {addr: {"balance": Decimal, "created_at": datetime}}；addrs 为空时返回全部地址（含已移出地址池的旧地址）
+    """
+    uniq = list(dict.fromkeys([a for a in (addrs or []) if a]))
+    where = ""
+    params: tuple = ()
+    if uniq:
+        where = "WHERE addr IN (" + ",".join(["%s"] * len(uniq)) + ")"
+        params = tuple(uniq)
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(
+        f"""
+        SELECT s.addr, s.balance, s.created_at
+        FROM usdt_balance_snapshots s
+        JOIN (SELECT addr, MAX(id) AS mid FROM usdt_balance_snapshots {where} GROUP BY addr) m ON s.id = m.mid
+        """,
+        params,
+    )
+    rows = cur.fetchall() or []
     cur.close()
     conn.close()
+    return {r["addr"]: {"balance": Decimal(str(r["balance"])), "created_at": r["created_at"]} for r in rows}
 
 
-def update_user_payment(telegram_id: int, paid_until: datetime, total_received: Decimal, plan_code: str):
+def prune_balance_snapshots(retention_days: int) -> int:
     conn = get_conn()
     cur = conn.cursor()
     cur.execute(
-        "UPDATE users SET paid_until=%s, total_received=%s, last_plan=%s WHERE telegram_id=%s",
-        (paid_until, str(Decimal(str(total_received))), (plan_code or "")[:32], int(telegram_id)),
+        "DELETE FROM usdt_balance_snapshots WHERE created_at < (UTC_TIMESTAMP() - INTERVAL %s DAY) LIMIT 50000",
+        (max(1, int(retention_days)),),
     )
+    n = int(cur.rowcount or 0)
     cur.close()
     conn.close()
+    return n
 
 
-def insert_usdt_tx_if_new(telegram_id: int | None, addr: str, tx_id: str, amount, from_addr: str | None, block_time: datetime | None):
+def save_tron_cursors(cursors: dict[str, dict]):
+    rows = [
+        (
+            (addr or "")[:128],
+            int(c.get("min_timestamp") or 0),
+            int(c.get("last_block_ts") or 0),
+            (c.get("fingerprint") or "")[:512] or None,
+        )
+        for addr, c in cursors.items()
+        if addr
+    ]
+    if not rows:
+        return
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute(
+    cur.executemany(
         """
-        INSERT IGNORE INTO usdt_txs (tx_id, telegram_id, addr, from_addr, amount, status, block_time)
-        VALUES (%s,%s,%s,%s,%s,'seen',%s)
+        INSERT INTO tron_cursors (addr, min_timestamp, last_block_ts, fingerprint, updated_at)
+        VALUES (%s,%s,%s,%s,UTC_TIMESTAMP())
+        ON DUPLICATE KEY UPDATE
+          min_timestamp=VALUES(min_timestamp),
+          last_block_ts=VALUES(last_block_ts),
+          fingerprint=VALUES(fingerprint),
+          updated_at=VALUES(updated_at)
         """,
-        ((tx_id or "")[:128], int(telegram_id) if telegram_id else None, (addr or "")[:128], (from_addr or "")[:128] if from_addr else None, str(Decimal(str(amount))), block_time),
+        rows,
     )
     cur.close()
     conn.close()
 
 
-def get_unassigned_usdt_txs(addr: str, confirm_before: datetime) -> list[dict]:
+# 充值匹配热路径只取用得到的列
+_UnassignedTxRow = row_type("UnassignedTxRow", ("tx_id", "addr", "from_addr", "amount", "status", "block_time", "created_at"))
+_PendingOrderRow = row_type("PendingOrderRow", ("id", "telegram_id", "addr", "amount", "plan_code", "created_at"))
+
+
+def get_unassigned_usdt_txs(addr: str, confirm_before: datetime) -> list:
     conn = get_conn()
-    cur = conn.cursor(dictionary=True)
+    cur = conn.cursor()
     cur.execute(
-        """
-        SELECT * FROM usdt_txs
+        f"""
+        SELECT {_UnassignedTxRow.columns} FROM usdt_txs
         WHERE addr=%s
           AND (telegram_id IS NULL OR telegram_id=0)
           AND (block_time IS NULL OR block_time <= %s)
@@ -718,7 +770,7 @@ def get_unassigned_usdt_txs(addr: str, confirm_before: datetime) -> list[dict]:
         """,
         ((addr or "")[:128], confirm_before),
     )
-    rows = cur.fetchall() or []
+    rows = fetch_rows(cur, _UnassignedTxRow)
     cur.close()
     conn.close()
     return rows
@@ -734,13 +786,13 @@ def get_address_assigned_at(addr: str) -> datetime | None:
     return row[0] if row else None
 
 
-def get_unassigned_usdt_txs_since(addr: str, confirm_before: datetime, since: datetime | None) -> list[dict]:
+def get_unassigned_usdt_txs_since(addr: str, confirm_before: datetime, since: datetime | None) -> list:
     conn = get_conn()
-    cur = conn.cursor(dictionary=True)
+    cur = conn.cursor()
     if since:
         cur.execute(
-            """
-            SELECT * FROM usdt_txs
+            f"""
+            SELECT {_UnassignedTxRow.columns} FROM usdt_txs
             WHERE addr=%s
               AND (telegram_id IS NULL OR telegram_id=0)
               AND (block_time IS NULL OR block_time <= %s)
@@ -753,8 +805,8 @@ def get_unassigned_usdt_txs_since(addr: str, confirm_before: datetime, since: da
         )
     else:
         cur.execute(
-            """
-            SELECT * FROM usdt_txs
+            f"""
+            SELECT {_UnassignedTxRow.columns} FROM usdt_txs
             WHERE addr=%s
               AND (telegram_id IS NULL OR telegram_id=0)
               AND (block_time IS NULL OR block_time <= %s)
@@ -764,17 +816,17 @@ def get_unassigned_usdt_txs_since(addr: str, confirm_before: datetime, since: da
             """,
             ((addr or "")[:128], confirm_before),
         )
-    rows = cur.fetchall() or []
+    rows = fetch_rows(cur, _UnassignedTxRow)
     cur.close()
     conn.close()
     return rows
 
 
-def match_pending_order_by_amount_v2(*, addr: str, amount: Decimal, eps: Decimal, tx_time: datetime | None, lookback_hours: int, prefer_recent: bool) -> dict | None:
+def match_pending_order_by_amount_v2(*, addr: str, amount: Decimal, eps: Decimal, tx_time: datetime | None, lookback_hours: int, prefer_recent: bool):
     a = Decimal(str(amount))
     e = Decimal(str(eps))
     conn = get_conn()
-    cur = conn.cursor(dictionary=True)
+    cur = conn.cursor()
     params: list = [(addr or "")[:128], int(lookback_hours)]
     time_clause = ""
     if tx_time:
@@ -783,7 +835,7 @@ def match_pending_order_by_amount_v2(*, addr: str, amount: Decimal, eps: Decimal
     order_by = "created_at DESC" if prefer_recent else "created_at ASC"
     cur.execute(
         f"""
-        SELECT * FROM orders
+        SELECT {_PendingOrderRow.columns} FROM orders
         WHERE addr=%s
           AND status='pending'
           AND created_at >= (UTC_TIMESTAMP() - INTERVAL %s HOUR)
@@ -793,12 +845,12 @@ def match_pending_order_by_amount_v2(*, addr: str, amount: Decimal, eps: Decimal
         """,
         tuple(params),
     )
-    rows = cur.fetchall() or []
+    rows = fetch_rows(cur, _PendingOrderRow)
     cur.close()
     conn.close()
     for r in rows:
         try:
-            oa = Decimal(str(r.get("amount") or "0"))
+            oa = Decimal(str(r.amount or "0"))
         except Exception:
             continue
         if abs(oa - a) <= e:
@@ -806,6 +858,30 @@ def match_pending_order_by_amount_v2(*, addr: str, amount: Decimal, eps: Decimal
     return None
 
 
+def get_pending_orders_for_match(addrs: list[str], lookback_hours: int) -> list:
+    keys = list(dict.fromkeys([(a or "")[:128] for a in addrs if a]))
+    if not keys:
+        return []
+    rows: list = []
+    conn = get_conn()
+    cur = conn.cursor()
+    for i in range(0, len(keys), 500):
+        chunk = keys[i : i + 500]
+        cur.execute(
+            f"""
+            SELECT {_PendingOrderRow.columns} FROM orders
+            WHERE addr IN ({','.join(['%s'] * len(chunk))})
+              AND status='pending'
+              AND created_at >= (UTC_TIMESTAMP() - INTERVAL %s HOUR)
+            """,
+            tuple(chunk) + (int(lookback_hours),),
+        )
+        rows.extend(fetch_rows(cur, _PendingOrderRow))
+    cur.close()
+    conn.close()
+    return rows
+
+
 def match_pending_order_by_amount(addr: str, amount: Decimal, eps: Decimal | None = None, tx_time: datetime | None = None) -> dict | None:
     return match_pending_order_by_amount_v2(
         addr=addr,
@@ -842,16 +918,307 @@ def set_usdt_tx_status(tx_id: str, status: str, plan_code: str | None = None, cr
     conn.close()
 
 
-def get_success_orders_between(start: datetime, end: datetime) -> list[dict]:
+def _enqueue_outbound(cur, kind: str, chat_id: int | None, payload: dict):
+    cur.execute(
+        "INSERT INTO outbound_messages (kind, chat_id, payload, status, next_attempt_at) VALUES (%s,%s,%s,'pending',UTC_TIMESTAMP())",
+        ((kind or "")[:32], int(chat_id) if chat_id else None, json.dumps(payload or {}, ensure_ascii=False)),
+    )
+
+
+def enqueue_outbound_message(kind: str, chat_id: int | None, payload: dict):
+    conn = get_conn()
+    cur = conn.cursor()
+    _enqueue_outbound(cur, kind, chat_id, payload)
+    cur.close()
+    conn.close()
+
+
+def claim_outbound_messages(claim_token: str, limit: int = 50) -> list[dict]:
     conn = get_conn()
     cur = conn.cursor(dictionary=True)
     cur.execute(
         """
-        SELECT * FROM orders
-        WHERE status='success' AND created_at BETWEEN %s AND %s
-        ORDER BY created_at DESC
+        UPDATE outbound_messages
+        SET status='sending', claim_token=%s, claimed_at=UTC_TIMESTAMP()
+        WHERE status='pending' AND next_attempt_at <= UTC_TIMESTAMP()
+        ORDER BY id ASC
+        LIMIT %s
+        """,
+        ((claim_token or "")[:64], max(1, int(limit))),
+    )
+    cur.execute(
+        "SELECT id, kind, chat_id, payload, attempts FROM outbound_messages WHERE claim_token=%s AND status='sending' ORDER BY id ASC",
+        ((claim_token or "")[:64],),
+    )
+    rows = cur.fetchall() or []
+    cur.close()
+    conn.close()
+    for r in rows:
+        try:
+            r["payload"] = json.loads(r.get("payload") or "{}")
+        except Exception:
+            r["payload"] = {}
+    return rows
+
+
+def mark_outbound_sent(message_id: int):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE outbound_messages SET status='sent', sent_at=UTC_TIMESTAMP(), claim_token=NULL WHERE id=%s",
+        (int(message_id),),
+    )
+    cur.close()
+    conn.close()
+
+
+def reschedule_outbound(message_id: int, delay_sec: float, error: str | None, give_up: bool = False, count_attempt: bool = True):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE outbound_messages
+        SET status=%s,
+            attempts=attempts+%s,
+            next_attempt_at=(UTC_TIMESTAMP() + INTERVAL %s SECOND),
+            last_error=%s,
+            claim_token=NULL
+        WHERE id=%s
+        """,
+        ("failed" if give_up else "pending", 1 if count_attempt else 0, max(0, int(delay_sec)), (error or "")[:256] or None, int(message_id)),
+    )
+    cur.close()
+    conn.close()
+
+
+def requeue_stale_outbound(stale_minutes: int = 10) -> int:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE outbound_messages
+        SET status='pending', claim_token=NULL
+        WHERE status='sending' AND claimed_at < (UTC_TIMESTAMP() - INTERVAL %s MINUTE)
+        """,
+        (max(1, int(stale_minutes)),),
+    )
+    n = int(cur.rowcount or 0)
+    cur.close()
+    conn.close()
+    return n
+
+
+def claim_usdt_txs(tx_ids: list[str], worker_id: str, lease_sec: int) -> set[str]:
+    """
+    认领待处理交易（条件 UPDATE）：只认领 status 为 seen / unmatched（未匹配的每轮重新匹配）且未被认领、租约已过期或本就属于自己的行。
+    返回本 worker 实际持有租约的 tx_id
+    """
+    ids = list(dict.fromkeys([(t or "").strip()[:128] for t in tx_ids if t]))
+    if not ids:
+        return set()
+    worker_id = (worker_id or "")[:64]
+    out: set[str] = set()
+    conn = get_conn()
+    cur = conn.cursor()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i : i + 500]
+        marks = ",".join(["%s"] * len(chunk))
+        cur.execute(
+            f"""
+            UPDATE usdt_txs
+            SET claimed_by=%s, lease_until=(UTC_TIMESTAMP() + INTERVAL %s SECOND)
+            WHERE tx_id IN ({marks})
+              AND status IN ('seen','unmatched')
+              AND (claimed_by IS NULL OR claimed_by=%s OR lease_until IS NULL OR lease_until < UTC_TIMESTAMP())
+            """,
+            (worker_id, max(1, int(lease_sec)), *chunk, worker_id),
+        )
+        cur.execute(
+            f"SELECT tx_id FROM usdt_txs WHERE tx_id IN ({marks}) AND status IN ('seen','unmatched') AND claimed_by=%s",
+            (*chunk, worker_id),
+        )
+        out.update(str(r[0]) for r in cur.fetchall() or [])
+    cur.close()
+    conn.close()
+    return out
+
+
+def mark_claimed_usdt_tx_unmatched(tx_id: str, worker_id: str) -> bool:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE usdt_txs
+        SET status='unmatched', lease_until=NULL
+        WHERE tx_id=%s AND status IN ('seen','unmatched') AND claimed_by=%s AND lease_until >= UTC_TIMESTAMP()
         """,
+        ((tx_id or "").strip()[:128], (worker_id or "")[:64]),
+    )
+    n = int(cur.rowcount or 0)
+    cur.close()
+    conn.close()
+    return n > 0
+
+
+def credit_deposit(tx_id: str, order_id: int, worker_id: str | None = None, admin_targets: list[int] | tuple = ()) -> dict:
+    """
+    匹配成功的充值入账（单连接单事务）：锁定订单/交易/用户行，延长会员、订单置 success、
+    交易置 processed，首充时给邀请人加奖励天数，并把通知写入 outbound_messages。失败整体回滚。
+    传入 worker_id 时要求该交易的租约仍属于本 worker（多进程分片处理）；admin_targets 为充值通知的管理员 chat_id，每个写一条出站消息。
+    返回 {"ok": True, ...入账结果} 或 {"ok": False, "reason": ...}
+    """
+    tx_id = (tx_id or "").strip()[:128]
+    order_id = int(order_id or 0)
+    conn = get_conn()
+    try:
+        conn.start_transaction()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT id, telegram_id, addr, amount, plan_code, status FROM orders WHERE id=%s LIMIT 1 FOR UPDATE", (order_id,))
+        order = cur.fetchone()
+        if not order or (order.get("status") or "") != "pending":
+            conn.rollback()
+            return {"ok": False, "reason": "order not pending"}
+        cur.execute(
+            """
+            SELECT status, telegram_id, addr, amount, claimed_by, (lease_until >= UTC_TIMESTAMP()) AS lease_ok
+            FROM usdt_txs WHERE tx_id=%s LIMIT 1 FOR UPDATE
+            """,
+            (tx_id,),
+        )
+        tx = cur.fetchone()
+        if not tx or (tx.get("status") or "") not in ("seen", "unmatched") or tx.get("telegram_id"):
+            conn.rollback()
+            return {"ok": False, "reason": "tx not eligible"}
+        if worker_id is not None and (tx.get("claimed_by") != worker_id[:64] or not tx.get("lease_ok")):
+            conn.rollback()
+            return {"ok": False, "reason": "claim lost"}
+        telegram_id = int(order.get("telegram_id") or 0)
+        cur.execute(
+            "SELECT telegram_id, paid_until, total_received, language, inviter_id FROM users WHERE telegram_id=%s LIMIT 1 FOR UPDATE",
+            (telegram_id,),
+        )
+        user = cur.fetchone()
+        if not user:
+            conn.rollback()
+            return {"ok": False, "reason": "user not found"}
+        plan_code = str(order.get("plan_code") or "").strip()
+        plan = _plan_by_code(plan_code)
+        if not plan:
+            conn.rollback()
+            return {"ok": False, "reason": "plan not found"}
+
+        now = _utc_now()
+        price = Decimal(str(plan["price"]))
+        new_paid_until = compute_new_paid_until(user.get("paid_until"), [plan])
+        total_old = Decimal(str(user.get("total_received") or 0))
+        cur.execute(
+            "UPDATE users SET paid_until=%s, total_received=%s, last_plan=%s WHERE telegram_id=%s",
+            (new_paid_until, str(total_old + price), plan_code[:32], telegram_id),
+        )
+        cur.execute("UPDATE orders SET status='success', tx_id=%s WHERE id=%s", (tx_id, order_id))
+        sync_member_since(cur, order_id)
+        cur.execute(
+            "DELETE FROM payment_amount_slots WHERE addr=%s AND amount=%s",
+            ((order.get("addr") or "")[:128], str(Decimal(str(order.get("amount") or 0)))),
+        )
+        cur.execute(
+            """
+            UPDATE usdt_txs
+            SET status='processed', plan_code=%s, credited_amount=%s, processed_at=%s, telegram_id=%s, lease_until=NULL
+            WHERE tx_id=%s
+            """,
+            (plan_code[:32] or None, str(price), now, telegram_id, tx_id),
+        )
+
+        inviter = None
+        inviter_id = int(user.get("inviter_id") or 0)
+        reward_days = int(INVITE_REWARD.get(plan_code, 0) or 0)
+        if inviter_id > 0 and total_old == 0 and reward_days > 0:
+            cur.execute("SELECT paid_until, language FROM users WHERE telegram_id=%s LIMIT 1 FOR UPDATE", (inviter_id,))
+            inv = cur.fetchone()
+            cur.execute("UPDATE users SET invite_reward_days=invite_reward_days+%s WHERE telegram_id=%s", (reward_days, inviter_id))
+            cur.execute(
+                "INSERT INTO admin_audit (actor, action, target_id, payload) VALUES (%s,%s,%s,%s)",
+                ("invite", "reward", inviter_id, json.dumps({"days": reward_days, "invitee_id": telegram_id}, ensure_ascii=False)),
+            )
+            if inv:
+                inv_paid_until = inv.get("paid_until")
+                base = inv_paid_until if (inv_paid_until and inv_paid_until > now) else now
+                cur.execute(
+                    "UPDATE users SET paid_until=%s, last_plan=%s WHERE telegram_id=%s",
+                    (base + timedelta(days=reward_days), "INVITE", inviter_id),
+                )
+                inviter = {"telegram_id": inviter_id, "days": reward_days, "language": inv.get("language")}
+
+        tx_amount = str(Decimal(str(tx.get("amount") or 0)))
+        # 每个管理员目标一条，投递失败各自重试，不会因为一个目标失败而重发给其他人
+        admin_payload = {"telegram_id": telegram_id, "amount": tx_amount, "plan_code": plan_code, "addr": tx.get("addr") or "", "tx_id": tx_id}
+        for admin_chat_id in admin_targets:
+            _enqueue_outbound(cur, "admin_recharge", admin_chat_id, admin_payload)
+        _enqueue_outbound(
+            cur,
+            "paid_invite",
+            telegram_id,
+            {"amount": tx_amount, "until": new_paid_until.strftime("%Y-%m-%d %H:%M:%S"), "lang": user.get("language") or "en"},
+        )
+        if inviter:
+            _enqueue_outbound(
+                cur,
+                "invite_reward",
+                inviter_id,
+                {"uid": telegram_id, "days": reward_days, "lang": inviter.get("language") or "en"},
+            )
+        conn.commit()
+        cur.close()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    deposit_watch.unwatch_order(order_id)
+    user_cache.invalidate(telegram_id, inviter_id if inviter else None)
+    return {
+        "ok": True,
+        "telegram_id": telegram_id,
+        "plan_code": plan_code,
+        "language": user.get("language"),
+        "new_paid_until": new_paid_until,
+        "total_old": total_old,
+        "inviter": inviter,
+    }
+
+
+def get_success_orders_between(start: datetime, end: datetime) -> list[dict]:
+    # 范围早于归档窗口时连同归档月表一起读
+    return archive.read_recent(
+        "orders",
+        "id, telegram_id, addr, amount, plan_code, status, tx_id, created_at",
+        "status='success' AND created_at BETWEEN %s AND %s",
         (start, end),
+        "created_at DESC",
+        100000,
+        since=start,
+        until=end,
+    )
+
+
+def get_pending_order_refs(lookback_hours: int) -> list[dict]:
+    conn = get_conn()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(
+        """
+        SELECT id, addr, created_at FROM orders
+        WHERE status='pending'
+          AND created_at >= (UTC_TIMESTAMP() - INTERVAL %s HOUR)
+          AND addr IS NOT NULL AND addr<>''
+        """,
+        (int(lookback_hours),),
     )
     rows = cur.fetchall() or []
     cur.close()
@@ -859,6 +1226,25 @@ def get_success_orders_between(start: datetime, end: datetime) -> list[dict]:
     return rows
 
 
+def get_wallet_addrs(shard_index: int = 0, shard_count: int = 1) -> list[str]:
+    """
+    已分配给用户的收款地址；shard_count>1 时只返回 CRC32(addr) % shard_count == shard_index 的地址（与 zlib.crc32 一致）
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    if int(shard_count) > 1:
+        cur.execute(
+            "SELECT DISTINCT wallet_addr FROM users WHERE wallet_addr IS NOT NULL AND wallet_addr<>'' AND CRC32(wallet_addr) %% %s = %s",
+            (int(shard_count), int(shard_index)),
+        )
+    else:
+        cur.execute("SELECT DISTINCT wallet_addr FROM users WHERE wallet_addr IS NOT NULL AND wallet_addr<>''")
+    rows = cur.fetchall() or []
+    cur.close()
+    conn.close()
+    return [str(r[0]) for r in rows if r and r[0]]
+
+
 def get_all_users() -> list[dict]:
     conn = get_conn()
     cur = conn.cursor(dictionary=True)
@@ -899,6 +1285,7 @@ def add_invite_reward(inviter_id: int, reward_days: int, invitee_id: int):
         pass
     cur.close()
     conn.close()
+    user_cache.invalidate(inviter_id)
 
 
 def _safe_user_col(col: str) -> str | None:
@@ -913,12 +1300,16 @@ def _safe_user_col(col: str) -> str | None:
     return c if c in allow else None
 
 
-def get_unhandled_expired_users(now: datetime) -> list[dict]:
+# 到期处理 / 提醒 / 召回任务只需要这几列，不拉整行用户数据
+_UserNoticeRow = row_type("UserNoticeRow", ("telegram_id", "language", "paid_until", "is_whitelisted"))
+
+
+def get_unhandled_expired_users(now: datetime) -> list:
     conn = get_conn()
-    cur = conn.cursor(dictionary=True)
+    cur = conn.cursor()
     cur.execute(
-        """
-        SELECT * FROM users
+        f"""
+        SELECT {_UserNoticeRow.columns} FROM users
         WHERE paid_until IS NOT NULL
           AND paid_until <= %s
           AND (expired_handled_at IS NULL)
@@ -927,7 +1318,7 @@ def get_unhandled_expired_users(now: datetime) -> list[dict]:
         """,
         (now,),
     )
-    rows = cur.fetchall() or []
+    rows = fetch_rows(cur, _UserNoticeRow)
     cur.close()
     conn.close()
     return rows
@@ -939,17 +1330,18 @@ def mark_user_expired_handled(telegram_id: int, now: datetime):
     cur.execute("UPDATE users SET expired_handled_at=%s WHERE telegram_id=%s", (now, int(telegram_id)))
     cur.close()
     conn.close()
+    user_cache.invalidate(telegram_id)
 
 
-def get_users_expiring_within_days(now: datetime, days: int, reminded_col: str) -> list[dict]:
+def get_users_expiring_within_days(now: datetime, days: int, reminded_col: str) -> list:
     col = _safe_user_col(reminded_col)
     if not col:
         return []
     conn = get_conn()
-    cur = conn.cursor(dictionary=True)
+    cur = conn.cursor()
     cur.execute(
         f"""
-        SELECT * FROM users
+        SELECT {_UserNoticeRow.columns} FROM users
         WHERE paid_until IS NOT NULL
           AND paid_until > %s
           AND paid_until <= (%s + INTERVAL %s DAY)
@@ -959,21 +1351,21 @@ def get_users_expiring_within_days(now: datetime, days: int, reminded_col: str)
         """,
         (now, now, int(days)),
     )
-    rows = cur.fetchall() or []
+    rows = fetch_rows(cur, _UserNoticeRow)
     cur.close()
     conn.close()
     return rows
 
 
-def get_expired_users_for_recall(now: datetime, days_after: int, reminded_col: str) -> list[dict]:
+def get_expired_users_for_recall(now: datetime, days_after: int, reminded_col: str) -> list:
     col = _safe_user_col(reminded_col)
     if not col:
         return []
     conn = get_conn()
-    cur = conn.cursor(dictionary=True)
+    cur = conn.cursor()
     cur.execute(
         f"""
-        SELECT * FROM users
+        SELECT {_UserNoticeRow.columns} FROM users
         WHERE paid_until IS NOT NULL
           AND paid_until <= (%s - INTERVAL %s DAY)
           AND ({col} IS NULL)
@@ -982,7 +1374,7 @@ def get_expired_users_for_recall(now: datetime, days_after: int, reminded_col: s
         """,
         (now, int(days_after)),
     )
-    rows = cur.fetchall() or []
+    rows = fetch_rows(cur, _UserNoticeRow)
     cur.close()
     conn.close()
     return rows
@@ -997,6 +1389,7 @@ def mark_user_reminded(telegram_id: int, reminded_col: str, now: datetime):
     cur.execute(f"UPDATE users SET {col}=%s WHERE telegram_id=%s", (now, int(telegram_id)))
     cur.close()
     conn.close()
+    user_cache.invalidate(telegram_id)
 
 
 def redeem_access_code(code: str, telegram_id: int) -> tuple[bool, str | None, datetime | None, int]:
@@ -1036,7 +1429,8 @@ def redeem_access_code(code: str, telegram_id: int) -> tuple[bool, str | None, d
     cur2.close()
     cur.close()
     conn.close()
-    u = get_user(telegram_id) or {}
+    user_cache.invalidate(telegram_id)
+    u = get_user(telegram_id, fresh=True) or {}
     old_paid_until = u.get("paid_until")
     base = _utc_now()
     if old_paid_until and old_paid_until > base:
@@ -1294,14 +1688,139 @@ def set_video_category(video_id: int, category_id: int):
 
 
 def record_video_view(telegram_id: int, video_id: int):
+    flush_video_views([(int(telegram_id), int(video_id), _utc_now())])
+
+
+def flush_video_views(views: list[tuple[int, int, datetime]]) -> int:
+    """
+    批量写入观看记录（单事务）：明细行、按小时 / 按天汇总、videos.view_count 增量一起提交。
+    views 为 [(telegram_id, video_id, 观看时间 UTC)]；汇总与计数按 video_id 排序更新，多进程同时写时加锁顺序一致
+    """
+    rows = [(int(t), int(v), ts) for t, v, ts in views if int(v or 0) > 0]
+    if not rows:
+        return 0
+    hourly: dict[tuple[int, datetime], int] = {}
+    daily: dict[tuple[int, object], int] = {}
+    per_video: dict[int, int] = {}
+    for _, vid, ts in rows:
+        hour = ts.replace(minute=0, second=0, microsecond=0)
+        hourly[(vid, hour)] = hourly.get((vid, hour), 0) + 1
+        daily[(vid, hour.date())] = daily.get((vid, hour.date()), 0) + 1
+        per_video[vid] = per_video.get(vid, 0) + 1
+    conn = get_conn()
+    try:
+        conn.start_transaction()
+        cur = conn.cursor()
+        cur.executemany("INSERT INTO video_views (telegram_id, video_id, created_at) VALUES (%s,%s,%s)", rows)
+        cur.executemany(
+            """
+            INSERT INTO video_view_hourly (video_id, hour_at, views) VALUES (%s,%s,%s)
+            ON DUPLICATE KEY UPDATE views=views+VALUES(views)
+            """,
+            [(vid, hour, n) for (vid, hour), n in sorted(hourly.items())],
+        )
+        cur.executemany(
+            """
+            INSERT INTO video_view_daily (video_id, day, views) VALUES (%s,%s,%s)
+            ON DUPLICATE KEY UPDATE views=views+VALUES(views)
+            """,
+            [(vid, day, n) for (vid, day), n in sorted(daily.items())],
+        )
+        cur.executemany(
+            "UPDATE videos SET view_count=view_count+%s WHERE id=%s",
+            [(n, vid) for vid, n in sorted(per_video.items())],
+        )
+        conn.commit()
+        cur.close()
+        return len(rows)
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        conn.close()
+
+
+def refresh_hot_videos(top_n: int, window_days: int) -> tuple[int, int]:
+    """
+    按最近 window_days 天的日汇总取播放量前 top_n 的视频标为热门；只改动标记有变化的行，返回 (新增, 取消) 数量
+    """
+    since = (_utc_now() - timedelta(days=max(1, int(window_days)))).date()
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT video_id FROM video_view_daily
+        WHERE day >= %s
+        GROUP BY video_id
+        ORDER BY SUM(views) DESC
+        LIMIT %s
+        """,
+        (since, max(1, int(top_n))),
+    )
+    hot = {int(r[0]) for r in (cur.fetchall() or [])}
+    cur.execute("SELECT id FROM videos WHERE is_hot=1")
+    current = {int(r[0]) for r in (cur.fetchall() or [])}
+    added = sorted(hot - current)
+    removed = sorted(current - hot)
+    if added:
+        cur.execute(f"UPDATE videos SET is_hot=1 WHERE id IN ({','.join(['%s'] * len(added))})", tuple(added))
+    if removed:
+        cur.execute(f"UPDATE videos SET is_hot=0 WHERE id IN ({','.join(['%s'] * len(removed))})", tuple(removed))
+    cur.close()
+    conn.close()
+    return len(added), len(removed)
+
+
+def _video_views_cutoff_id(cur, before: datetime) -> int:
+    """
+    created_at < before 的最大主键（没有则 0）。video_views 没有以 created_at 开头的索引，
+    利用主键自增与 created_at 同序在主键上二分，每步一次主键定位
+    """
+    cur.execute("SELECT MIN(id), MAX(id) FROM video_views")
+    row = cur.fetchone()
+    if not row or row[0] is None:
+        return 0
+    lo, hi = int(row[0]), int(row[1])
+    found = 0
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        cur.execute("SELECT id, created_at FROM video_views WHERE id >= %s ORDER BY id LIMIT 1", (mid,))
+        r = cur.fetchone()
+        if not r:
+            hi = mid - 1
+        elif r[1] is not None and r[1] < before:
+            found = int(r[0])
+            lo = int(r[0]) + 1
+        else:
+            hi = mid - 1
+    return found
+
+
+def prune_video_views(retention_days: int, hourly_retention_days: int, batch: int = 20000) -> int:
+    """
+    删除超过保留期的观看明细和小时汇总（日汇总长期保留）；先定出截止主键，再按主键区间分批删，
+    每批单独提交，只扫描、锁定要删的行，不阻塞 flush_video_views 的写入
+    """
     conn = get_conn()
     cur = conn.cursor()
+    removed = 0
+    cutoff_id = _video_views_cutoff_id(cur, _utc_now() - timedelta(days=max(1, int(retention_days))))
+    for _ in range(50 if cutoff_id else 0):
+        cur.execute("DELETE FROM video_views WHERE id <= %s ORDER BY id LIMIT %s", (cutoff_id, int(batch)))
+        n = int(cur.rowcount or 0)
+        removed += n
+        if n < int(batch):
+            break
     cur.execute(
-        "INSERT INTO video_views (telegram_id, video_id) VALUES (%s,%s)",
-        (int(telegram_id), int(video_id)),
+        "DELETE FROM video_view_hourly WHERE hour_at < (UTC_TIMESTAMP() - INTERVAL %s DAY) LIMIT 50000",
+        (max(1, int(hourly_retention_days)),),
     )
     cur.close()
     conn.close()
+    return removed
 
 
 def user_viewed_tags(telegram_id: int, limit: int = 200) -> list[dict]:
@@ -0,0 +1,87 @@
+# core/order_matcher.py
+# 待支付订单内存索引：每轮充值检查加载一次，按 (地址, 金额) 分桶，二分查找 eps 窗口内的订单。
+import bisect
+from datetime import datetime
+from decimal import Decimal
+
+_AMOUNT_SCALE = Decimal("100000000")  # orders.amount 为 DECIMAL(24,8)，按 1e-8 量化成整数
+
+
+def _amount_key(amount) -> int:
+    return int((Decimal(str(amount)) * _AMOUNT_SCALE).to_integral_value())
+
+
+def _order_sort_key(row: dict) -> tuple:
+    return (row.get("created_at") or datetime.min, int(row.get("id") or 0))
+
+
+class PendingOrderIndex:
+    def __init__(self, rows: list[dict], eps: Decimal, prefer_recent: bool = True):
+        self._eps_key = _amount_key(eps)
+        self._prefer_recent = bool(prefer_recent)
+        self._keys: dict[str, list[int]] = {}
+        self._buckets: dict[tuple[str, int], list[dict]] = {}
+        self._by_id: dict[int, tuple[str, int]] = {}
+        for r in rows:
+            addr = (r.get("addr") or "").strip()
+            oid = int(r.get("id") or 0)
+            if not addr or oid <= 0:
+                continue
+            try:
+                key = _amount_key(r.get("amount") or "0")
+            except Exception:
+                continue
+            self._buckets.setdefault((addr, key), []).append(r)
+            self._by_id[oid] = (addr, key)
+        for (addr, key), bucket in self._buckets.items():
+            bucket.sort(key=_order_sort_key)
+            self._keys.setdefault(addr, []).append(key)
+        for keys in self._keys.values():
+            keys.sort()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def _best_in_bucket(self, bucket: list[dict], tx_time: datetime | None) -> dict | None:
+        if not bucket:
+            return None
+        if tx_time is None:
+            return bucket[-1] if self._prefer_recent else bucket[0]
+        if self._prefer_recent:
+            i = bisect.bisect_right(bucket, (tx_time, float("inf")), key=_order_sort_key)
+            return bucket[i - 1] if i > 0 else None
+        first = bucket[0]
+        return first if _order_sort_key(first)[0] <= tx_time else None
+
+    def match(self, addr: str, amount, tx_time: datetime | None = None) -> dict | None:
+        """
+        找 |订单金额 - amount| <= eps 且创建时间不晚于 tx_time 的订单；
+        prefer_recent 时取最新的，否则取最早的（与 match_pending_order_by_amount_v2 语义一致）
+        """
+        keys = self._keys.get((addr or "").strip())
+        if not keys:
+            return None
+        k = _amount_key(amount)
+        lo = bisect.bisect_left(keys, k - self._eps_key)
+        hi = bisect.bisect_right(keys, k + self._eps_key)
+        best = None
+        for key in keys[lo:hi]:
+            cand = self._best_in_bucket(self._buckets.get((addr, key)) or [], tx_time)
+            if cand is None:
+                continue
+            if best is None:
+                best = cand
+            elif self._prefer_recent and _order_sort_key(cand) > _order_sort_key(best):
+                best = cand
+            elif not self._prefer_recent and _order_sort_key(cand) < _order_sort_key(best):
+                best = cand
+        return best
+
+    def discard(self, order_id: int):
+        ref = self._by_id.pop(int(order_id or 0), None)
+        if ref is None:
+            return
+        bucket = self._buckets.get(ref)
+        if not bucket:
+            return
+        bucket[:] = [r for r in bucket if int(r.get("id") or 0) != int(order_id)]
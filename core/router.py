@@ -0,0 +1,177 @@
+# core/router.py
+# 表驱动的 HTTP 路由：精确路径走 dict 一次查找，前缀路由（/uploads/、/api/webapp/ 等兜底）放在按 "/" 分段的前缀树里取最长匹配。
+# 每条路由带自己的中间件链（鉴权 / IP 白名单 / 上传端 token 等），按顺序执行，任一返回 False 即视为已响应并停止。
+# 分发时顺带按路由记录次数与耗时，供 /api/stats 查看。
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+
+class Request:
+    """
+    一次请求的路由上下文：query 按需解析，中间件可往上挂 user_data 等结果
+    """
+
+    __slots__ = ("method", "path", "query", "route", "user_data", "_qs")
+
+    def __init__(self, method: str, path: str, query: str, route: "Route"):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.route = route
+        self.user_data: dict | None = None
+        self._qs: dict | None = None
+
+    @property
+    def qs(self) -> dict:
+        if self._qs is None:
+            self._qs = parse_qs(self.query) if self.query else {}
+        return self._qs
+
+    def arg(self, name: str, default: str = "") -> str:
+        return self.qs.get(name, [default])[0] or default
+
+    def int_arg(self, name: str, default: int = 0) -> int:
+        return int(self.arg(name, str(default)))
+
+
+class Route:
+    __slots__ = ("method", "path", "fn", "middleware", "prefix", "name", "count", "denied", "errors", "ms_total", "ms_max")
+
+    def __init__(self, method: str, path: str, fn, middleware: tuple, prefix: bool):
+        self.method = method
+        self.path = path
+        self.fn = fn
+        self.middleware = tuple(middleware or ())
+        self.prefix = prefix
+        self.name = f"{method} {path}{'*' if prefix else ''}"
+        self.count = 0
+        self.denied = 0
+        self.errors = 0
+        self.ms_total = 0.0
+        self.ms_max = 0.0
+
+
+class _Node:
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children: dict[str, "_Node"] = {}
+        self.route: Route | None = None
+
+
+def _segments(path: str) -> list[str]:
+    return [s for s in path.split("/") if s]
+
+
+class Router:
+    def __init__(self):
+        self._exact: dict[tuple[str, str], Route] = {}
+        self._trees: dict[str, _Node] = {}
+        self._routes: list[Route] = []
+        self._lock = threading.Lock()
+
+    def add(self, method: str, path: str, fn, middleware=(), prefix: bool = False, head: bool = False) -> Route:
+        """
+        prefix=True 时匹配所有以 path 开头的路径（path 以 "/" 结尾）；head=True 时同一处理函数也响应 HEAD，
+        由 Handler 负责在 HEAD 下只发响应头
+        """
+        methods = [method, "HEAD"] if head and method == "GET" else [method]
+        route = None
+        for m in methods:
+            route = Route(m, path, fn, middleware, prefix)
+            if prefix:
+                node = self._trees.setdefault(m, _Node())
+                for seg in _segments(path):
+                    node = node.children.setdefault(seg, _Node())
+                if node.route is not None:
+                    raise ValueError(f"duplicate route {route.name}")
+                node.route = route
+            else:
+                if (m, path) in self._exact:
+                    raise ValueError(f"duplicate route {route.name}")
+                self._exact[(m, path)] = route
+            self._routes.append(route)
+        return route
+
+    def route(self, method: str, path: str, middleware=(), prefix: bool = False, head: bool = False):
+        def deco(fn):
+            self.add(method, path, fn, middleware, prefix=prefix, head=head)
+            return fn
+
+        return deco
+
+    def match(self, method: str, path: str) -> Route | None:
+        route = self._exact.get((method, path))
+        if route is not None:
+            return route
+        node = self._trees.get(method)
+        if node is None:
+            return None
+        # 沿前缀树向下走，记下途经的前缀路由，取最长且确实是 path 前缀的那个（"/webapp/" 不能匹配 "/webapp"）
+        seen = [node.route] if node.route is not None else []
+        for seg in _segments(path):
+            node = node.children.get(seg)
+            if node is None:
+                break
+            if node.route is not None:
+                seen.append(node.route)
+        for r in reversed(seen):
+            if path.startswith(r.path):
+                return r
+        return None
+
+    def dispatch(self, handler) -> bool:
+        """
+        按 handler.command / handler.path 分发；没有匹配的路由返回 False
+        """
+        u = urlparse(handler.path)
+        route = self.match(handler.command, u.path)
+        if route is None:
+            return False
+        req = Request(handler.command, u.path, u.query, route)
+        started = time.perf_counter()
+        denied = False
+        failed = False
+        try:
+            for mw in route.middleware:
+                if not mw(handler, req):
+                    denied = True
+                    return True
+            route.fn(handler, req)
+            return True
+        except Exception:
+            failed = True
+            raise
+        finally:
+            ms = (time.perf_counter() - started) * 1000.0
+            with self._lock:
+                route.count += 1
+                route.ms_total += ms
+                if ms > route.ms_max:
+                    route.ms_max = ms
+                if denied:
+                    route.denied += 1
+                if failed:
+                    route.errors += 1
+
+    def stats(self, top: int = 30) -> list[dict]:
+        """
+        按累计耗时排序的路由统计（只列被请求过的路由）
+        """
+        with self._lock:
+            rows = [
+                {
+                    "route": r.name,
+                    "count": r.count,
+                    "denied": r.denied,
+                    "errors": r.errors,
+                    "ms_total": round(r.ms_total, 1),
+                    "ms_avg": round(r.ms_total / r.count, 2),
+                    "ms_max": round(r.ms_max, 1),
+                }
+                for r in self._routes
+                if r.count
+            ]
+        rows.sort(key=lambda x: x["ms_total"], reverse=True)
+        return rows[: int(top)]
@@ -0,0 +1,61 @@
+# core/rows.py
+# 热点查询的行对象：SELECT 显式列清单 + 普通（元组）游标，每行构造一个 __slots__ 对象，
+# 不再为每行建 dict。对调用方保持 dict 的读法（row["col"] / row.get("col")）。
+
+
+class _Row:
+    __slots__ = ()
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self.__slots__
+
+    def keys(self) -> tuple:
+        return self.__slots__
+
+    def items(self) -> list[tuple]:
+        return [(k, getattr(self, k)) for k in self.__slots__]
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, _Row):
+            return self.items() == other.items()
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+
+def row_type(name: str, cols: tuple[str, ...]) -> type:
+    """
+    生成一个行类型：字段与 cols 一一对应，构造参数顺序与 SELECT 列顺序一致
+    """
+    cols = tuple(cols)
+    if not cols or not all(c.isidentifier() for c in cols):
+        raise ValueError(f"bad columns: {cols}")
+    # 与 dataclasses / namedtuple 相同做法：生成按位置赋值的 __init__，比逐列 setattr 快
+    ns: dict = {}
+    body = "\n".join(f"    self.{c} = {c}" for c in cols)
+    exec(f"def __init__(self, {', '.join(cols)}):\n{body}\n", ns)
+    cls = type(name, (_Row,), {"__slots__": cols, "__init__": ns["__init__"]})
+    cls.columns = ", ".join(cols)
+    return cls
+
+
+def fetch_rows(cur, row_cls: type) -> list:
+    return [row_cls(*r) for r in (cur.fetchall() or [])]
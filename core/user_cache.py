@@ -0,0 +1,91 @@
+# core/user_cache.py
+# users 行的进程内 LRU + TTL 缓存，供 core.models.get_user 读穿透使用。
+# 本进程内的写操作（models / admin_web）写后立即失效；其它进程的修改最多在 USER_CACHE_TTL_SEC 秒后可见。
+import threading
+import time
+from collections import OrderedDict
+
+from config import USER_CACHE_SIZE, USER_CACHE_TTL_SEC
+
+_lock = threading.Lock()
+_rows: OrderedDict[int, tuple[float, dict | None]] = OrderedDict()
+_epoch = 0
+_stats = {"hits": 0, "misses": 0, "fills": 0, "stale_fills": 0, "invalidations": 0, "evictions": 0}
+
+
+def enabled() -> bool:
+    return int(USER_CACHE_SIZE) > 0 and int(USER_CACHE_TTL_SEC) > 0
+
+
+def get(telegram_id: int) -> tuple[bool, dict | None]:
+    """
+    返回 (是否命中, 行)；行为 None 表示缓存了“用户不存在”
+    """
+    key = int(telegram_id)
+    now = time.monotonic()
+    with _lock:
+        ent = _rows.get(key)
+        if ent is None or ent[0] <= now:
+            if ent is not None:
+                _rows.pop(key, None)
+            _stats["misses"] += 1
+            return False, None
+        _rows.move_to_end(key)
+        _stats["hits"] += 1
+        row = ent[1]
+    return True, (dict(row) if row is not None else None)
+
+
+def begin() -> int:
+    """
+    读库前取一个令牌；读库期间发生过失效时 put 会丢弃这次结果，避免把旧数据写回缓存
+    """
+    with _lock:
+        return _epoch
+
+
+def put(telegram_id: int, row: dict | None, token: int):
+    key = int(telegram_id)
+    with _lock:
+        if token != _epoch:
+            _stats["stale_fills"] += 1
+            return
+        _rows[key] = (time.monotonic() + float(USER_CACHE_TTL_SEC), dict(row) if row is not None else None)
+        _rows.move_to_end(key)
+        _stats["fills"] += 1
+        while len(_rows) > int(USER_CACHE_SIZE):
+            _rows.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def invalidate(*telegram_ids):
+    global _epoch
+    with _lock:
+        _epoch += 1
+        for tid in telegram_ids:
+            if tid is None:
+                continue
+            try:
+                _rows.pop(int(tid), None)
+            except (TypeError, ValueError):
+                continue
+            _stats["invalidations"] += 1
+
+
+def clear():
+    global _epoch
+    with _lock:
+        _epoch += 1
+        _rows.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        s = dict(_stats)
+        size = len(_rows)
+    lookups = s["hits"] + s["misses"]
+    s["size"] = size
+    s["capacity"] = int(USER_CACHE_SIZE)
+    s["ttl_sec"] = int(USER_CACHE_TTL_SEC)
+    s["hit_rate"] = round(s["hits"] / lookups, 4) if lookups else 0.0
+    return s
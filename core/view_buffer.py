@@ -0,0 +1,101 @@
+# core/view_buffer.py
+# 视频观看记录的进程内缓冲：track_view 只追加到内存，后台线程每 VIDEO_VIEW_FLUSH_SEC 秒
+# （或攒满一批时提前）调用 models.flush_video_views 批量落库。写库失败时保留在缓冲里下次重试，
+# 缓冲超过 VIDEO_VIEW_BUFFER_MAX 条后丢弃新记录并计数；进程正常退出时再刷一次。
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from config import VIDEO_VIEW_BUFFER_MAX, VIDEO_VIEW_FLUSH_SEC
+from core.models import flush_video_views, record_video_view
+import logging
+logger = logging.getLogger(__name__)
+
+_BATCH = 1000
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wake = threading.Event()
+_buf: list[tuple[int, int, datetime]] = []
+_thread: threading.Thread | None = None
+_stats = {"added": 0, "flushed": 0, "dropped": 0, "flushes": 0, "errors": 0, "last_flush_ms": 0.0}
+
+
+def enabled() -> bool:
+    return float(VIDEO_VIEW_FLUSH_SEC) > 0
+
+
+def add(telegram_id: int, video_id: int):
+    """
+    记录一次观看；缓冲关闭时直接写库
+    """
+    if not enabled():
+        record_video_view(telegram_id, video_id)
+        return
+    _ensure_thread()
+    with _lock:
+        if len(_buf) >= int(VIDEO_VIEW_BUFFER_MAX):
+            _stats["dropped"] += 1
+            return
+        _buf.append((int(telegram_id), int(video_id), datetime.utcnow()))
+        _stats["added"] += 1
+        full = len(_buf) >= _BATCH
+    if full:
+        _wake.set()
+
+
+def flush() -> int:
+    with _flush_lock:
+        with _lock:
+            batch = _buf[:]
+            _buf.clear()
+        if not batch:
+            return 0
+        started = time.perf_counter()
+        try:
+            n = flush_video_views(batch)
+        except Exception as e:
+            with _lock:
+                # 放回队首按原顺序重试，超出上限的部分丢弃
+                room = max(0, int(VIDEO_VIEW_BUFFER_MAX) - len(_buf))
+                _buf[:0] = batch[:room]
+                _stats["dropped"] += len(batch) - min(room, len(batch))
+                _stats["errors"] += 1
+            logger.warning(f"[view_buffer] 观看记录落库失败 pending={len(batch)}: {e}")
+            return 0
+        with _lock:
+            _stats["flushed"] += n
+            _stats["flushes"] += 1
+            _stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+        return n
+
+
+def _loop():
+    while True:
+        _wake.wait(float(VIDEO_VIEW_FLUSH_SEC))
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("[view_buffer] flush loop error")
+
+
+def _ensure_thread():
+    global _thread
+    if _thread is not None:
+        return
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_loop, name="view-buffer", daemon=True)
+            _thread.start()
+            atexit.register(flush)
+
+
+def stats() -> dict:
+    with _lock:
+        s = dict(_stats)
+        s["pending"] = len(_buf)
+    s["flush_sec"] = float(VIDEO_VIEW_FLUSH_SEC)
+    s["capacity"] = int(VIDEO_VIEW_BUFFER_MAX)
+    return s
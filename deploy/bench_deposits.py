@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+# 充值链路端到端基准：本地假 TronGrid + 临时 MySQL 库（init_tables 建表），
+# 反复执行 check_deposits_job，统计 ticks/s、credits/s、每笔入账的 DB 往返次数、入账延迟 p50/p99。
+# 会清空目标库里的 users/orders/usdt_txs 等表，只能指向专用的基准库。
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_BENCH_TABLES = ["orders", "usdt_txs", "tron_cursors", "outbound_messages", "address_pool", "users", "admin_audit"]
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = int(round((len(s) - 1) * p))
+    return s[max(0, min(len(s) - 1, k))]
+
+
+class _Counter:
+    def __init__(self):
+        self.conns = 0
+        self.queries = 0
+        self.enabled = False
+
+
+class _CountingCursor:
+    def __init__(self, cur, counter: _Counter):
+        self._cur = cur
+        self._counter = counter
+
+    def execute(self, *a, **kw):
+        if self._counter.enabled:
+            self._counter.queries += 1
+        return self._cur.execute(*a, **kw)
+
+    def executemany(self, *a, **kw):
+        if self._counter.enabled:
+            self._counter.queries += 1
+        return self._cur.executemany(*a, **kw)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+
+class _CountingConn:
+    def __init__(self, conn, counter: _Counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *a, **kw):
+        return _CountingCursor(self._conn.cursor(*a, **kw), self._counter)
+
+    def commit(self):
+        if self._counter.enabled:
+            self._counter.queries += 1
+        return self._conn.commit()
+
+    def rollback(self):
+        if self._counter.enabled:
+            self._counter.queries += 1
+        return self._conn.rollback()
+
+    def start_transaction(self, *a, **kw):
+        if self._counter.enabled:
+            self._counter.queries += 1
+        return self._conn.start_transaction(*a, **kw)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _install_db_counter(counter: _Counter):
+    """
+    统计 DB 连接借出次数和语句往返次数（只包装，不改变行为）
+    """
+    import core.db
+    import core.models
+
+    raw = core.db.get_conn
+
+    def counting_get_conn():
+        if counter.enabled:
+            counter.conns += 1
+        return _CountingConn(raw(), counter)
+
+    core.db.get_conn = counting_get_conn
+    core.models.get_conn = counting_get_conn
+    return raw
+
+
+def _seed(raw_get_conn, addrs: list[str], orders_per_addr: int, plan: dict) -> list[dict]:
+    conn = raw_get_conn()
+    cur = conn.cursor()
+    for table in _BENCH_TABLES:
+        cur.execute(f"DELETE FROM {table}")
+    users = [(900000000 + i, addr) for i, addr in enumerate(addrs)]
+    cur.executemany("INSERT INTO users (telegram_id, language, wallet_addr) VALUES (%s,'en',%s)", users)
+    cur.executemany(
+        "INSERT INTO address_pool (addr, assigned_to, assigned_at) VALUES (%s,%s,UTC_TIMESTAMP() - INTERVAL 1 DAY)",
+        [(addr, uid) for uid, addr in users],
+    )
+    cur.close()
+    conn.close()
+
+    from core.models import create_pending_order
+
+    orders = []
+    for uid, addr in users:
+        for j in range(max(1, orders_per_addr)):
+            amount = (Decimal(str(plan["price"])) + Decimal(j + 1) * Decimal("0.0001")).quantize(Decimal("0.000001"))
+            oid = create_pending_order(uid, addr, amount, plan["code"])
+            orders.append({"id": oid, "addr": addr, "amount": amount})
+    return orders
+
+
+def _success_ids(raw_get_conn, ids: list[int]) -> set[int]:
+    if not ids:
+        return set()
+    out: set[int] = set()
+    conn = raw_get_conn()
+    cur = conn.cursor()
+    for i in range(0, len(ids), 1000):
+        chunk = ids[i : i + 1000]
+        cur.execute(
+            "SELECT id FROM orders WHERE status='success' AND id IN (" + ",".join(["%s"] * len(chunk)) + ")",
+            tuple(chunk),
+        )
+        out.update(int(r[0]) for r in cur.fetchall() or [])
+    cur.close()
+    conn.close()
+    return out
+
+
+class _Ctx:
+    bot = None
+    job_queue = None
+
+
+async def _run(args, state, raw_get_conn, counter: _Counter, orders: list[dict]) -> dict:
+    from bot.scheduler import check_deposits_job
+    from chain.tron_client import aclose_async_client
+
+    rnd = random.Random(args.seed)
+    window = max(0.1, args.duration * 0.7)
+    schedule = sorted(((rnd.uniform(0, window), o) for o in orders), key=lambda x: x[0])
+    injected: dict[int, float] = {}
+    credited: dict[int, float] = {}
+    tick_ms: list[float] = []
+    ctx = _Ctx()
+
+    started = time.perf_counter()
+    busy = 0.0
+    si = 0
+    while True:
+        now = time.perf_counter() - started
+        if now >= args.duration and (len(credited) >= len(injected) or now >= args.duration * 2):
+            break
+        while si < len(schedule) and schedule[si][0] <= now:
+            o = schedule[si][1]
+            state.add_transfer(o["addr"], o["amount"])
+            injected[o["id"]] = time.perf_counter()
+            for _ in range(args.noise_per_transfer):
+                state.add_transfer(o["addr"], f"{rnd.uniform(0.1, 0.9):.2f}")
+            si += 1
+
+        counter.enabled = True
+        t0 = time.perf_counter()
+        await check_deposits_job(ctx)
+        dt = time.perf_counter() - t0
+        counter.enabled = False
+        busy += dt
+        tick_ms.append(dt * 1000.0)
+
+        done_at = time.perf_counter()
+        waiting = [oid for oid in injected if oid not in credited]
+        for oid in _success_ids(raw_get_conn, waiting):
+            credited[oid] = done_at
+        sleep = args.tick_interval - dt
+        if sleep > 0:
+            await asyncio.sleep(sleep)
+
+    elapsed = time.perf_counter() - started
+    await aclose_async_client()
+    ttc = [credited[oid] - injected[oid] for oid in credited]
+    n = max(1, len(credited))
+    return {
+        "addrs": args.addrs,
+        "orders": len(orders),
+        "injected": len(injected),
+        "credited": len(credited),
+        "elapsed_sec": round(elapsed, 2),
+        "ticks": len(tick_ms),
+        "ticks_per_sec": round(len(tick_ms) / max(busy, 1e-9), 2),
+        "tick_p50_ms": round(_percentile(tick_ms, 0.5), 1),
+        "tick_p99_ms": round(_percentile(tick_ms, 0.99), 1),
+        "credits_per_sec": round(len(credited) / max(busy, 1e-9), 2),
+        "db_queries_total": counter.queries,
+        "db_queries_per_credit": round(counter.queries / n, 2),
+        "db_conns_per_credit": round(counter.conns / n, 2),
+        "ttc_p50_sec": round(_percentile(ttc, 0.5), 3),
+        "ttc_p99_sec": round(_percentile(ttc, 0.99), 3),
+        "ttc_mean_sec": round(statistics.mean(ttc), 3) if ttc else 0.0,
+        "trongrid_requests": state.requests,
+        "trongrid_429": state.throttled,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-name", required=True, help="专用基准库（会被清空），需事先 CREATE DATABASE")
+    ap.add_argument("--yes-wipe", action="store_true", help="确认清空基准库里的业务表")
+    ap.add_argument("--addrs", type=int, default=200)
+    ap.add_argument("--orders-per-addr", type=int, default=1)
+    ap.add_argument("--noise-per-transfer", type=int, default=2, help="每笔订单转账附带的无关小额转账数")
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--tick-interval", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    if not args.yes_wipe:
+        raise SystemExit("refusing to run without --yes-wipe (the target database is wiped)")
+
+    from fake_trongrid import FakeTronGridState, fake_addr, start_server
+
+    state = FakeTronGridState(args.latency_ms, args.rate_429)
+    srv = start_server(state)
+    os.environ.update(
+        {
+            "DB_NAME": args.db_name,
+            "TRONGRID_API_BASE": f"http://127.0.0.1:{srv.server_address[1]}",
+            "TRONGRID_API_KEYS": "",
+            "TRONGRID_API_KEY": "",
+            "TRONGRID_KEY_RATE": "1000",
+            "TRONGRID_CACHE_TTL_SEC": "0",
+            "PAYMENT_MODE": "address_pool",
+            "MIN_TX_AGE_SEC": "0",
+            "DEPOSIT_INGEST_MODE": "poll",
+        }
+    )
+
+    from config import PLANS
+    from core.models import init_tables
+
+    counter = _Counter()
+    raw_get_conn = _install_db_counter(counter)
+    init_tables()
+    addrs = [fake_addr(i) for i in range(max(1, args.addrs))]
+    orders = _seed(raw_get_conn, addrs, args.orders_per_addr, PLANS[-1])
+    try:
+        out = asyncio.run(_run(args, state, raw_get_conn, counter, orders))
+    finally:
+        srv.shutdown()
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
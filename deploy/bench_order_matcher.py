@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.order_matcher import PendingOrderIndex
+
+
+def _linear_match(rows: list[dict], amount: Decimal, eps: Decimal, tx_time: datetime | None) -> dict | None:
+    # 与 match_pending_order_by_amount_v2 的 Python 扫描一致（rows 已按 created_at DESC 排序）
+    for r in rows:
+        if tx_time and r["created_at"] > tx_time:
+            continue
+        oa = Decimal(str(r.get("amount") or "0"))
+        if abs(oa - amount) <= eps:
+            return r
+    return None
+
+
+def _make_orders(n: int, addr: str, now: datetime) -> list[dict]:
+    bases = [Decimal("1.99"), Decimal("3.99"), Decimal("15.99")]
+    rows = []
+    for i in range(n):
+        suffix = Decimal(random.randint(1, 99)) * Decimal("0.0001") + Decimal(random.randint(0, 99)) * Decimal("0.000001")
+        rows.append(
+            {
+                "id": i + 1,
+                "telegram_id": 100000 + i,
+                "addr": addr,
+                "amount": (random.choice(bases) + suffix).quantize(Decimal("0.000001")),
+                "plan_code": "monthly",
+                "created_at": now - timedelta(seconds=random.randint(0, 72 * 3600)),
+            }
+        )
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--orders", type=int, default=10000)
+    ap.add_argument("--txs", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    random.seed(args.seed)
+    addr = "TBenchAddrxxxxxxxxxxxxxxxxxxxxxxxx"
+    eps = Decimal("0.000001")
+    now = datetime.utcnow()
+    rows = _make_orders(max(1, args.orders), addr, now)
+    rows_desc = sorted(rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)
+
+    txs = []
+    for _ in range(max(1, args.txs)):
+        if random.random() < 0.8:
+            txs.append((random.choice(rows)["amount"], now))
+        else:
+            txs.append((Decimal("9.123457"), now))
+
+    t0 = time.perf_counter()
+    linear = [_linear_match(rows_desc, a, eps, t) for a, t in txs]
+    linear_sec = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    index = PendingOrderIndex(rows, eps, prefer_recent=True)
+    build_sec = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    indexed = [index.match(addr, a, t) for a, t in txs]
+    index_sec = time.perf_counter() - t0
+
+    mismatches = sum(1 for a, b in zip(linear, indexed) if (a or {}).get("id") != (b or {}).get("id"))
+    out = {
+        "orders": len(rows),
+        "txs": len(txs),
+        "linear_total_ms": round(linear_sec * 1000.0, 2),
+        "linear_per_tx_us": round(linear_sec / len(txs) * 1e6, 2),
+        "index_build_ms": round(build_sec * 1000.0, 2),
+        "index_total_ms": round(index_sec * 1000.0, 2),
+        "index_per_tx_us": round(index_sec / len(txs) * 1e6, 2),
+        "speedup": round(linear_sec / max(index_sec, 1e-9), 1),
+        "mismatches": mismatches,
+    }
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
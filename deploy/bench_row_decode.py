@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# 热点查询行解码对比：SELECT * + dictionary 游标 vs 显式列清单 + __slots__ 行对象。
+# 默认用合成数据测每行分配字节数和构造耗时；--db-name 时对真实库执行各热点查询，
+# 额外用 SHOW SESSION STATUS 的 Bytes_sent 统计每次调用服务端发出的字节数（只读，不改数据）。
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_USER_COLS = (
+    "telegram_id", "username", "language", "paid_until", "total_received", "last_plan", "wallet_addr",
+    "inviter_id", "invite_count", "invite_reward_days", "pending_coupon", "first_source", "last_source",
+    "last_source_at", "is_blacklisted", "is_whitelisted", "note", "expired_handled_at", "remind_7d_at",
+    "remind_3d_at", "remind_1d_at", "expired_recall_3d_at", "expired_recall_7d_at", "created_at",
+)
+
+
+def _synthetic_user(i: int) -> tuple:
+    now = datetime.utcnow()
+    return (
+        900000000 + i, f"user_{i}", "en", now - timedelta(days=i % 40), Decimal("15.99000000"), "yearly",
+        f"TFake{i:029d}", None, i % 7, 0, None, "ref", "ref", now, 0, 0, None, None, None, None, None,
+        None, None, now - timedelta(days=400),
+    )
+
+
+def _measure(label: str, build, rows: list[tuple], repeat: int) -> dict:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    out = build(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del out
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        build(rows)
+    dt = (time.perf_counter() - t0) / max(1, repeat)
+    n = max(1, len(rows))
+    return {"case": label, "bytes_per_row": round((after - before) / n, 1), "us_per_row": round(dt * 1e6 / n, 3)}
+
+
+def run_synthetic(n: int, repeat: int) -> list[dict]:
+    from core.rows import row_type
+
+    notice_cols = ("telegram_id", "language", "paid_until", "is_whitelisted")
+    idx = [_USER_COLS.index(c) for c in notice_cols]
+    wide = [_synthetic_user(i) for i in range(n)]
+    narrow = [tuple(r[j] for j in idx) for r in wide]
+    Row = row_type("UserNoticeRow", notice_cols)
+    return [
+        _measure("select * / dict", lambda rows: [dict(zip(_USER_COLS, r)) for r in rows], wide, repeat),
+        _measure("columns / dict", lambda rows: [dict(zip(notice_cols, r)) for r in rows], narrow, repeat),
+        _measure("columns / tuple", lambda rows: list(rows), narrow, repeat),
+        _measure("columns / slots row", lambda rows: [Row(*r) for r in rows], narrow, repeat),
+    ]
+
+
+def _bytes_sent(cur) -> int:
+    cur.execute("SHOW SESSION STATUS LIKE 'Bytes_sent'")
+    return int(cur.fetchone()[1])
+
+
+def _run_case(conn, stat, sql: str, params: tuple, decode, calls: int) -> tuple[int, int, int, float]:
+    sent = 0
+    rows = 0
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        b0 = _bytes_sent(stat)
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = len(decode(cur))
+        cur.close()
+        sent += _bytes_sent(stat) - b0
+    ms = (time.perf_counter() - t0) * 1000.0 / max(1, calls)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, round(sent / max(1, calls)), peak, round(ms, 2)
+
+
+def run_db(calls: int) -> list[dict]:
+    from core.db import get_conn
+    from core import models
+    from core.rows import fetch_rows
+
+    now = datetime.utcnow()
+    conn = get_conn()
+    stat = conn.cursor()
+    stat.execute("SELECT addr FROM usdt_txs ORDER BY created_at DESC LIMIT 1")
+    row = stat.fetchone()
+    addr = row[0] if row else ""
+
+    cases = [
+        (
+            "get_unhandled_expired_users",
+            models._UserNoticeRow,
+            "FROM users WHERE paid_until IS NOT NULL AND paid_until <= %s AND (expired_handled_at IS NULL) ORDER BY paid_until ASC LIMIT 5000",
+            (now,),
+        ),
+        (
+            "get_unassigned_usdt_txs",
+            models._UnassignedTxRow,
+            "FROM usdt_txs WHERE addr=%s AND (telegram_id IS NULL OR telegram_id=0) AND (block_time IS NULL OR block_time <= %s) "
+            "AND status IN ('seen','unmatched') ORDER BY created_at DESC LIMIT 200",
+            (addr, now),
+        ),
+        (
+            "get_pending_orders_for_match",
+            models._PendingOrderRow,
+            "FROM orders WHERE addr IN (%s) AND status='pending' AND created_at >= (UTC_TIMESTAMP() - INTERVAL %s HOUR)",
+            (addr, 72),
+        ),
+    ]
+
+    def _dict_rows(cur):
+        names = cur.column_names
+        return [dict(zip(names, r)) for r in (cur.fetchall() or [])]
+
+    out = []
+    for name, row_cls, tail, params in cases:
+        rows, wide_bytes, wide_peak, wide_ms = _run_case(conn, stat, "SELECT * " + tail, params, _dict_rows, calls)
+        _, cols_bytes, cols_peak, cols_ms = _run_case(
+            conn, stat, f"SELECT {row_cls.columns} " + tail, params, lambda cur: fetch_rows(cur, row_cls), calls
+        )
+        out.append(
+            {
+                "query": name,
+                "rows": rows,
+                "bytes_per_call": {"select_star_dict": wide_bytes, "columns_slots": cols_bytes},
+                "peak_alloc_bytes": {"select_star_dict": wide_peak, "columns_slots": cols_peak},
+                "ms_per_call": {"select_star_dict": wide_ms, "columns_slots": cols_ms},
+            }
+        )
+    stat.close()
+    conn.close()
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000, help="合成数据行数")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--db-name", default="", help="对该库执行真实查询（只读）；为空只跑合成数据")
+    ap.add_argument("--calls", type=int, default=20)
+    args = ap.parse_args()
+
+    out = {"synthetic": run_synthetic(max(1, args.rows), max(1, args.repeat))}
+    if args.db_name:
+        os.environ["DB_NAME"] = args.db_name
+        out["db"] = run_db(max(1, args.calls))
+    print(json.dumps(out, ensure_ascii=False, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
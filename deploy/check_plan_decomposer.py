@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import random
+import sys
+from decimal import Decimal
+
+# PlanDecomposer 回归检查：随机套餐 + 随机金额，与穷举结果逐个比较（两种 objective 都查），有不一致即以退出码 1 失败。
+# 金额覆盖表内、周期起点附近和远超表长（按周期折算）的情况。
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.payments import PlanDecomposer
+
+_UNIT = Decimal("0.01")
+
+
+def _score(objective: str, days: int, spent: int) -> tuple[int, int]:
+    return (days, spent) if objective == "days" else (spent, days)
+
+
+def _brute(weights: list[int], days: list[int], cap: int, objective: str) -> tuple[int, int]:
+    """
+    枚举前 n-1 个套餐的份数，最后一个套餐取满（份数越多天数和花费都越大，对两个目标都最优）
+    """
+    best = (0, 0)
+
+    def walk(i: int, left: int, d: int):
+        nonlocal best
+        if i == len(weights) - 1:
+            k = left // weights[i]
+            cand = _score(objective, d + k * days[i], cap - left + k * weights[i])
+            if cand > best:
+                best = cand
+            return
+        for k in range(left // weights[i] + 1):
+            walk(i + 1, left - k * weights[i], d + k * days[i])
+
+    walk(0, cap, 0)
+    return best
+
+
+def _random_plans(rnd: random.Random) -> list[dict]:
+    n = rnd.choice((2, 2, 3))
+    lo = 1 if n == 2 else 8
+    return [
+        {"code": f"p{i}", "price": str(Decimal(rnd.randint(lo, 600)) * _UNIT), "days": rnd.randint(1, 400)}
+        for i in range(n)
+    ]
+
+
+def _check(plans: list[dict], caps: list[int], failures: list, checked: list):
+    weights = [int(Decimal(p["price"]) / _UNIT) for p in plans]
+    days = [int(p["days"]) for p in plans]
+    for objective in ("days", "remainder"):
+        d = PlanDecomposer(plans, objective)
+        for cap in caps:
+            counts, rest = d.decompose(Decimal(cap) * _UNIT, Decimal(0))
+            got_days = sum(int(p["days"]) * counts.get(p["code"], 0) for p in plans)
+            got = _score(objective, got_days, cap - int(rest / _UNIT))
+            want = _brute(weights, days, cap, objective)
+            checked[0] += 1
+            if got != want:
+                failures.append({"plans": plans, "objective": objective, "amount": str(Decimal(cap) * _UNIT), "got": got, "want": want})
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cases", type=int, default=300, help="随机套餐组数")
+    ap.add_argument("--amounts", type=int, default=40, help="每组套餐检查的金额个数")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    rnd = random.Random(args.seed)
+    failures: list = []
+    checked = [0]
+
+    # 已知反例：remainder 目标下天数总和曾溢出打包值的低位
+    _check([{"code": "p1", "price": "5.13", "days": 279}, {"code": "p2", "price": "0.04", "days": 83}], [1478, 5000, 12345], failures, checked)
+    for _ in range(int(args.cases)):
+        plans = _random_plans(rnd)
+        w = [int(Decimal(p["price"]) / _UNIT) for p in plans]
+        period = (min(w) - 1) * max(w) + max(w) * 2
+        top = min(6000 if len(plans) == 2 else 1500, period * 2 + 50)
+        caps = sorted({rnd.randint(1, top) for _ in range(int(args.amounts))})
+        _check(plans, caps, failures, checked)
+
+    print(json.dumps({"checked": checked[0], "failures": len(failures), "examples": failures[:10]}, ensure_ascii=False, indent=2))
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# users 热点查询的执行计划回归检查：直接调用 core.models / admin_web 里的真实函数，记录它们发出的
+# SELECT，再逐条 EXPLAIN；users 表上出现全表扫描（type=ALL，或未列入白名单的全索引扫描 type=index）即以退出码 1 失败。
+# --seed-users N 会先清空目标库的 users 表并灌入 N 行合成用户，只能指向专用库；不加时只读地检查现有数据。
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_CHECK_TABLES = {"users", "u"}
+# 本来就要数整张表的语句，允许走全索引扫描
+_FULL_INDEX_OK = {"SELECT COUNT(*) FROM users"}
+_SOURCES = ["ref", "ads", "group", "channel", None]
+
+
+def _seed_users(conn, n: int, seed: int):
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM users")
+    batch = []
+    sql = (
+        "INSERT INTO users (telegram_id, language, paid_until, last_source, is_blacklisted, is_whitelisted, "
+        "expired_handled_at, remind_7d_at, remind_3d_at, remind_1d_at, expired_recall_3d_at, expired_recall_7d_at, created_at) "
+        "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
+    )
+    for i in range(n):
+        # 约三成从未付费，其余到期时间分布在过去一年到未来一年；已过期的大多已处理 / 已召回
+        paid_until = None if rnd.random() < 0.3 else now + timedelta(minutes=rnd.randint(-525600, 525600))
+        expired = paid_until is not None and paid_until <= now
+        done = expired and rnd.random() < 0.98
+        near = paid_until is not None and not expired and paid_until <= now + timedelta(days=7)
+        batch.append(
+            (
+                1000000000 + i,
+                rnd.choice(("en", "zh", "ru")),
+                paid_until,
+                rnd.choice(_SOURCES),
+                1 if rnd.random() < 0.01 else 0,
+                1 if rnd.random() < 0.005 else 0,
+                now if done else None,
+                now if (done or (near and rnd.random() < 0.5)) else None,
+                now if done else None,
+                now if done else None,
+                now if done else None,
+                now if done else None,
+                now - timedelta(days=rnd.randint(0, 700)),
+            )
+        )
+        if len(batch) >= 5000:
+            cur.executemany(sql, batch)
+            batch = []
+    if batch:
+        cur.executemany(sql, batch)
+    cur.execute("ANALYZE TABLE users")
+    cur.fetchall()
+    cur.close()
+
+
+class _RecordingCursor:
+    def __init__(self, cur, sink: list):
+        self._cur = cur
+        self._sink = sink
+
+    def execute(self, sql, params=()):
+        if str(sql).lstrip().upper().startswith("SELECT"):
+            self._sink.append((str(sql), tuple(params or ())))
+        return self._cur.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+
+class _RecordingConn:
+    def __init__(self, conn, sink: list):
+        self._conn = conn
+        self._sink = sink
+
+    def cursor(self, *a, **kw):
+        return _RecordingCursor(self._conn.cursor(*a, **kw), self._sink)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _capture(sink: list):
+    import core.db
+    import core.models
+    import admin_web
+
+    raw = core.db.get_conn
+
+    def recording_get_conn():
+        return _RecordingConn(raw(), sink)
+
+    core.models.get_conn = recording_get_conn
+    admin_web.get_conn = recording_get_conn
+    return raw
+
+
+def _hot_calls(now: datetime) -> list[tuple[str, object]]:
+    from core import models
+    import admin_web
+
+    calls = [
+        ("get_unhandled_expired_users", lambda: models.get_unhandled_expired_users(now)),
+        ("expired_recall_3d", lambda: models.get_expired_users_for_recall(now, 3, "expired_recall_3d_at")),
+        ("expired_recall_7d", lambda: models.get_expired_users_for_recall(now, 7, "expired_recall_7d_at")),
+        ("admin stats", admin_web.stats),
+    ]
+    for days in (7, 3, 1):
+        calls.append((f"expiring_{days}d", lambda d=days: models.get_users_expiring_within_days(now, d, f"remind_{d}d_at")))
+    for seg in ("active", "expired", "expiring1d", "expiring3d"):
+        calls.append((f"broadcast {seg}", lambda s=seg: admin_web._pick_broadcast_targets(s, None)))
+    calls.append(("broadcast all+source", lambda: admin_web._pick_broadcast_targets("all", "ref")))
+    return calls
+
+
+def _explain(conn, sql: str, params: tuple) -> list[dict]:
+    cur = conn.cursor(dictionary=True)
+    cur.execute("EXPLAIN " + sql, params)
+    rows = cur.fetchall() or []
+    cur.close()
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-name", required=True)
+    ap.add_argument("--seed-users", type=int, default=0, help="清空 users 并灌入 N 行合成数据（如 1000000）")
+    ap.add_argument("--yes-wipe", action="store_true", help="确认清空目标库的 users 表")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    if args.seed_users and not args.yes_wipe:
+        raise SystemExit("refusing to seed without --yes-wipe (the users table is wiped)")
+    os.environ["DB_NAME"] = args.db_name
+    os.environ["USER_CACHE_SIZE"] = "0"
+
+    from core.models import init_tables
+
+    init_tables()
+    sink: list = []
+    raw_get_conn = _capture(sink)
+    conn = raw_get_conn()
+    if args.seed_users:
+        t0 = time.perf_counter()
+        _seed_users(conn, int(args.seed_users), args.seed)
+        print(f"seeded {args.seed_users} users in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    now = datetime.utcnow()
+    report = []
+    failures = 0
+    for name, fn in _hot_calls(now):
+        sink.clear()
+        t0 = time.perf_counter()
+        fn()
+        ms = round((time.perf_counter() - t0) * 1000.0, 1)
+        for sql, params in list(sink):
+            plan = _explain(conn, sql, params)
+            bad = []
+            for p in plan:
+                if p.get("table") not in _CHECK_TABLES:
+                    continue
+                kind = p.get("type")
+                if kind == "ALL" or (kind == "index" and " ".join(sql.split()) not in _FULL_INDEX_OK):
+                    bad.append(f"{p.get('table')}: type={kind} rows={p.get('rows')}")
+            if not any(p.get("table") in _CHECK_TABLES for p in plan):
+                continue
+            failures += 1 if bad else 0
+            report.append(
+                {
+                    "call": name,
+                    "call_ms": ms,
+                    "sql": " ".join(sql.split())[:200],
+                    "plan": [
+                        {k: p.get(k) for k in ("table", "type", "key", "rows", "filtered", "Extra")}
+                        for p in plan
+                        if p.get("table") in _CHECK_TABLES
+                    ],
+                    "full_scan": bad,
+                }
+            )
+    conn.close()
+    print(json.dumps({"failures": failures, "queries": report}, ensure_ascii=False, indent=2, default=str))
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
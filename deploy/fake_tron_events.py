@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+USDT_CONTRACT = "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"
+
+# 本地 TRC20 Transfer 事件流替身：GET /events 以 SSE 推送事件，POST /emit 注入一笔转账。
+# 用于联调 DEPOSIT_INGEST_MODE=push（TRON_EVENT_STREAM_URL=http://127.0.0.1:8091/events）。
+
+_subs_lock = threading.Lock()
+_subs: list[queue.Queue] = []
+_args = None
+
+
+def _make_event(to_addr: str, amount: str, from_addr: str | None = None, tx_id: str | None = None) -> dict:
+    raw = int(round(float(amount) * 1_000_000))
+    return {
+        "transaction_id": tx_id or secrets.token_hex(32),
+        "block_timestamp": int(time.time() * 1000),
+        "contract_address": USDT_CONTRACT,
+        "event_name": "Transfer",
+        "token_decimals": 6,
+        "result": {"from": from_addr or "TFakeSenderxxxxxxxxxxxxxxxxxxxxxxx", "to": to_addr, "value": str(raw)},
+    }
+
+
+def _broadcast(ev: dict) -> int:
+    with _subs_lock:
+        subs = list(_subs)
+    for q in subs:
+        q.put(ev)
+    return len(subs)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        return
+
+    def _json(self, code: int, obj: dict):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/events":
+            return self._json(404, {"ok": False})
+        q: queue.Queue = queue.Queue()
+        with _subs_lock:
+            _subs.append(q)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        started = time.time()
+        try:
+            while True:
+                if _args.drop_after > 0 and (time.time() - started) >= _args.drop_after:
+                    break
+                try:
+                    ev = q.get(timeout=float(_args.heartbeat))
+                    self.wfile.write(("data: " + json.dumps(ev) + "\n\n").encode("utf-8"))
+                except queue.Empty:
+                    self.wfile.write(b": ping\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with _subs_lock:
+                if q in _subs:
+                    _subs.remove(q)
+            self.close_connection = True
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/emit":
+            return self._json(404, {"ok": False})
+        n = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(n) or b"{}")
+        except Exception:
+            return self._json(400, {"ok": False, "error": "bad json"})
+        to_addr = (body.get("to") or "").strip()
+        if not to_addr:
+            return self._json(400, {"ok": False, "error": "to required"})
+        ev = _make_event(to_addr, str(body.get("amount") or "0"), body.get("from"), body.get("tx_id"))
+        subscribers = _broadcast(ev)
+        return self._json(200, {"ok": True, "event": ev, "subscribers": subscribers})
+
+
+def _auto_emit(addrs: list[str], interval: float):
+    while True:
+        time.sleep(max(0.05, interval))
+        amount = f"{random.choice([1.99, 3.99, 15.99]) + random.randint(1, 99) / 10000:.4f}"
+        _broadcast(_make_event(random.choice(addrs), amount))
+
+
+def main():
+    global _args
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default=os.getenv("FAKE_TRON_EVENTS_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("FAKE_TRON_EVENTS_PORT", "8091")))
+    ap.add_argument("--heartbeat", type=float, default=15.0)
+    ap.add_argument("--drop-after", type=float, default=0.0, help="每个连接保持 N 秒后主动断开（测试回退轮询），0=不断开")
+    ap.add_argument("--auto-addrs", default="", help="逗号分隔：自动向这些地址随机推送转账")
+    ap.add_argument("--auto-interval", type=float, default=2.0)
+    _args = ap.parse_args()
+
+    addrs = [a.strip() for a in _args.auto_addrs.split(",") if a.strip()]
+    if addrs:
+        threading.Thread(target=_auto_emit, args=(addrs, _args.auto_interval), daemon=True).start()
+
+    srv = ThreadingHTTPServer((_args.host, _args.port), Handler)
+    srv.daemon_threads = True
+    print(f"fake tron events listening on http://{_args.host}:{_args.port}/events (POST /emit to inject)")
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+USDT_CONTRACT = "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"
+
+# 本地 TronGrid 替身：实现 /v1/accounts/{addr}/transactions/trc20（min_timestamp + fingerprint 翻页）
+# 和 /v1/accounts/{addr}（USDT 余额），可注入延迟和 429。供 bench_deposits.py 或手工联调
+# （TRONGRID_API_BASE=http://127.0.0.1:8092）使用。
+
+
+class FakeTronGridState:
+    def __init__(self, latency_ms: float = 0.0, rate_429: float = 0.0):
+        self.latency_ms = float(latency_ms)
+        self.rate_429 = float(rate_429)
+        self._lock = threading.Lock()
+        self._txs: dict[str, list[dict]] = {}
+        self.requests = 0
+        self.throttled = 0
+
+    def add_transfer(self, to_addr: str, amount, from_addr: str | None = None, ts_ms: int | None = None) -> str:
+        tx_id = secrets.token_hex(32)
+        tx = {
+            "transaction_id": tx_id,
+            "token_info": {"symbol": "USDT", "address": USDT_CONTRACT, "decimals": 6, "name": "Tether USD"},
+            "block_timestamp": int(ts_ms if ts_ms is not None else time.time() * 1000),
+            "from": from_addr or "TFakeSenderxxxxxxxxxxxxxxxxxxxxxxx",
+            "to": to_addr,
+            "type": "Transfer",
+            "value": str(int(round(float(amount) * 1_000_000))),
+        }
+        with self._lock:
+            self._txs.setdefault(to_addr, []).append(tx)
+        return tx_id
+
+    def list_incoming(self, addr: str, min_ts: int, asc: bool, offset: int, limit: int) -> tuple[list[dict], int | None]:
+        with self._lock:
+            rows = [t for t in self._txs.get(addr, []) if int(t["block_timestamp"]) >= min_ts]
+        rows.sort(key=lambda t: t["block_timestamp"], reverse=not asc)
+        page = rows[offset : offset + limit]
+        nxt = offset + limit if offset + limit < len(rows) else None
+        return page, nxt
+
+    def balance(self, addr: str) -> int:
+        with self._lock:
+            return sum(int(t["value"]) for t in self._txs.get(addr, []))
+
+
+def _make_handler(state: FakeTronGridState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            return
+
+        def _json(self, code: int, obj: dict):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if code == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with state._lock:
+                state.requests += 1
+            if state.latency_ms > 0:
+                time.sleep(random.uniform(0.5, 1.5) * state.latency_ms / 1000.0)
+            if state.rate_429 > 0 and random.random() < state.rate_429:
+                with state._lock:
+                    state.throttled += 1
+                return self._json(429, {"Error": "request rate exceeded"})
+
+            u = urlparse(self.path)
+            parts = [p for p in u.path.split("/") if p]
+            qs = parse_qs(u.query)
+            if len(parts) == 5 and parts[:2] == ["v1", "accounts"] and parts[3:] == ["transactions", "trc20"]:
+                addr = parts[2]
+                limit = max(1, min(200, int((qs.get("limit") or ["20"])[0])))
+                min_ts = int((qs.get("min_timestamp") or ["0"])[0])
+                asc = (qs.get("order_by") or ["block_timestamp,desc"])[0].endswith(",asc")
+                offset = int((qs.get("fingerprint") or ["0"])[0] or 0)
+                page, nxt = state.list_incoming(addr, min_ts, asc, offset, limit)
+                meta = {"at": int(time.time() * 1000), "page_size": len(page)}
+                if nxt is not None:
+                    meta["fingerprint"] = str(nxt)
+                return self._json(200, {"data": page, "success": True, "meta": meta})
+            if len(parts) == 3 and parts[:2] == ["v1", "accounts"]:
+                bal = state.balance(parts[2])
+                return self._json(200, {"data": [{"address": parts[2], "trc20": [{USDT_CONTRACT: str(bal)}]}], "success": True})
+            return self._json(404, {"Error": "not found"})
+
+    return Handler
+
+
+def start_server(state: FakeTronGridState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer((host, port), _make_handler(state))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def fake_addr(i: int) -> str:
+    return f"TFake{int(i):029d}"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default=os.getenv("FAKE_TRONGRID_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("FAKE_TRONGRID_PORT", "8092")))
+    ap.add_argument("--addrs", type=int, default=100)
+    ap.add_argument("--transfers-per-addr", type=int, default=5)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    args = ap.parse_args()
+
+    state = FakeTronGridState(args.latency_ms, args.rate_429)
+    now_ms = int(time.time() * 1000)
+    for i in range(max(0, args.addrs)):
+        for _ in range(max(0, args.transfers_per_addr)):
+            state.add_transfer(fake_addr(i), f"{random.uniform(1, 50):.2f}", ts_ms=now_ms - random.randint(0, 3600_000))
+    srv = start_server(state, args.host, args.port)
+    print(f"fake trongrid listening on http://{args.host}:{srv.server_address[1]} addrs={args.addrs} (e.g. {fake_addr(0)})")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps({"requests": state.requests, "throttled": state.throttled}))
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 import argparse
+import asyncio
 import base64
+import http.client
 import json
 import random
 import statistics
+import threading
 import time
 import urllib.error
 import urllib.parse
@@ -33,6 +36,86 @@ def _req(url: str, method: str, headers: dict[str, str], body: bytes | None, tim
         return 0, 0, f"{type(e).__name__}: {e}"
 
 
+_local = threading.local()
+
+
+def _req_keepalive(url: str, method: str, headers: dict[str, str], body: bytes | None, timeout: float) -> tuple[int, int, str]:
+    """
+    每个压测线程复用一条 HTTP/1.1 长连接（模拟浏览器 / Mini App 的 keep-alive），出错后重连
+    """
+    u = urllib.parse.urlsplit(url)
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        cls = http.client.HTTPSConnection if u.scheme == "https" else http.client.HTTPConnection
+        conn = cls(u.hostname, u.port, timeout=timeout)
+        _local.conn = conn
+    target = u.path + (("?" + u.query) if u.query else "")
+    try:
+        conn.request(method, target, body=body, headers=headers)
+        resp = conn.getresponse()
+        data = resp.read()
+        if resp.will_close:
+            conn.close()
+            _local.conn = None
+        return resp.status, len(data), ""
+    except Exception as e:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        _local.conn = None
+        return 0, 0, f"{type(e).__name__}: {e}"
+
+
+async def _aio_req(conn: list, url: str, method: str, headers: dict[str, str], body: bytes | None, timeout: float, keepalive: bool):
+    """
+    asyncio 压测端的单次请求：conn 为 [reader, writer] 长连接槽位，keepalive 时跨请求复用
+    """
+    u = urllib.parse.urlsplit(url)
+    target = u.path + (("?" + u.query) if u.query else "")
+    try:
+        if conn[0] is None:
+            conn[0], conn[1] = await asyncio.wait_for(
+                asyncio.open_connection(u.hostname, u.port or (443 if u.scheme == "https" else 80), ssl=(u.scheme == "https") or None),
+                timeout=timeout,
+            )
+        reader, writer = conn
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {u.netloc}", f"Content-Length: {len(body or b'')}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        if not keepalive:
+            lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=timeout)
+        status = int(head.split(b" ", 2)[1])
+        length = None
+        # HTTP/1.0 响应（ThreadingHTTPServer 默认）发完即关连接
+        close = (not keepalive) or head.startswith(b"HTTP/1.0")
+        for line in head.split(b"\r\n")[1:]:
+            k, _, v = line.partition(b":")
+            k = k.strip().lower()
+            if k == b"content-length":
+                length = int(v.strip())
+            elif k == b"connection" and v.strip().lower() == b"close":
+                close = True
+        if method == "HEAD":
+            length = 0
+        if length is None:
+            data = await asyncio.wait_for(reader.read(), timeout=timeout)
+            close = True
+        else:
+            data = await asyncio.wait_for(reader.readexactly(length), timeout=timeout) if length else b""
+        if close:
+            writer.close()
+            conn[0] = conn[1] = None
+        return status, len(data), ""
+    except Exception as e:
+        if conn[1] is not None:
+            conn[1].close()
+        conn[0] = conn[1] = None
+        return 0, 0, f"{type(e).__name__}: {e}"
+
+
 def _percentile(values: list[float], p: float) -> float:
     if not values:
         return 0.0
@@ -50,7 +133,19 @@ def main():
     ap.add_argument("--duration", type=int, default=60)
     ap.add_argument("--concurrency", type=int, default=30)
     ap.add_argument("--timeout", type=float, default=8.0)
-    ap.add_argument("--mix", default="health,stats,users,detail", help="comma list: health,stats,users,detail")
+    ap.add_argument(
+        "--mix",
+        default="health,stats,users,detail",
+        help="comma list: health,stats,users,detail,webapp(公开 Mini App 接口),static(--static-path 指定的 /uploads/ 文件)",
+    )
+    ap.add_argument("--keepalive", action="store_true", help="每个并发复用长连接（默认每请求新建连接）")
+    ap.add_argument("--static-path", default="/webapp/index.html")
+    ap.add_argument(
+        "--engine",
+        choices=("threads", "asyncio"),
+        default="threads",
+        help="压测端实现：threads=每并发一个线程；asyncio=单线程协程，500+ 并发时压测端自身不成为瓶颈",
+    )
     ap.add_argument("--telegram-id", type=int, default=0, help="optional fixed telegram_id for detail")
     ap.add_argument("--q", default="", help="optional username query")
     args = ap.parse_args()
@@ -79,66 +174,103 @@ def main():
             tid = args.telegram_id or random.randint(10000, 99999)
             qs = urllib.parse.urlencode({"telegram_id": str(tid)})
             return f"{base}/api/user_detail?{qs}", "GET", None, {}
+        if kind == "webapp":
+            return f"{base}{random.choice(['/api/webapp/config', '/api/webapp/plans'])}", "GET", None, {}
+        if kind == "static":
+            return f"{base}{args.static_path}", "GET", None, {}
         return f"{base}/health", "GET", None, {}
 
-    end_at = time.time() + max(1, int(args.duration))
+    send = _req_keepalive if args.keepalive else _req
+    started_at = time.time()
+    end_at = started_at + max(1, int(args.duration))
     latencies: list[float] = []
+    statuses: list[int] = []
     codes: dict[int, int] = {}
     errs: dict[str, int] = {}
     bytes_total = 0
     total = 0
 
-    def worker_once() -> tuple[float, int, int, str]:
-        kind = random.choice(mix)
-        url, method, body, extra_headers = make_task_url(kind)
+    def next_task() -> tuple[str, str, bytes | None, dict[str, str]]:
+        url, method, body, extra_headers = make_task_url(random.choice(mix))
         h = dict(headers)
         for k, v in extra_headers.items():
             h[k] = v
+        return url, method, body, h
+
+    def worker_once() -> tuple[float, int, int, str]:
+        url, method, body, h = next_task()
         t0 = time.time()
-        code, size, err = _req(url, method, h, body, args.timeout)
+        code, size, err = send(url, method, h, body, args.timeout)
         dt = time.time() - t0
         return dt, code, size, err
 
-    with ThreadPoolExecutor(max_workers=max(1, int(args.concurrency))) as ex:
-        inflight = set()
-        for _ in range(max(1, int(args.concurrency))):
-            inflight.add(ex.submit(worker_once))
-
-        while inflight:
-            done, _pending = wait(inflight, timeout=1, return_when=FIRST_COMPLETED)
-            if not done:
-                if time.time() >= end_at:
-                    break
-                continue
-            for f in list(done):
-                inflight.remove(f)
+    def record(dt: float, code: int, size: int, err: str):
+        nonlocal total, bytes_total
+        total += 1
+        latencies.append(float(dt))
+        statuses.append(int(code))
+        bytes_total += int(size)
+        codes[int(code)] = int(codes.get(int(code), 0)) + 1
+        if err:
+            errs[err] = int(errs.get(err, 0)) + 1
+
+    async def aio_client():
+        conn: list = [None, None]
+        while time.time() < end_at:
+            url, method, body, h = next_task()
+            t0 = time.time()
+            code, size, err = await _aio_req(conn, url, method, h, body, args.timeout, args.keepalive)
+            record(time.time() - t0, code, size, err)
+        if conn[1] is not None:
+            conn[1].close()
+
+    async def aio_run():
+        await asyncio.gather(*(aio_client() for _ in range(max(1, int(args.concurrency)))))
+
+    def run_threads():
+        with ThreadPoolExecutor(max_workers=max(1, int(args.concurrency))) as ex:
+            inflight = set()
+            for _ in range(max(1, int(args.concurrency))):
+                inflight.add(ex.submit(worker_once))
+
+            while inflight:
+                done, _pending = wait(inflight, timeout=1, return_when=FIRST_COMPLETED)
+                if not done:
+                    if time.time() >= end_at:
+                        break
+                    continue
+                for f in list(done):
+                    inflight.remove(f)
+                    try:
+                        dt, code, size, err = f.result()
+                    except Exception as e:
+                        dt, code, size, err = 0.0, 0, 0, f"{type(e).__name__}: {e}"
+                    record(dt, code, size, err)
+
+                    if time.time() < end_at:
+                        inflight.add(ex.submit(worker_once))
+
+            for f in list(inflight):
                 try:
-                    dt, code, size, err = f.result()
-                except Exception as e:
-                    dt, code, size, err = 0.0, 0, 0, f"{type(e).__name__}: {e}"
-                total += 1
-                latencies.append(float(dt))
-                bytes_total += int(size)
-                codes[int(code)] = int(codes.get(int(code), 0)) + 1
-                if err:
-                    errs[err] = int(errs.get(err, 0)) + 1
-
-                if time.time() < end_at:
-                    inflight.add(ex.submit(worker_once))
-
-        for f in list(inflight):
-            try:
-                f.cancel()
-            except Exception:
-                pass
+                    f.cancel()
+                except Exception:
+                    pass
+
+    if args.engine == "asyncio":
+        asyncio.run(aio_run())
+    else:
+        run_threads()
 
+    elapsed = max(1e-6, time.time() - started_at)
     ok = sum(v for k, v in codes.items() if 200 <= k < 300)
+    shed = int(codes.get(503, 0))
     fail = total - ok
     p50 = _percentile(latencies, 0.50)
     p95 = _percentile(latencies, 0.95)
     p99 = _percentile(latencies, 0.99)
     avg = statistics.mean(latencies) if latencies else 0.0
-    rps = (total / max(1.0, float(args.duration)))
+    rps = total / elapsed
+    ok_lat = [latencies[i] for i in range(len(latencies)) if 200 <= statuses[i] < 300]
 
     out = {
         "base": base,
@@ -147,11 +279,14 @@ def main():
         "requests": int(total),
         "ok": int(ok),
         "fail": int(fail),
+        "shed_503": shed,
+        "keepalive": bool(args.keepalive),
         "rps": round(float(rps), 2),
         "avg_ms": round(float(avg) * 1000.0, 2),
         "p50_ms": round(float(p50) * 1000.0, 2),
         "p95_ms": round(float(p95) * 1000.0, 2),
         "p99_ms": round(float(p99) * 1000.0, 2),
+        "ok_p99_ms": round(_percentile(ok_lat, 0.99) * 1000.0, 2),
         "bytes_total": int(bytes_total),
         "codes": dict(sorted(codes.items(), key=lambda x: x[0])),
         "top_errors": sorted(errs.items(), key=lambda x: x[1], reverse=True)[:5],
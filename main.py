@@ -1,12 +1,25 @@
 # main.py
+import asyncio
 import logging
 from datetime import time
 
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ChatJoinRequestHandler, filters
 
-from config import BOT_TOKEN, PAID_CHANNEL_ID, AUTO_CLIP_FROM_PAID_CHANNEL
+from config import (
+    BOT_TOKEN,
+    PAID_CHANNEL_ID,
+    AUTO_CLIP_FROM_PAID_CHANNEL,
+    OUTBOX_POLL_SEC,
+    BALANCE_SNAPSHOT_INTERVAL_SEC,
+    DEPOSIT_INGEST_MODE,
+    DEPOSIT_WORKER_COUNT,
+    DEPOSIT_WORKER_INDEX,
+    PAYMENT_MODE,
+    RECEIVE_ADDRESS,
+)
 from core.logging_setup import setup_logging
-from core.models import init_tables
+from core.db import set_role as set_db_role
+from core.models import init_tables, get_wallet_addrs
 from bot.handlers import (
     start,
     plans,
@@ -33,19 +46,78 @@ from bot.scheduler import (
     cleanup_downloads_job,
     health_alert_job,
     heartbeat_job,
+    balance_snapshot_job,
+    trigger_deposit_check,
+    release_amount_slots_job,
+    address_pool_job,
+    video_views_job,
+    archive_job,
 )
 from bot.clipper import private_channel_video_handler
 from bot.uploader import build_upload_conversation_handler
 from bot.error_notify import application_error_handler
 from bot.join_requests import paid_channel_join_request
+from bot.outbox import outbox_worker_job
+from chain.tron_client import aclose_async_client
+from chain import tron_events
+from core import adb
 
 logger = logging.getLogger(__name__)
 
+
+def _event_addresses() -> list[str]:
+    addrs = get_wallet_addrs()
+    if RECEIVE_ADDRESS:
+        addrs.append(RECEIVE_ADDRESS)
+    return addrs
+
+
+async def _post_init(app: Application):
+    # 单地址模式只有 0 号进程取事件入库，其余分片进程订阅了也没人取，缓冲会一直增长
+    if PAYMENT_MODE == "single_address" and RECEIVE_ADDRESS and int(DEPOSIT_WORKER_INDEX) > 0:
+        return
+    if DEPOSIT_INGEST_MODE == "push":
+        tron_events.start(_event_addresses, lambda: trigger_deposit_check(app))
+
+
+async def _post_shutdown(app: Application):
+    await tron_events.stop()
+    await aclose_async_client()
+    adb.shutdown(wait=False)
+
+
+async def _run_deposit_worker(app: Application):
+    """
+    充值分片进程（DEPOSIT_WORKER_INDEX > 0）：不拉取 Telegram 更新（同一 BOT_TOKEN 只能有一个 getUpdates），
+    只跑本分片的充值检测和出站队列投递；其余定时任务只在 0 号进程执行，避免重复踢人 / 提醒 / 汇报
+    """
+    await app.initialize()
+    await app.start()
+    await _post_init(app)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await app.stop()
+        await app.shutdown()
+        await _post_shutdown(app)
+
+
 def main():
     setup_logging()
+    set_db_role("bot")
     init_tables()
 
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = Application.builder().token(BOT_TOKEN).post_init(_post_init).post_shutdown(_post_shutdown).build()
+
+    if int(DEPOSIT_WORKER_INDEX) > 0:
+        app.job_queue.run_repeating(check_deposits_job, interval=60, first=10)
+        app.job_queue.run_repeating(outbox_worker_job, interval=max(0.5, float(OUTBOX_POLL_SEC)), first=5)
+        logger.info(f"🚀 充值分片进程 {DEPOSIT_WORKER_INDEX}/{DEPOSIT_WORKER_COUNT} 已启动（不拉取消息）")
+        try:
+            asyncio.run(_run_deposit_worker(app))
+        except KeyboardInterrupt:
+            pass
+        return
 
     # 命令
     app.add_handler(CommandHandler("start", start))
@@ -75,16 +147,22 @@ def main():
             )
         )
 
-    # 定时任务：每 60 秒检查到账，每小时检查过期
+    # 定时任务：每 60 秒检查到账（多进程时只处理 0 号分片），每小时检查过期；以下任务全部只在 0 号进程运行
     app.job_queue.run_repeating(check_deposits_job, interval=60, first=10)
+    app.job_queue.run_repeating(outbox_worker_job, interval=max(0.5, float(OUTBOX_POLL_SEC)), first=5)
     app.job_queue.run_repeating(check_expired_job, interval=3600, first=60)
     app.job_queue.run_repeating(check_expiring_job, interval=3600, first=120)
     app.job_queue.run_repeating(expired_recall_job, interval=3600, first=180)
     app.job_queue.run_repeating(cleanup_logs_job, interval=21600, first=300)
+    app.job_queue.run_repeating(address_pool_job, interval=1800, first=240)
+    app.job_queue.run_repeating(video_views_job, interval=3600, first=420)
+    app.job_queue.run_repeating(release_amount_slots_job, interval=600, first=90)
+    app.job_queue.run_repeating(balance_snapshot_job, interval=max(60, int(BALANCE_SNAPSHOT_INTERVAL_SEC)), first=30)
     app.job_queue.run_repeating(hourly_admin_report_job, interval=3600, first=600)
     app.job_queue.run_repeating(health_alert_job, interval=300, first=120)
     app.job_queue.run_repeating(heartbeat_job, interval=60, first=5)
     app.job_queue.run_daily(cleanup_downloads_job, time=time(hour=3, minute=0))
+    app.job_queue.run_daily(archive_job, time=time(hour=4, minute=0))
 
     logger.info("🚀 Bot is Running — 收款 / 续费 / 踢人 / 剪辑 / 邀请裂变 已开启")
     app.run_polling()